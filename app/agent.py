@@ -0,0 +1,25 @@
+import asyncio
+from fastapi import FastAPI
+from dotenv import load_dotenv
+from app.routes.android_device_manager import router as android_router
+from app.routes.ios_device_manager import router as ios_router
+from app.routes.agent import router as agent_router
+from app.services import farm_agent
+
+# Per-host device agent. Exposes the same device manager routes as the main app, without
+# GitLab/session handling, so the central API can proxy to it:
+#   FARM_AGENT_ID=host-a FARM_AGENT_URL=http://10.0.0.12:8101 FARM_ROUTER_URL=http://central:8000 \
+#   uvicorn app.agent:app --host 0.0.0.0 --port 8101
+
+load_dotenv()
+
+app = FastAPI()
+
+app.include_router(agent_router)
+app.include_router(ios_router)
+app.include_router(android_router)
+
+@app.on_event("startup")
+async def on_startup():
+    print(f"[Agent] {farm_agent.AGENT_ID} serving at {farm_agent.AGENT_URL}")
+    app.state.register_task = asyncio.create_task(farm_agent.register_loop())
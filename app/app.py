@@ -1,9 +1,10 @@
 import os
 import shutil
+import time
 from urllib.parse import urlencode
 import uuid
 import httpx
-from fastapi import FastAPI, HTTPException, Cookie
+from fastapi import FastAPI, HTTPException, Cookie, Request
 from fastapi.responses import RedirectResponse
 from app.routes.android_device_manager import router as android_router
 from fastapi.middleware.cors import CORSMiddleware
@@ -11,8 +12,17 @@ from app.routes.ios_device_manager import router as ios_router
 from app.routes.device_manager import router as device_manager_router
 import app.database as database
 from dotenv import load_dotenv
-import app.services.gitlab_service as gitlab_service
+import app.services.gitlab_async as gitlab_async
 from app.routes.gitlab import router as gitlab_router
+from app.routes.farm import router as farm_router
+from app.routes.leases import router as leases_router
+import app.routes.android_device_manager as android_routes
+import app.routes.ios_device_manager as ios_routes
+from app.services.farm_router import farm
+from app.services.pipeline_sync import pipeline_sync
+from app.services.artifact_catalog import catalog as artifact_catalog
+from app.services.build_prefetch import prefetcher
+from app.services.gitlab_http_cache import begin_trace, trace_stats
 
 
 load_dotenv()
@@ -39,15 +49,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_gitlab_calls(request: Request, call_next):
+    """Count the GitLab calls each /gitlab request makes (X-GitLab-Calls header and /gitlab/trace/stats)."""
+    if not request.url.path.startswith("/gitlab"):
+        return await call_next(request)
+    trace = begin_trace()
+    started = time.time()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    trace_stats.record(f"{request.method} {getattr(route, 'path', request.url.path)}", trace, time.time() - started)
+    response.headers["X-GitLab-Calls"] = str(trace.network)
+    response.headers["X-GitLab-Cached"] = str(trace.cached + trace.coalesced)
+    return response
+
 app.include_router(device_manager_router)
 app.include_router(ios_router)
 app.include_router(android_router)
 app.include_router(gitlab_router)
+app.include_router(farm_router)
+app.include_router(leases_router)
 
 database.init_db()
 
 @app.on_event("startup")
 async def on_startup():
+    # Track remote device agents (FARM_AGENTS / self-registration); idle when there are none
+    await farm.start()
+    # Keep builds.status current from GitLab (PIPELINE_SYNC_INTERVAL, 0 disables)
+    pipeline_sync.start()
+    # Index storage/artifacts for /gitlab/artifacts (ARTIFACT_CATALOG_INTERVAL)
+    artifact_catalog.start()
+    # Prefetch (and optionally install) builds for users who opted in via PUT /gitlab/prefetch
+    prefetcher.start({"android": android_routes.manager.install_app, "ios": ios_routes.manager.install_app})
     try:
         # Warn if critical tools are missing
         if shutil.which('adb') is None:
@@ -70,6 +104,14 @@ async def on_startup():
     except Exception as e:
         print(f"[Startup] Android scan failed: {e}")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await farm.stop()
+    pipeline_sync.stop()
+    artifact_catalog.stop()
+    await prefetcher.stop()
+    await gitlab_async.close_client()
+
 @app.get("/")
 def root():
     return {"message": "Open /docs to see the api documentation."}
@@ -129,9 +171,9 @@ async def gitlab_callback(code: str):
         if not access_token or not refresh_token:
             raise HTTPException(status_code=400, detail="Failed to obtain access token")
         
-        # Fetch user info to get username
-        gl = gitlab_service.GitLabService(GITLAB_URL, access_token)
-        user = gl.get_user()
+        # Fetch user info to get username; also warms the client cache for this token
+        gl = await gitlab_async.get_service(GITLAB_URL, access_token)
+        user = await gl.get_user()
         username = user.get('username')
         
         session_id = str(uuid.uuid4())
@@ -162,6 +204,10 @@ def logout(dev_farm_session: str = Cookie(None)):
     if not dev_farm_session:
         raise HTTPException(status_code=400, detail="No session cookie found")
 
+    token = get_token_from_session(dev_farm_session)
+    if token:
+        gitlab_async.invalidate(GITLAB_URL, token)
+
     conn = database.get_connection()
     cursor = conn.cursor()
 
@@ -1,11 +1,116 @@
+import os
 import sqlite3
+import threading
 
-DB_PATH = "device_manager.db"
+DB_PATH = os.getenv("DEVICE_FARM_DB", "device_manager.db")
+# Device log index lives in its own file so high-rate log ingest never contends with sessions/builds
+LOG_DB_PATH = os.getenv("DEVICE_LOGS_DB", "device_logs.db")
+POOL_SIZE = int(os.getenv("DEVICE_FARM_DB_POOL", "8"))  # idle connections kept per database
+BUSY_TIMEOUT_MS = int(os.getenv("DEVICE_FARM_DB_BUSY_TIMEOUT_MS", "5000"))
+CACHED_STATEMENTS = 256  # per connection; pooled connections keep their prepared statements
+
+
+class PooledConnection:
+    """A pooled sqlite3 connection; close() hands it back to the pool instead of closing it."""
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of SQLite connections in WAL mode.
+
+    Connections are opened on demand and up to `size` idle ones are kept (most recently
+    used first, so their statement caches stay warm); get_connection() never blocks, so
+    code holding one connection may still open another. WAL lets readers run alongside
+    the single writer, synchronous=NORMAL syncs at checkpoints instead of every commit,
+    and the busy timeout makes writers wait for each other instead of failing with
+    "database is locked".
+    """
+
+    def __init__(self, path, size=POOL_SIZE, busy_timeout_ms=BUSY_TIMEOUT_MS):
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False,
+                               cached_statements=CACHED_STATEMENTS)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return PooledConnection(self, self._idle.pop())
+        return PooledConnection(self, self._open())
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()  # what closing it would have done to uncommitted work
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {"path": self.path, "idle": len(self._idle), "size": self.size, "opened": self.opened,
+                    "reused": self.reused}
+
+
+_pool = ConnectionPool(DB_PATH)
+_log_pool = ConnectionPool(LOG_DB_PATH)
 
 def get_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return _pool.acquire()
+
+def pool_stats():
+    return {"main": _pool.stats(), "logs": _log_pool.stats()}
+
+def add_missing_columns(cursor, table, columns):
+    """Add columns introduced after a database file was first created."""
+    existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    for name, column_type in columns.items():
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
 
 def init_db():
     conn = get_connection()
@@ -38,9 +143,18 @@ def init_db():
             web_url TEXT,
             artifact_path TEXT,
             username TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT,
+            updated_at TIMESTAMP,
+            duration INTEGER,
+            finished_at TIMESTAMP,
+            artifact_digest TEXT
         )
     ''')
+    add_missing_columns(cursor, 'builds', {'status': 'TEXT', 'updated_at': 'TIMESTAMP', 'duration': 'INTEGER',
+                                           'finished_at': 'TIMESTAMP', 'artifact_digest': 'TEXT'})
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_builds_pipeline ON builds (pipeline_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_builds_status ON builds (status)')
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS artifacts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -48,9 +162,129 @@ def init_db():
             project_id INTEGER NOT NULL,
             username TEXT,
             file_path TEXT NOT NULL,
-            downloaded_at TIMESTAMP
+            downloaded_at TIMESTAMP,
+            digest TEXT
+        )
+    ''')
+    add_missing_columns(cursor, 'artifacts', {'digest': 'TEXT'})
+    # Content-addressed artifact store (app/services/artifact_store.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS artifact_objects (
+            digest TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            pinned INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS artifact_links (
+            link_path TEXT PRIMARY KEY,
+            digest TEXT NOT NULL
+        )
+    ''')
+    # /gitlab/artifacts index of storage/artifacts (app/services/artifact_catalog.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS artifact_catalog (
+            entry TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            extension TEXT,
+            platform TEXT,
+            type TEXT NOT NULL,
+            pipeline_id INTEGER,
+            job_id INTEGER,
+            digest TEXT,
+            mtime REAL NOT NULL,
+            indexed_at REAL NOT NULL
+        )
+    ''')
+    # Listings are newest first; the old (platform, extension, filename) index matched the previous order
+    cursor.execute('DROP INDEX IF EXISTS idx_artifact_catalog_listing')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_artifact_catalog_newest ON artifact_catalog (pipeline_id, mtime)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_artifact_catalog_platform ON artifact_catalog (platform, pipeline_id, mtime)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_artifact_catalog_digest ON artifact_catalog (digest)')
+    # Most recent device each user booted or installed on, per platform (build prefetch installs there)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS device_usage (
+            username TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            device TEXT NOT NULL,
+            used_at REAL NOT NULL,
+            PRIMARY KEY (username, platform)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS prefetch_settings (
+            username TEXT PRIMARY KEY,
+            enabled INTEGER NOT NULL DEFAULT 0,
+            install INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_artifact_objects_lru ON artifact_objects (pinned, last_used_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_artifact_links_digest ON artifact_links (digest)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_builds_artifact_digest ON builds (artifact_digest)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_digest ON artifacts (digest)')
+    conn.commit()
+    conn.close()
+
+def get_log_connection():
+    return _log_pool.acquire()
+
+def fts5_available(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def init_log_db():
+    conn = get_log_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device TEXT NOT NULL,
+            platform TEXT,
+            started_at REAL NOT NULL,
+            ended_at REAL
         )
     ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_segments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            first_ts REAL,
+            last_ts REAL,
+            line_count INTEGER DEFAULT 0,
+            compressed_size INTEGER
+        )
+    ''')
+    # One row per log line; the message text itself lives only in the compressed segment
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_lines (
+            id INTEGER PRIMARY KEY,
+            segment_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            priority TEXT,
+            tag TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_lines_ts ON log_lines (ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_lines_segment ON log_lines (segment_id, seq)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_lines_tag ON log_lines (tag, ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_segments_session ON log_segments (session_id)')
+    if fts5_available(conn):
+        # Contentless: only the inverted index is stored, rowid = log_lines.id
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5(message, content='')")
     conn.commit()
     conn.close()
 
@@ -65,3 +299,15 @@ def get_token_from_session(session_id: str):
     if row:
         return row["access_token"]
     return None
+
+def get_username_from_session(session_id: str):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT username FROM sessions WHERE session_id = ?', (session_id,))
+    row = cursor.fetchone()
+    conn.close()
+
+    if row:
+        return row["username"]
+    return None
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+import app.routes.android_device_manager as android_routes
+import app.routes.ios_device_manager as ios_routes
+from app.services import farm_agent
+
+router = APIRouter(prefix="/agent", tags=["Agent"])
+
+@router.get("/health")
+def agent_health():
+    return {"agent_id": farm_agent.AGENT_ID, "status": "ok", "load": farm_agent.host_load()}
+
+@router.get("/inventory")
+async def agent_inventory():
+    """Devices on this host plus current load; polled by the central farm router."""
+    # Listing shells out to adb/emulator/simctl, keep it off the event loop
+    return await run_in_threadpool(farm_agent.collect_inventory, android_routes.manager, ios_routes.manager)
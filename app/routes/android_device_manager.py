@@ -1,6 +1,10 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Cookie
 from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
 import app.services.android_device_manager as adm
+from app.services.lease_scheduler import ensure_device_access, record_device_use, LeaseError
+from app.services.admission import AdmissionRejected
+from app.services.batch_runner import BatchRequest, batch_response, validate_batch
 import asyncio
 import os
 import json
@@ -78,6 +82,11 @@ def list_avds_with_status():
         })
     return {"avds": items}
 
+@router.get("/avds/details")
+def list_avd_details():
+    """AVDs with API level, ABI, system image, device profile and RAM from their config.ini."""
+    return {"avds": manager.list_avd_details()}
+
 @router.get("/emulators")
 def list_running_emulators():
     """List running emulator serials and their resolved AVD names."""
@@ -104,10 +113,20 @@ def list_installed_system_images():
         pass
     try:
         images = manager.list_installed_system_images()
-        return {"installed_system_images": images}
+        return {"installed_system_images": images, "system_images": manager.list_system_image_details()}
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
+@router.get("/resources")
+def get_emulator_resources():
+    """Resident memory and CPU share of each running emulator process family."""
+    return {"emulators": manager.resource_usage()}
+
+@router.get("/boot-timings")
+def get_boot_timings():
+    """Per-device boot phase timings (seconds since launch or first wait) from the boot monitors."""
+    return {"devices": manager.readiness.timings()}
+
 @router.get("/device-info")
 def get_android_device_info(avd_name: str):
     """
@@ -153,7 +172,7 @@ def delete_android_avd(name: str):
     return {"message": result}
 
 @router.post("/emulator/start")
-def start_android_emulator(avd_name: str):
+def start_android_emulator(avd_name: str, dev_farm_session: str = Cookie(None)):
     log = None
     # Refresh mapping before start in case of stale DB
     try:
@@ -161,37 +180,77 @@ def start_android_emulator(avd_name: str):
     except Exception:
         pass
     try:
+        ensure_device_access('android', avd_name, dev_farm_session)
         result = manager.start_emulator(avd_name, log)
+        record_device_use('android', avd_name, dev_farm_session)
         return {"message": result}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
 @router.post("/emulator/stop")
-def stop_android_emulator(avd_name: str):
+def stop_android_emulator(avd_name: str, dev_farm_session: str = Cookie(None)):
     # Refresh mapping so stop resolves correct serial/pid
     try:
         manager._refresh_emulator_mapping()
     except Exception:
         pass
     try:
+        ensure_device_access('android', avd_name, dev_farm_session)
         result = manager.stop_emulator(avd_name)
         return {"message": result}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
 @router.post("/emulator/install-app")
-def install_android_app(avd_name: str, app_path: str):
+def install_android_app(avd_name: str, app_path: str, dev_farm_session: str = Cookie(None)):
     # Refresh mapping so install targets the correct emulator
     try:
         manager._refresh_emulator_mapping()
     except Exception:
         pass
     try:
+        ensure_device_access('android', avd_name, dev_farm_session)
         result = manager.install_app(avd_name, app_path)
+        record_device_use('android', avd_name, dev_farm_session)
         return {"message": result}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
+@router.post("/batch")
+def run_android_batch(request: BatchRequest, dev_farm_session: str = Cookie(None)):
+    """
+    Run one lifecycle operation (boot, shutdown, erase, install, uninstall) on many AVDs
+    concurrently. Streams one NDJSON line per AVD as it finishes, then a summary line.
+    """
+    error = validate_batch(request)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    operations = {
+        "boot": lambda avd: manager.start_emulator(avd, None),
+        "shutdown": manager.stop_emulator,
+        "erase": manager.erase_avd,
+        "install": lambda avd: manager.install_app(avd, request.app_path),
+        "uninstall": lambda avd: manager.uninstall_app(avd, request.app_id),
+    }
+
+    def run(avd_name):
+        ensure_device_access('android', avd_name, dev_farm_session)
+        result = operations[request.operation](avd_name)
+        if request.operation in ("boot", "install"):
+            # As the single-device start and install routes do
+            record_device_use('android', avd_name, dev_farm_session)
+        return result
+
+    return batch_response(request, run)
+
 @router.websocket("/logs/{avd_name}")
 async def stream_logs(websocket: WebSocket, avd_name: str):
     # Refresh mapping prior to launching logcat
@@ -200,26 +259,24 @@ async def stream_logs(websocket: WebSocket, avd_name: str):
     except Exception:
         pass
     await websocket.accept()
-    process = None
+    subscription = None
     try:
-        process = manager.start_log_stream(avd_name)
-        print(f"Log stream started (PID: {process.pid}) for {avd_name}")
-        loop = asyncio.get_running_loop()
+        tap = manager.start_log_stream(avd_name)
+        subscription = tap.subscribe()
+        print(f"Log viewer attached for {avd_name} ({len(tap.subscribers)} viewer(s))")
         while True:
-            line = await loop.run_in_executor(None, process.stdout.readline)
-            if not line:
-                err = process.stderr.read()
-                if err:
-                    print(f"Logcat stderr: {err.decode(errors='replace')}")
+            line = await subscription.get()
+            if line is None:
                 break
-            await websocket.send_text(line.decode('utf-8', errors='replace').rstrip())
+            await websocket.send_text(line)
     except WebSocketDisconnect:
         print(f"Log WebSocket disconnected for {avd_name}")
     except Exception as e:
         print(f"Error in log stream for {avd_name}: {e}")
     finally:
-        if process:
-            manager.stop_log_stream(avd_name)
+        # Only detach this viewer; the tap stops itself after the last viewer leaves
+        if subscription:
+            subscription.close()
         try:
             if websocket.client_state.name != "DISCONNECTED":
                 await websocket.close()
@@ -231,9 +288,14 @@ async def stream_video(websocket: WebSocket, avd_name: str):
     await websocket.accept()
     streamer = None
     try:
+        try:
+            ensure_device_access('android', avd_name, websocket.cookies.get('dev_farm_session'))
+        except LeaseError as e:
+            await websocket.send_text(json.dumps({"error": str(e)}))
+            return
         # First consult current mapping from Home page's perspective
         try:
-            mapping = manager._list_avd_to_emulators()
+            mapping = await run_in_threadpool(manager._list_avd_to_emulators)
         except Exception:
             mapping = {}
 
@@ -251,7 +313,8 @@ async def stream_video(websocket: WebSocket, avd_name: str):
             # No running emulator for this AVD; start it and then retry
             print(f"No active emulator for {avd_name}, attempting to start...")
             try:
-                _ = manager.start_emulator(avd_name, log=None)
+                # Blocks in boot admission and adb; keep it off the event loop
+                _ = await run_in_threadpool(manager.start_emulator, avd_name, None)
             except Exception as e2:
                 await websocket.send_text(json.dumps({
                     "error": f"Failed to start emulator for {avd_name}: {e2}",
@@ -260,7 +323,7 @@ async def stream_video(websocket: WebSocket, avd_name: str):
             # Poll mapping until the new emulator is visible, then start stream
             for _ in range(60):
                 try:
-                    mapping = manager._list_avd_to_emulators()
+                    mapping = await run_in_threadpool(manager._list_avd_to_emulators)
                 except Exception:
                     mapping = {}
                 if mapping.get(avd_name):
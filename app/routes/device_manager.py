@@ -1,6 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from fastapi.responses import HTMLResponse
 import os
+import sqlite3
+from app.services.log_archive import get_archive
+from app.services.admission import admission
 
 
 router = APIRouter(prefix="/device-manager", tags=["Device Manager"])
@@ -14,4 +17,50 @@ def get_device_manager_ui():
     if os.path.exists(html_path):
         with open(html_path, "r") as f:
             return f.read()
-    return "<h1>UI Template not found</h1>"
\ No newline at end of file
+    return "<h1>UI Template not found</h1>"
+
+@router.get("/admission")
+def get_boot_admission_status():
+    """Host headroom, boots in progress and queued boots as seen by the admission controller."""
+    return admission.status()
+
+@router.get("/logs/search")
+def search_device_logs(
+    q: str = None,
+    device: str = None,
+    since: float = None,
+    until: float = None,
+    priority: str = None,
+    tag: str = None,
+    session_id: int = None,
+    limit: int = 200,
+):
+    """
+    Search archived device logs across sessions.
+    q is a full-text query over the message; since/until are unix timestamps.
+    """
+    archive = get_archive()
+    if archive is None:
+        raise HTTPException(status_code=503, detail="Device log archive is disabled")
+    try:
+        results = archive.search(q=q, device=device, since=since, until=until, priority=priority,
+                                 tag=tag, session_id=session_id, limit=min(limit, 5000))
+    except sqlite3.OperationalError as e:
+        # Typically a malformed FTS5 query
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results, "total": len(results)}
+
+@router.get("/logs/sessions")
+def list_device_log_sessions(device: str = None, limit: int = 100):
+    archive = get_archive()
+    if archive is None:
+        raise HTTPException(status_code=503, detail="Device log archive is disabled")
+    return {"sessions": archive.list_sessions(device=device, limit=limit)}
+
+@router.get("/logs/stats")
+def get_device_log_archive_stats():
+    """Archive writer backlog, lines ingested, ingest errors and what crash recovery found."""
+    archive = get_archive()
+    if archive is None:
+        raise HTTPException(status_code=503, detail="Device log archive is disabled")
+    return archive.stats()
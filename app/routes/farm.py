@@ -0,0 +1,193 @@
+from fastapi import APIRouter, WebSocket, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+import asyncio
+import hmac
+from urllib.parse import quote
+import httpx
+from app.services.farm_router import farm, AGENT_TOKEN, AgentConflict
+from app.services.lease_scheduler import ensure_device_access, LeaseError
+
+router = APIRouter(prefix="/farm", tags=["Farm"])
+
+# Query parameter naming the device in each platform's device manager routes
+DEVICE_PARAMS = {
+    "android": ("avd_name", "name"),
+    "ios": ("udid",),
+}
+BOOT_PATHS = {"emulator/start", "simulator/start"}
+CREATE_PATHS = {"avd/create", "simulator/create"}
+# Hop-by-hop headers must not be copied onto the proxied response
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "content-length", "content-encoding"}
+
+
+@router.get("/agents")
+def list_agents():
+    return {"agents": [a.to_dict() for a in farm.agents.values()]}
+
+def _check_agent_token(token):
+    if not AGENT_TOKEN:
+        raise HTTPException(status_code=503, detail="FARM_AGENT_TOKEN is not configured")
+    if not token or not hmac.compare_digest(token, AGENT_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid agent token")
+
+@router.post("/agents/register")
+async def register_agent(agent_id: str, url: str, x_farm_agent_token: str = Header(None)):
+    """Called periodically by each agent (with FARM_AGENT_TOKEN); acts as registration and heartbeat."""
+    _check_agent_token(x_farm_agent_token)
+    try:
+        agent = farm.register(agent_id, url)
+    except AgentConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not agent.healthy and farm.client:
+        # Pull inventory right away instead of waiting for the next health cycle
+        await farm.refresh_agent(agent)
+    return {"agent_id": agent.agent_id, "healthy": agent.healthy}
+
+@router.delete("/agents/{agent_id}")
+def forget_agent(agent_id: str, x_farm_agent_token: str = Header(None)):
+    """Drop an agent, e.g. before it re-registers from a new URL."""
+    _check_agent_token(x_farm_agent_token)
+    if not farm.forget(agent_id):
+        raise HTTPException(status_code=404, detail=f"Unknown agent {agent_id}")
+    return {"agent_id": agent_id}
+
+@router.post("/agents/refresh")
+async def refresh_agents():
+    await farm.refresh_all()
+    return {"agents": [a.to_dict() for a in farm.agents.values()]}
+
+@router.get("/devices")
+def list_farm_devices():
+    """Merged device inventory across all healthy agents."""
+    return {"devices": farm.devices()}
+
+
+def _device_param(platform, params):
+    return next((params[p] for p in DEVICE_PARAMS[platform] if params.get(p)), None)
+
+
+def _resolve_agent(platform, path, params):
+    if platform not in DEVICE_PARAMS:
+        raise HTTPException(status_code=404, detail=f"Unknown platform {platform}")
+    agent_id = params.get("agent")
+    if agent_id:
+        agent = farm.agents.get(agent_id)
+        if not agent or not agent.healthy:
+            raise HTTPException(status_code=503, detail=f"Agent {agent_id} is not available")
+        return agent
+    if path in CREATE_PATHS:
+        agent = farm.least_loaded()
+        if not agent:
+            raise HTTPException(status_code=503, detail="No healthy agents")
+        return agent
+    device = _device_param(platform, params)
+    if not device:
+        raise HTTPException(status_code=400, detail="Pass a device parameter or agent=<agent_id>")
+    if path in BOOT_PATHS:
+        agent = farm.choose_for_boot(platform, device)
+    else:
+        agent = farm.owner_of(platform, device)
+    if not agent:
+        raise HTTPException(status_code=404, detail=f"No healthy agent owns {platform} device {device}")
+    return agent
+
+
+# One route per method: a multi-method route gets the same OpenAPI operation id for each method
+@router.get("/{platform}/{path:path}")
+@router.post("/{platform}/{path:path}")
+@router.delete("/{platform}/{path:path}")
+async def proxy_device_request(platform: str, path: str, request: Request):
+    """
+    Forward /farm/<platform>/<path> to /device-manager/<platform>/<path> on the owning agent.
+    Boots go to the least loaded agent that has the device; creates go to the least loaded agent.
+    """
+    params = dict(request.query_params)
+    agent = _resolve_agent(platform, path, params)
+    params.pop("agent", None)
+    session = request.cookies.get("dev_farm_session")
+    device = _device_param(platform, params)
+    if device:
+        # Leases live here, not on the agents: check the caller before the request leaves.
+        # Reads count too: logs, screenshots and app lists belong to the lease holder
+        try:
+            await run_in_threadpool(ensure_device_access, platform, device, session)
+        except LeaseError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    # The agent's routes record device use against the caller's session
+    headers = {"Cookie": f"dev_farm_session={session}"} if session else None
+    try:
+        res = await farm.forward(agent, request.method, f"/device-manager/{platform}/{path}",
+                                 params=params, content=await request.body(), headers=headers)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Agent {agent.agent_id} unreachable: {e}")
+    if res.status_code < 400 and request.method != "GET":
+        # Lifecycle changes move devices between running/stopped; refresh placement data
+        asyncio.get_running_loop().create_task(farm.refresh_agent(agent))
+    headers = {k: v for k, v in res.headers.items() if k.lower() not in HOP_HEADERS}
+    headers["X-Farm-Agent"] = agent.agent_id
+    return Response(content=res.content, status_code=res.status_code, headers=headers)
+
+
+async def _pump(websocket: WebSocket, upstream_url):
+    # websockets ships with uvicorn[standard]; import lazily so the central API runs without it
+    import websockets
+
+    session = websocket.cookies.get("dev_farm_session")
+    headers = {"Cookie": f"dev_farm_session={session}"} if session else None
+    async with websockets.connect(upstream_url, max_size=None, additional_headers=headers) as upstream:
+        async def downstream():
+            async for message in upstream:
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+
+        async def upstream_loop():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes") is not None:
+                    await upstream.send(message["bytes"])
+                elif message.get("text") is not None:
+                    await upstream.send(message["text"])
+
+        done, pending = await asyncio.wait(
+            [asyncio.create_task(downstream()), asyncio.create_task(upstream_loop())],
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+
+
+@router.websocket("/{platform}/{kind}/{device}")
+async def proxy_device_socket(websocket: WebSocket, platform: str, kind: str, device: str):
+    """Proxy log and video WebSockets to the agent running the device."""
+    await websocket.accept()
+    if platform in DEVICE_PARAMS:
+        try:
+            await run_in_threadpool(ensure_device_access, platform, device, websocket.cookies.get("dev_farm_session"))
+        except LeaseError as e:
+            await websocket.send_json({"error": str(e)})
+            await websocket.close()
+            return
+    agent = farm.owner_of(platform, device) if platform in DEVICE_PARAMS and kind in ("logs", "stream") else None
+    if not agent and platform == "android" and kind == "stream":
+        # The Android stream route boots the emulator on demand
+        agent = farm.choose_for_boot(platform, device)
+    if not agent:
+        await websocket.send_json({"error": f"No healthy agent owns {platform} device {device}"})
+        await websocket.close()
+        return
+    query = websocket.url.query
+    url = farm.ws_url(agent, f"/device-manager/{platform}/{kind}/{quote(device, safe='')}" + (f"?{query}" if query else ""))
+    try:
+        await _pump(websocket, url)
+    except Exception as e:
+        print(f"[Farm] Proxy {kind} for {device} via {agent.agent_id} ended: {e}")
+    finally:
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass
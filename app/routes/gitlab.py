@@ -1,12 +1,23 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
-from fastapi import Cookie, HTTPException
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
+from fastapi import Cookie, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import hmac
 import os
 from dotenv import load_dotenv
 from httpx import request
 from app import database
-from app.database import get_token_from_session, get_connection
-import app.services.gitlab_service as gitlab_service
+from app.database import get_token_from_session, get_username_from_session, get_connection
+import app.services.gitlab_async as gitlab_async
+from app.services.gitlab_async import GitLabError
+from app.services.gitlab_http_cache import response_cache, shared_cache, trace_stats
+from app.services.build_events import hub, apply_webhook, WEBHOOK_SECRET
+from app.services.pipeline_sync import pipeline_sync
+from app.services.artifact_store import store as artifact_store
+from app.services.artifact_catalog import catalog as artifact_catalog
+from app.services.artifact_downloads import downloads, build_job, submit_build
+from app.services import artifact_serving, build_prefetch
 
 load_dotenv()
 GITLAB_URL = os.getenv("GITLAB_URL", "https://git.iris.nitk.ac.in") 
@@ -14,113 +25,121 @@ ARTIFACTS_DIR = os.path.join(os.getcwd(), "storage", "artifacts")
 
 router = APIRouter(prefix="/gitlab", tags=["GitLab"])
 
-@router.get("/user")
-def get_current_user(dev_farm_session: str = Cookie(None)):
+async def _gitlab(dev_farm_session):
+    """Authenticated async GitLab client for the session (cached per token)."""
     if not dev_farm_session:
         raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    gl = gitlab_service.GitLabService(
-        url=GITLAB_URL,
-        private_token=get_token_from_session(dev_farm_session)
-    )
+    token = get_token_from_session(dev_farm_session)
+    if not token:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    try:
+        return await gitlab_async.get_service(GITLAB_URL, token)
+    except GitLabError as e:
+        raise HTTPException(status_code=401 if e.status_code == 401 else 502, detail=str(e))
+
+def _gitlab_error(e):
+    # Pass GitLab's client errors through; anything else means GitLab itself failed
+    return HTTPException(status_code=e.status_code if e.status_code < 500 else 502, detail=str(e))
+
+@router.get("/clients/stats")
+def get_client_cache_stats():
+    """Hit ratio and size of the per-token client cache the API routes authenticate through."""
+    return gitlab_async.async_clients.stats()
+
+@router.get("/cache/stats")
+def get_response_cache_stats():
+    """Hit ratio and bytes saved by the conditional-request cache shared by the async and sync GitLab clients."""
+    return response_cache.stats()
+
+@router.get("/trace/stats")
+def get_trace_stats():
+    """GitLab round trips per endpoint, as counted by the app's tracing middleware."""
+    return trace_stats.snapshot()
+
+@router.get("/user")
+async def get_current_user(dev_farm_session: str = Cookie(None)):
+    gl = await _gitlab(dev_farm_session)
 
-    user = gl.get_user()
+    user = await gl.get_user()
     return {"user": user}
 
 @router.get("/branches")
-def get_branches(dev_farm_session: str = Cookie(None), project_id: int = 63):
-    if not dev_farm_session:
-        raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    gl = gitlab_service.GitLabService(
-        url=GITLAB_URL,
-        private_token=get_token_from_session(dev_farm_session)
-    )
+async def get_branches(dev_farm_session: str = Cookie(None), project_id: int = 63):
+    gl = await _gitlab(dev_farm_session)
 
-    branches = gl.list_branches(project_id)
+    try:
+        branches = await gl.list_branches(project_id)
+    except GitLabError as e:
+        raise _gitlab_error(e)
     return {"branches": branches}
 
 @router.post("/pipeline/trigger")
-def trigger_pipeline(dev_farm_session: str = Cookie(None), project_id: int = 63, branch: str = None, platform: str = None):
-    if not dev_farm_session:
-        raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    gl = gitlab_service.GitLabService(
-        url=GITLAB_URL,
-        private_token=get_token_from_session(dev_farm_session)
-    )
+async def trigger_pipeline(dev_farm_session: str = Cookie(None), project_id: int = 63, branch: str = None, platform: str = None):
+    gl = await _gitlab(dev_farm_session)
 
     variables = {
         "SCHEME": "debug",
         "PLATFORM": platform,
     }
 
-    user = gl.get_user()
+    user = await gl.get_user()
     username = user.get('username')
 
-    pipeline = gl.trigger_pipeline(project_id, branch, variables, username=username)
+    try:
+        pipeline = await gl.trigger_pipeline(project_id, branch, variables, username=username)
+    except GitLabError as e:
+        raise _gitlab_error(e)
     return pipeline
 
 @router.get("/pipeline/status/{pipeline_id}")
-def get_pipeline_status(dev_farm_session: str = Cookie(None), project_id: int = 63, pipeline_id: int = None):
-    if not dev_farm_session:
-        raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    gl = gitlab_service.GitLabService(
-        url=GITLAB_URL,
-        private_token=get_token_from_session(dev_farm_session)
-    )
+async def get_pipeline_status(dev_farm_session: str = Cookie(None), project_id: int = 63, pipeline_id: int = None):
+    gl = await _gitlab(dev_farm_session)
 
-    pipeline = gl.get_pipeline_status(project_id, pipeline_id)
+    try:
+        pipeline = await gl.get_pipeline_status(project_id, pipeline_id)
+    except GitLabError as e:
+        raise _gitlab_error(e)
     return {"pipeline_id": pipeline["id"], "status": pipeline["status"], "web_url": pipeline["web_url"]}
 
+async def _queued(job, wait, message):
+    """Response for a queued download: 202 with the job, or the old synchronous result when wait is set."""
+    if not wait:
+        return JSONResponse(status_code=202, content={"message": message, "download": job.to_dict()})
+    try:
+        local_path = await asyncio.shield(job.done)
+    except Exception as e:
+        raise HTTPException(status_code=job.error_status or 500, detail=f"Failed to download artifact: {str(e)}")
+    return {"message": message, "local_path": local_path, "download": job.to_dict()}
+
 @router.post("/build/{pipeline_id}/download")
-def download_build_artifacts(
+async def download_build_artifacts(
     pipeline_id: int,
     platform: str,
     project_id: int = 63,
+    wait: bool = False,
     dev_farm_session: str = Cookie(None)
 ):
-    if not dev_farm_session:
-        raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    token = get_token_from_session(dev_farm_session)
-    if not token:
-        raise HTTPException(status_code=401, detail="Invalid session")
-
-    gl = gitlab_service.GitLabService(
-        url=GITLAB_URL,
-        private_token=token
-    )
+    """Queue the build's artifact download; progress in /gitlab/downloads/{id} and on /gitlab/builds/events."""
+    gl = await _gitlab(dev_farm_session)
     
-    # Determine job name and artifact path based on platform
-    job_name = "build_debug_android" if platform == "android" else "build_debug_ios"
-    artifact_path_in_zip = "build/app/outputs/flutter-apk/app-debug.apk" if platform == "android" else "build/ios/iphonesimulator/Runner.app"
+    # Determine job name based on platform
+    job_name, _ = build_job(platform)
     
-    job = gl.get_job_by_name(project_id, pipeline_id, job_name)
+    try:
+        job = await gl.get_job_by_name(project_id, pipeline_id, job_name)
+    except GitLabError as e:
+        raise _gitlab_error(e)
     if not job:
         raise HTTPException(status_code=404, detail=f"Job {job_name} not found in pipeline {pipeline_id}")
         
-    if job.status != 'success':
-        raise HTTPException(status_code=400, detail=f"Job status is {job.status}, cannot download artifacts yet")
-
-    try:
-        if platform == "android":
-            # Save as pipeline_id.apk
-            filename = f"{pipeline_id}.apk"
-            local_path = gl.download_and_extract_artifact(project_id, job.id, artifact_path_in_zip, filename)
-            message = "APK downloaded"
-        else:
-            # Unzip Runner.app directory to folder named pipeline_id.app
-            output_dir = f"{pipeline_id}.app"
-            local_path = gl.download_and_unzip_ios_app(project_id, job.id, artifact_path_in_zip, output_dir)
-            message = "iOS app unzipped"
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to download artifact: {str(e)}")
+    if job["status"] != 'success':
+        raise HTTPException(status_code=400, detail=f"Job status is {job['status']}, cannot download artifacts yet")
 
-    return {"message": message, "local_path": local_path}
+    # Saved as pipeline_id.apk, or Runner.app unzipped to pipeline_id.app
+    user = await gl.get_user()
+    download = submit_build(gl, project_id, pipeline_id, platform, job["id"], user.get('username'))
+    message = "APK download queued" if platform == "android" else "iOS app download queued"
+    return await _queued(download, wait, message)
 
 @router.get("/builds")
 def list_builds(dev_farm_session: str = Cookie(None)):
@@ -148,148 +167,255 @@ def list_builds(dev_farm_session: str = Cookie(None)):
             "platform": row["platform"],
             "web_url": row["web_url"],
             "artifact_path": row["artifact_path"],
+            "artifact_digest": row["artifact_digest"],
             "username": row["username"],
             "created_at": row["created_at"],
+            "status": row["status"],
+            "duration": row["duration"],
+            "finished_at": row["finished_at"],
+            "updated_at": row["updated_at"],
         })
 
     return {"builds": builds}
 
+@router.post("/webhook")
+async def gitlab_webhook(request: Request, x_gitlab_token: str = Header(None)):
+    """
+    Receiver for GitLab pipeline and job events (project Settings > Webhooks, secret token
+    = GITLAB_WEBHOOK_SECRET). Updates the builds table and pushes the change to
+    /gitlab/builds/events subscribers.
+    """
+    if not WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="GITLAB_WEBHOOK_SECRET is not configured")
+    if not x_gitlab_token or not hmac.compare_digest(x_gitlab_token, WEBHOOK_SECRET):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+
+    payload = await request.json()
+    events = await run_in_threadpool(apply_webhook, payload)
+    if events:
+        # Cached pipeline/job responses for this project are stale now
+        shared_cache.expire_scope(f"{GITLAB_URL.rstrip('/')}/api/v4/projects/{events[0]['project_id']}")
+    for event in events:
+        hub.publish(event)
+    return {"accepted": payload.get("object_kind"), "events": len(events)}
+
+@router.get("/builds/events")
+def build_events(dev_farm_session: str = Cookie(None)):
+    """Server-Sent Events stream of status changes for the session user's builds."""
+    if not dev_farm_session:
+        raise HTTPException(status_code=401, detail="No session cookie found")
+    username = get_username_from_session(dev_farm_session)
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid session")
+
+    return StreamingResponse(hub.stream(username), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/builds/events/stats")
+def build_event_stats():
+    return hub.stats()
+
+@router.get("/sync/stats")
+def get_pipeline_sync_stats():
+    """Background pipeline status sync: last cycle's GitLab calls and builds updated."""
+    return pipeline_sync.stats()
+
+@router.post("/sync")
+def run_pipeline_sync(dev_farm_session: str = Cookie(None)):
+    """Run a pipeline status sync cycle now."""
+    if not dev_farm_session:
+        raise HTTPException(status_code=401, detail="No session cookie found")
+    if not get_username_from_session(dev_farm_session):
+        raise HTTPException(status_code=401, detail="Invalid session")
+    return pipeline_sync.sync_once()
+
+@router.get("/store/stats")
+def get_artifact_store_stats():
+    """Size, quota, dedup and eviction counters of the content-addressed artifact store."""
+    return artifact_store.stats()
+
+@router.post("/store/{digest}/pin")
+def pin_artifact(digest: str):
+    """Exempt a stored artifact from quota eviction."""
+    if not artifact_store.set_pinned(digest, True):
+        raise HTTPException(status_code=404, detail=f"Artifact {digest} is not in the store")
+    return {"digest": digest, "pinned": True}
+
+@router.delete("/store/{digest}/pin")
+def unpin_artifact(digest: str):
+    if not artifact_store.set_pinned(digest, False):
+        raise HTTPException(status_code=404, detail=f"Artifact {digest} is not in the store")
+    return {"digest": digest, "pinned": False}
+
 @router.get("/artifacts")
-def list_available_artifacts():
-    """List all artifacts in storage directory with metadata.
-    Includes files (apk, ipa, zip) and iOS .app directories (unzipped apps).
+def list_available_artifacts(platform: str = None, limit: int = 100, offset: int = 0):
+    """List artifacts in the storage directory with metadata, from the artifact catalog.
+    Includes files (apk, ipa, zip) and iOS .app directories (unzipped apps), newest pipeline first.
     """
-    if not os.path.exists(ARTIFACTS_DIR):
-        return {"artifacts": []}
+    limit = max(1, min(limit, 500))
+    return artifact_catalog.page(platform, limit, max(0, offset))
+
+@router.get("/artifacts/catalog/stats")
+def get_artifact_catalog_stats():
+    """Catalog size and the outcome of the last background reconcile."""
+    return artifact_catalog.stats()
+
+@router.post("/artifacts/catalog/reconcile")
+def reconcile_artifact_catalog(dev_farm_session: str = Cookie(None)):
+    """Re-scan storage/artifacts now instead of waiting for the next background pass."""
+    if not dev_farm_session or not get_username_from_session(dev_farm_session):
+        raise HTTPException(status_code=401, detail="Invalid session")
+    return artifact_catalog.reconcile()
+
+class _ArtifactFileResponse(FileResponse):
+    """FileResponse that keeps the artifact from being evicted until it has been sent (or the client left)."""
+
+    def __init__(self, artifact, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.artifact = artifact
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await run_in_threadpool(self.artifact.close)
+
 
-    entries = os.listdir(ARTIFACTS_DIR)
-    artifacts = []
+class _ArtifactStreamingResponse(StreamingResponse):
+    def __init__(self, artifact, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.artifact = artifact
 
-    for name in entries:
-        path = os.path.join(ARTIFACTS_DIR, name)
+    async def __call__(self, scope, receive, send):
         try:
-            if os.path.isfile(path):
-                size_bytes = os.path.getsize(path)
-                ext = os.path.splitext(name)[1].lower()
-
-                platform = None
-                if ext == '.apk':
-                    platform = 'android'
-                elif ext in ['.ipa', '.zip']:
-                    platform = 'ios'
-
-                artifacts.append({
-                    "filename": name,
-                    "path": path,
-                    "size": size_bytes,
-                    "size_mb": round(size_bytes / (1024 * 1024), 2),
-                    "extension": ext,
-                    "platform": platform,
-                    "type": "file",
-                })
-            elif os.path.isdir(path):
-                # Include iOS unzipped apps
-                # Case A: directory itself ends with .app
-                if name.endswith('.app'):
-                    total = 0
-                    for root, _, files in os.walk(path):
-                        for f in files:
-                            fp = os.path.join(root, f)
-                            try:
-                                total += os.path.getsize(fp)
-                            except OSError:
-                                pass
-                    artifacts.append({
-                        "filename": name,
-                        "path": path,
-                        "size": total,
-                        "size_mb": round(total / (1024 * 1024), 2),
-                        "extension": ".app",
-                        "platform": "ios",
-                        "type": "directory",
-                    })
-                else:
-                    # Case B: directory contains a nested .app (e.g., storage/artifacts/23856/Runner.app)
-                    nested_app_path = None
-                    nested_app_name = None
-                    try:
-                        # Look only one level deep for performance
-                        for child in os.listdir(path):
-                            child_path = os.path.join(path, child)
-                            if os.path.isdir(child_path) and child.endswith('.app'):
-                                nested_app_path = child_path
-                                nested_app_name = child
-                                break
-                    except Exception:
-                        pass
-                    if nested_app_path:
-                        total = 0
-                        for root, _, files in os.walk(nested_app_path):
-                            for f in files:
-                                fp = os.path.join(root, f)
-                                try:
-                                    total += os.path.getsize(fp)
-                                except OSError:
-                                    pass
-                        # Present filename as parent/nested for clarity (e.g., 23856/Runner.app)
-                        artifacts.append({
-                            "filename": f"{name}/{nested_app_name}",
-                            "path": nested_app_path,
-                            "size": total,
-                            "size_mb": round(total / (1024 * 1024), 2),
-                            "extension": ".app",
-                            "platform": "ios",
-                            "type": "directory",
-                        })
-        except Exception:
-            # Skip unreadable entries
-            continue
-
-    # Sort with iOS .app directories first for convenience
-    artifacts.sort(key=lambda a: (0 if a.get('extension') == '.app' else 1, a.get('filename')))
-    return {"artifacts": artifacts, "total": len(artifacts)}
+            await super().__call__(scope, receive, send)
+        finally:
+            await run_in_threadpool(self.artifact.close)
+
+@router.get("/artifacts/file/{filename:path}")
+@router.head("/artifacts/file/{filename:path}")
+async def serve_artifact(filename: str, request: Request):
+    """Download an artifact listed by /gitlab/artifacts; .app directories are sent as a ZIP.
+    Supports Range/If-Range and conditional GET with a strong ETag from the artifact's content digest.
+    """
+    try:
+        artifact = await run_in_threadpool(artifact_serving.describe, filename)
+    except artifact_serving.ArtifactNotFound:
+        raise HTTPException(status_code=404, detail=f"Artifact {filename} not found")
+    try:
+        return await _artifact_response(artifact, request)
+    except BaseException:
+        await run_in_threadpool(artifact.close)
+        raise
+
+async def _artifact_response(artifact, request):
+    headers = {"ETag": artifact.etag, "Cache-Control": "no-cache"}
+    if artifact_serving.not_modified(request.headers.get("if-none-match"), artifact.etag):
+        await run_in_threadpool(artifact.close)
+        return Response(status_code=304, headers=headers)
+
+    path = artifact.path
+    if artifact.is_dir:
+        path = artifact.cached_zip()
+        if path is None and artifact.stored and (request.method == "HEAD" or "range" in request.headers):
+            # Ranges and Content-Length need the whole ZIP, so cache it first
+            path = await run_in_threadpool(artifact_serving.build_zip, artifact)
+        if path is None:
+            headers["Content-Disposition"] = f'attachment; filename="{artifact.download_name}"'
+            if request.method == "HEAD":
+                await run_in_threadpool(artifact.close)
+                return Response(media_type=artifact.media_type, headers=headers)
+            return _ArtifactStreamingResponse(artifact, artifact_serving.zip_stream(artifact),
+                                              media_type=artifact.media_type, headers=headers)
+    return _ArtifactFileResponse(artifact, path, media_type=artifact.media_type, filename=artifact.download_name,
+                                 headers=headers)
 
 @router.post("/jobs/{job_id}/artifacts")
-def download_artifacts(job_id: int, dev_farm_session: str = Cookie(None), project_id: int = 63):
-    if not dev_farm_session:
-        raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    token = get_token_from_session(dev_farm_session)
-    gl = gitlab_service.GitLabService(url=GITLAB_URL, private_token=token)
+async def download_artifacts(job_id: int, dev_farm_session: str = Cookie(None), project_id: int = 63,
+                             wait: bool = False):
+    gl = await _gitlab(dev_farm_session)
     
     # We need the username for DB logging
-    user_info = gl.get_user()
+    user_info = await gl.get_user()
     username = user_info.get('username')
 
+    # Ask GitLab with this user's token before joining a download someone else started
     try:
-        artifact_path = gl.download_job_artifact_generic(project_id, job_id, username)
-        return {"message": "Artifact downloaded successfully", "path": artifact_path}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        await gl.get_job(project_id, job_id)
+    except GitLabError as e:
+        raise _gitlab_error(e)
+
+    download = downloads.submit(("job", project_id, job_id),
+                                lambda progress: gl.download_job_artifact_generic(project_id, job_id, username, progress),
+                                username, kind="job", project_id=project_id, pipeline_id=None, job_id=job_id,
+                                platform=None)
+    response = await _queued(download, wait, "Artifact download queued")
+    if wait:
+        response["path"] = response["local_path"]
+    return response
+
+@router.get("/downloads")
+def list_downloads(dev_farm_session: str = Cookie(None)):
+    """The session user's queued, running and recently finished artifact downloads."""
+    username = get_username_from_session(dev_farm_session) if dev_farm_session else None
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    return {"downloads": downloads.list(username), "stats": downloads.stats()}
+
+@router.get("/downloads/{download_id}")
+def get_download(download_id: str, dev_farm_session: str = Cookie(None)):
+    username = get_username_from_session(dev_farm_session) if dev_farm_session else None
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    download = downloads.get(download_id)
+    if download is None or username not in download.usernames:
+        raise HTTPException(status_code=404, detail=f"Download {download_id} not found")
+    return download.to_dict()
+
+@router.get("/prefetch")
+def get_prefetch(dev_farm_session: str = Cookie(None)):
+    """The session user's prefetch settings and recent prefetch runs with per-stage timings."""
+    username = get_username_from_session(dev_farm_session) if dev_farm_session else None
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    return {**build_prefetch.get_settings(username), "runs": build_prefetch.prefetcher.list(username),
+            "stats": build_prefetch.prefetcher.stats()}
+
+@router.put("/prefetch")
+def set_prefetch(enabled: bool, install: bool = False, dev_farm_session: str = Cookie(None)):
+    """Opt in to downloading (and with install=true, installing) builds as soon as their pipeline succeeds."""
+    username = get_username_from_session(dev_farm_session) if dev_farm_session else None
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    return build_prefetch.set_settings(username, enabled, install)
+
+@router.get("/jobs/{job_id}/artifacts/stream")
+async def stream_job_artifacts(job_id: int, dev_farm_session: str = Cookie(None), project_id: int = 63):
+    """Relay the job's artifact ZIP straight from GitLab without storing it."""
+    gl = await _gitlab(dev_farm_session)
+    chunks = gl.stream_artifacts(project_id, job_id)
+    try:
+        # Pull the first chunk here so GitLab errors become proper status codes
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except GitLabError as e:
+        raise _gitlab_error(e)
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="job_{job_id}_artifacts.zip"'})
 
 @router.get("/pipelines/{pipeline_id}/jobs")
-def get_pipeline_jobs(pipeline_id: int, dev_farm_session: str = Cookie(None), project_id: int = 63):
-    if not dev_farm_session:
-        raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    gl = gitlab_service.GitLabService(
-        url=GITLAB_URL,
-        private_token=get_token_from_session(dev_farm_session)
-    )
+async def get_pipeline_jobs(pipeline_id: int, dev_farm_session: str = Cookie(None), project_id: int = 63):
+    gl = await _gitlab(dev_farm_session)
     
-    jobs = gl.get_pipeline_jobs(project_id, pipeline_id)
+    try:
+        jobs = await gl.get_pipeline_jobs(project_id, pipeline_id)
+    except GitLabError as e:
+        raise _gitlab_error(e)
     return {"jobs": jobs}
-
-@router.get("/builds")
-def get_builds(dev_farm_session: str = Cookie(None)):
-    if not dev_farm_session:
-        raise HTTPException(status_code=401, detail="No session cookie found")
-    
-    token = get_token_from_session(dev_farm_session)
-    gl = gitlab_service.GitLabService(url=GITLAB_URL, private_token=token)
-    
-    user_info = gl.get_user()
-    username = user_info.get('username')
-
-    builds = gl.list_builds(username=username)
-    return {"builds": builds}
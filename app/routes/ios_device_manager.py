@@ -1,9 +1,13 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Cookie, Query
 from fastapi.responses import HTMLResponse
 from app.services.ios_device_manager import IOSDeviceManager
+from app.services.lease_scheduler import ensure_device_access, record_device_use, LeaseError
+from app.services.admission import AdmissionRejected
+from app.services.batch_runner import BatchRequest, batch_response, validate_batch
 import asyncio
 import json
 import os
+from typing import List
 
 router = APIRouter(prefix="/device-manager/ios", tags=["iOS"])
 
@@ -17,6 +21,12 @@ def list_simulators():
         raise HTTPException(status_code=503, detail=str(e))
 
 
+@router.get("/inventory/stats")
+def get_inventory_stats():
+    """Refresh count, cache hits and age of the cached simctl inventory."""
+    return manager.inventory.stats()
+
+
 @router.get("/device-types")
 def list_device_types():
     try:
@@ -41,37 +51,121 @@ def create_simulator(name: str, device_type: str, runtime: str):
         raise HTTPException(status_code=503, detail=str(e))
 
 
+@router.post("/pool/configure")
+def configure_simulator_pool(device_type: str, runtime: str, size: int, preload_app: List[str] = Query(None)):
+    """Keep `size` booted clones ready; preload_app paths are installed into the golden image."""
+    try:
+        manager._ensure_xcrun_available()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    config = manager.pool.configure(device_type, runtime, max(size, 0), preload_app)
+    return {"message": f"Pool for {device_type} on {runtime} set to {config.size}"}
+
+
+@router.get("/pool/stats")
+def get_simulator_pool_stats():
+    return manager.pool.stats()
+
+
+@router.post("/pool/acquire")
+def acquire_pooled_simulator(device_type: str, runtime: str):
+    try:
+        return manager.provision_simulator(device_type, runtime)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/pool/release")
+def release_pooled_simulator(udid: str, dev_farm_session: str = Cookie(None)):
+    try:
+        ensure_device_access('ios', udid, dev_farm_session)
+        return {"message": manager.release_simulator(udid)}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 @router.delete("/simulator/delete")
-def delete_simulator(udid: str):
+def delete_simulator(udid: str, dev_farm_session: str = Cookie(None)):
     try:
+        ensure_device_access('ios', udid, dev_farm_session)
         return {"message": manager.delete_simulator(udid)}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
 
 @router.post("/simulator/start")
-def start_simulator(udid: str):
+def start_simulator(udid: str, dev_farm_session: str = Cookie(None)):
     try:
-        return {"message": manager.start_simulator(udid)}
+        ensure_device_access('ios', udid, dev_farm_session)
+        result = manager.start_simulator(udid)
+        record_device_use('ios', udid, dev_farm_session)
+        return {"message": result}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
 
 @router.post("/simulator/stop")
-def stop_simulator(udid: str):
+def stop_simulator(udid: str, dev_farm_session: str = Cookie(None)):
     try:
+        ensure_device_access('ios', udid, dev_farm_session)
         return {"message": manager.stop_simulator(udid)}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
 
 @router.post("/simulator/install-app")
-def install_ios_app(udid: str, app_path: str):
+def install_ios_app(udid: str, app_path: str, dev_farm_session: str = Cookie(None)):
     try:
-        return {"message": manager.install_app(udid, app_path)}
+        ensure_device_access('ios', udid, dev_farm_session)
+        result = manager.install_app(udid, app_path)
+        record_device_use('ios', udid, dev_farm_session)
+        return {"message": result}
+    except LeaseError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
+@router.post("/batch")
+def run_ios_batch(request: BatchRequest, dev_farm_session: str = Cookie(None)):
+    """
+    Run one lifecycle operation (boot, shutdown, erase, install, uninstall) on many
+    simulators concurrently. Streams one NDJSON line per UDID as it finishes, then a summary.
+    """
+    error = validate_batch(request)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    operations = {
+        "boot": manager.start_simulator,
+        "shutdown": manager.stop_simulator,
+        "erase": manager.erase_simulator,
+        "install": lambda udid: manager.install_app(udid, request.app_path),
+        "uninstall": lambda udid: manager.uninstall_app(udid, request.app_id),
+    }
+
+    def run(udid):
+        ensure_device_access('ios', udid, dev_farm_session)
+        result = operations[request.operation](udid)
+        if request.operation in ("boot", "install"):
+            # As the single-device start and install routes do
+            record_device_use('ios', udid, dev_farm_session)
+        return result
+
+    return batch_response(request, run)
+
 @router.get("/device-info")
 def get_ios_device_info(udid: str):
     """
@@ -92,44 +186,42 @@ def get_ios_device_info(udid: str):
                 "booted": True
             })
         else:
-            # Best effort: check simulator boot state
-            # xcrun simctl list devices --json includes state; reuse manager.list_simulators
+            # Best effort: check simulator boot state from the cached simctl inventory
             try:
-                devices = manager.list_simulators()
+                device = manager.get_simulator(udid)
             except FileNotFoundError as e:
                 raise HTTPException(status_code=503, detail=str(e))
-            state = None
-            for d in devices:
-                if d.get('udid') == udid:
-                    state = d.get('state')
-                    break
-            info["booted"] = (state == 'Booted')
+            info["booted"] = bool(device) and device.get('state') == 'Booted'
     except Exception as e:
         info["error"] = str(e)
     return info
 
 
 @router.websocket("/logs/{udid}")
-async def stream_logs(websocket: WebSocket, udid: str):
+async def stream_logs(websocket: WebSocket, udid: str, process: str = None, subsystem: str = None, level: str = None):
+    """
+    Streams simulator logs as JSON arrays of records, one array per frame.
+    process/subsystem/level are applied inside the simulator via a log stream predicate.
+    """
     await websocket.accept()
-    process = None
+    subscription = None
     try:
-        process = manager.start_log_stream(udid)
-        loop = asyncio.get_running_loop()
+        subscription = manager.start_log_stream(udid, process, subsystem, level).subscribe()
         while True:
-            line = await loop.run_in_executor(None, process.stdout.readline)
-            if not line:
+            batch = await subscription.get_batch()
+            if batch is None:
                 break
-            # Send a single log line without trailing newline; client will append \n
-            text = line.decode('utf-8', errors='replace').rstrip('\r\n')
-            await websocket.send_text(text)
+            await websocket.send_text(json.dumps(batch))
     except WebSocketDisconnect:
         pass
+    except ValueError as e:
+        await websocket.send_text(json.dumps({"error": str(e)}))
     except Exception as e:
         print(f"iOS Log stream error: {e}")
     finally:
-        if process:
-            manager.stop_log_stream(udid)
+        # Only detach this viewer; the tap stops itself after the last viewer leaves
+        if subscription:
+            subscription.close()
         try:
             await websocket.close()
         except:
@@ -141,6 +233,11 @@ async def stream_video(websocket: WebSocket, udid: str):
     await websocket.accept()
     streamer = None
     try:
+        try:
+            ensure_device_access('ios', udid, websocket.cookies.get('dev_farm_session'))
+        except LeaseError as e:
+            await websocket.send_text(json.dumps({"error": str(e)}))
+            return
         streamer = await manager.get_video_stream(udid)
         print(f"[iOS] Video stream started for {udid}")
 
@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Cookie, HTTPException
+from fastapi.responses import JSONResponse
+import app.routes.android_device_manager as android_routes
+import app.routes.ios_device_manager as ios_routes
+from app.database import get_username_from_session
+from app.services.lease_scheduler import scheduler, DeviceClassResolver, LeaseError
+
+router = APIRouter(prefix="/leases", tags=["Leases"])
+
+scheduler.set_resolver(DeviceClassResolver(android_routes.manager, ios_routes.manager))
+
+
+def _require_user(dev_farm_session):
+    if not dev_farm_session:
+        raise HTTPException(status_code=401, detail="No session cookie found")
+    username = get_username_from_session(dev_farm_session)
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    return username
+
+@router.get("")
+def list_leases():
+    return scheduler.snapshot()
+
+@router.get("/mine")
+def list_my_leases(dev_farm_session: str = Cookie(None)):
+    username = _require_user(dev_farm_session)
+    return {"leases": [l.to_dict() for l in scheduler.leases_for_owner(username)]}
+
+@router.get("/metrics")
+def lease_metrics():
+    return scheduler.metrics()
+
+@router.post("/acquire")
+def acquire_lease(device_class: str, ttl: int = None, dev_farm_session: str = Cookie(None)):
+    """
+    Lease a device of device_class ("android", "android:<avd>", "ios", "ios:<model or udid>").
+    Returns 200 with the lease, or 202 with a ticket to poll while queued.
+    """
+    username = _require_user(dev_farm_session)
+    lease, ticket = scheduler.acquire(username, device_class, ttl)
+    if lease:
+        return {"lease": lease.to_dict()}
+    return JSONResponse(status_code=202, content={"ticket": scheduler.ticket_dict(ticket)})
+
+@router.get("/tickets/{ticket_id}")
+def poll_ticket(ticket_id: str, dev_farm_session: str = Cookie(None)):
+    username = _require_user(dev_farm_session)
+    try:
+        ticket = scheduler.poll(ticket_id, username)
+    except LeaseError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"ticket": scheduler.ticket_dict(ticket)}
+
+@router.delete("/tickets/{ticket_id}")
+def cancel_ticket(ticket_id: str, dev_farm_session: str = Cookie(None)):
+    username = _require_user(dev_farm_session)
+    try:
+        scheduler.cancel(ticket_id, username)
+    except LeaseError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"message": f"Ticket {ticket_id} cancelled"}
+
+@router.post("/{lease_id}/heartbeat")
+def heartbeat_lease(lease_id: str, ttl: int = None, dev_farm_session: str = Cookie(None)):
+    username = _require_user(dev_farm_session)
+    try:
+        lease = scheduler.heartbeat(lease_id, username, ttl)
+    except LeaseError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"lease": lease.to_dict()}
+
+@router.delete("/{lease_id}")
+def release_lease(lease_id: str, dev_farm_session: str = Cookie(None)):
+    username = _require_user(dev_farm_session)
+    try:
+        scheduler.release(lease_id, username)
+    except LeaseError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"message": f"Lease {lease_id} released"}
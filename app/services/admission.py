@@ -0,0 +1,239 @@
+import itertools
+import os
+import threading
+import time
+
+
+BOOT_MAX_CONCURRENT = int(os.getenv("BOOT_MAX_CONCURRENT", "2"))
+# Boots are refused while less than this much memory would remain after the boot
+BOOT_MIN_FREE_MB = int(os.getenv("BOOT_MIN_FREE_MB", "1024"))
+# Expected resident size of one freshly booted emulator/simulator
+BOOT_EST_MB = int(os.getenv("BOOT_EST_MB", "2048"))
+BOOT_MAX_LOAD_PER_CPU = float(os.getenv("BOOT_MAX_LOAD_PER_CPU", "1.5"))
+BOOT_MAX_CPU_PERCENT = float(os.getenv("BOOT_MAX_CPU_PERCENT", "90"))
+# "queue" waits up to BOOT_QUEUE_TIMEOUT seconds for headroom, "reject" fails immediately
+BOOT_ADMISSION_MODE = os.getenv("BOOT_ADMISSION_MODE", "queue")
+BOOT_QUEUE_TIMEOUT = float(os.getenv("BOOT_QUEUE_TIMEOUT", "300"))
+# Host CPU busy share is measured over this many seconds at admission time
+CPU_SAMPLE_WINDOW = float(os.getenv("BOOT_CPU_SAMPLE_WINDOW", "0.25"))
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class HostSampler:
+    """Reads host and per-process resource usage from /proc (or a fake tree for tests)."""
+
+    def __init__(self, proc_root='/proc', cpu_window=CPU_SAMPLE_WINDOW):
+        self.proc_root = proc_root
+        self.cpu_window = cpu_window
+        self._last_proc = {}  # pid -> (cpu ticks, wall time)
+        self._ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._lock = threading.Lock()
+
+    def _read(self, *parts):
+        with open(os.path.join(self.proc_root, *parts)) as f:
+            return f.read()
+
+    def _cpu_times(self):
+        values = [int(v) for v in self._read('stat').splitlines()[0].split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        total = sum(values)
+        return total - idle, total
+
+    def _cpu_percent(self):
+        # Two readings a fixed window apart; a delta against an older reading would average
+        # over however long ago the previous boot happened to be admitted
+        busy_before, total_before = self._cpu_times()
+        time.sleep(self.cpu_window)
+        busy, total = self._cpu_times()
+        if total == total_before:
+            return None
+        return round(100.0 * (busy - busy_before) / (total - total_before), 1)
+
+    def sample(self):
+        cpus = os.cpu_count() or 1
+        info = {"cpus": cpus, "load1": None, "load_per_cpu": None, "cpu_percent": None,
+                "mem_total": None, "mem_available": None}
+        try:
+            info["load1"] = float(self._read('loadavg').split()[0])
+        except (OSError, ValueError, IndexError):
+            try:
+                info["load1"] = os.getloadavg()[0]
+            except OSError:
+                pass
+        if info["load1"] is not None:
+            info["load_per_cpu"] = round(info["load1"] / cpus, 3)
+        try:
+            info["cpu_percent"] = self._cpu_percent()
+        except (OSError, ValueError, IndexError):
+            pass
+        try:
+            for line in self._read('meminfo').splitlines():
+                key, value = line.split(':', 1)
+                if key == 'MemTotal':
+                    info["mem_total"] = int(value.split()[0]) * 1024
+                elif key == 'MemAvailable':
+                    info["mem_available"] = int(value.split()[0]) * 1024
+        except (OSError, ValueError):
+            pass
+        return info
+
+    def find_processes(self, match):
+        """Return (pid, argv) for processes whose argv (list of strings) satisfies match(argv)."""
+        pids = []
+        try:
+            entries = os.listdir(self.proc_root)
+        except OSError:
+            return pids
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            try:
+                argv = self._read(entry, 'cmdline').split('\0')
+            except OSError:
+                continue
+            if argv and match(argv):
+                pids.append((int(entry), argv))
+        return pids
+
+    def process_usage(self, pid):
+        """Resident size and CPU share (since the previous call for this pid) of one process."""
+        rss = None
+        try:
+            for line in self._read(str(pid), 'status').splitlines():
+                if line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+                    break
+            stat = self._read(str(pid), 'stat')
+        except OSError:
+            return None
+        # Fields after the parenthesised command name; utime/stime are fields 14/15
+        fields = stat[stat.rfind(')') + 2:].split()
+        ticks = int(fields[11]) + int(fields[12])
+        now = time.time()
+        with self._lock:
+            last = self._last_proc.get(pid)
+            self._last_proc[pid] = (ticks, now)
+        cpu = None
+        if last and now > last[1]:
+            cpu = round(100.0 * (ticks - last[0]) / self._ticks / (now - last[1]), 1)
+        return {"pid": pid, "rss": rss, "cpu_percent": cpu}
+
+
+class BootTicket:
+    """One admitted (or waiting) boot; the same device may hold several if booted twice."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name):
+        self.id = next(self._ids)
+        self.name = name
+        self.admitted_at = None
+
+
+class AdmissionController:
+    """
+    Gate for device boots, the most expensive phase of a device's life.
+
+    At most `max_concurrent` boots run at once, and a boot is only admitted while the
+    host has headroom: memory left after the boot, load per CPU and CPU busy share under
+    their limits. Callers queue in FIFO order (mode "queue") or fail fast ("reject").
+    """
+
+    def __init__(self, sampler=None, max_concurrent=BOOT_MAX_CONCURRENT, min_free_mb=BOOT_MIN_FREE_MB,
+                 est_mb=BOOT_EST_MB, max_load_per_cpu=BOOT_MAX_LOAD_PER_CPU,
+                 max_cpu_percent=BOOT_MAX_CPU_PERCENT, mode=BOOT_ADMISSION_MODE, timeout=BOOT_QUEUE_TIMEOUT):
+        self.sampler = sampler or HostSampler()
+        self.max_concurrent = max_concurrent
+        self.min_free = min_free_mb * 1024 * 1024
+        self.est = est_mb * 1024 * 1024
+        self.max_load_per_cpu = max_load_per_cpu
+        self.max_cpu_percent = max_cpu_percent
+        self.mode = mode
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self.booting = {}  # ticket id -> BootTicket
+        self.waiting = []  # BootTickets in arrival order
+        self.admitted = 0
+        self.rejected = 0
+        self.last_boot_seconds = {}
+
+    def _refusal_reason(self, sample):
+        if len(self.booting) >= self.max_concurrent:
+            return f"{len(self.booting)} boot(s) already in progress (limit {self.max_concurrent})"
+        mem_available = sample.get('mem_available')
+        if mem_available is not None:
+            # Boots already admitted have not reached their full size yet
+            remaining = mem_available - self.est * (len(self.booting) + 1)
+            if remaining < self.min_free:
+                return f"insufficient memory: {mem_available // (1024 * 1024)} MB available"
+        load = sample.get('load_per_cpu')
+        if load is not None and load > self.max_load_per_cpu:
+            return f"host load {load} per CPU exceeds {self.max_load_per_cpu}"
+        cpu = sample.get('cpu_percent')
+        if cpu is not None and cpu > self.max_cpu_percent:
+            return f"host CPU {cpu}% exceeds {self.max_cpu_percent}%"
+        return None
+
+    def acquire(self, name):
+        """
+        Block until `name` may boot and return its BootTicket, to be passed to release();
+        raises AdmissionRejected when refused or timed out.
+        """
+        deadline = time.time() + self.timeout
+        ticket = BootTicket(name)
+        with self._cond:
+            self.waiting.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    head = self.waiting[0]
+                # Only the head of the queue samples the host, and never while holding the lock
+                sample = self.sampler.sample() if head is ticket else None
+                with self._cond:
+                    if self.waiting[0] is not ticket:
+                        reason = f"queued behind {self.waiting[0].name}"
+                    else:
+                        reason = self._refusal_reason(sample)
+                        if reason is None:
+                            ticket.admitted_at = time.time()
+                            self.booting[ticket.id] = ticket
+                            self.admitted += 1
+                            return ticket
+                    remaining = deadline - time.time()
+                    if self.mode == 'reject' or remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionRejected(f"Boot of {name} refused: {reason}")
+                    # Re-sample periodically; releases wake us up earlier
+                    self._cond.wait(timeout=min(2.0, remaining))
+        finally:
+            with self._cond:
+                self.waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def release(self, ticket):
+        with self._cond:
+            if self.booting.pop(ticket.id, None) is not None:
+                self.last_boot_seconds[ticket.name] = round(time.time() - ticket.admitted_at, 1)
+            self._cond.notify_all()
+
+    def status(self):
+        sample = self.sampler.sample()
+        with self._cond:
+            now = time.time()
+            return {
+                "host": sample,
+                "mode": self.mode,
+                "max_concurrent": self.max_concurrent,
+                "booting": [{"name": t.name, "seconds": round(now - t.admitted_at, 1)} for t in self.booting.values()],
+                "waiting": [t.name for t in self.waiting],
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "would_admit": self._refusal_reason(sample) is None,
+                "last_boot_seconds": dict(self.last_boot_seconds),
+            }
+
+
+admission = AdmissionController()
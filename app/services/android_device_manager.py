@@ -8,11 +8,21 @@ import threading
 import signal
 import socket
 from app.services.scrcpy_streamer import ScrcpyStreamer
+from app.services.log_tap import LogTap
+from app.services.log_archive import get_archive
+from app.services.artifact_store import store as artifact_store
+from app.services.admission import admission
+from app.services.boot_readiness import tracker as readiness
+from app.services.avd_catalog import catalog
 
 class AndroidDeviceManager:
     def __init__(self):
         self.stream = {} # Stores ScrcpyStreamer instances
-        self.log_streams = {}
+        self.log_streams = {} # Stores shared LogTap instances per AVD
+        self.emulator_processes = {} # Emulator launcher processes started by this manager
+        self.admission = admission
+        self.readiness = readiness
+        self.catalog = catalog
 
     def _ensure_cmd_available(self, cmd: str):
         """Ensure the required command exists on PATH, else raise FileNotFoundError."""
@@ -20,11 +30,11 @@ class AndroidDeviceManager:
             raise FileNotFoundError(f"Required command '{cmd}' not found in PATH. Please install it and ensure it's accessible.")
 
     def list_avds(self):
-        # emulator is used to list AVDs
-        self._ensure_cmd_available('emulator')
-        result = subprocess.run(['emulator', '-list-avds'], capture_output=True, text=True)
-        devices = result.stdout.splitlines()
-        return devices
+        # AVD .ini files are indexed on disk; no `emulator -list-avds` fork
+        return self.catalog.avd_names()
+
+    def list_avd_details(self):
+        return self.catalog.avds()
 
     def list_connected_devices(self):
         self._ensure_cmd_available('adb')
@@ -39,24 +49,47 @@ class AndroidDeviceManager:
         return devices
     
     def list_installed_system_images(self):
+        if self.catalog.has_sdk():
+            return [image['package'] for image in self.catalog.system_images()]
+        # SDK location unknown: fall back to asking sdkmanager
         result = subprocess.run(['sdkmanager', '--list_installed'], capture_output=True, text=True)
         lines = result.stdout.splitlines()
         images = [line.split(" ")[2] for line in lines if 'system-images;' in line]
         return images
+
+    def list_system_image_details(self):
+        return self.catalog.system_images()
     
     def create_avd(self, name, package, device_profile='pixel_6'):
         subprocess.run(['avdmanager', 'create', 'avd', '-n', name, '-k', package, '-d', device_profile])
+        self.catalog.refresh_avd(name)
         return f"AVD {name} created."
     
     def delete_avd(self, name):
-        avd_dir = os.path.expanduser(f'~/.android/avd/{name}.avd')
-        ini_file = os.path.expanduser(f'~/.android/avd/{name}.ini')
+        avd_dir = self.catalog.avd_path(name)
+        ini_file = os.path.join(self.catalog.avd_home, f'{name}.ini')
         if os.path.isdir(avd_dir):
             shutil.rmtree(avd_dir, ignore_errors=True)
         if os.path.isfile(ini_file):
             os.remove(ini_file)
+        self.catalog.remove_avd(name)
         return f"AVD {name} deleted."
     
+    def erase_avd(self, name):
+        """Equivalent of `emulator -wipe-data`: drop user data so the next boot starts clean."""
+        if self._list_avd_to_emulators().get(name):
+            return f"Error: AVD {name} is running; stop it before erasing."
+        avd_dir = self.catalog.avd_path(name)
+        if not os.path.isdir(avd_dir):
+            raise ValueError(f"AVD {name} not found")
+        for entry in ('userdata-qemu.img', 'userdata-qemu.img.qcow2', 'cache.img', 'cache.img.qcow2', 'snapshots'):
+            path = os.path.join(avd_dir, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        return f"AVD {name} erased."
+    
     def _is_port_free(self, port):
         """Check if a port is free on localhost."""
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -100,43 +133,76 @@ class AndroidDeviceManager:
             print(f"Reusing running emulator for {avd_name} at {serial}")
             return f"Emulator {avd_name} already running at {serial}."
 
-        # Start emulator without explicit port; let it choose next free port
-        process = subprocess.Popen([
-                'emulator',
-                '-avd', avd_name,
-                '-no-window',
-                '-gpu', 'host',
-                '-no-boot-anim',
-                '-no-snapshot',
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+        # Wait for a boot slot and host headroom; raises AdmissionRejected
+        ticket = self.admission.acquire(avd_name)
+        try:
+            # Start emulator without explicit port; let it choose next free port
+            launched_at = time.time()
+            process = subprocess.Popen([
+                    'emulator',
+                    '-avd', avd_name,
+                    '-no-window',
+                    '-gpu', 'host',
+                    '-no-boot-anim',
+                    '-no-snapshot',
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            self.emulator_processes[avd_name] = process
+
+            # Optionally stream logs
+            if log:
+                def log_emulator_output(stream, queue):
+                    for line in iter(stream.readline, b''):
+                        queue.put(line.decode('utf-8'))
+                    stream.close()
+                threading.Thread(target=log_emulator_output, args=(process.stdout, log), daemon=True).start()
+                threading.Thread(target=log_emulator_output, args=(process.stderr, log), daemon=True).start()
 
-        # Optionally stream logs
-        if log:
-            def log_emulator_output(stream, queue):
-                for line in iter(stream.readline, b''):
-                    queue.put(line.decode('utf-8'))
-                stream.close()
-            threading.Thread(target=log_emulator_output, args=(process.stdout, log), daemon=True).start()
-            threading.Thread(target=log_emulator_output, args=(process.stderr, log), daemon=True).start()
+            # Wait until emulator appears in adb and resolves to this AVD (pushed by adb track-devices)
+            serial = self.readiness.wait_for_emulator(avd_name, timeout=60)
 
-        # Wait until emulator appears in adb and resolves to this AVD
-        serial = None
-        for _ in range(60):
-            mapping = self._list_avd_to_emulators()
-            if avd_name in mapping and mapping[avd_name]:
-                serial = mapping[avd_name][0]
-                break
-            time.sleep(1)
+            if not serial:
+                raise RuntimeError(f"Emulator {avd_name} did not appear in adb in time.")
+        except Exception:
+            self.admission.release(ticket)
+            raise
 
-        if not serial:
-            raise RuntimeError(f"Emulator {avd_name} did not appear in adb in time.")
+        # Start the shared boot monitor now so boot-phase timings are measured from launch
+        self.readiness.watch(serial, label=avd_name, started_at=launched_at).mark('adb_visible')
+        # Keep the boot slot until Android reports boot completion
+        threading.Thread(target=self._release_boot_slot, args=(ticket, avd_name, serial), daemon=True).start()
 
         print(f"Started emulator {avd_name} at {serial}")
+        try:
+            self.start_log_stream(avd_name)
+        except Exception as e:
+            print(f"Log capture not started for {avd_name}: {e}")
         return f"Emulator {avd_name} started at {serial}."
     
+    def _release_boot_slot(self, ticket, avd_name, serial, timeout=300):
+        try:
+            if not self.readiness.wait(serial, timeout, label=avd_name):
+                print(f"Emulator {avd_name} did not report boot completion within {timeout}s")
+        finally:
+            self.admission.release(ticket)
+
+    def resource_usage(self):
+        """Resident size and CPU share of every running emulator, keyed by AVD name."""
+        usage = {}
+        for pid, argv in self.admission.sampler.find_processes(lambda argv: '-avd' in argv[:-1]):
+            name = argv[argv.index('-avd') + 1]
+            proc = self.admission.sampler.process_usage(pid)
+            if not proc:
+                continue
+            entry = usage.setdefault(name, {"avd_name": name, "pids": [], "rss": 0, "cpu_percent": 0.0})
+            # The emulator launcher execs qemu; sum the whole process family
+            entry["pids"].append(pid)
+            entry["rss"] += proc["rss"] or 0
+            entry["cpu_percent"] = round(entry["cpu_percent"] + (proc["cpu_percent"] or 0.0), 1)
+        return list(usage.values())
+
     def stop_emulator(self, avd_name):
         self._ensure_cmd_available('adb')
         mapping = self._list_avd_to_emulators()
@@ -148,10 +214,20 @@ class AndroidDeviceManager:
                 subprocess.run(['adb', '-s', serial, 'emu', 'kill'], capture_output=True, text=True)
             except Exception:
                 pass
+            self.readiness.forget(serial)
         try:
             self.stop_scrcpy_stream(avd_name)
         except Exception:
             pass
+        self.stop_log_stream(avd_name)
+        process = self.emulator_processes.pop(avd_name, None)
+        if process is not None:
+            # Reap the launcher we started so it does not linger as a zombie
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
         return f"Stopped {len(serials)} emulator(s) for {avd_name}."
     
     def _refresh_emulator_mapping(self):
@@ -169,6 +245,8 @@ class AndroidDeviceManager:
         return serials[0]
     
     def _check_if_booted(self, device_id):
+        if self.readiness.is_booted(device_id):
+            return True
         self._ensure_cmd_available('adb')
         result = subprocess.run(['adb', '-s', device_id, 'shell', 'getprop', 'sys.boot_completed'], capture_output=True, text=True)
         return result.stdout.strip() == '1'
@@ -182,14 +260,9 @@ class AndroidDeviceManager:
             # If already running, return existing streamer
             return self.stream[avd_name]
         
-        # Ensure the device is booted
-        booted = False
-        for _ in range(60):  # Wait up to 60 seconds
-            if self._check_if_booted(device_id):
-                booted = True
-                break
-            await asyncio.sleep(1)
-        
+        # Ensure the device is booted; resolves as soon as the shared boot monitor sees it
+        booted = await self.readiness.wait_async(device_id, timeout=60, label=avd_name)
+
         if not booted:
             raise RuntimeError(f"Emulator {avd_name} did not boot in time.")
         
@@ -209,26 +282,36 @@ class AndroidDeviceManager:
  
     
     def start_log_stream(self, avd_name):
+        """Return the shared LogTap for avd_name, creating it on first use."""
         self._ensure_cmd_available('adb')
         device_id = self._get_device_id(avd_name)
         if not device_id:
             raise ValueError(f"No active emulator found for AVD {avd_name}")
-        if avd_name in self.log_streams and self.log_streams[avd_name].poll() is None:
-            return self.log_streams[avd_name]
-        proc = subprocess.Popen(
+        tap = self.log_streams.get(avd_name)
+        if tap is None:
+            tap = LogTap(avd_name, lambda: self._spawn_logcat(avd_name))
+            archive = get_archive()
+            if archive:
+                # Archive everything the device logs, not only what a viewer happened to watch
+                tap.add_sink(archive.sink('android', avd_name))
+            self.log_streams[avd_name] = tap
+        return tap
+
+    def _spawn_logcat(self, avd_name):
+        # Resolve the serial on every (re)start: the emulator may have been restarted on another port
+        device_id = self._get_device_id(avd_name)
+        if not device_id:
+            raise ValueError(f"No active emulator found for AVD {avd_name}")
+        return subprocess.Popen(
             ['adb', '-s', device_id, 'logcat', '-v', 'time', '-T', '0'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
         )
-        self.log_streams[avd_name] = proc
-        return proc
 
     def stop_log_stream(self, avd_name):
-        p = self.log_streams.get(avd_name)
-        if p and p.poll() is None:
-            p.terminate()
-            p.wait()
-        del self.log_streams[avd_name]
+        tap = self.log_streams.pop(avd_name, None)
+        if tap:
+            tap.stop()
         return f"Log stream for {avd_name} stopped."
     
     def install_app(self, avd_name, app_path):
@@ -248,12 +331,23 @@ class AndroidDeviceManager:
         if not self._check_if_booted(device_id):
             return f"Error: Device {device_id} is not booted."
 
-        result = subprocess.run(
-            ['adb', '-s', device_id, 'install', '-r', app_path],
-            capture_output=True, text=True
-        )
+        # Keep the artifact store from evicting the APK mid-install; counts as a use for LRU
+        with artifact_store.using(app_path):
+            result = subprocess.run(
+                ['adb', '-s', device_id, 'install', '-r', app_path],
+                capture_output=True, text=True
+            )
         if result.returncode == 0:
             return f"App installed successfully on {avd_name}."
         else:
             return f"Failed to install app on {avd_name}: {result.stderr}"
 
+    def uninstall_app(self, avd_name, package):
+        self._ensure_cmd_available('adb')
+        device_id = self._get_device_id(avd_name)
+        if not device_id:
+            raise ValueError(f"No running emulator found for AVD {avd_name}")
+        result = subprocess.run(['adb', '-s', device_id, 'uninstall', package], capture_output=True, text=True)
+        if result.returncode == 0 and 'Success' in result.stdout:
+            return f"{package} uninstalled from {avd_name}."
+        return f"Failed to uninstall {package} from {avd_name}: {(result.stderr or result.stdout).strip()}"
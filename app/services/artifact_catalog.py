@@ -0,0 +1,222 @@
+import os
+import re
+import threading
+import time
+from app.database import get_connection
+from app.services.artifact_store import store
+
+
+ARTIFACTS_DIR = os.path.join(os.getcwd(), "storage", "artifacts")
+RECONCILE_INTERVAL = float(os.getenv("ARTIFACT_CATALOG_INTERVAL", "300"))
+FILE_PLATFORMS = {".apk": "android", ".ipa": "ios", ".zip": "ios"}
+_PIPELINE_NAME = re.compile(r"^(\d+)(\.apk|\.app|\.ipa)?$")
+
+
+def _tree_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def _nested_app(path):
+    # storage/artifacts/23856/Runner.app; only one level deep
+    try:
+        for child in os.listdir(path):
+            if child.endswith('.app') and os.path.isdir(os.path.join(path, child)):
+                return child
+    except OSError:
+        pass
+    return None
+
+
+def _stored_size(digest):
+    conn = get_connection()
+    row = conn.execute('SELECT size FROM artifact_objects WHERE digest = ?', (digest,)).fetchone()
+    conn.close()
+    return row["size"] if row else None
+
+
+def _mtime(path):
+    # lstat catches a link re-pointed at another store object, stat a file rewritten in place
+    mtime = max(os.lstat(path).st_mtime, os.stat(path).st_mtime)
+    if os.path.isdir(path) and not path.endswith('.app'):
+        # A pipeline folder's mtime does not move when the Runner.app inside it is replaced
+        nested = _nested_app(path)
+        if nested:
+            mtime = max(mtime, os.stat(os.path.join(path, nested)).st_mtime)
+    return mtime
+
+
+def _pipeline_from_name(name):
+    match = _PIPELINE_NAME.match(name)
+    return int(match.group(1)) if match else None
+
+
+class ArtifactCatalog:
+    """
+    SQLite index of the artifacts directory behind /gitlab/artifacts.
+
+    Downloads add their row as soon as they finish (size taken from the artifact store
+    when the digest is known, so .app bundles are not walked). A background reconcile
+    picks up anything copied in or removed by hand: one listdir of the artifacts
+    directory and one stat per entry, re-measuring only entries whose mtime changed.
+    """
+
+    def __init__(self, root=ARTIFACTS_DIR, interval=RECONCILE_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self.reconciles = 0
+        self.last_reconcile = None
+        self.last_error = None
+
+    def start(self):
+        if self._worker and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._loop, daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        # First pass right away so a fresh catalog table is filled from the existing directory
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[ArtifactCatalog] Reconcile failed: {e}")
+            if self.interval <= 0 or self._stop.wait(self.interval):
+                return
+
+    def _entry(self, name, size=None, pipeline_id=None, job_id=None, digest=None):
+        """Catalog row for a top-level entry of the artifacts directory, or None if it is not an artifact."""
+        if name.startswith(("temp_", ".")):
+            return None  # full-ZIP fallback download or a link being swapped in
+        path = os.path.join(self.root, name)
+        mtime = _mtime(path)
+        if os.path.isfile(path):
+            extension = os.path.splitext(name)[1].lower()
+            row = {"filename": name, "path": path, "extension": extension,
+                   "platform": FILE_PLATFORMS.get(extension), "type": "file"}
+            if size is None:
+                size = os.path.getsize(path)
+        elif name.endswith('.app'):
+            row = {"filename": name, "path": path, "extension": ".app", "platform": "ios", "type": "directory"}
+        else:
+            nested = _nested_app(path)
+            if nested is None:
+                return None
+            path = os.path.join(path, nested)
+            row = {"filename": f"{name}/{nested}", "path": path, "extension": ".app", "platform": "ios",
+                   "type": "directory"}
+        digest = digest or store.digest_for(path)
+        if size is None and digest:
+            size = _stored_size(digest)
+        if size is None:
+            size = _tree_size(path)
+        row.update(entry=name, size=size, mtime=mtime, digest=digest, job_id=job_id,
+                   pipeline_id=pipeline_id if pipeline_id is not None else _pipeline_from_name(name))
+        return row
+
+    def _upsert(self, cursor, row):
+        cursor.execute('''
+            INSERT INTO artifact_catalog (entry, filename, path, size, extension, platform, type, pipeline_id,
+                                          job_id, digest, mtime, indexed_at)
+            VALUES (:entry, :filename, :path, :size, :extension, :platform, :type, :pipeline_id,
+                    :job_id, :digest, :mtime, :indexed_at)
+            ON CONFLICT(entry) DO UPDATE SET
+                filename = excluded.filename, path = excluded.path, size = excluded.size,
+                extension = excluded.extension, platform = excluded.platform, type = excluded.type,
+                pipeline_id = COALESCE(excluded.pipeline_id, pipeline_id), job_id = COALESCE(excluded.job_id, job_id),
+                digest = COALESCE(excluded.digest, digest), mtime = excluded.mtime, indexed_at = excluded.indexed_at
+        ''', dict(row, indexed_at=time.time()))
+
+    def record(self, path, pipeline_id=None, job_id=None, digest=None):
+        """Index a finished download; path is the artifact's location in the artifacts directory."""
+        name = os.path.relpath(os.path.abspath(path), self.root).split(os.sep)[0]
+        row = self._entry(name, pipeline_id=pipeline_id, job_id=job_id, digest=digest)
+        conn = get_connection()
+        try:
+            if row:
+                self._upsert(conn.cursor(), row)
+                conn.commit()
+        finally:
+            conn.close()
+        return row
+
+    def reconcile(self):
+        """Bring the catalog in line with the directory; returns counts of what changed."""
+        with self._lock:
+            started = time.time()
+            names = os.listdir(self.root) if os.path.isdir(self.root) else []
+            conn = get_connection()
+            cursor = conn.cursor()
+            known = {row["entry"]: row["mtime"] for row in cursor.execute('SELECT entry, mtime FROM artifact_catalog')}
+            added = updated = removed = 0
+            present = set()
+            for name in names:
+                try:
+                    if name in known and known[name] == _mtime(os.path.join(self.root, name)):
+                        present.add(name)
+                        continue
+                    row = self._entry(name)
+                except OSError:
+                    continue  # removed, or a link whose store object was evicted
+                if row is None:
+                    continue
+                present.add(name)
+                self._upsert(cursor, row)
+                if name in known:
+                    updated += 1
+                else:
+                    added += 1
+            gone = set(known) - present
+            cursor.executemany('DELETE FROM artifact_catalog WHERE entry = ?', [(name,) for name in gone])
+            removed = len(gone)
+            conn.commit()
+            conn.close()
+            self.reconciles += 1
+            self.last_reconcile = {"entries": len(names), "added": added, "updated": updated, "removed": removed,
+                                   "seconds": round(time.time() - started, 3)}
+            return self.last_reconcile
+
+    def page(self, platform=None, limit=100, offset=0):
+        """Newest first: by pipeline, then entries without one (copied in by hand) by mtime."""
+        conn = get_connection()
+        try:
+            where, params = ('WHERE platform = ?', [platform]) if platform else ('', [])
+            total = conn.execute(f'SELECT COUNT(*) FROM artifact_catalog {where}', params).fetchone()[0]
+            rows = conn.execute(f'''
+                SELECT filename, path, size, extension, platform, type, pipeline_id, job_id, digest
+                FROM artifact_catalog {where}
+                ORDER BY pipeline_id DESC, mtime DESC, filename
+                LIMIT ? OFFSET ?
+            ''', params + [limit, offset]).fetchall()
+        finally:
+            conn.close()
+        artifacts = []
+        for row in rows:
+            artifact = dict(row)
+            artifact["size_mb"] = round(row["size"] / (1024 * 1024), 2)
+            artifacts.append(artifact)
+        return {"artifacts": artifacts, "total": total, "limit": limit, "offset": offset}
+
+    def stats(self):
+        conn = get_connection()
+        count = conn.execute('SELECT COUNT(*) FROM artifact_catalog').fetchone()[0]
+        conn.close()
+        return {"entries": count, "interval": self.interval, "reconciles": self.reconciles,
+                "last_reconcile": self.last_reconcile, "last_error": self.last_error}
+
+
+catalog = ArtifactCatalog()
@@ -0,0 +1,183 @@
+import asyncio
+import collections
+import os
+import time
+import uuid
+from app.services.build_events import hub
+
+
+DOWNLOAD_CONCURRENCY = int(os.getenv("ARTIFACT_DOWNLOAD_CONCURRENCY", "2"))
+HISTORY_SIZE = 100  # finished jobs kept for GET /gitlab/downloads
+PROGRESS_INTERVAL = 1.0  # seconds between progress events per job
+# Pipeline job that builds each platform, and the artifact's path inside its ZIP
+BUILD_JOBS = {
+    "android": ("build_debug_android", "build/app/outputs/flutter-apk/app-debug.apk"),
+    "ios": ("build_debug_ios", "build/ios/iphonesimulator/Runner.app"),
+}
+
+
+class DownloadJob:
+    def __init__(self, key, info, username):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.info = info  # kind, project_id, pipeline_id, job_id, platform
+        self.usernames = [username] if username else []
+        self.status = "queued"
+        self.bytes_done = 0
+        self.bytes_total = None
+        self.requests = 1
+        self.result = None
+        self.error = None
+        self.error_status = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.done = asyncio.get_running_loop().create_future()
+        self._published_at = 0.0
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            **self.info,
+            "status": self.status,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.bytes_total,
+            "requests": self.requests,
+            "local_path": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class DownloadQueue:
+    """
+    Runs artifact downloads in the background, at most `concurrency` at a time.
+
+    Requests for an artifact that is already queued or downloading join that job instead
+    of starting a second transfer. Jobs report bytes_done/bytes_total while they run and
+    are published to the requesters' /gitlab/builds/events streams as "download" events;
+    finished jobs stay visible in GET /gitlab/downloads for a while.
+    """
+
+    def __init__(self, concurrency=DOWNLOAD_CONCURRENCY, history_size=HISTORY_SIZE):
+        self.concurrency = max(1, concurrency)
+        self._semaphore = None
+        self._active = {}  # key -> DownloadJob (queued or running)
+        self._jobs = collections.OrderedDict()  # id -> DownloadJob, oldest first
+        self.history_size = history_size
+        self.merged = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, key, start, username=None, **info):
+        """
+        Queue start(progress) for key unless a job for key is already pending; returns the job.
+        start is a coroutine function returning the artifact's local path. The key does not
+        say who is asking, so callers must first check with the requester's own token that
+        they can read the artifact.
+        """
+        job = self._active.get(key)
+        if job is not None:
+            job.requests += 1
+            if username and username not in job.usernames:
+                job.usernames.append(username)
+            self.merged += 1
+            return job
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        job = DownloadJob(key, info, username)
+        self._active[key] = job
+        self._jobs[job.id] = job
+        self._trim()
+        self._publish(job)
+        job.task = asyncio.get_running_loop().create_task(self._run(job, start))
+        return job
+
+    async def _run(self, job, start):
+        async with self._semaphore:
+            job.status = "running"
+            job.started_at = time.time()
+            self._publish(job)
+            try:
+                job.result = await start(lambda done, total: self._progress(job, done, total))
+                job.status = "success"
+                self.completed += 1
+                job.done.set_result(job.result)
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                job.error_status = 404 if isinstance(e, FileNotFoundError) else getattr(e, "status_code", None)
+                self.failed += 1
+                job.done.set_exception(e)
+                job.done.exception()  # nobody may be waiting on it
+            finally:
+                job.finished_at = time.time()
+                self._active.pop(job.key, None)
+                self._publish(job)
+
+    def _progress(self, job, done, total):
+        job.bytes_done = done
+        job.bytes_total = total
+        now = time.time()
+        if now - job._published_at >= PROGRESS_INTERVAL:
+            self._publish(job)
+
+    def _publish(self, job):
+        job._published_at = time.time()
+        for username in job.usernames:
+            hub.publish({"type": "download", "download_id": job.id, **job.info, "status": job.status,
+                         "bytes_done": job.bytes_done, "bytes_total": job.bytes_total, "local_path": job.result,
+                         "error": job.error, "username": username})
+
+    def _trim(self):
+        while len(self._jobs) > self.history_size:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status in ("queued", "running"):
+                break  # never forget a pending job
+            self._jobs.pop(oldest.id)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self, username=None):
+        jobs = [job for job in reversed(self._jobs.values()) if username is None or username in job.usernames]
+        return [job.to_dict() for job in jobs]
+
+    def stats(self):
+        running = sum(1 for job in self._active.values() if job.status == "running")
+        return {
+            "concurrency": self.concurrency,
+            "running": running,
+            "queued": len(self._active) - running,
+            "merged": self.merged,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+downloads = DownloadQueue()
+
+
+def build_job(platform):
+    """(job name, artifact path in the ZIP) for a build platform; anything but android is iOS."""
+    return BUILD_JOBS["android" if platform == "android" else "ios"]
+
+
+def submit_build(gl, project_id, pipeline_id, platform, job_id, username=None):
+    """
+    Queue the download of a pipeline's APK (as <pipeline>.apk) or Runner.app (as <pipeline>.app).
+    job_id must come from a lookup made with the requester's token (see DownloadQueue.submit).
+    """
+    _, artifact_path_in_zip = build_job(platform)
+    if platform == "android":
+        async def start(progress):
+            return await gl.download_and_extract_artifact(project_id, job_id, artifact_path_in_zip,
+                                                          f"{pipeline_id}.apk", progress)
+    else:
+        async def start(progress):
+            return await gl.download_and_unzip_ios_app(project_id, job_id, artifact_path_in_zip,
+                                                       f"{pipeline_id}.app", progress)
+    return downloads.submit(("build", project_id, pipeline_id, platform), start, username, kind="build",
+                            project_id=project_id, pipeline_id=pipeline_id, job_id=job_id, platform=platform)
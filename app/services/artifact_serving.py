@@ -0,0 +1,232 @@
+import collections
+import hashlib
+import os
+import stat
+import threading
+import uuid
+import zipfile
+from app.services.artifact_catalog import ARTIFACTS_DIR
+from app.services.artifact_store import store, manifest_digest
+
+
+CHUNK_SIZE = 1024 * 1024
+# Fixed timestamps and walk order keep a generated ZIP byte-identical, so its ETag can be strong
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+ZIP_COMPRESSLEVEL = int(os.getenv("ARTIFACT_ZIP_LEVEL", "1"))  # speed over size for on-the-fly ZIPs
+MEDIA_TYPES = {
+    ".apk": "application/vnd.android.package-archive",
+    ".ipa": "application/octet-stream",
+    ".zip": "application/zip",
+}
+
+DIGEST_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_digests = collections.OrderedDict()  # stat signature -> digest for unstored artifacts, least recent first
+_zip_locks = {}  # ETag -> [lock, users] while that ZIP is being cached; dropped with its last user
+
+
+class ArtifactNotFound(Exception):
+    pass
+
+
+class ServedArtifact:
+    def __init__(self, path, digest, stored):
+        self.path = path
+        self.digest = digest
+        self.stored = stored  # backed by an artifact store object (its ZIP may be cached)
+        self._held = None
+        self.is_dir = os.path.isdir(path)
+        self.name = os.path.basename(path)
+        self.download_name = self.name + ".zip" if self.is_dir else self.name
+        # The ZIP's top folder is named after the link, so one tree can have several ZIPs
+        self.etag = f'"{digest}/{self.download_name}"' if self.is_dir else f'"{digest}"'
+        extension = ".zip" if self.is_dir else os.path.splitext(self.name)[1].lower()
+        self.media_type = MEDIA_TYPES.get(extension, "application/octet-stream")
+
+    def close(self):
+        """Let the store evict the object again; call once the response has been sent."""
+        held, self._held = self._held, None
+        store.release(held)
+
+    def cached_zip(self):
+        path = store.zip_path(self.digest, self.name)
+        return path if self.stored and os.path.exists(path) else None
+
+
+def resolve(filename):
+    """Path of an artifact listed by /gitlab/artifacts (a file or an .app directory) under ARTIFACTS_DIR."""
+    path = os.path.normpath(os.path.join(ARTIFACTS_DIR, filename))
+    if os.path.isabs(filename) or os.path.relpath(path, ARTIFACTS_DIR).startswith(os.pardir):
+        raise ArtifactNotFound(filename)
+    if os.path.basename(path).startswith(("temp_", ".")):
+        raise ArtifactNotFound(filename)  # partial download or a link being swapped in
+    if os.path.isfile(path) or (os.path.isdir(path) and path.endswith(".app")):
+        return path
+    raise ArtifactNotFound(filename)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _walk(path):
+    """(relative path, lstat) of every file and symlink under path, in a fixed order."""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files + [d for d in dirs if os.path.islink(os.path.join(root, d))]):
+            full = os.path.join(root, name)
+            yield os.path.relpath(full, path), os.lstat(full)
+
+
+def _unstored_digest(path):
+    # Artifacts copied in by hand are hashed once per stat signature, the same way the store does
+    if os.path.isdir(path):
+        entries = list(_walk(path))
+        signature = (path, tuple((rel, st.st_size, st.st_mtime_ns, st.st_mode) for rel, st in entries))
+    else:
+        st = os.stat(path)
+        signature = (path, st.st_size, st.st_mtime_ns)
+    with _lock:
+        digest = _digests.get(signature)
+        if digest:
+            _digests.move_to_end(signature)
+            return digest
+    if os.path.isdir(path):
+        digest = manifest_digest({
+            rel: "link:" + os.readlink(os.path.join(path, rel)) if stat.S_ISLNK(st.st_mode)
+            else f"{_file_sha256(os.path.join(path, rel))}:{st.st_mode & 0o111:o}"
+            for rel, st in entries
+        })
+    else:
+        digest = _file_sha256(path)
+    with _lock:
+        _digests[signature] = digest
+        while len(_digests) > DIGEST_CACHE_SIZE:
+            _digests.popitem(last=False)
+    return digest
+
+
+def describe(filename):
+    """
+    Resolve filename and work out its content digest (the ETag), without reading stored artifacts.
+    A stored object is held against eviction until the returned artifact is closed.
+    """
+    path = resolve(filename)
+    digest = store.hold(path)
+    if digest:
+        artifact = ServedArtifact(path, digest, stored=True)
+        artifact._held = digest
+        return artifact
+    return ServedArtifact(path, _unstored_digest(path), stored=False)
+
+
+def not_modified(if_none_match, etag):
+    """True when an If-None-Match header already names etag (weak comparison, as RFC 9110 asks)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class _ZipOutput:
+    """Non-seekable sink for ZipFile: collects output for the response and tees it to the cache file."""
+
+    def __init__(self, cache_file=None):
+        self._chunks = []
+        self._cache = cache_file
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        if self._cache is not None:
+            self._cache.write(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _zip_info(name, st, compress_type):
+    info = zipfile.ZipInfo(name, ZIP_DATE)
+    info.external_attr = (st.st_mode & 0xFFFF) << 16
+    info.create_system = 3  # unix, so extractors honour the mode bits and symlinks
+    info.compress_type = compress_type
+    return info
+
+
+def zip_stream(artifact):
+    """
+    Yield a ZIP of an .app directory as it is written, at most about CHUNK_SIZE at a time.
+    Store-backed trees are teed to the ZIP cache, which is only published once complete.
+    """
+    cache_path = store.zip_path(artifact.digest, artifact.name) if artifact.stored else None
+    temp_path = None
+    cache_file = None
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        cache_file = open(temp_path, "wb")
+    output = _ZipOutput(cache_file)
+    parent = os.path.dirname(artifact.path)
+    try:
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED, compresslevel=ZIP_COMPRESSLEVEL) as archive:
+            for root, dirs, _ in os.walk(artifact.path):
+                dirs.sort()
+                archive.writestr(_zip_info(os.path.relpath(root, parent) + "/", os.stat(root), zipfile.ZIP_STORED), b"")
+                yield output.take()
+                for name in sorted(os.listdir(root)):
+                    full = os.path.join(root, name)
+                    st = os.lstat(full)
+                    arcname = os.path.relpath(full, parent)
+                    if stat.S_ISLNK(st.st_mode):
+                        archive.writestr(_zip_info(arcname, st, zipfile.ZIP_STORED), os.readlink(full))
+                    elif stat.S_ISREG(st.st_mode):
+                        info = _zip_info(arcname, st, zipfile.ZIP_DEFLATED)
+                        info.file_size = st.st_size  # lets ZipFile pick ZIP64 up front
+                        with open(full, "rb") as src, archive.open(info, "w") as dst:
+                            while chunk := src.read(CHUNK_SIZE):
+                                dst.write(chunk)
+                                yield output.take()
+        yield output.take()
+        if cache_file is not None:
+            cache_file.close()
+            os.replace(temp_path, cache_path)
+            temp_path = None
+    finally:
+        if cache_file is not None and temp_path is not None:
+            cache_file.close()
+            os.remove(temp_path)
+
+
+def build_zip(artifact):
+    """Cache the ZIP of a stored .app tree (for Range and HEAD requests) and return its path."""
+    with _lock:
+        entry = _zip_locks.setdefault(artifact.etag, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            cached = artifact.cached_zip()
+            if cached is None:
+                for _ in zip_stream(artifact):
+                    pass
+                cached = artifact.cached_zip()
+        return cached
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _zip_locks[artifact.etag]
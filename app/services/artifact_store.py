@@ -0,0 +1,312 @@
+import collections
+import contextlib
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from app.database import get_connection
+
+
+STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", os.path.join("storage", "artifact_store"))
+QUOTA_BYTES = int(float(os.getenv("ARTIFACT_STORE_QUOTA_GB", "20")) * 1024 ** 3)
+
+
+def manifest_digest(entries):
+    """Digest of a directory tree from {relative path: "<sha256>:<exec bits>" or "link:<target>"}."""
+    manifest = hashlib.sha256()
+    for relative in sorted(entries):
+        manifest.update(f"{relative}\0{entries[relative]}\n".encode())
+    return manifest.hexdigest()
+
+
+class HashingFile:
+    """Write-only file that hashes and counts what is written, so no second read pass is needed."""
+
+    def __init__(self, path):
+        self._file = open(path, "wb")
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def close(self):
+        self._file.close()
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StagedFile:
+    """A single-file artifact (APK, IPA, ZIP) being written into the store."""
+
+    def __init__(self, store, extension):
+        self.store = store
+        self.extension = extension
+        self.path = os.path.join(store.tmp_dir, uuid.uuid4().hex + extension)
+        self._file = None
+
+    def open(self, _path=None):
+        # Signature matches the open_file callbacks of the ZIP extractors
+        self._file = HashingFile(self.path)
+        return self._file
+
+    def commit(self, link_path=None):
+        return self.store.commit(self._file.hexdigest(), self._file.size, self.path, "file", self.extension,
+                                 link_path)
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StagedTree:
+    """A directory artifact (an iOS .app) being written into the store, one hashed file at a time."""
+
+    def __init__(self, store, extension=".app"):
+        self.store = store
+        self.extension = extension
+        self.path = os.path.join(store.tmp_dir, uuid.uuid4().hex + extension)
+        self._files = {}  # relative path -> HashingFile
+        os.makedirs(self.path)
+
+    def open(self, path):
+        handle = HashingFile(path)
+        self._files[os.path.relpath(path, self.path)] = handle
+        return handle
+
+    def commit(self, link_path=None):
+        # The tree digest covers every file's path, content digest and executable bit, and
+        # every symlink (which the extractors create without going through open())
+        entries = {relative: f"{handle.hexdigest()}:{os.stat(os.path.join(self.path, relative)).st_mode & 0o111:o}"
+                   for relative, handle in self._files.items()}
+        for root, dirs, files in os.walk(self.path):
+            for name in dirs + files:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    entries[os.path.relpath(path, self.path)] = "link:" + os.readlink(path)
+        size = sum(handle.size for handle in self._files.values())
+        return self.store.commit(manifest_digest(entries), size, self.path, "tree", self.extension, link_path)
+
+    def discard(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class ArtifactStore:
+    """
+    Content-addressed artifact storage with dedup and an LRU size quota.
+
+    Artifacts are hashed while they stream in and stored once under their SHA-256
+    (objects/<2 hex>/<digest><ext>; an .app directory's digest covers its file paths and
+    contents). Rebuilding the same commit therefore costs no extra disk. The friendly
+    paths callers already use (storage/artifacts/<pipeline>.apk, <pipeline>.app) are
+    symlinks into the store, recorded on the builds and artifacts rows together with the
+    digest. When the store exceeds its quota the least recently installed or downloaded
+    objects are deleted, together with their links; pinned objects and objects being
+    installed are never evicted.
+    """
+
+    def __init__(self, root=STORE_DIR, quota_bytes=QUOTA_BYTES):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.tmp_dir = os.path.join(root, "tmp")
+        self._lock = threading.Lock()
+        self._in_use = collections.Counter()  # digest -> active installs/downloads
+        self.dedup_hits = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def _object_path(self, digest, extension):
+        return os.path.join(self.root, "objects", digest[:2], digest + extension)
+
+    def zip_path(self, digest, name=None):
+        """Where the served ZIP of a stored .app tree (as folder `name`) is cached; deleted with the object."""
+        directory = os.path.join(self.root, "zips", digest[:2], digest)
+        return os.path.join(directory, name + ".zip") if name else directory
+
+    # Writing
+
+    def stage_file(self, extension):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return StagedFile(self, extension)
+
+    def stage_tree(self, extension=".app"):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return StagedTree(self, extension)
+
+    def commit(self, digest, size, staged_path, kind, extension, link_path=None):
+        """
+        Move a staged artifact to its digest path (or drop it if already stored); returns (digest, path).
+        With link_path the friendly link is made before the object can be evicted: an object
+        that was already stored may be the least recently used one when another thread evicts.
+        """
+        final_path = self._object_path(digest, extension)
+        with self._lock:
+            if os.path.exists(final_path):
+                self.dedup_hits += 1
+                if kind == "tree":
+                    shutil.rmtree(staged_path, ignore_errors=True)
+                else:
+                    os.remove(staged_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(staged_path, final_path)
+            conn = get_connection()
+            conn.execute('''
+                INSERT INTO artifact_objects (digest, kind, path, size, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(digest) DO UPDATE SET last_used_at = excluded.last_used_at, path = excluded.path
+            ''', (digest, kind, final_path, size, time.time(), time.time()))
+            conn.commit()
+            conn.close()
+            self._in_use[digest] += 1
+        try:
+            if link_path:
+                self.link(digest, final_path, link_path)
+        finally:
+            self.release(digest)
+        self.evict(keep=digest)
+        return digest, final_path
+
+    def link(self, digest, target, link_path):
+        """Point link_path (a friendly artifact path) at a stored object; removed on eviction."""
+        if os.path.isdir(link_path) and not os.path.islink(link_path):
+            shutil.rmtree(link_path)  # pre-store layout
+        directory = os.path.dirname(link_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Swap the link in with a rename so readers see the old or the new artifact, never neither
+        temp_link = os.path.join(directory, f".{uuid.uuid4().hex}.link")
+        os.symlink(os.path.relpath(target, directory), temp_link)
+        os.replace(temp_link, link_path)
+        conn = get_connection()
+        conn.execute('INSERT OR REPLACE INTO artifact_links (link_path, digest) VALUES (?, ?)', (link_path, digest))
+        conn.commit()
+        conn.close()
+        return link_path
+
+    # Usage tracking
+
+    def digest_for(self, path):
+        """Digest of the stored object path (or a link to it) refers to, else None."""
+        real = os.path.realpath(path)
+        objects = os.path.realpath(os.path.join(self.root, "objects"))
+        if os.path.dirname(os.path.dirname(real)) != objects:
+            return None
+        name = os.path.basename(real)
+        return name.split(".", 1)[0]
+
+    def touch(self, digest):
+        conn = get_connection()
+        conn.execute('UPDATE artifact_objects SET last_used_at = ? WHERE digest = ?', (time.time(), digest))
+        conn.commit()
+        conn.close()
+
+    def hold(self, path):
+        """Protect the object behind path from eviction until release(); returns its digest (or None)."""
+        digest = self.digest_for(path)
+        if digest is not None:
+            with self._lock:
+                self._in_use[digest] += 1
+        return digest
+
+    def release(self, digest):
+        if digest is None:
+            return
+        with self._lock:
+            self._in_use[digest] -= 1
+            if self._in_use[digest] <= 0:
+                del self._in_use[digest]
+        self.touch(digest)
+
+    @contextlib.contextmanager
+    def using(self, path):
+        """Protect the object behind path from eviction while it is installed or served."""
+        digest = self.hold(path)
+        try:
+            yield digest
+        finally:
+            self.release(digest)
+
+    def set_pinned(self, digest, pinned):
+        conn = get_connection()
+        cursor = conn.execute('UPDATE artifact_objects SET pinned = ? WHERE digest = ?', (1 if pinned else 0, digest))
+        conn.commit()
+        conn.close()
+        return cursor.rowcount > 0
+
+    # Eviction
+
+    def evict(self, keep=None):
+        """Delete least recently used unpinned objects until the store fits its quota."""
+        with self._lock:
+            conn = get_connection()
+            cursor = conn.cursor()
+            total = cursor.execute('SELECT COALESCE(SUM(size), 0) FROM artifact_objects').fetchone()[0]
+            if total <= self.quota_bytes:
+                conn.close()
+                return 0
+            candidates = cursor.execute('''
+                SELECT digest, kind, path, size FROM artifact_objects WHERE pinned = 0 ORDER BY last_used_at
+            ''').fetchall()
+            freed = 0
+            for row in candidates:
+                if total - freed <= self.quota_bytes:
+                    break
+                if row["digest"] == keep or row["digest"] in self._in_use:
+                    continue
+                self._delete(cursor, row)
+                freed += row["size"]
+            conn.commit()
+            conn.close()
+            return freed
+
+    def _delete(self, cursor, row):
+        digest = row["digest"]
+        if row["kind"] == "tree":
+            shutil.rmtree(row["path"], ignore_errors=True)
+            shutil.rmtree(self.zip_path(digest), ignore_errors=True)
+        elif os.path.exists(row["path"]):
+            os.remove(row["path"])
+        # Drop the friendly links and forget the path on builds that referenced it
+        for (link_path,) in cursor.execute('SELECT link_path FROM artifact_links WHERE digest = ?', (digest,)).fetchall():
+            if os.path.islink(link_path):
+                os.remove(link_path)
+        cursor.execute('DELETE FROM artifact_links WHERE digest = ?', (digest,))
+        cursor.execute('UPDATE builds SET artifact_path = NULL WHERE artifact_digest = ?', (digest,))
+        cursor.execute('DELETE FROM artifact_catalog WHERE digest = ?', (digest,))
+        cursor.execute('DELETE FROM artifact_objects WHERE digest = ?', (digest,))
+        self.evictions += 1
+        self.evicted_bytes += row["size"]
+
+    def stats(self):
+        conn = get_connection()
+        row = conn.execute('''
+            SELECT COUNT(*) AS objects, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(pinned), 0) AS pinned
+            FROM artifact_objects
+        ''').fetchone()
+        conn.close()
+        with self._lock:
+            in_use = len(self._in_use)
+        return {
+            "objects": row["objects"],
+            "bytes": row["bytes"],
+            "quota_bytes": self.quota_bytes,
+            "pinned": row["pinned"],
+            "in_use": in_use,
+            "dedup_hits": self.dedup_hits,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+
+store = ArtifactStore()
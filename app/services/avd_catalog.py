@@ -0,0 +1,260 @@
+import os
+import shutil
+import threading
+import time
+
+
+def _default_avd_home():
+    if os.getenv("ANDROID_AVD_HOME"):
+        return os.getenv("ANDROID_AVD_HOME")
+    if os.getenv("ANDROID_USER_HOME"):
+        return os.path.join(os.getenv("ANDROID_USER_HOME"), "avd")
+    if os.getenv("ANDROID_SDK_HOME"):
+        return os.path.join(os.getenv("ANDROID_SDK_HOME"), ".android", "avd")
+    return os.path.expanduser("~/.android/avd")
+
+
+def _default_sdk_root():
+    for var in ("ANDROID_SDK_ROOT", "ANDROID_HOME"):
+        if os.getenv(var):
+            return os.getenv(var)
+    # <sdk>/emulator/emulator or <sdk>/cmdline-tools/<version>/bin/sdkmanager on PATH
+    for cmd, depth in (("emulator", 2), ("sdkmanager", 4)):
+        path = shutil.which(cmd)
+        if path:
+            root = os.path.realpath(path)
+            for _ in range(depth):
+                root = os.path.dirname(root)
+            if os.path.isdir(os.path.join(root, "system-images")):
+                return root
+    return None
+
+
+def read_ini(path):
+    """Parse a key=value file (AVD .ini, config.ini, source.properties); {} if unreadable."""
+    values = {}
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                values[key.strip()] = value.strip()
+    except OSError:
+        pass
+    return values
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _int(value):
+    try:
+        return int(str(value).rstrip("MmBb"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _api_level(value):
+    # "android-34", "android-UpsideDownCake" or a bare "34"
+    if not value:
+        return None
+    return _int(value.rsplit("-", 1)[-1])
+
+
+class AvdCatalog:
+    """
+    AVDs and installed system images read straight from disk.
+
+    AVDs come from <avd_home>/<name>.ini and <name>.avd/config.ini, system images from
+    <sdk>/system-images/<api>/<tag>/<abi>/source.properties. Parsed entries are cached and
+    revalidated by mtime at most every `check_interval` seconds, so listing is a dict copy
+    instead of an `emulator -list-avds` fork or an `sdkmanager --list_installed` JVM start.
+    """
+
+    def __init__(self, avd_home=None, sdk_root=None, check_interval=1.0):
+        self.avd_home = avd_home or _default_avd_home()
+        self.sdk_root = sdk_root if sdk_root is not None else _default_sdk_root()
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._avds = {}  # name -> (fingerprint, info)
+        self._avd_dir_mtime = None
+        self._avds_checked = 0.0
+        self._images = []
+        self._images_fingerprint = None
+        self._images_checked = 0.0
+        self.rescans = 0
+
+    # AVDs
+
+    def _avd_files(self, name):
+        ini = os.path.join(self.avd_home, f"{name}.ini")
+        path = read_ini(ini).get("path") or os.path.join(self.avd_home, f"{name}.avd")
+        return ini, path
+
+    def _parse_avd(self, name):
+        ini_path, avd_path = self._avd_files(name)
+        ini = read_ini(ini_path)
+        config_path = os.path.join(avd_path, "config.ini")
+        config = read_ini(config_path)
+        sysdir = config.get("image.sysdir.1", "").strip("/\\")
+        parts = sysdir.replace("\\", "/").split("/")
+        package = ";".join(parts) if len(parts) == 4 and parts[0] == "system-images" else None
+        api = _api_level(ini.get("target")) or (_api_level(parts[1]) if package else None)
+        width, height = _int(config.get("hw.lcd.width")), _int(config.get("hw.lcd.height"))
+        info = {
+            "name": name,
+            "display_name": config.get("avd.ini.displayname", name),
+            "path": avd_path,
+            "target": ini.get("target"),
+            "api_level": api,
+            "abi": config.get("abi.type"),
+            "tag": config.get("tag.id"),
+            "system_image": package,
+            "device": config.get("hw.device.name"),
+            "manufacturer": config.get("hw.device.manufacturer"),
+            "ram_mb": _int(config.get("hw.ramSize")),
+            "heap_mb": _int(config.get("vm.heapSize")),
+            "data_partition": config.get("disk.dataPartition.size"),
+            "lcd": {"width": width, "height": height, "density": _int(config.get("hw.lcd.density"))},
+            "play_store": config.get("PlayStore.enabled", "").lower() in ("yes", "true"),
+        }
+        return (_mtime(ini_path), _mtime(config_path)), info
+
+    def _revalidate_avds_locked(self, force=False):
+        now = time.time()
+        if not force and now - self._avds_checked < self.check_interval:
+            return
+        self._avds_checked = now
+        dir_mtime = _mtime(self.avd_home)
+        if dir_mtime is None:
+            self._avds.clear()
+            self._avd_dir_mtime = None
+            return
+        if force or dir_mtime != self._avd_dir_mtime:
+            # Entries added or removed: re-list the .ini files
+            self._avd_dir_mtime = dir_mtime
+            names = {f[:-4] for f in os.listdir(self.avd_home) if f.endswith(".ini")}
+            for gone in set(self._avds) - names:
+                del self._avds[gone]
+            for name in names - set(self._avds):
+                self._avds[name] = self._parse_avd(name)
+                self.rescans += 1
+        # Edited in place (e.g. config.ini tweaks) do not touch the directory mtime
+        for name, (fingerprint, _) in list(self._avds.items()):
+            ini_path, avd_path = self._avd_files(name)
+            if (_mtime(ini_path), _mtime(os.path.join(avd_path, "config.ini"))) != fingerprint:
+                self._avds[name] = self._parse_avd(name)
+                self.rescans += 1
+
+    def avds(self):
+        with self._lock:
+            self._revalidate_avds_locked()
+            return [dict(self._avds[name][1]) for name in sorted(self._avds)]
+
+    def avd_names(self):
+        with self._lock:
+            self._revalidate_avds_locked()
+            return sorted(self._avds)
+
+    def get_avd(self, name):
+        with self._lock:
+            self._revalidate_avds_locked()
+            entry = self._avds.get(name)
+            return dict(entry[1]) if entry else None
+
+    def avd_path(self, name):
+        return self._avd_files(name)[1]
+
+    def refresh_avd(self, name):
+        """Re-read one AVD after it was created or changed by this process."""
+        with self._lock:
+            ini_path, _ = self._avd_files(name)
+            if os.path.isfile(ini_path):
+                self._avds[name] = self._parse_avd(name)
+                self.rescans += 1
+            else:
+                self._avds.pop(name, None)
+            self._avd_dir_mtime = _mtime(self.avd_home)
+
+    def remove_avd(self, name):
+        with self._lock:
+            self._avds.pop(name, None)
+            self._avd_dir_mtime = _mtime(self.avd_home)
+
+    # System images
+
+    def _images_root(self):
+        return os.path.join(self.sdk_root, "system-images") if self.sdk_root else None
+
+    def _image_dirs(self):
+        """(path, (api, tag, abi)) for every <api>/<tag>/<abi> directory plus a fingerprint of the tree."""
+        root = self._images_root()
+        dirs, fingerprint = [], [_mtime(root)]
+        if fingerprint[0] is None:
+            return dirs, tuple(fingerprint)
+        for api in sorted(os.listdir(root)):
+            api_path = os.path.join(root, api)
+            if not os.path.isdir(api_path):
+                continue
+            fingerprint.append(_mtime(api_path))
+            for tag in sorted(os.listdir(api_path)):
+                tag_path = os.path.join(api_path, tag)
+                if not os.path.isdir(tag_path):
+                    continue
+                fingerprint.append(_mtime(tag_path))
+                for abi in sorted(os.listdir(tag_path)):
+                    abi_path = os.path.join(tag_path, abi)
+                    if os.path.isdir(abi_path):
+                        props = os.path.join(abi_path, "source.properties")
+                        fingerprint.append(_mtime(props))
+                        dirs.append((abi_path, (api, tag, abi)))
+        return dirs, tuple(fingerprint)
+
+    def _revalidate_images_locked(self, force=False):
+        now = time.time()
+        if not force and now - self._images_checked < self.check_interval:
+            return
+        self._images_checked = now
+        dirs, fingerprint = self._image_dirs()
+        if not force and fingerprint == self._images_fingerprint:
+            return
+        self._images_fingerprint = fingerprint
+        images = []
+        for path, (api, tag, abi) in dirs:
+            props = read_ini(os.path.join(path, "source.properties"))
+            images.append({
+                "package": f"system-images;{api};{tag};{abi}",
+                "api_level": _int(props.get("AndroidVersion.ApiLevel")) or _api_level(api),
+                "codename": props.get("AndroidVersion.CodeName"),
+                "tag": props.get("SystemImage.TagId", tag),
+                "tag_display": props.get("SystemImage.TagDisplay"),
+                "abi": props.get("SystemImage.Abi", abi),
+                "description": props.get("Pkg.Desc"),
+                "revision": props.get("Pkg.Revision"),
+                "path": path,
+            })
+        self._images = images
+        self.rescans += 1
+
+    def has_sdk(self):
+        root = self._images_root()
+        return bool(root and os.path.isdir(root))
+
+    def system_images(self):
+        with self._lock:
+            self._revalidate_images_locked()
+            return [dict(i) for i in self._images]
+
+    def invalidate(self):
+        with self._lock:
+            self._revalidate_avds_locked(force=True)
+            self._revalidate_images_locked(force=True)
+
+
+catalog = AvdCatalog(check_interval=float(os.getenv("AVD_CATALOG_CHECK_INTERVAL", "1.0")))
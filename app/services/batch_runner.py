@@ -0,0 +1,90 @@
+import asyncio
+import json
+import os
+import time
+from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_OPERATIONS = ("boot", "shutdown", "erase", "install", "uninstall")
+
+
+class BatchRequest(BaseModel):
+    operation: str
+    targets: List[str]
+    app_path: Optional[str] = None  # install
+    app_id: Optional[str] = None  # uninstall: Android package name or iOS bundle id
+    concurrency: Optional[int] = None
+
+
+def _failed_message(result):
+    # Manager methods report some failures as "Failed ..."/"Error: ..." strings instead of raising
+    return isinstance(result, str) and result.startswith(("Failed", "Error"))
+
+
+async def run_batch(targets, action, concurrency=None):
+    """
+    Run action(target) for each target in worker threads, at most `concurrency` at a time,
+    and yield one result dict per target in completion order.
+    """
+    limit = max(1, min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_one(target):
+        async with semaphore:
+            started = time.time()
+            try:
+                result = await run_in_threadpool(action, target)
+                item = {"target": target, "ok": not _failed_message(result), "result": result}
+            except Exception as e:
+                item = {"target": target, "ok": False, "error": str(e)}
+            item["seconds"] = round(time.time() - started, 3)
+            return item
+
+    # Duplicate targets would race each other on the same device
+    tasks = [asyncio.ensure_future(run_one(t)) for t in dict.fromkeys(targets)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def batch_response(request, action):
+    """Stream batch results as NDJSON: one line per target, then a summary line."""
+    async def body():
+        started = time.time()
+        succeeded = failed = 0
+        async for item in run_batch(request.targets, action, request.concurrency):
+            if item["ok"]:
+                succeeded += 1
+            else:
+                failed += 1
+            yield json.dumps(item) + "\n"
+        yield json.dumps({
+            "done": True,
+            "operation": request.operation,
+            "succeeded": succeeded,
+            "failed": failed,
+            "seconds": round(time.time() - started, 3),
+        }) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def validate_batch(request):
+    """Return an error message for an unusable batch request, else None."""
+    if request.operation not in BATCH_OPERATIONS:
+        return f"Unknown operation {request.operation}; expected one of {', '.join(BATCH_OPERATIONS)}"
+    if not request.targets:
+        return "No targets given"
+    if request.operation == "install" and not request.app_path:
+        return "install requires app_path"
+    if request.operation == "uninstall" and not request.app_id:
+        return "uninstall requires app_id"
+    return None
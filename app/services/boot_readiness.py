@@ -0,0 +1,227 @@
+import asyncio
+import subprocess
+import threading
+import time
+
+
+# Runs inside one long-lived `adb shell`: prints a line whenever the boot state changes
+# and exits once sys.boot_completed is 1. Polling getprop on the device costs no adb fork.
+_WATCH_SCRIPT = (
+    'echo online; last=""; '
+    'while true; do '
+    'c=$(getprop sys.boot_completed); a=$(getprop init.svc.bootanim); '
+    's="bootanim=$a boot_completed=$c"; '
+    'if [ "$s" != "$last" ]; then echo "$s"; last="$s"; fi; '
+    'if [ "$c" = "1" ]; then break; fi; '
+    'sleep 0.2; '
+    'done'
+)
+
+
+class _Monitor:
+    def __init__(self, serial, label, started_at):
+        self.serial = serial
+        self.label = label
+        self.started_at = started_at
+        self.phases = {}  # phase -> seconds since started_at
+        self.booted = threading.Event()
+        self.done = threading.Event()
+        self.error = None
+        self.process = None
+        self.futures = []  # (loop, future) awaiting boot
+
+    def mark(self, phase):
+        self.phases.setdefault(phase, round(time.time() - self.started_at, 3))
+
+
+class BootReadinessTracker:
+    """
+    Boot readiness for Android devices without per-second adb polling.
+
+    One monitor per booting serial runs a single `adb wait-for-device shell` loop and
+    resolves every waiter as soon as the device reports boot completion. Waiters for the
+    same serial share the monitor. Boot-phase timings are kept per serial.
+
+    Emulator serials appearing in adb are followed with one shared `adb track-devices`
+    stream instead of re-listing devices every second.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._monitors = {}  # serial -> _Monitor
+        self._booted = set()  # serials known to have completed boot
+        # adb track-devices state
+        self._devices_cond = threading.Condition()
+        self._online = set()
+        self._listed = set()  # every serial adb lists, in any state
+        self._updates = 0  # bumped on every track-devices update
+        self._tracker = None
+        self._avd_names = {}  # serial -> avd name, resolved once per serial
+
+    # Boot completion
+
+    def watch(self, serial, label=None, started_at=None):
+        """Start (or reuse) the monitor for serial and return it."""
+        with self._lock:
+            monitor = self._monitors.get(serial)
+            if monitor and not (monitor.done.is_set() and not monitor.booted.is_set()):
+                return monitor
+            monitor = _Monitor(serial, label or serial, started_at or time.time())
+            if serial in self._booted:
+                monitor.mark('boot_completed')
+                monitor.booted.set()
+                monitor.done.set()
+            else:
+                threading.Thread(target=self._run_monitor, args=(monitor,), daemon=True).start()
+            self._monitors[serial] = monitor
+            return monitor
+
+    def _run_monitor(self, monitor):
+        try:
+            monitor.process = subprocess.Popen(
+                ['adb', '-s', monitor.serial, 'wait-for-device', 'shell', _WATCH_SCRIPT],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            for raw in iter(monitor.process.stdout.readline, b''):
+                line = raw.decode('utf-8', errors='replace').strip()
+                if line == 'online':
+                    monitor.mark('device_online')
+                elif 'bootanim=running' in line:
+                    monitor.mark('boot_animation')
+                if line.endswith('boot_completed=1'):
+                    monitor.mark('boot_completed')
+                    with self._lock:
+                        self._booted.add(monitor.serial)
+                    monitor.booted.set()
+                    break
+            monitor.process.stdout.close()
+            monitor.process.wait()
+        except Exception as e:
+            monitor.error = str(e)
+        finally:
+            monitor.done.set()
+            for loop, fut in monitor.futures:
+                loop.call_soon_threadsafe(self._resolve_future, fut, monitor.booted.is_set())
+            monitor.futures = []
+
+    @staticmethod
+    def _resolve_future(fut, value):
+        if not fut.done():
+            fut.set_result(value)
+
+    def wait(self, serial, timeout=60, label=None):
+        """Block until serial has booted; returns False on timeout or monitor failure."""
+        monitor = self.watch(serial, label)
+        monitor.done.wait(timeout)
+        return monitor.booted.is_set()
+
+    async def wait_async(self, serial, timeout=60, label=None):
+        monitor = self.watch(serial, label)
+        if monitor.done.is_set():
+            return monitor.booted.is_set()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        monitor.futures.append((loop, fut))
+        if monitor.done.is_set():
+            # Finished between the check and registration
+            return monitor.booted.is_set()
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    def is_booted(self, serial):
+        """True only when a monitor has seen this serial complete boot (no adb call)."""
+        return serial in self._booted
+
+    def forget(self, serial):
+        """Drop cached state for a serial, e.g. when its emulator is stopped."""
+        with self._lock:
+            self._booted.discard(serial)
+            monitor = self._monitors.pop(serial, None)
+        if monitor and monitor.process and monitor.process.poll() is None:
+            monitor.process.terminate()
+        self._avd_names.pop(serial, None)
+
+    def timings(self):
+        with self._lock:
+            return [
+                {"serial": m.serial, "label": m.label, "booted": m.booted.is_set(), "phases": dict(m.phases),
+                 "error": m.error}
+                for m in self._monitors.values()
+            ]
+
+    # Emulator appearance
+
+    def _ensure_tracking(self):
+        with self._devices_cond:
+            if self._tracker and self._tracker.is_alive():
+                return
+            self._tracker = threading.Thread(target=self._track_devices, daemon=True)
+            self._tracker.start()
+
+    def _track_devices(self):
+        try:
+            proc = subprocess.Popen(['adb', 'track-devices'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            while True:
+                # Each update is a 4 hex digit length followed by "serial\tstate\n" lines
+                header = proc.stdout.read(4)
+                if len(header) < 4:
+                    break
+                body = proc.stdout.read(int(header, 16)).decode('utf-8', errors='replace')
+                online, listed = set(), set()
+                for line in body.splitlines():
+                    parts = line.split()
+                    if len(parts) >= 2:
+                        listed.add(parts[0])
+                        if parts[1] == 'device':
+                            online.add(parts[0])
+                with self._devices_cond:
+                    gone = self._listed - listed
+                    self._online = online
+                    self._listed = listed
+                    self._updates += 1
+                    self._devices_cond.notify_all()
+                # An emulator that died outside stop_emulator must not leave its serial marked
+                # booted for the next emulator that reuses it
+                for serial in gone:
+                    self.forget(serial)
+        except Exception as e:
+            print(f"[BootReadiness] adb track-devices stopped: {e}")
+        finally:
+            with self._devices_cond:
+                self._devices_cond.notify_all()
+
+    def _avd_name(self, serial):
+        name = self._avd_names.get(serial)
+        if name is None:
+            res = subprocess.run(['adb', '-s', serial, 'emu', 'avd', 'name'], capture_output=True, text=True)
+            lines = [l.strip() for l in res.stdout.splitlines() if l.strip() and l.strip().upper() != 'OK']
+            if not lines:
+                return None
+            name = lines[0]
+            self._avd_names[serial] = name
+        return name
+
+    def wait_for_emulator(self, avd_name, timeout=60):
+        """Return the serial of the emulator running avd_name once adb sees it, else None."""
+        self._ensure_tracking()
+        deadline = time.time() + timeout
+        while True:
+            with self._devices_cond:
+                online = sorted(self._online)
+                seen = self._updates
+            # `emu avd name` forks adb; never while holding the lock the tracker needs
+            for serial in online:
+                if serial.startswith('emulator-') and self._avd_name(serial) == avd_name:
+                    return serial
+            with self._devices_cond:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self._tracker.is_alive():
+                    return None
+                if self._updates == seen:
+                    # A freshly listed emulator may not answer `emu avd name` yet; re-check shortly
+                    self._devices_cond.wait(min(remaining, 2.0))
+
+
+tracker = BootReadinessTracker()
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import threading
+from app.database import get_connection
+
+
+WEBHOOK_SECRET = os.getenv("GITLAB_WEBHOOK_SECRET")
+SUBSCRIBER_QUEUE_SIZE = 100
+FINISHED_STATUSES = ("success", "failed", "canceled", "skipped")
+KEEPALIVE_SECONDS = 15
+
+
+class BuildEventHub:
+    """
+    Fans build status changes out to Server-Sent Events subscribers.
+
+    Each subscriber is an asyncio.Queue owned by the event loop serving its stream, so
+    publish() may be called from any thread. A subscriber that stops reading loses its
+    oldest events rather than holding up the others; the dashboard reconciles from
+    /gitlab/builds anyway. Server-side consumers that act on every event subscribe with
+    lossless=True and get an unbounded queue instead.
+    """
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}  # queue -> (loop, username or None for all builds)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, username=None, lossless=False):
+        queue = asyncio.Queue(maxsize=0 if lossless else self.queue_size)
+        with self._lock:
+            self._subscribers[queue] = (asyncio.get_running_loop(), username)
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def _offer(self, queue, event):
+        if queue.full():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(event)
+
+    def publish(self, event):
+        """Deliver event to every subscriber watching its username."""
+        with self._lock:
+            targets = [(queue, loop) for queue, (loop, username) in self._subscribers.items()
+                       if username is None or username == event.get("username")]
+            self.published += 1
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                self.unsubscribe(queue)  # loop closed
+
+    async def stream(self, username=None):
+        """SSE body: one `event:`/`data:` frame per change, comments as keep-alives."""
+        queue = self.subscribe(username)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+    def stats(self):
+        with self._lock:
+            return {"subscribers": len(self._subscribers), "published": self.published, "dropped": self.dropped}
+
+
+hub = BuildEventHub()
+
+
+def _builds_for_pipeline(cursor, project_id, pipeline_id):
+    cursor.execute('SELECT * FROM builds WHERE pipeline_id = ? AND project_id = ?', (pipeline_id, project_id))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def record_pipeline_status(project_id, pipeline_id, status, duration=None, finished_at=None):
+    """
+    Store a pipeline's status on its builds rows. Returns the events to publish (one per
+    build owner); empty when nothing changed or the farm did not trigger the pipeline.
+
+    Webhooks can arrive out of order, and pipeline sync never lists a finished pipeline
+    again, so a late running/pending event must not replace a finished status.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    params = [status, duration, finished_at, pipeline_id, project_id, status, duration, finished_at]
+    finished_only = ''
+    if status not in FINISHED_STATUSES:
+        finished_only = f' AND (status IS NULL OR status NOT IN ({",".join("?" * len(FINISHED_STATUSES))}))'
+        params.extend(FINISHED_STATUSES)
+    try:
+        cursor.execute('''
+            UPDATE builds SET status = ?, duration = COALESCE(?, duration), finished_at = COALESCE(?, finished_at),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE pipeline_id = ? AND project_id = ?
+                AND (status IS NOT ? OR duration IS NOT COALESCE(?, duration)
+                     OR finished_at IS NOT COALESCE(?, finished_at))
+        ''' + finished_only, params)
+        if cursor.rowcount == 0:
+            return []
+        conn.commit()
+        return [
+            {"type": "pipeline", "pipeline_id": pipeline_id, "project_id": project_id, "status": status,
+             "duration": build["duration"], "finished_at": build["finished_at"],
+             "platform": build["platform"], "username": build["username"]}
+            for build in _builds_for_pipeline(cursor, project_id, pipeline_id)
+        ]
+    finally:
+        conn.close()
+
+
+def apply_webhook(payload):
+    """
+    Apply a GitLab pipeline or job webhook to the builds table.
+
+    Pipeline events set the status of the matching builds rows; job events only carry
+    job progress to subscribers. Returns the events to publish (one per build owner),
+    empty for pipelines this farm did not trigger.
+    """
+    kind = payload.get("object_kind")
+    project_id = (payload.get("project") or {}).get("id") or payload.get("project_id")
+    if kind == "pipeline":
+        attributes = payload.get("object_attributes") or {}
+        return record_pipeline_status(project_id, attributes.get("id"), attributes.get("status"),
+                                      attributes.get("duration"), attributes.get("finished_at"))
+    if kind == "build":
+        pipeline_id = payload.get("pipeline_id")
+        conn = get_connection()
+        try:
+            owners = {build["username"] for build in _builds_for_pipeline(conn.cursor(), project_id, pipeline_id)}
+        finally:
+            conn.close()
+        return [
+            {"type": "job", "pipeline_id": pipeline_id, "project_id": project_id,
+             "job_id": payload.get("build_id"), "name": payload.get("build_name"),
+             "status": payload.get("build_status"), "username": username}
+            for username in owners
+        ]
+    return []
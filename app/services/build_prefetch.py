@@ -0,0 +1,188 @@
+import asyncio
+import collections
+import os
+import time
+from app.database import get_connection
+from app.services import gitlab_async
+from app.services.artifact_downloads import build_job, submit_build
+from app.services.build_events import hub
+from app.services.lease_scheduler import preferred_device, scheduler
+from app.services.pipeline_sync import SYNC_TOKEN, _parse_time
+
+
+HISTORY_SIZE = 100  # prefetch runs kept for GET /gitlab/prefetch
+HANDLED_SIZE = 1000  # builds remembered so a repeated success event is not fetched twice
+
+
+def get_settings(username):
+    conn = get_connection()
+    row = conn.execute('SELECT enabled, install FROM prefetch_settings WHERE username = ?', (username,)).fetchone()
+    conn.close()
+    return {"enabled": bool(row and row["enabled"]), "install": bool(row and row["install"])}
+
+
+def set_settings(username, enabled, install):
+    conn = get_connection()
+    conn.execute('''
+        INSERT INTO prefetch_settings (username, enabled, install, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(username) DO UPDATE SET enabled = excluded.enabled, install = excluded.install,
+            updated_at = excluded.updated_at
+    ''', (username, int(enabled), int(install), time.time()))
+    conn.commit()
+    conn.close()
+    return get_settings(username)
+
+
+def _token_for(username):
+    conn = get_connection()
+    row = conn.execute('SELECT access_token FROM sessions WHERE username = ? ORDER BY created_at DESC LIMIT 1',
+                       (username,)).fetchone()
+    conn.close()
+    return row["access_token"] if row else SYNC_TOKEN
+
+
+def _finished_at(value):
+    # Webhooks send "2026-10-19 10:00:00 UTC", the API and pipeline sync ISO 8601
+    try:
+        return _parse_time(value.replace(" UTC", "")).timestamp() if value else None
+    except ValueError:
+        return None
+
+
+class PrefetchSkipped(Exception):
+    pass
+
+
+class BuildPrefetcher:
+    """
+    Opt-in: when a tracked pipeline succeeds, download its artifact right away and, if the
+    user asked for it, install it on their leased (else last used) device.
+
+    Listens to the same build events the dashboard gets (webhook or pipeline sync), so it
+    costs nothing between builds, on its own unbounded subscription so a burst of events
+    cannot push a success out. A run that fails is forgotten and the next success event
+    for the build (a redelivered webhook, a manual sync) tries again. Downloads go through the download queue and merge with
+    a manual click on the same build. Every run records how long each stage took: notice
+    (pipeline finished to event seen), job lookup, queue wait, download and install.
+    """
+
+    def __init__(self, gitlab_url):
+        self.gitlab_url = gitlab_url
+        self._installers = {}  # platform -> install_app(device, path)
+        self._task = None
+        self._running = set()
+        self._handled = collections.OrderedDict()  # (project_id, pipeline_id, platform, username) -> None
+        self._device_locks = collections.defaultdict(asyncio.Lock)  # one install at a time per device
+        self.runs = collections.deque(maxlen=HISTORY_SIZE)
+
+    def start(self, installers):
+        self._installers = dict(installers)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self):
+        queue = hub.subscribe(lossless=True)
+        try:
+            while True:
+                event = await queue.get()
+                try:
+                    await self._handle(event)
+                except Exception as e:
+                    # e.g. a locked database while reading settings; keep watching
+                    print(f"[Prefetch] Could not handle event for pipeline {event.get('pipeline_id')}: {e}")
+        finally:
+            hub.unsubscribe(queue)
+
+    async def _handle(self, event):
+        if event.get("type") != "pipeline" or event.get("status") != "success" or not event.get("username"):
+            return
+        seen_at = time.time()
+        key = (event["project_id"], event["pipeline_id"], event.get("platform"), event["username"])
+        if key in self._handled:
+            return
+        settings = await asyncio.to_thread(get_settings, event["username"])
+        if not settings["enabled"] or key in self._handled:
+            return
+        self._handled[key] = None
+        while len(self._handled) > HANDLED_SIZE:
+            self._handled.popitem(last=False)
+        task = asyncio.get_running_loop().create_task(self._prefetch(key, event, settings["install"], seen_at))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _prefetch(self, key, event, install, seen_at):
+        username, platform = event["username"], event.get("platform")
+        project_id, pipeline_id = event["project_id"], event["pipeline_id"]
+        run = {"pipeline_id": pipeline_id, "project_id": project_id, "platform": platform, "username": username,
+               "status": "running", "device": None, "local_path": None, "error": None, "stages": {},
+               "started_at": seen_at}
+        self.runs.appendleft(run)
+        stages = run["stages"]
+        finished_at = _finished_at(event.get("finished_at"))
+        if finished_at is not None:
+            stages["notice"] = round(max(0.0, seen_at - finished_at), 3)
+        try:
+            token = await asyncio.to_thread(_token_for, username)
+            if not token:
+                raise PrefetchSkipped(f"No GitLab session for {username}")
+            started = time.time()
+            gl = await gitlab_async.get_service(self.gitlab_url, token)
+            job_name, _ = build_job(platform)
+            job = await gl.get_job_by_name(project_id, pipeline_id, job_name)
+            stages["job_lookup"] = round(time.time() - started, 3)
+            if not job or job["status"] != "success":
+                raise PrefetchSkipped(f"Job {job_name} in pipeline {pipeline_id} is not successful")
+
+            submitted = time.time()
+            download = submit_build(gl, project_id, pipeline_id, platform, job["id"], username)
+            run["local_path"] = await asyncio.shield(download.done)
+            # A merged job may have started before this run asked for it
+            stages["queue"] = round(max(0.0, download.started_at - submitted), 3)
+            stages["download"] = round(download.finished_at - max(download.started_at, submitted), 3)
+
+            if install:
+                await self._install(run, platform, username)
+            run["status"] = "success" if not run["error"] else "downloaded"
+        except PrefetchSkipped as e:
+            run["status"] = "skipped"
+            run["error"] = str(e)
+        except Exception as e:
+            run["status"] = "failed"
+            run["error"] = str(e)
+            self._handled.pop(key, None)
+            print(f"[Prefetch] Pipeline {pipeline_id} ({platform}) for {username} failed: {e}")
+        finally:
+            stages["total"] = round(time.time() - seen_at + stages.get("notice", 0.0), 3)
+            hub.publish({"type": "prefetch", **run})
+
+    async def _install(self, run, platform, username):
+        device = await asyncio.to_thread(preferred_device, username, platform)
+        if device is None:
+            run["error"] = "No leased or recently used device to install on"
+            return
+        lease = scheduler.lease_for_device(platform, device)
+        if lease and lease.owner != username:
+            run["error"] = f"{device} is leased by {lease.owner}"
+            return
+        run["device"] = device
+        async with self._device_locks[(platform, device)]:
+            started = time.time()
+            result = await asyncio.to_thread(self._installers[platform], device, run["local_path"])
+            run["stages"]["install"] = round(time.time() - started, 3)
+        # Managers report some failures as "Failed ..."/"Error: ..." strings instead of raising
+        if isinstance(result, str) and result.startswith(("Failed", "Error")):
+            raise RuntimeError(result)
+
+    def list(self, username):
+        return [run for run in self.runs if run["username"] == username]
+
+    def stats(self):
+        return {"running": len(self._running), "handled": len(self._handled), "watching": bool(self._task)}
+
+
+prefetcher = BuildPrefetcher(os.getenv("GITLAB_URL", "https://git.iris.nitk.ac.in"))
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import socket
+import httpx
+
+
+AGENT_ID = os.getenv("FARM_AGENT_ID", socket.gethostname())
+# URL under which the central router can reach this agent, e.g. http://10.0.0.12:8101
+AGENT_URL = os.getenv("FARM_AGENT_URL", "http://127.0.0.1:8101")
+# Central API to register with; registration is skipped when unset
+FARM_ROUTER_URL = os.getenv("FARM_ROUTER_URL")
+REGISTER_INTERVAL = float(os.getenv("FARM_REGISTER_INTERVAL", "15"))
+# Shared secret the central router expects on registration (its FARM_AGENT_TOKEN)
+AGENT_TOKEN = os.getenv("FARM_AGENT_TOKEN")
+
+
+def host_load(running_devices=0):
+    """Snapshot of host load used by the central router to place boots."""
+    cpus = os.cpu_count() or 1
+    try:
+        load1, load5, _ = os.getloadavg()
+    except OSError:
+        load1 = load5 = 0.0
+    mem_total = mem_available = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                if key == 'MemTotal':
+                    mem_total = int(value.split()[0]) * 1024
+                elif key == 'MemAvailable':
+                    mem_available = int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return {
+        "cpus": cpus,
+        "load1": load1,
+        "load5": load5,
+        "load_per_cpu": round(load1 / cpus, 3),
+        "mem_total": mem_total,
+        "mem_available": mem_available,
+        "running_devices": running_devices,
+    }
+
+
+def collect_inventory(android_manager, ios_manager):
+    """Describe every device this host can serve. Missing toolchains yield empty sections."""
+    avds = []
+    running = {}
+    try:
+        avds = android_manager.list_avds()
+        running = android_manager._list_avd_to_emulators()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[Agent] Android inventory failed: {e}")
+
+    simulators = []
+    try:
+        simulators = [
+            {"udid": d.get('udid'), "name": d.get('name'), "state": d.get('state'), "runtime": d.get('runtime')}
+            for d in ios_manager.list_simulators()
+        ]
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[Agent] iOS inventory failed: {e}")
+
+    booted = sum(1 for d in simulators if d.get('state') == 'Booted')
+    return {
+        "agent_id": AGENT_ID,
+        "url": AGENT_URL,
+        "android": {"avds": avds, "running": running},
+        "ios": {"simulators": simulators},
+        "load": host_load(running_devices=len(running) + booted),
+    }
+
+
+async def register_loop():
+    """Periodically announce this agent to the central router (doubles as a heartbeat)."""
+    if not FARM_ROUTER_URL:
+        return
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        while True:
+            try:
+                res = await client.post(
+                    f"{FARM_ROUTER_URL.rstrip('/')}/farm/agents/register",
+                    params={"agent_id": AGENT_ID, "url": AGENT_URL},
+                    headers={"X-Farm-Agent-Token": AGENT_TOKEN or ""},
+                )
+                if res.status_code >= 400:
+                    print(f"[Agent] Registration with {FARM_ROUTER_URL} refused: {res.status_code} {res.text}")
+            except httpx.HTTPError as e:
+                print(f"[Agent] Registration with {FARM_ROUTER_URL} failed: {e}")
+            await asyncio.sleep(REGISTER_INTERVAL)
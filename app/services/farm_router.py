@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+import httpx
+
+
+# Comma separated agent base URLs known at startup; agents can also self-register
+FARM_AGENTS = os.getenv("FARM_AGENTS", "")
+HEALTH_INTERVAL = float(os.getenv("FARM_HEALTH_INTERVAL", "10"))
+MAX_FAILURES = int(os.getenv("FARM_MAX_FAILURES", "3"))
+# Shared secret agents present when registering (X-Farm-Agent-Token); registration is refused without it
+AGENT_TOKEN = os.getenv("FARM_AGENT_TOKEN")
+
+
+class AgentConflict(Exception):
+    pass
+
+
+class AgentInfo:
+    def __init__(self, agent_id, url):
+        self.agent_id = agent_id
+        self.url = url.rstrip('/')
+        self.healthy = False
+        self.failures = 0
+        self.last_seen = None
+        self.inventory = {"android": {"avds": [], "running": {}}, "ios": {"simulators": []}}
+        self.load = {}
+
+    def score(self):
+        """Lower is better: normalised CPU load plus a penalty per running device."""
+        return self.load.get('load_per_cpu', 0.0) + 0.25 * self.load.get('running_devices', 0)
+
+    def has_device(self, platform, device):
+        if platform == 'android':
+            return device in self.inventory['android']['avds']
+        return any(d.get('udid') == device for d in self.inventory['ios']['simulators'])
+
+    def runs_device(self, platform, device):
+        if platform == 'android':
+            return bool(self.inventory['android']['running'].get(device))
+        return any(d.get('udid') == device and d.get('state') == 'Booted' for d in self.inventory['ios']['simulators'])
+
+    def to_dict(self):
+        return {
+            "agent_id": self.agent_id,
+            "url": self.url,
+            "healthy": self.healthy,
+            "failures": self.failures,
+            "last_seen": self.last_seen,
+            "load": self.load,
+            "score": round(self.score(), 3),
+        }
+
+
+class FarmRouter:
+    """
+    Inventory of device agents across hosts and placement of device requests.
+
+    Agents are health-checked by polling /agent/inventory; an agent that fails
+    `max_failures` checks in a row is taken out of placement until it answers again.
+    """
+
+    def __init__(self, agent_urls=(), health_interval=HEALTH_INTERVAL, max_failures=MAX_FAILURES):
+        self.agents = {}
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.client = None
+        self._task = None
+        for url in agent_urls:
+            self.register(url.rstrip('/'), url)
+
+    def register(self, agent_id, url):
+        """
+        Add or heartbeat an agent. A known agent_id keeps its URL: re-registering it elsewhere
+        raises AgentConflict, so traffic for its devices cannot be redirected; forget() it first.
+        """
+        url = url.rstrip('/')
+        agent = self.agents.get(agent_id)
+        if agent is not None and agent.url != url:
+            raise AgentConflict(f"Agent {agent_id} is registered at {agent.url}")
+        # A statically configured agent (keyed by its URL) is renamed once it announces its id
+        static = self.agents.get(url)
+        if agent is None and static is not None and static.agent_id == url:
+            agent = self.agents.pop(url)
+            agent.agent_id = agent_id
+            self.agents[agent_id] = agent
+        if agent is None:
+            agent = AgentInfo(agent_id, url)
+            self.agents[agent_id] = agent
+        agent.last_seen = time.time()
+        return agent
+
+    def forget(self, agent_id):
+        return self.agents.pop(agent_id, None)
+
+    async def start(self):
+        self.client = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0))
+        self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self.client:
+            await self.client.aclose()
+
+    async def _health_loop(self):
+        while True:
+            await self.refresh_all()
+            await asyncio.sleep(self.health_interval)
+
+    async def refresh_all(self):
+        await asyncio.gather(*(self.refresh_agent(a) for a in list(self.agents.values())))
+
+    async def refresh_agent(self, agent):
+        try:
+            res = await self.client.get(f"{agent.url}/agent/inventory")
+            res.raise_for_status()
+            data = res.json()
+        except (httpx.HTTPError, ValueError) as e:
+            agent.failures += 1
+            if agent.failures >= self.max_failures and agent.healthy:
+                print(f"[Farm] Agent {agent.agent_id} marked unhealthy: {e}")
+                agent.healthy = False
+            return
+        agent.inventory = {"android": data.get('android', {}), "ios": data.get('ios', {})}
+        agent.inventory['android'].setdefault('avds', [])
+        agent.inventory['android'].setdefault('running', {})
+        agent.inventory['ios'].setdefault('simulators', [])
+        agent.load = data.get('load', {})
+        agent.failures = 0
+        agent.healthy = True
+        agent.last_seen = time.time()
+
+    def healthy_agents(self):
+        return [a for a in self.agents.values() if a.healthy]
+
+    def devices(self):
+        items = []
+        for agent in self.healthy_agents():
+            running = agent.inventory['android']['running']
+            for avd in agent.inventory['android']['avds']:
+                items.append({
+                    "platform": "android",
+                    "device": avd,
+                    "agent_id": agent.agent_id,
+                    "running": bool(running.get(avd)),
+                    "serials": running.get(avd, []),
+                })
+            for sim in agent.inventory['ios']['simulators']:
+                items.append({
+                    "platform": "ios",
+                    "device": sim.get('udid'),
+                    "name": sim.get('name'),
+                    "runtime": sim.get('runtime'),
+                    "agent_id": agent.agent_id,
+                    "running": sim.get('state') == 'Booted',
+                })
+        return items
+
+    def owner_of(self, platform, device):
+        """Agent currently running the device, else the only agent that has it, else None."""
+        holders = [a for a in self.healthy_agents() if a.has_device(platform, device)]
+        for agent in holders:
+            if agent.runs_device(platform, device):
+                return agent
+        if len(holders) == 1:
+            return holders[0]
+        return None
+
+    def choose_for_boot(self, platform, device):
+        """Agent already running the device, else the least loaded agent that has it."""
+        candidates = [a for a in self.healthy_agents() if a.has_device(platform, device)]
+        for agent in candidates:
+            if agent.runs_device(platform, device):
+                return agent
+        if not candidates:
+            return None
+        return min(candidates, key=lambda a: a.score())
+
+    def least_loaded(self):
+        agents = self.healthy_agents()
+        return min(agents, key=lambda a: a.score()) if agents else None
+
+    async def forward(self, agent, method, path, params=None, content=None, headers=None):
+        return await self.client.request(method, f"{agent.url}{path}", params=params, content=content, headers=headers)
+
+    def ws_url(self, agent, path):
+        if agent.url.startswith('https://'):
+            return 'wss://' + agent.url[len('https://'):] + path
+        return 'ws://' + agent.url[len('http://'):] + path
+
+
+farm = FarmRouter([u.strip() for u in FARM_AGENTS.split(',') if u.strip()])
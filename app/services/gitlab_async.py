@@ -0,0 +1,378 @@
+import asyncio
+import importlib.util
+import json
+import os
+import httpx
+from app.services import gitlab_service
+from app.services.gitlab_http_cache import shared_cache, count_call, token_identity
+from app.services.remote_zip import (
+    RETRIES, RETRY_BACKOFF, RangeNotSupported, extract_remote_member, extract_remote_directory,
+)
+from app.services.artifact_store import store
+from app.services.artifact_catalog import catalog
+from app.services.gitlab_service import (
+    ARTIFACTS_DIR, GitLabClientCache, record_build, record_build_artifact, record_artifact_download,
+    extract_zip_member, extract_zip_directory,
+)
+
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]"); HTTP/1.1 keep-alive otherwise
+HTTP2 = importlib.util.find_spec("h2") is not None
+MAX_CONNECTIONS = int(os.getenv("GITLAB_ASYNC_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("GITLAB_ASYNC_MAX_KEEPALIVE", "20"))
+CHUNK_SIZE = 1024 * 1024
+
+_client = None
+_slots = None
+
+
+def get_client():
+    """The process-wide AsyncClient; created on first use inside the running loop."""
+    global _client, _slots
+    if _client is None or _client.is_closed:
+        # API calls wait here rather than in httpcore's pool, which rescans every queued
+        # request on each connection event and burns the loop once hundreds are waiting
+        _slots = asyncio.Semaphore(MAX_CONNECTIONS)
+        _client = httpx.AsyncClient(
+            http2=HTTP2,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE),
+            timeout=httpx.Timeout(30.0, read=120.0),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class GitLabError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AsyncGitLabService:
+    """
+    Non-blocking counterpart of GitLabService for the API routes.
+
+    Requests go through the shared AsyncClient and the same ResponseCache as the sync
+    client (ETag revalidation, freshness window, per-request call tracing); identical
+    concurrent GETs for this token share one request.
+    """
+
+    def __init__(self, url, private_token, user=None):
+        self.api = url.rstrip('/') + "/api/v4"
+        self.headers = {"Authorization": f"Bearer {private_token}"}
+        self.identity = token_identity(self.headers["Authorization"])
+        self.user = user
+        self._inflight = {}  # url -> Future[(status, headers, body)]
+
+    async def _fetch(self, url, entry):
+        headers = dict(self.headers)
+        if entry:
+            headers["If-None-Match"] = entry.etag
+        count_call("network")
+        client = get_client()
+        async with _slots:
+            res = await client.get(url, headers=headers)
+        if res.status_code == 304 and entry:
+            shared_cache.confirm(entry, self.identity)
+            return 200, entry.headers, entry.body
+        shared_cache.update(url, self.identity, res.status_code, res.headers, res.content, entry)
+        return res.status_code, dict(res.headers), res.content
+
+    async def _coalesced(self, url, entry):
+        """Fetch url once for all concurrent callers; a cancelled leader hands the fetch to a follower."""
+        while url in self._inflight:
+            future = self._inflight[url]
+            shared_cache.note_coalesced()
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this caller was cancelled, not the leader
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            result = await self._fetch(url, entry)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an un-awaited failure is not reported as never retrieved
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()  # leader cancelled: wake the followers so one of them retries
+            if self._inflight.get(url) is future:
+                del self._inflight[url]
+
+    async def _get(self, path, params=None):
+        """GET an API path; returns (decoded JSON, response headers)."""
+        url = str(httpx.URL(self.api + path, params=params))
+        entry, fresh = shared_cache.lookup(url, self.identity)
+        if fresh:
+            status, headers, body = 200, entry.headers, entry.body
+        else:
+            status, headers, body = await self._coalesced(url, entry)
+        if status >= 400:
+            raise GitLabError(status, f"GitLab GET {path} failed with {status}: {body[:200].decode(errors='replace')}")
+        return json.loads(body), headers
+
+    async def _get_all(self, path, params=None):
+        """Follow X-Next-Page pagination and return every item."""
+        params = dict(params or {}, per_page=100)
+        items, page = [], "1"
+        while page:
+            chunk, headers = await self._get(path, dict(params, page=page))
+            items.extend(chunk)
+            page = headers.get("X-Next-Page") or headers.get("x-next-page")
+        return items
+
+    async def _post(self, path, payload):
+        shared_cache.expire_scope(self.api + path)
+        count_call("network")
+        client = get_client()
+        async with _slots:
+            res = await client.post(self.api + path, headers=self.headers, json=payload)
+        if res.status_code >= 400:
+            raise GitLabError(res.status_code, f"GitLab POST {path} failed with {res.status_code}: {res.text[:200]}")
+        return res.json()
+
+    async def auth(self):
+        self.user, _ = await self._get("/user")
+        return self
+
+    async def get_user(self):
+        if self.user is None:
+            await self.auth()
+        return self.user
+
+    async def list_branches(self, project_id=63):
+        branches = await self._get_all(f"/projects/{project_id}/repository/branches")
+        return [
+            {
+                "name": branch["name"],
+                "commit": branch["commit"]["id"],
+                "merged": branch.get("merged"),
+                "protected": branch.get("protected"),
+            }
+            for branch in branches
+        ]
+
+    async def trigger_pipeline(self, project_id=63, ref=None, variables=None, username=None):
+        data = {'ref': ref}
+        if variables:
+            data['variables'] = [{'key': k, 'value': v} for k, v in variables.items()]
+        pipeline = await self._post(f"/projects/{project_id}/pipeline", data)
+
+        platform = variables.get('PLATFORM', 'unknown') if variables else 'unknown'
+        await asyncio.to_thread(record_build, pipeline["id"], project_id, ref, platform, pipeline.get("web_url"), username,
+                                pipeline.get("status"))
+
+        return {
+            "id": pipeline["id"],
+            "status": pipeline.get("status"),
+            "ref": pipeline.get("ref"),
+            "web_url": pipeline.get("web_url"),
+        }
+
+    async def get_pipeline_status(self, project_id=63, pipeline_id=None):
+        pipeline, _ = await self._get(f"/projects/{project_id}/pipelines/{pipeline_id}")
+        return {
+            "id": pipeline["id"],
+            "status": pipeline.get("status"),
+            "ref": pipeline.get("ref"),
+            "web_url": pipeline.get("web_url"),
+        }
+
+    async def list_pipeline_jobs(self, project_id, pipeline_id):
+        return await self._get_all(f"/projects/{project_id}/pipelines/{pipeline_id}/jobs")
+
+    async def get_pipeline_jobs(self, project_id, pipeline_id):
+        jobs = await self.list_pipeline_jobs(project_id, pipeline_id)
+        return [{"id": job["id"], "name": job["name"], "status": job["status"]} for job in jobs]
+
+    async def get_job_by_name(self, project_id=63, pipeline_id=None, job_name="build_debug_android"):
+        for job in await self.list_pipeline_jobs(project_id, pipeline_id):
+            if job["name"] == job_name:
+                return job
+        return None
+
+    async def get_job(self, project_id, job_id):
+        job, _ = await self._get(f"/projects/{project_id}/jobs/{job_id}")
+        return job
+
+    async def stream_artifacts(self, project_id, job_id):
+        """Yield the job's artifact ZIP in chunks without buffering it."""
+        count_call("network")
+        async with get_client().stream("GET", f"{self.api}/projects/{project_id}/jobs/{job_id}/artifacts",
+                                       headers=self.headers, follow_redirects=True) as res:
+            if res.status_code >= 400:
+                raise GitLabError(res.status_code, f"Artifact download for job {job_id} failed with {res.status_code}")
+            async for chunk in res.aiter_bytes(CHUNK_SIZE):
+                yield chunk
+
+    async def _download_resumable(self, project_id, job_id, open_target, progress=None):
+        """
+        Write the job's artifact ZIP to open_target(). A dropped connection is resumed with a
+        Range request from the last byte written (If-Range guards against the artifact
+        changing in between); a server that answers with the whole body again gets a fresh
+        target. Returns the number of bytes written.
+        """
+        url = f"{self.api}/projects/{project_id}/jobs/{job_id}/artifacts"
+        target = open_target()
+        written, total, validator = 0, None, None
+        try:
+            for attempt in range(RETRIES + 1):
+                headers = dict(self.headers)
+                if written:
+                    headers["Range"] = f"bytes={written}-"
+                    if validator:
+                        headers["If-Range"] = validator
+                try:
+                    count_call("network")
+                    async with get_client().stream("GET", url, headers=headers, follow_redirects=True) as res:
+                        if res.status_code >= 400:
+                            raise GitLabError(res.status_code,
+                                              f"Artifact download for job {job_id} failed with {res.status_code}")
+                        if res.status_code == 206:
+                            total = int(res.headers["Content-Range"].rpartition("/")[2])
+                        else:
+                            if written:
+                                target.close()
+                                target = open_target()
+                                written = 0
+                            length = res.headers.get("Content-Length")
+                            total = int(length) if length else None
+                        etag = res.headers.get("ETag")
+                        # If-Range only accepts a strong validator
+                        validator = etag if etag and not etag.startswith("W/") else res.headers.get("Last-Modified")
+                        # Unbuffered, so bytes received before a drop are kept for the resume
+                        async for chunk in res.aiter_bytes():
+                            target.write(chunk)
+                            written += len(chunk)
+                            if progress:
+                                progress(written, total)
+                    if total is None or written >= total:
+                        return written
+                except httpx.TransportError as e:
+                    if attempt >= RETRIES:
+                        raise
+                    print(f"[GitLab] Job {job_id}: artifact download interrupted at {written} bytes ({e}), resuming")
+                await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+            raise GitLabError(502, f"Artifact download for job {job_id} kept ending early at {written} bytes")
+        finally:
+            target.close()
+
+    async def download_artifacts(self, project_id, job_id, path, progress=None):
+        await self._download_resumable(project_id, job_id, lambda: open(path, "wb"), progress)
+        return path
+
+    async def _extract_remote(self, extract, project_id, job_id, path_in_zip, destination, open_file, progress):
+        """Try a ranged extraction; returns False when GitLab does not serve ranges."""
+        url = f"{self.api}/projects/{project_id}/jobs/{job_id}/artifacts"
+        try:
+            remote = await extract(get_client(), url, self.headers, path_in_zip, destination, open_file, progress)
+        except RangeNotSupported:
+            return False
+        stats = remote.stats()
+        print(f"[GitLab] Job {job_id}: fetched {stats['bytes_fetched']} of {stats['archive_size']} artifact bytes "
+              f"in {stats['requests']} ranged requests ({stats['retries']} retried)")
+        return True
+
+    async def _download_and_extract(self, project_id, job_id, extract_local, path_in_zip, destination, open_file,
+                                    progress):
+        temp_zip = os.path.join(ARTIFACTS_DIR, f"temp_{job_id}.zip")
+        try:
+            await self.download_artifacts(project_id, job_id, temp_zip, progress)
+            await asyncio.to_thread(extract_local, temp_zip, path_in_zip, destination, open_file)
+        finally:
+            if os.path.exists(temp_zip):
+                os.remove(temp_zip)
+
+    async def _extract_to_store(self, staged, link_path, project_id, job_id, path_in_zip, extract_remote,
+                                extract_local, progress=None):
+        """
+        Extract into a staged store object (hashed while written) linked from link_path;
+        returns (digest, object path).
+        Staging happens in the store's tmp directory and commit is a rename, so a failed or
+        interrupted download never leaves a half-written artifact behind.
+        """
+        try:
+            if not await self._extract_remote(extract_remote, project_id, job_id, path_in_zip, staged.path,
+                                              staged.open, progress):
+                await self._download_and_extract(project_id, job_id, extract_local, path_in_zip, staged.path,
+                                                 staged.open, progress)
+            return await asyncio.to_thread(staged.commit, link_path)
+        except BaseException:
+            staged.discard()
+            raise
+
+    async def download_and_extract_artifact(self, project_id, job_id, artifact_path_in_zip, output_filename,
+                                            progress=None):
+        """
+        Async GitLabService.download_and_extract_artifact. Only the ranges holding the
+        member are fetched (the whole ZIP when ranges are not supported); the file goes
+        into the artifact store and output_filename becomes a link to it.
+        """
+        job = await self.get_job(project_id, job_id)
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        staged = store.stage_file(os.path.splitext(output_filename)[1])
+        final_path = os.path.join(ARTIFACTS_DIR, output_filename)
+        digest, _ = await self._extract_to_store(staged, final_path, project_id, job_id, artifact_path_in_zip,
+                                                 extract_remote_member, extract_zip_member, progress)
+        await asyncio.to_thread(record_build_artifact, job["pipeline"]["id"], final_path, digest)
+        await asyncio.to_thread(catalog.record, final_path, job["pipeline"]["id"], job_id, digest)
+        return final_path
+
+    async def download_and_unzip_ios_app(self, project_id, job_id, artifact_path_in_zip, output_dir_name,
+                                         progress=None):
+        """Async GitLabService.download_and_unzip_ios_app, fetching only the .app subtree where possible."""
+        job = await self.get_job(project_id, job_id)
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        staged = store.stage_tree()
+        final_dir = os.path.join(ARTIFACTS_DIR, output_dir_name)
+        digest, _ = await self._extract_to_store(staged, final_dir, project_id, job_id, artifact_path_in_zip,
+                                                 extract_remote_directory, extract_zip_directory, progress)
+        await asyncio.to_thread(record_build_artifact, job["pipeline"]["id"], final_dir, digest)
+        await asyncio.to_thread(catalog.record, final_dir, job["pipeline"]["id"], job_id, digest)
+        return final_dir
+
+    async def download_job_artifact_generic(self, project_id, job_id, username, progress=None):
+        project, _ = await self._get(f"/projects/{project_id}")
+        job = await self.get_job(project_id, job_id)
+        artifact_path = os.path.join(ARTIFACTS_DIR, f"{project['name']}_{job['ref']}_{job['id']}.zip")
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        staged = store.stage_file(".zip")
+        try:
+            # staged.open starts a fresh hash if the download has to start over
+            await self._download_resumable(project_id, job_id, staged.open, progress)
+            digest, _ = await asyncio.to_thread(staged.commit, artifact_path)
+        except BaseException:
+            staged.discard()
+            raise
+        await asyncio.to_thread(record_artifact_download, job_id, project_id, username, artifact_path, digest)
+        await asyncio.to_thread(catalog.record, artifact_path, job["pipeline"]["id"], job_id, digest)
+        return artifact_path
+
+
+async_clients = GitLabClientCache(factory=None)
+
+
+async def get_service(url, private_token):
+    """Authenticated AsyncGitLabService for the token, cached like the sync clients."""
+    service = async_clients.lookup(url, private_token)
+    if service is None:
+        service = await AsyncGitLabService(url, private_token).auth()
+        async_clients.put(url, private_token, service)
+    return service
+
+
+def invalidate(url, private_token):
+    async_clients.invalidate(url, private_token)
+    gitlab_service.clients.invalidate(url, private_token)
@@ -0,0 +1,292 @@
+import collections
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+FRESH_SECONDS = float(os.getenv("GITLAB_CACHE_FRESH_SECONDS", "10"))
+MAX_BYTES = int(os.getenv("GITLAB_CACHE_MAX_MB", "64")) * 1024 * 1024
+# Response headers worth replaying; pagination relies on Link / X-Next-Page
+KEPT_HEADERS = ("Content-Type", "ETag", "Link", "X-Page", "X-Per-Page", "X-Next-Page", "X-Prev-Page",
+                "X-Total", "X-Total-Pages")
+
+
+class CallTrace:
+    """GitLab calls made while serving one API request."""
+
+    __slots__ = ("network", "cached", "coalesced")
+
+    def __init__(self):
+        self.network = 0
+        self.cached = 0
+        self.coalesced = 0
+
+
+_trace = contextvars.ContextVar("gitlab_call_trace", default=None)
+
+
+def begin_trace():
+    trace = CallTrace()
+    _trace.set(trace)
+    return trace
+
+
+def count_call(field):
+    trace = _trace.get()
+    if trace is not None:
+        setattr(trace, field, getattr(trace, field) + 1)
+
+
+class TraceStats:
+    """Per-endpoint totals of CallTrace results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = collections.defaultdict(lambda: {"requests": 0, "network": 0, "cached": 0, "coalesced": 0,
+                                                           "seconds": 0.0})
+
+    def record(self, endpoint, trace, seconds):
+        with self._lock:
+            totals = self._endpoints[endpoint]
+            totals["requests"] += 1
+            totals["network"] += trace.network
+            totals["cached"] += trace.cached
+            totals["coalesced"] += trace.coalesced
+            totals["seconds"] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": t["requests"],
+                    "gitlab_calls_per_request": round(t["network"] / t["requests"], 2),
+                    "cached_per_request": round(t["cached"] / t["requests"], 2),
+                    "coalesced_per_request": round(t["coalesced"] / t["requests"], 2),
+                    "avg_ms": round(1000 * t["seconds"] / t["requests"], 1),
+                }
+                for endpoint, t in self._endpoints.items()
+            }
+
+
+trace_stats = TraceStats()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # (status, headers, body)
+        self.error = None
+
+
+def token_identity(credential):
+    """Cache identity of an Authorization / token header value."""
+    return hashlib.sha256((credential or "").encode()).hexdigest()
+
+
+def _identity(request):
+    return token_identity(request.headers.get("Authorization") or request.headers.get("PRIVATE-TOKEN")
+                          or request.headers.get("JOB-TOKEN"))
+
+
+def _scope(url):
+    # /api/v4/projects/63/pipelines/5 -> /api/v4/projects/63; writes invalidate their scope
+    parts = urlsplit(url).path.split("/")
+    return "/".join(parts[:5])
+
+
+class _Entry:
+    __slots__ = ("etag", "body", "headers", "validated")
+
+    def __init__(self, etag, body, headers):
+        self.etag = etag
+        self.body = body
+        self.headers = headers
+        self.validated = {}  # identity -> time GitLab last confirmed this body for that user
+
+
+class ResponseCache:
+    """
+    GitLab GET response bodies by URL with their ETags, shared by the sync and async clients.
+
+    A user's repeat request within `fresh_seconds` of GitLab last confirming the body for
+    them is answered locally. Otherwise the cached ETag is sent as If-None-Match and a 304
+    replays the stored body, so only headers cross the network. Bodies are shared between
+    users, but a user is only served a body GitLab has confirmed for their own token (by a
+    200 or a 304 to their request), so permissions are checked by GitLab every time a
+    user first sees an entry. Writes drop freshness for the project they touch.
+    """
+
+    def __init__(self, fresh_seconds=FRESH_SECONDS, max_bytes=MAX_BYTES):
+        self.fresh_seconds = fresh_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # url -> _Entry
+        self._size = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.coalesced = 0
+
+    def lookup(self, url, identity, revalidate=False):
+        """
+        Return (entry, fresh). A fresh entry may be served without contacting GitLab;
+        with revalidate the entry is only returned for its ETag.
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if not entry:
+                return None, False
+            self._entries.move_to_end(url)
+            if not revalidate and time.time() - entry.validated.get(identity, 0) < self.fresh_seconds:
+                self.hits += 1
+                self.bytes_saved += len(entry.body)
+                count_call("cached")
+                return entry, True
+            return entry, False
+
+    def confirm(self, entry, identity):
+        """GitLab answered 304 for this user: the cached body is current."""
+        with self._lock:
+            entry.validated[identity] = time.time()
+            self.revalidated += 1
+            self.bytes_saved += len(entry.body)
+
+    def update(self, url, identity, status, headers, body, prior=None):
+        """Record a full response; cacheable ones replace the entry, others drop it."""
+        with self._lock:
+            self.misses += 1
+            etag = headers.get("ETag")
+            if status == 200 and etag and "no-store" not in headers.get("Cache-Control", ""):
+                kept = {k: headers[k] for k in KEPT_HEADERS if k in headers}
+                entry = _Entry(etag, body, kept)
+                entry.validated[identity] = time.time()
+                old = self._entries.pop(url, None)
+                if old:
+                    self._size -= len(old.body)
+                self._entries[url] = entry
+                self._size += len(body)
+                while self._size > self.max_bytes and self._entries:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= len(evicted.body)
+            elif prior and self._entries.get(url) is prior:
+                del self._entries[url]
+                self._size -= len(prior.body)
+
+    def note_coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+        count_call("coalesced")
+
+    def expire_scope(self, url):
+        scope = _scope(url)
+        with self._lock:
+            for cached_url, entry in self._entries.items():
+                if _scope(cached_url) == scope:
+                    entry.validated.clear()
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.revalidated
+            total = served + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "fresh_seconds": self.fresh_seconds,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "hit_ratio": round(served / total, 3) if total else None,
+                "bytes_saved": self.bytes_saved,
+                "coalesced": self.coalesced,
+            }
+
+
+class ConditionalCacheAdapter(HTTPAdapter):
+    """
+    requests transport adapter that serves python-gitlab GETs through a ResponseCache.
+    Concurrent identical GETs from one user are coalesced into a single request.
+    """
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._inflight = {}  # (url, identity) -> _Flight
+
+    @staticmethod
+    def _replay(request, status, headers, body):
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.reason = "OK" if status == 200 else ""
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != "GET" or stream:
+            if request.method != "GET":
+                self.cache.expire_scope(request.url)
+            count_call("network")
+            return super().send(request, stream=stream, **kwargs)
+
+        url = request.url
+        identity = _identity(request)
+        # Cache-Control: no-cache skips the freshness window but still revalidates by ETag
+        entry, fresh = self.cache.lookup(url, identity,
+                                         revalidate="no-cache" in request.headers.get("Cache-Control", ""))
+        if fresh:
+            return self._replay(request, 200, entry.headers, entry.body)
+        # Single flight: identical concurrent requests from the same user share one round trip
+        with self._lock:
+            flight = self._inflight.get((url, identity))
+            leader = flight is None
+            if leader:
+                flight = self._inflight[(url, identity)] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            self.cache.note_coalesced()
+            if flight.error is not None:
+                raise flight.error
+            return self._replay(request, *flight.result)
+
+        try:
+            if entry:
+                request.headers["If-None-Match"] = entry.etag
+            count_call("network")
+            response = super().send(request, stream=False, **kwargs)
+            if response.status_code == 304 and entry:
+                self.cache.confirm(entry, identity)
+                response = self._replay(request, 200, entry.headers, entry.body)
+            else:
+                self.cache.update(url, identity, response.status_code, response.headers, response.content, entry)
+            flight.result = (response.status_code, dict(response.headers), response.content)
+            return response
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop((url, identity), None)
+            flight.done.set()
+
+    def stats(self):
+        return self.cache.stats()
+
+
+shared_cache = ResponseCache()
+response_cache = ConditionalCacheAdapter(shared_cache, pool_maxsize=int(os.getenv("GITLAB_POOL_SIZE", "20")))
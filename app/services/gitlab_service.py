@@ -1,26 +1,143 @@
 import gitlab
+import collections
+import hashlib
 import os
+import threading
+import time
 import zipfile
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from app.database import get_connection
+from app.services.artifact_store import store
+from app.services.gitlab_http_cache import response_cache
+from app.services.remote_zip import EXTRACT_WORKERS, apply_mode, is_symlink, make_symlink, member_path, open_for_write
 
 
 ARTIFACTS_DIR = "storage/artifacts"
+CLIENT_TTL = float(os.getenv("GITLAB_CLIENT_TTL", "300"))
+CLIENT_CACHE_SIZE = int(os.getenv("GITLAB_CLIENT_CACHE_SIZE", "64"))
+
+
+def record_build(pipeline_id, project_id, ref, platform, web_url, username, status=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO builds (pipeline_id, project_id, ref, platform, web_url, username, status, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (pipeline_id, project_id, ref, platform, web_url, username, status))
+    conn.commit()
+    conn.close()
+
+
+def record_build_artifact(pipeline_id, path, digest=None):
+    """Point the pipeline's builds row at its extracted artifact (and its artifact store digest)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE builds SET artifact_path = ?, artifact_digest = ? WHERE pipeline_id = ?
+    ''', (path, digest, pipeline_id))
+    conn.commit()
+    conn.close()
+
+
+def record_artifact_download(job_id, project_id, username, path, digest=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO artifacts (job_id, project_id, username, file_path, downloaded_at, digest)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
+    ''', (job_id, project_id, username, path, digest))
+    conn.commit()
+    conn.close()
+
+
+def extract_zip_member(zip_path, member, final_path, open_file=open_for_write):
+    """Extract one file (APK or IPA) from an artifact ZIP to final_path."""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        # Check if the file exists in the archive
+        if member not in zip_ref.namelist():
+            raise FileNotFoundError(f"File {member} not found in artifact ZIP")
+
+        # Extract the specific file
+        with zip_ref.open(member) as source:
+            with open_file(final_path) as target:
+                shutil.copyfileobj(source, target)
+    return final_path
+
+
+def _extract_files(zip_path, batch, open_file):
+    # One ZipFile per worker: reads through a shared handle would interleave seeks
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for info, target_path in batch:
+            with zip_ref.open(info) as source, open_file(target_path) as target:
+                shutil.copyfileobj(source, target)
+            apply_mode(target_path, info.external_attr)
+
+
+def extract_zip_directory(zip_path, directory, final_dir, open_file=open_for_write, workers=None):
+    """
+    Extract a directory (e.g. Runner.app) from an artifact ZIP into final_dir.
+
+    Files are inflated by `workers` threads (zlib releases the GIL; by default one per
+    CPU, up to ARTIFACT_EXTRACT_WORKERS); permission bits and symlinks recorded in
+    the archive are kept. final_dir is replaced, so callers that need the result to
+    appear atomically extract into a staging directory (see artifact_store.stage_tree).
+    """
+    # Filter files that start with the directory prefix
+    prefix = directory.rstrip('/') + '/'
+    files, links = [], []
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        selected = [info for info in zip_ref.infolist() if info.filename.startswith(prefix)]
+        if not selected:
+            raise FileNotFoundError(f"Directory {directory} not found in artifact ZIP")
+
+        if os.path.exists(final_dir):
+            shutil.rmtree(final_dir)
+        os.makedirs(final_dir, exist_ok=True)
+        for info in selected:
+            # Remove the prefix to extract into final_dir
+            relative_path = info.filename[len(prefix):]
+            if not relative_path:
+                continue
+            target_path = member_path(final_dir, relative_path)
+            if info.is_dir():
+                os.makedirs(target_path, exist_ok=True)
+            elif is_symlink(info.external_attr):
+                links.append((target_path, zip_ref.read(info).decode()))
+            else:
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                files.append((info, target_path))
+
+    # Largest first, dealt round-robin, so the workers finish at about the same time
+    workers = workers or min(EXTRACT_WORKERS, os.cpu_count() or 1)
+    files.sort(key=lambda item: item[0].file_size, reverse=True)
+    batches = [files[i::workers] for i in range(workers) if files[i::workers]]
+    with ThreadPoolExecutor(max_workers=max(1, len(batches))) as pool:
+        for future in [pool.submit(_extract_files, zip_path, batch, open_file) for batch in batches]:
+            future.result()
+    # Symlinks last, so no file is written through one
+    for target_path, target in links:
+        make_symlink(final_dir, target_path, target)
+    return final_dir
 
 
 class GitLabService:
     def __init__(self, url, private_token):
         self.gl = gitlab.Gitlab(url, oauth_token=private_token)
+        # Shared ETag cache and connection pool for every client (see gitlab_http_cache)
+        self.gl.session.mount(url, response_cache)
         self.gl.auth()
+        # auth() already fetched the current user; keep it so callers need no extra round trip
+        self.user = dict(self.gl.user.attributes)
 
     def get_user(self):
-        return self.gl.user.attributes
+        return self.user
 
     def list_projects(self):
         return self.gl.projects.list()
     
     def list_branches(self, project_id=63):
-        project = self.gl.projects.get(project_id)
+        project = self.gl.projects.get(project_id, lazy=True)
         branches = project.branches.list(get_all=True)
         return [
             {
@@ -33,7 +150,7 @@ class GitLabService:
         ]
     
     def trigger_pipeline(self, project_id=63, ref=None, variables=None, username=None):
-        project = self.gl.projects.get(project_id)
+        project = self.gl.projects.get(project_id, lazy=True)
         data = {'ref': ref}
         if variables:
             data['variables'] = [{'key': k, 'value': v} for k, v in variables.items()]
@@ -41,14 +158,7 @@ class GitLabService:
         
         # Store build in DB
         platform = variables.get('PLATFORM', 'unknown') if variables else 'unknown'
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO builds (pipeline_id, project_id, ref, platform, web_url, username)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (pipeline.id, project_id, ref, platform, pipeline.web_url, username))
-        conn.commit()
-        conn.close()
+        record_build(pipeline.id, project_id, ref, platform, pipeline.web_url, username, pipeline.status)
 
         return {
             "id": pipeline.id,
@@ -58,7 +168,7 @@ class GitLabService:
         }
 
     def get_pipeline_status(self, project_id=63, pipeline_id=None):
-        project = self.gl.projects.get(project_id)
+        project = self.gl.projects.get(project_id, lazy=True)
         pipeline = project.pipelines.get(pipeline_id)
         return {
             "id": pipeline.id,
@@ -68,8 +178,8 @@ class GitLabService:
         }
     
     def get_job_by_name(self, project_id=63, pipeline_id=None, job_name="build_debug_android"):
-        project = self.gl.projects.get(project_id)
-        pipeline = project.pipelines.get(pipeline_id)
+        project = self.gl.projects.get(project_id, lazy=True)
+        pipeline = project.pipelines.get(pipeline_id, lazy=True)
         jobs = pipeline.jobs.list()
         for job in jobs:
             if job.name == job_name:
@@ -89,7 +199,7 @@ class GitLabService:
         Returns:
             Path to the extracted file
         """
-        project = self.gl.projects.get(project_id)
+        project = self.gl.projects.get(project_id, lazy=True)
         job = project.jobs.get(job_id)
         
         os.makedirs(ARTIFACTS_DIR, exist_ok=True)
@@ -104,25 +214,10 @@ class GitLabService:
                 job.artifacts(streamed=True, action=f.write)
             
             # Extract specific file from ZIP
-            with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
-                # Check if the file exists in the archive
-                if artifact_path_in_zip not in zip_ref.namelist():
-                    raise FileNotFoundError(f"File {artifact_path_in_zip} not found in artifact ZIP")
-                
-                # Extract the specific file
-                with zip_ref.open(artifact_path_in_zip) as source:
-                    with open(final_path, 'wb') as target:
-                        shutil.copyfileobj(source, target)
+            extract_zip_member(temp_zip, artifact_path_in_zip, final_path)
             
             # Update artifact path in DB (for builds table)
-            pipeline_id = job.pipeline['id']
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE builds SET artifact_path = ? WHERE pipeline_id = ?
-            ''', (final_path, pipeline_id))
-            conn.commit()
-            conn.close()
+            record_build_artifact(job.pipeline['id'], final_path)
             
             return final_path
             
@@ -144,7 +239,7 @@ class GitLabService:
         Returns:
             Path to the unzipped .app directory
         """
-        project = self.gl.projects.get(project_id)
+        project = self.gl.projects.get(project_id, lazy=True)
         job = project.jobs.get(job_id)
 
         os.makedirs(ARTIFACTS_DIR, exist_ok=True)
@@ -157,45 +252,18 @@ class GitLabService:
             with open(temp_zip, "wb") as f:
                 job.artifacts(streamed=True, action=f.write)
 
-            # Extract the directory from the ZIP
-            if os.path.exists(final_dir):
-                shutil.rmtree(final_dir)
-            os.makedirs(final_dir, exist_ok=True)
-
-            with zipfile.ZipFile(temp_zip, 'r') as zip_ref:
-                # Filter files that start with artifact_path_in_zip
-                prefix = artifact_path_in_zip.rstrip('/') + '/'
-                found = False
-                for member in zip_ref.namelist():
-                    if member.startswith(prefix):
-                        found = True
-                        # Remove the prefix to extract into final_dir
-                        relative_path = member[len(prefix):]
-                        if not relative_path:
-                            continue
-                        
-                        target_path = os.path.join(final_dir, relative_path)
-                        
-                        # Handle directories
-                        if member.endswith('/'):
-                            os.makedirs(target_path, exist_ok=True)
-                        else:
-                            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-                            with zip_ref.open(member) as source, open(target_path, "wb") as target:
-                                shutil.copyfileobj(source, target)
-                
-                if not found:
-                    raise FileNotFoundError(f"Directory {artifact_path_in_zip} not found in artifact ZIP")
+            # Extract the directory from the ZIP into the store's staging area, then link it
+            # in, so installers never see a half-written bundle
+            staged = store.stage_tree()
+            try:
+                extract_zip_directory(temp_zip, artifact_path_in_zip, staged.path, staged.open)
+                digest, _ = staged.commit(final_dir)
+            except BaseException:
+                staged.discard()
+                raise
 
             # Update artifact path in DB (for builds table)
-            pipeline_id = job.pipeline['id']
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE builds SET artifact_path = ? WHERE pipeline_id = ?
-            ''', (final_dir, pipeline_id))
-            conn.commit()
-            conn.close()
+            record_build_artifact(job.pipeline['id'], final_dir, digest)
 
             return final_dir
         finally:
@@ -206,6 +274,7 @@ class GitLabService:
         """
         Download full job artifact ZIP (for generic use).
         """
+        # Full fetch: project.name is used in the filename
         project = self.gl.projects.get(project_id)
         job = project.jobs.get(job_id)
         
@@ -220,20 +289,13 @@ class GitLabService:
             job.artifacts(streamed=True, action=f.write)
             
         # Store in DB
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO artifacts (job_id, project_id, username, file_path, downloaded_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (job_id, project_id, username, artifact_path))
-        conn.commit()
-        conn.close()
+        record_artifact_download(job_id, project_id, username, artifact_path)
 
         return artifact_path
     
     def get_pipeline_jobs(self, project_id, pipeline_id):
-        project = self.gl.projects.get(project_id)
-        pipeline = project.pipelines.get(pipeline_id)
+        project = self.gl.projects.get(project_id, lazy=True)
+        pipeline = project.pipelines.get(pipeline_id, lazy=True)
         jobs = pipeline.jobs.list()
         return [{"id": job.id, "name": job.name, "status": job.status} for job in jobs]
     
@@ -247,4 +309,84 @@ class GitLabService:
         
         builds = cursor.fetchall()
         conn.close()
-        return [dict(row) for row in builds]
\ No newline at end of file
+        return [dict(row) for row in builds]
+
+
+class GitLabClientCache:
+    """
+    Authenticated GitLabService instances keyed by token.
+
+    Reusing a service skips the auth() round trip; all services send through the shared
+    response_cache adapter, which owns the keep-alive connection pool. Entries expire after `ttl` seconds so a
+    revoked token is noticed; the cache holds at most `max_size` tokens (least recently used
+    go first).
+    """
+
+    def __init__(self, ttl=CLIENT_TTL, max_size=CLIENT_CACHE_SIZE, factory=GitLabService):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # token hash -> (created_at, service)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(url, token):
+        return hashlib.sha256(f"{url}\0{token}".encode()).hexdigest()
+
+    def lookup(self, url, token):
+        """Cached service for the token, or None (counted as a miss)."""
+        key = self._key(url, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.time() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, url, token, service):
+        key = self._key(url, token)
+        with self._lock:
+            self._entries[key] = (time.time(), service)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, url, token):
+        service = self.lookup(url, token)
+        if service is None:
+            # Authenticate outside the lock; raises for invalid tokens, which are not cached
+            service = self._factory(url, token)
+            self.put(url, token, service)
+        return service
+
+    def invalidate(self, url, token):
+        with self._lock:
+            self._entries.pop(self._key(url, token), None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "clients": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+            }
+
+
+clients = GitLabClientCache()
+
+
+def get_service(url, private_token):
+    """Cached authenticated GitLabService for the token (see GitLabClientCache)."""
+    return clients.get(url, private_token)
@@ -1,14 +1,24 @@
 import asyncio
 import subprocess
+import threading
 import json
 import shutil
 import os
 from app.services.ios_streamer import IOSStreamer
+from app.services.log_tap import LogTap
+from app.services.log_archive import get_archive
+from app.services.artifact_store import store as artifact_store
+from app.services.admission import admission
+from app.services.ios_log import build_log_stream_args, filter_key, parse_ndjson, format_compact
+from app.services.simulator_inventory import SimulatorInventory
+from app.services.simulator_pool import SimulatorPool
 
 class IOSDeviceManager:
     def __init__(self):
         self.stream = {}  # Stores IOSStreamer instances
-        self.log_streams = {}
+        self.log_streams = {}  # Stores shared LogTap instances per (UDID, filter)
+        self.inventory = SimulatorInventory()  # Cached simctl listing, indexed by UDID
+        self.pool = SimulatorPool(self)  # Pre-booted clones of golden simulators
 
     def _ensure_xcrun_available(self):
         """Ensure xcrun (and thus simctl) is available on PATH."""
@@ -40,37 +50,25 @@ class IOSDeviceManager:
     
     def list_simulators(self):
         self._ensure_xcrun_available()
-        result = subprocess.run([
-            'xcrun',
-            'simctl',
-            'list',
-            'devices',
-            '--json'
-        ], capture_output=True, text=True)
-        devices_dict = json.loads(result.stdout)['devices']
-        
-        # Flatten the dictionary
-        flat_list = []
-        for runtime, devices in devices_dict.items():
-            for device in devices:
-                device['runtime'] = runtime
-                flat_list.append(device)
-        return flat_list
+        return self.inventory.devices()
+
+    def get_simulator(self, udid):
+        """Cached simctl entry for udid, or None."""
+        self._ensure_xcrun_available()
+        return self.inventory.get(udid)
 
     def list_device_types(self):
         self._ensure_xcrun_available()
-        result = subprocess.run(['xcrun', 'simctl', 'list', 'devicetypes', '--json'], capture_output=True, text=True)
         try:
-            return json.loads(result.stdout)['devicetypes']
-        except (json.JSONDecodeError, KeyError):
+            return self.inventory.device_types()
+        except json.JSONDecodeError:
             return []
 
     def list_runtimes(self):
         self._ensure_xcrun_available()
-        result = subprocess.run(['xcrun', 'simctl', 'list', 'runtimes', '--json'], capture_output=True, text=True)
         try:
-            return json.loads(result.stdout)['runtimes']
-        except (json.JSONDecodeError, KeyError):
+            return self.inventory.runtimes()
+        except json.JSONDecodeError:
             return []
 
     def create_simulator(self, name, device_type, runtime):
@@ -83,14 +81,25 @@ class IOSDeviceManager:
                 capture_output=True, text=True, check=True
             )
             udid = result.stdout.strip()
+            self.inventory.invalidate()
             return f"Simulator {name} created with UDID {udid}."
         except subprocess.CalledProcessError as e:
             return f"Failed to create simulator: {e.stderr}"
 
+    def provision_simulator(self, device_type, runtime):
+        """Booted simulator cloned from the golden image for device_type/runtime."""
+        self._ensure_xcrun_available()
+        return self.pool.acquire(device_type, runtime)
+
+    def release_simulator(self, udid):
+        self.pool.release(udid)
+        return f"Simulator {udid} returned to the pool."
+
     def delete_simulator(self, udid):
         self._ensure_xcrun_available()
         try:
             subprocess.run(['xcrun', 'simctl', 'delete', udid], check=True)
+            self.inventory.remove(udid)
             return f"Simulator {udid} deleted."
         except subprocess.CalledProcessError as e:
             return f"Failed to delete simulator: {e.stderr}"
@@ -99,28 +108,66 @@ class IOSDeviceManager:
         self._ensure_xcrun_available()
         # Check if already booted to avoid redundant boot
         try:
-            devices = self.list_simulators()
-            for d in devices:
-                if d.get('udid') == udid and d.get('state') == 'Booted':
-                    return f"Simulator {udid} already booted."
+            device = self.inventory.get(udid)
+            if device and device.get('state') == 'Booted':
+                return f"Simulator {udid} already booted."
         except Exception:
             # If listing fails, attempt boot anyway
             pass
 
-        subprocess.run(['xcrun', 'simctl', 'boot', udid], check=True)
+        # Wait for a boot slot and host headroom; raises AdmissionRejected
+        ticket = admission.acquire(udid)
+        try:
+            subprocess.run(['xcrun', 'simctl', 'boot', udid], check=True)
+        except Exception:
+            admission.release(ticket)
+            self.inventory.invalidate()
+            raise
+        self.inventory.set_state(udid, 'Booted')
+        # Keep the boot slot until the simulator has finished booting
+        threading.Thread(target=self._release_boot_slot, args=(ticket, udid), daemon=True).start()
         # Connect idb
         # idb is optional for streaming; check availability before using
         if shutil.which('idb') is not None:
             subprocess.run(['idb', 'connect', udid])
+        try:
+            self.start_log_stream(udid)
+        except Exception as e:
+            print(f"Log capture not started for {udid}: {e}")
         return f"Simulator {udid} booted."
 
+    def _release_boot_slot(self, ticket, udid, timeout=300):
+        try:
+            subprocess.run(['xcrun', 'simctl', 'bootstatus', udid], capture_output=True, timeout=timeout)
+        except Exception as e:
+            print(f"Boot status wait for {udid} ended: {e}")
+        finally:
+            admission.release(ticket)
+
     def stop_simulator(self, udid):
         self._ensure_xcrun_available()
-        subprocess.run(['xcrun', 'simctl', 'shutdown', udid], check=True)
+        try:
+            subprocess.run(['xcrun', 'simctl', 'shutdown', udid], check=True)
+        except subprocess.CalledProcessError:
+            self.inventory.invalidate()
+            raise
+        self.inventory.set_state(udid, 'Shutdown')
         self.stop_video_stream(udid)
         self.stop_log_stream(udid)
         return f"Simulator {udid} shutdown."
 
+    def erase_simulator(self, udid):
+        """Reset contents and settings; a booted simulator is shut down first."""
+        self._ensure_xcrun_available()
+        device = self.inventory.get(udid)
+        if device and device.get('state') == 'Booted':
+            self.stop_simulator(udid)
+        try:
+            subprocess.run(['xcrun', 'simctl', 'erase', udid], capture_output=True, text=True, check=True)
+            return f"Simulator {udid} erased."
+        except subprocess.CalledProcessError as e:
+            return f"Failed to erase simulator: {e.stderr}"
+
     async def get_video_stream(self, udid):
         if udid in self.stream:
             return self.stream[udid]
@@ -135,27 +182,32 @@ class IOSDeviceManager:
             self.stream[udid].stop()
             del self.stream[udid]
 
-    def start_log_stream(self, udid):
+    def start_log_stream(self, udid, process=None, subsystem=None, level=None):
+        """
+        Return the shared LogTap for udid and filter, creating it on first use.
+        Items are records parsed from `log stream --style ndjson`.
+        """
         self._ensure_xcrun_available()
-        if udid in self.log_streams and self.log_streams[udid].poll() is None:
-            return self.log_streams[udid]
-        
-        # xcrun simctl spawn booted log stream --style compact
-        process = subprocess.Popen(
-            ['xcrun', 'simctl', 'spawn', udid, 'log', 'stream', '--style', 'compact'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        self.log_streams[udid] = process
-        return process
+        key = (udid,) + filter_key(process, subsystem, level)
+        tap = self.log_streams.get(key)
+        if tap is None:
+            args = build_log_stream_args(udid, process, subsystem, level)
+            tap = LogTap(key, lambda: subprocess.Popen(
+                args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            ), parse=parse_ndjson)
+            archive = get_archive()
+            if archive and key == (udid,) + filter_key():
+                # Archive everything the simulator logs, not only what a viewer happened to watch
+                sink = archive.sink('ios', udid)
+                tap.add_sink(lambda record: sink(None if record is None else format_compact(record)))
+            self.log_streams[key] = tap
+        return tap
 
     def stop_log_stream(self, udid):
-        if udid in self.log_streams:
-            p = self.log_streams[udid]
-            if p.poll() is None:
-                p.terminate()
-                p.wait()
-            del self.log_streams[udid]
+        for key in [k for k in self.log_streams if k[0] == udid]:
+            self.log_streams.pop(key).stop()
 
     def install_app(self, udid, app_path):
         # Requires idb and xcrun boot/shutdown
@@ -178,15 +230,20 @@ class IOSDeviceManager:
                 except Exception:
                     pass
 
-            result = subprocess.run(
-                ['idb', 'install', '--udid', udid, target_path],
-                capture_output=True, text=True, check=True
-            )
+            # Keep the artifact store from evicting the app mid-install; counts as a use for LRU
+            with artifact_store.using(target_path):
+                result = subprocess.run(
+                    ['idb', 'install', '--udid', udid, target_path],
+                    capture_output=True, text=True, check=True
+                )
             return f"App installed on {udid}: {result.stdout}"
         except subprocess.CalledProcessError as e:
             return f"Failed to install app on {udid}: {e.stderr}"
 
-
-
-
-
+    def uninstall_app(self, udid, bundle_id):
+        self._ensure_xcrun_available()
+        try:
+            subprocess.run(['xcrun', 'simctl', 'uninstall', udid, bundle_id], capture_output=True, text=True, check=True)
+            return f"{bundle_id} uninstalled from {udid}."
+        except subprocess.CalledProcessError as e:
+            return f"Failed to uninstall {bundle_id} from {udid}: {e.stderr}"
@@ -0,0 +1,79 @@
+import json
+import os
+
+# messageType values emitted by `log stream`, lowest to highest severity
+LOG_LEVELS = ['debug', 'info', 'default', 'error', 'fault']
+
+
+def _quote(value):
+    """Quote a string literal for an NSPredicate."""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def build_log_stream_args(udid, process=None, subsystem=None, level=None):
+    """
+    Build the `simctl spawn ... log stream` command for a subscriber filter.
+
+    process/subsystem and error/fault levels are compiled into --predicate so the filtering
+    happens inside the simulator; debug/info/default map onto --level, which is how
+    `log stream` decides whether to emit those message types at all.
+    """
+    args = ['xcrun', 'simctl', 'spawn', udid, 'log', 'stream', '--style', 'ndjson']
+    clauses = []
+    if process:
+        clauses.append(f"process == {_quote(process)}")
+    if subsystem:
+        clauses.append(f"subsystem == {_quote(subsystem)}")
+    if level:
+        level = level.lower()
+        if level not in LOG_LEVELS:
+            raise ValueError(f"Unknown log level {level!r}; expected one of {LOG_LEVELS}")
+        if level in ('debug', 'info'):
+            args += ['--level', level]
+        elif level == 'error':
+            clauses.append("(messageType == error OR messageType == fault)")
+        elif level == 'fault':
+            clauses.append("messageType == fault")
+    if clauses:
+        args += ['--predicate', ' AND '.join(clauses)]
+    return args
+
+
+def filter_key(process=None, subsystem=None, level=None):
+    """Key identifying one filtered producer; identical filters share a process."""
+    return (process or None, subsystem or None, (level or '').lower() or None)
+
+
+def parse_ndjson(line):
+    """Parse one `log stream --style ndjson` line into a compact record, or None for non-log lines."""
+    if not line.startswith('{'):
+        # e.g. the "Filtering the log data using ..." banner
+        return None
+    try:
+        event = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if event.get('eventType', 'logEvent') != 'logEvent':
+        return None
+    return {
+        "ts": event.get('timestamp'),
+        "level": (event.get('messageType') or '').lower() or None,
+        "process": os.path.basename(event.get('processImagePath') or '') or None,
+        "pid": event.get('processID'),
+        "subsystem": event.get('subsystem') or None,
+        "category": event.get('category') or None,
+        "message": event.get('eventMessage', ''),
+    }
+
+
+_COMPACT_LEVELS = {'default': 'Df', 'info': 'I', 'debug': 'Db', 'error': 'E', 'fault': 'F'}
+
+
+def format_compact(record):
+    """Render a record the way `log stream --style compact` would, e.g. for the log archive."""
+    ts = (record.get('ts') or '')[:23]
+    level = _COMPACT_LEVELS.get(record.get('level'), 'Df')
+    sub = ''
+    if record.get('subsystem'):
+        sub = f" [{record['subsystem']}:{record.get('category') or ''}]"
+    return f"{ts} {level} {record.get('process') or '?'}[{record.get('pid') or 0}]{sub} {record.get('message', '')}"
@@ -0,0 +1,362 @@
+import collections
+import os
+import threading
+import time
+import uuid
+from app.database import get_connection, get_username_from_session
+
+
+DEFAULT_TTL = int(os.getenv("LEASE_DEFAULT_TTL", "900"))
+MAX_TTL = int(os.getenv("LEASE_MAX_TTL", "14400"))
+# A queued ticket that is not polled within this window is dropped
+TICKET_TTL = int(os.getenv("LEASE_TICKET_TTL", "60"))
+
+
+class LeaseError(Exception):
+    pass
+
+
+class Lease:
+    def __init__(self, device_class, platform, device, owner, ttl):
+        now = time.time()
+        self.id = uuid.uuid4().hex
+        self.device_class = device_class
+        self.platform = platform
+        self.device = device
+        self.owner = owner
+        self.ttl = ttl
+        self.acquired_at = now
+        self.last_heartbeat = now
+        self.expires_at = now + ttl
+
+    def to_dict(self):
+        return {
+            "lease_id": self.id,
+            "device_class": self.device_class,
+            "platform": self.platform,
+            "device": self.device,
+            "owner": self.owner,
+            "ttl": self.ttl,
+            "acquired_at": self.acquired_at,
+            "last_heartbeat": self.last_heartbeat,
+            "expires_at": self.expires_at,
+        }
+
+
+class Ticket:
+    def __init__(self, device_class, owner, ttl):
+        self.id = uuid.uuid4().hex
+        self.device_class = device_class
+        self.owner = owner
+        self.ttl = ttl
+        self.enqueued_at = time.time()
+        self.last_poll = self.enqueued_at
+        self.lease = None
+
+
+class LeaseScheduler:
+    """
+    Device leases with a FIFO queue per device class and per-user fairness.
+
+    A device class maps to the devices that can satisfy it through `resolve_class`, e.g.
+    "android:Pixel_6" is one AVD and "ios:iPhone 15" is every simulator of that model.
+    When a device frees up, the waiting user holding the fewest leases in that class is
+    served first; ties go to whoever has waited longest, so one user queueing many
+    requests cannot starve everyone else.
+    """
+
+    def __init__(self, resolve_class=None, default_ttl=DEFAULT_TTL, max_ttl=MAX_TTL, ticket_ttl=TICKET_TTL):
+        self._resolve_class = resolve_class or (lambda device_class: [])  # device_class -> [(platform, device), ...]
+        self.default_ttl = default_ttl
+        self.max_ttl = max_ttl
+        self.ticket_ttl = ticket_ttl
+        self._lock = threading.RLock()
+        self.leases = {}  # lease_id -> Lease
+        self.queues = collections.defaultdict(list)  # device_class -> [Ticket] in arrival order
+        self.tickets = {}  # ticket_id -> Ticket
+        self._waits = collections.defaultdict(lambda: collections.deque(maxlen=500))  # class -> wait seconds
+        self._holds = collections.defaultdict(lambda: collections.deque(maxlen=100))  # class -> hold seconds
+        self.reclaimed = 0
+
+    def set_resolver(self, resolve_class):
+        self._resolve_class = resolve_class
+
+    # Queries
+
+    def check_access(self, platform, device, owner):
+        """Raise LeaseError if someone other than owner holds a lease on the device."""
+        lease = self.lease_for_device(platform, device)
+        if lease and lease.owner != owner:
+            raise LeaseError(f"{device} is leased by {lease.owner} until {time.strftime('%H:%M:%S', time.localtime(lease.expires_at))}")
+        return lease
+
+    def lease_for_device(self, platform, device):
+        with self._lock:
+            self._reclaim_locked()
+            for lease in self.leases.values():
+                if lease.platform == platform and lease.device == device:
+                    return lease
+            return None
+
+    def leases_for_owner(self, owner):
+        with self._lock:
+            self._reclaim_locked()
+            return [l for l in self.leases.values() if l.owner == owner]
+
+    def _busy_devices(self):
+        return {(l.platform, l.device) for l in self.leases.values()}
+
+    def _free_device(self, device_class):
+        busy = self._busy_devices()
+        for platform, device in self._resolve_class(device_class):
+            if (platform, device) not in busy:
+                return platform, device
+        return None
+
+    # Lease lifecycle
+
+    def acquire(self, owner, device_class, ttl=None):
+        """Return (lease, None) when a device is free, else (None, ticket) queued for it."""
+        ttl = min(int(ttl or self.default_ttl), self.max_ttl)
+        with self._lock:
+            self._reclaim_locked()
+            queue = self.queues[device_class]
+            existing = next((t for t in queue if t.owner == owner), None)
+            if existing:
+                # One waiting ticket per user and class; re-requesting keeps the place in line
+                existing.last_poll = time.time()
+                return None, existing
+            if not queue:
+                free = self._free_device(device_class)
+                if free:
+                    lease = Lease(device_class, free[0], free[1], owner, ttl)
+                    self.leases[lease.id] = lease
+                    self._waits[device_class].append(0.0)
+                    return lease, None
+            ticket = Ticket(device_class, owner, ttl)
+            queue.append(ticket)
+            self.tickets[ticket.id] = ticket
+            self._dispatch_locked(device_class)
+            return ticket.lease, (None if ticket.lease else ticket)
+
+    def poll(self, ticket_id, owner):
+        """Refresh a queued ticket; returns the ticket (with .lease set once granted)."""
+        with self._lock:
+            self._reclaim_locked()
+            ticket = self.tickets.get(ticket_id)
+            if not ticket or ticket.owner != owner:
+                raise LeaseError(f"Unknown ticket {ticket_id}")
+            ticket.last_poll = time.time()
+            if ticket.lease is not None:
+                # Granted tickets are handed out once
+                del self.tickets[ticket_id]
+            return ticket
+
+    def cancel(self, ticket_id, owner):
+        with self._lock:
+            ticket = self.tickets.get(ticket_id)
+            if not ticket or ticket.owner != owner:
+                raise LeaseError(f"Unknown ticket {ticket_id}")
+            self._drop_ticket_locked(ticket)
+
+    def heartbeat(self, lease_id, owner, ttl=None):
+        with self._lock:
+            self._reclaim_locked()
+            lease = self.leases.get(lease_id)
+            if not lease or lease.owner != owner:
+                raise LeaseError(f"Lease {lease_id} not held by {owner}")
+            if ttl:
+                lease.ttl = min(int(ttl), self.max_ttl)
+            lease.last_heartbeat = time.time()
+            lease.expires_at = lease.last_heartbeat + lease.ttl
+            return lease
+
+    def release(self, lease_id, owner=None):
+        with self._lock:
+            lease = self.leases.get(lease_id)
+            if not lease or (owner is not None and lease.owner != owner):
+                raise LeaseError(f"Lease {lease_id} not held by {owner}")
+            self._end_lease_locked(lease)
+
+    def _end_lease_locked(self, lease):
+        del self.leases[lease.id]
+        self._holds[lease.device_class].append(time.time() - lease.acquired_at)
+        # The freed device may satisfy other classes too (e.g. "ios" and "ios:iPhone 15")
+        for device_class in list(self.queues):
+            self._dispatch_locked(device_class)
+
+    def _drop_ticket_locked(self, ticket):
+        self.tickets.pop(ticket.id, None)
+        queue = self.queues.get(ticket.device_class, [])
+        if ticket in queue:
+            queue.remove(ticket)
+
+    def _dispatch_locked(self, device_class):
+        queue = self.queues.get(device_class)
+        while queue:
+            free = self._free_device(device_class)
+            if not free:
+                return
+            held = collections.Counter(l.owner for l in self.leases.values() if l.device_class == device_class)
+            # Fewest leases held first, then arrival order (min is stable on the FIFO list)
+            ticket = min(queue, key=lambda t: held[t.owner])
+            queue.remove(ticket)
+            lease = Lease(device_class, free[0], free[1], ticket.owner, ticket.ttl)
+            self.leases[lease.id] = lease
+            ticket.lease = lease
+            self._waits[device_class].append(lease.acquired_at - ticket.enqueued_at)
+
+    def reclaim_expired(self):
+        with self._lock:
+            return self._reclaim_locked()
+
+    def _reclaim_locked(self):
+        now = time.time()
+        # Drop abandoned tickets first so devices freed below don't go to nobody
+        for ticket in [t for t in self.tickets.values() if t.lease is None and now - t.last_poll > self.ticket_ttl]:
+            self._drop_ticket_locked(ticket)
+        expired = [l for l in self.leases.values() if l.expires_at <= now]
+        for lease in expired:
+            print(f"[Leases] Reclaiming expired lease {lease.id} on {lease.device} from {lease.owner}")
+            self.reclaimed += 1
+            self._end_lease_locked(lease)
+        # Granted but never collected: the lease itself expires by TTL, just forget the ticket
+        for ticket in [t for t in self.tickets.values() if t.lease is not None and now - t.last_poll > self.ticket_ttl]:
+            self.tickets.pop(ticket.id, None)
+        return len(expired)
+
+    # Reporting
+
+    def position(self, ticket):
+        with self._lock:
+            queue = self.queues.get(ticket.device_class, [])
+            return queue.index(ticket) + 1 if ticket in queue else 0
+
+    def estimated_wait(self, ticket):
+        """Position in line times the average hold time, spread over the class's devices."""
+        with self._lock:
+            position = self.position(ticket)
+            if not position:
+                return 0.0
+            holds = self._holds.get(ticket.device_class)
+            avg_hold = (sum(holds) / len(holds)) if holds else self.default_ttl
+            devices = max(len(self._resolve_class(ticket.device_class)), 1)
+            return round(position * avg_hold / devices, 1)
+
+    def ticket_dict(self, ticket):
+        return {
+            "ticket_id": ticket.id,
+            "device_class": ticket.device_class,
+            "owner": ticket.owner,
+            "enqueued_at": ticket.enqueued_at,
+            "position": self.position(ticket),
+            "estimated_wait": self.estimated_wait(ticket),
+            "lease": ticket.lease.to_dict() if ticket.lease else None,
+        }
+
+    def snapshot(self):
+        """Active leases and waiting tickets per class, taken under one lock so neither moves mid-listing."""
+        with self._lock:
+            self._reclaim_locked()
+            queues = {
+                device_class: [self.ticket_dict(t) for t in tickets]
+                for device_class, tickets in self.queues.items() if tickets
+            }
+            return {"leases": [l.to_dict() for l in self.leases.values()], "queues": queues}
+
+    def metrics(self):
+        with self._lock:
+            self._reclaim_locked()
+            classes = {}
+            for device_class in set(self._waits) | set(self.queues):
+                waits = sorted(self._waits.get(device_class, []))
+                queue = self.queues.get(device_class, [])
+                classes[device_class] = {
+                    "queued": len(queue),
+                    "oldest_wait": round(time.time() - queue[0].enqueued_at, 1) if queue else 0.0,
+                    "grants": len(waits),
+                    "wait_avg": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                    "wait_p50": round(waits[len(waits) // 2], 2) if waits else 0.0,
+                    "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else 0.0,
+                    "wait_max": round(waits[-1], 2) if waits else 0.0,
+                }
+            return {"active_leases": len(self.leases), "reclaimed": self.reclaimed, "classes": classes}
+
+
+class DeviceClassResolver:
+    """
+    Maps device classes onto concrete devices using the managers' listings.
+
+    "android" is any AVD, "android:<avd>" one AVD; "ios" is any available simulator,
+    "ios:<name>" the simulators with that model name (or that UDID). Listings are cached
+    for `ttl` seconds because dispatch runs on every lease change.
+    """
+
+    def __init__(self, android_manager, ios_manager, ttl=10.0):
+        self.android_manager = android_manager
+        self.ios_manager = ios_manager
+        self.ttl = ttl
+        self._cache = {}
+
+    def _cached(self, key, fetch):
+        hit = self._cache.get(key)
+        if hit and time.time() - hit[0] < self.ttl:
+            return hit[1]
+        try:
+            value = fetch()
+        except Exception as e:
+            print(f"[Leases] Failed to list {key}: {e}")
+            value = hit[1] if hit else []
+        self._cache[key] = (time.time(), value)
+        return value
+
+    def __call__(self, device_class):
+        platform, _, name = device_class.partition(':')
+        if platform == 'android':
+            avds = self._cached('android', self.android_manager.list_avds)
+            return [('android', a) for a in avds if not name or a == name]
+        if platform == 'ios':
+            sims = self._cached('ios', self.ios_manager.list_simulators)
+            return [
+                ('ios', d['udid']) for d in sims
+                if d.get('isAvailable', True) and (not name or d.get('name') == name or d.get('udid') == name)
+            ]
+        return []
+
+
+scheduler = LeaseScheduler()
+
+
+def ensure_device_access(platform, device, session_id):
+    """Raise LeaseError when the device is leased to someone other than the session's user."""
+    if not scheduler.leases:
+        # Unleased farm: skip the session lookup entirely
+        return
+    owner = get_username_from_session(session_id) if session_id else None
+    scheduler.check_access(platform, device, owner)
+
+
+def record_device_use(platform, device, session_id):
+    """Remember the session user's most recent device for the platform."""
+    owner = get_username_from_session(session_id) if session_id else None
+    if not owner:
+        return
+    conn = get_connection()
+    conn.execute('''
+        INSERT INTO device_usage (username, platform, device, used_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(username, platform) DO UPDATE SET device = excluded.device, used_at = excluded.used_at
+    ''', (owner, platform, device, time.time()))
+    conn.commit()
+    conn.close()
+
+
+def preferred_device(owner, platform):
+    """The owner's leased device for the platform, else the one they used last; None if neither."""
+    leased = [l for l in scheduler.leases_for_owner(owner) if l.platform == platform]
+    if leased:
+        return max(leased, key=lambda l: l.acquired_at).device
+    conn = get_connection()
+    row = conn.execute('SELECT device FROM device_usage WHERE username = ? AND platform = ?',
+                       (owner, platform)).fetchone()
+    conn.close()
+    return row["device"] if row else None
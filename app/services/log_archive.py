@@ -0,0 +1,463 @@
+import collections
+import datetime
+import gzip
+import os
+import queue
+import re
+import threading
+import time
+from app.database import get_log_connection, init_log_db, fts5_available
+
+try:
+    import zstandard
+except ImportError:  # Optional: fall back to gzip segments when zstandard is not installed
+    zstandard = None
+
+
+LOGS_DIR = os.getenv("DEVICE_LOGS_DIR", "storage/logs")
+SEGMENT_MAX_LINES = int(os.getenv("DEVICE_LOGS_SEGMENT_LINES", "50000"))
+SEGMENT_MAX_SECONDS = int(os.getenv("DEVICE_LOGS_SEGMENT_SECONDS", "300"))
+ARCHIVE_MAX_BYTES = int(os.getenv("DEVICE_LOGS_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# adb logcat -v time: "01-15 12:34:56.789 D/ActivityManager( 1234): message"
+_LOGCAT_RE = re.compile(r'^(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d{3})\s+([VDIWEFS])/([^(]*?)\s*\(\s*\d+\):\s?(.*)$')
+# log stream --style compact: "2024-01-15 12:34:56.789 Df SpringBoard[61:1a2b] message"
+_COMPACT_RE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d+)\s+(\w+)\s+([^\[\s]+)(?:\[[^\]]*\])?\s?(.*)$')
+
+
+def parse_line(platform, line):
+    """Return (ts, priority, tag, message) for a raw log line, best effort."""
+    if platform == 'android':
+        m = _LOGCAT_RE.match(line)
+        if m:
+            mon, day, hh, mm, ss, ms, prio, tag, msg = m.groups()
+            year = datetime.date.today().year
+            try:
+                ts = datetime.datetime(year, int(mon), int(day), int(hh), int(mm), int(ss), int(ms) * 1000).timestamp()
+            except ValueError:
+                ts = time.time()
+            return ts, prio, tag.strip(), msg
+    elif platform == 'ios':
+        m = _COMPACT_RE.match(line)
+        if m:
+            stamp, prio, tag, msg = m.groups()
+            try:
+                ts = datetime.datetime.strptime(stamp[:26], '%Y-%m-%d %H:%M:%S.%f').timestamp()
+            except ValueError:
+                ts = time.time()
+            return ts, prio, tag, msg
+    return time.time(), None, None, line
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data), 'zstd'
+    return gzip.compress(data, compresslevel=6), 'gzip'
+
+
+def _decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Segment is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class _ActiveSegment:
+    def __init__(self, segment_id, session_id, path):
+        self.id = segment_id
+        self.session_id = session_id
+        self.path = path
+        self.lines = []
+        self.first_ts = None
+        self.last_ts = None
+        self.opened_at = time.time()
+
+
+class LogArchive:
+    """
+    Persistent device log archive.
+
+    Lines arrive from LogTap sinks on the tap's reader thread and are only queued there,
+    so the live stream is never slowed by disk or SQLite. A single writer thread batches
+    them into SQLite (timestamp/priority/tag rows plus a contentless FTS5 index over the
+    message) and into per-session segments that are compressed and written on rotation.
+
+    A segment's text lives only in memory until it is sealed, so after a crash the writer
+    starts by sealing segments whose file made it to disk and dropping the rest.
+    """
+
+    def __init__(self, root=LOGS_DIR, segment_max_lines=SEGMENT_MAX_LINES,
+                 segment_max_seconds=SEGMENT_MAX_SECONDS, max_bytes=ARCHIVE_MAX_BYTES):
+        self.root = root
+        self.segment_max_lines = segment_max_lines
+        self.segment_max_seconds = segment_max_seconds
+        self.max_bytes = max_bytes
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()  # guards _active (read by queries)
+        self._active = {}  # device -> _ActiveSegment
+        self._sessions = {}  # device -> (session_id, platform)
+        self._segment_cache = collections.OrderedDict()  # segment_id -> list of lines
+        self._writer = None
+        self._conn = None
+        self.has_fts = False
+        self.ingested = 0
+        self.ingest_errors = 0
+        self.last_error = None
+        self.recovered = None
+
+    # Ingest
+
+    def sink(self, platform, device):
+        """Return a LogTap sink callable that archives lines for this device."""
+        self._ensure_writer()
+
+        def _sink(line):
+            self._queue.put((platform, device, line))
+        return _sink
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is not None:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            init_log_db()
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        self._conn = get_log_connection()
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self.has_fts = fts5_available(self._conn) and self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'log_fts'").fetchone() is not None
+        try:
+            self._recover_unsealed()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[LogArchive] Recovery error: {e}")
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=1.0))
+                # Drain whatever else is already queued into the same transaction
+                while len(batch) < 5000:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self._ingest(batch)
+                self._rotate_expired()
+            except Exception as e:
+                self.ingest_errors += 1
+                self.last_error = str(e)
+                print(f"[LogArchive] Ingest error: {e}")
+
+    def _recover_unsealed(self):
+        """
+        Seal or drop segments a previous process left open, and end its sessions. Runs on
+        the writer thread before the first batch, so nothing of this process is open yet.
+        """
+        cursor = self._conn.cursor()
+        sealed = dropped = 0
+        segments = cursor.execute(
+            'SELECT id, path, codec FROM log_segments WHERE compressed_size IS NULL').fetchall()
+        for seg in segments:
+            try:
+                os.remove(seg['path'] + '.tmp')
+            except OSError:
+                pass
+            if seg['path'] and os.path.exists(seg['path']):
+                # Written and renamed, but the process died before the row was updated
+                with open(seg['path'], 'rb') as f:
+                    data = f.read()
+                line_count = _decompress(data, seg['codec']).count(b'\n') + 1
+                cursor.execute('''
+                    UPDATE log_segments SET line_count = ?, compressed_size = ?,
+                        first_ts = (SELECT MIN(ts) FROM log_lines WHERE segment_id = ?),
+                        last_ts = (SELECT MAX(ts) FROM log_lines WHERE segment_id = ?)
+                    WHERE id = ?
+                ''', (line_count, len(data), seg['id'], seg['id'], seg['id']))
+                sealed += 1
+            else:
+                # The text was still in memory. Contentless FTS rows cannot be deleted without
+                # it; they no longer join to a log_lines row, so searches never return them.
+                cursor.execute('DELETE FROM log_lines WHERE segment_id = ?', (seg['id'],))
+                cursor.execute('DELETE FROM log_segments WHERE id = ?', (seg['id'],))
+                dropped += 1
+        cursor.execute('''
+            UPDATE log_sessions SET ended_at = COALESCE(
+                (SELECT MAX(last_ts) FROM log_segments WHERE session_id = log_sessions.id), started_at)
+            WHERE ended_at IS NULL
+        ''')
+        self._conn.commit()
+        self.recovered = {"sealed": sealed, "dropped": dropped}
+        if sealed or dropped:
+            print(f"[LogArchive] Recovered unsealed segments: {sealed} sealed, {dropped} dropped")
+
+    def _ingest(self, batch):
+        if not batch:
+            return
+        cursor = self._conn.cursor()
+        fts_rows = []
+        closed = False
+        for platform, device, line in batch:
+            if line is None:
+                self._end_session(cursor, device)
+                closed = True
+                continue
+            seg = self._active.get(device)
+            if seg is None:
+                seg = self._open_segment(cursor, platform, device)
+            ts, prio, tag, msg = parse_line(platform, line)
+            with self._lock:
+                seq = len(seg.lines)
+                seg.lines.append(line)
+            seg.first_ts = ts if seg.first_ts is None else seg.first_ts
+            seg.last_ts = ts
+            cursor.execute(
+                'INSERT INTO log_lines (segment_id, seq, ts, priority, tag) VALUES (?, ?, ?, ?, ?)',
+                (seg.id, seq, ts, prio, tag)
+            )
+            if self.has_fts:
+                fts_rows.append((cursor.lastrowid, msg))
+            if len(seg.lines) >= self.segment_max_lines:
+                self._close_segment(cursor, device)
+                closed = True
+        if fts_rows:
+            cursor.executemany('INSERT INTO log_fts (rowid, message) VALUES (?, ?)', fts_rows)
+        self._conn.commit()
+        self.ingested += len(batch)
+        if closed:
+            # A busy device rotates on line count long before the time limit; keep the quota either way
+            self._enforce_quota()
+
+    def _open_segment(self, cursor, platform, device):
+        session = self._sessions.get(device)
+        if session is None:
+            cursor.execute('INSERT INTO log_sessions (device, platform, started_at) VALUES (?, ?, ?)',
+                           (device, platform, time.time()))
+            session = (cursor.lastrowid, platform)
+            self._sessions[device] = session
+        session_id = session[0]
+        session_dir = os.path.join(self.root, f"session_{session_id}")
+        os.makedirs(session_dir, exist_ok=True)
+        codec = 'zstd' if zstandard is not None else 'gzip'
+        cursor.execute('INSERT INTO log_segments (session_id, path, codec) VALUES (?, ?, ?)',
+                       (session_id, '', codec))
+        segment_id = cursor.lastrowid
+        path = os.path.join(session_dir, f"{segment_id}.log.{'zst' if codec == 'zstd' else 'gz'}")
+        cursor.execute('UPDATE log_segments SET path = ? WHERE id = ?', (path, segment_id))
+        seg = _ActiveSegment(segment_id, session_id, path)
+        with self._lock:
+            self._active[device] = seg
+        return seg
+
+    def _close_segment(self, cursor, device):
+        seg = self._active.get(device)
+        if seg is None:
+            return
+        data, codec = _compress('\n'.join(seg.lines).encode('utf-8'))
+        tmp = seg.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, seg.path)
+        cursor.execute('''
+            UPDATE log_segments SET codec = ?, first_ts = ?, last_ts = ?, line_count = ?, compressed_size = ?
+            WHERE id = ?
+        ''', (codec, seg.first_ts, seg.last_ts, len(seg.lines), len(data), seg.id))
+        with self._lock:
+            del self._active[device]
+
+    def _end_session(self, cursor, device):
+        self._close_segment(cursor, device)
+        session = self._sessions.pop(device, None)
+        if session:
+            cursor.execute('UPDATE log_sessions SET ended_at = ? WHERE id = ?', (time.time(), session[0]))
+
+    def _rotate_expired(self):
+        now = time.time()
+        expired = [d for d, seg in list(self._active.items()) if now - seg.opened_at >= self.segment_max_seconds]
+        if not expired:
+            return
+        cursor = self._conn.cursor()
+        for device in expired:
+            self._close_segment(cursor, device)
+        self._conn.commit()
+        self._enforce_quota()
+
+    def _enforce_quota(self):
+        cursor = self._conn.cursor()
+        total = cursor.execute('SELECT COALESCE(SUM(compressed_size), 0) FROM log_segments').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        segments = cursor.execute('''
+            SELECT s.id, s.path, s.codec, s.compressed_size, ls.platform FROM log_segments s
+            JOIN log_sessions ls ON ls.id = s.session_id
+            WHERE s.compressed_size IS NOT NULL ORDER BY s.id
+        ''').fetchall()
+        for seg in segments:
+            if total <= self.max_bytes:
+                break
+            if self.has_fts:
+                # Contentless FTS5 rows can only be deleted by supplying the original text
+                lines = self._read_segment(seg['id'], seg['path'], seg['codec'])
+                rows = cursor.execute('SELECT id, seq FROM log_lines WHERE segment_id = ?', (seg['id'],)).fetchall()
+                cursor.executemany(
+                    "INSERT INTO log_fts (log_fts, rowid, message) VALUES ('delete', ?, ?)",
+                    [(r['id'], parse_line(seg['platform'], lines[r['seq']])[3]) for r in rows if r['seq'] < len(lines)]
+                )
+            cursor.execute('DELETE FROM log_lines WHERE segment_id = ?', (seg['id'],))
+            cursor.execute('DELETE FROM log_segments WHERE id = ?', (seg['id'],))
+            try:
+                os.remove(seg['path'])
+            except OSError:
+                pass
+            self._segment_cache.pop(seg['id'], None)
+            total -= seg['compressed_size']
+        self._conn.commit()
+
+    # Query
+
+    def _read_segment(self, segment_id, path, codec):
+        with self._lock:
+            for seg in self._active.values():
+                if seg.id == segment_id:
+                    return list(seg.lines)
+            cached = self._segment_cache.get(segment_id)
+            if cached is not None:
+                self._segment_cache.move_to_end(segment_id)
+                return cached
+        try:
+            with open(path, 'rb') as f:
+                lines = _decompress(f.read(), codec).decode('utf-8', errors='replace').split('\n')
+        except FileNotFoundError:
+            return []
+        with self._lock:
+            self._segment_cache[segment_id] = lines
+            while len(self._segment_cache) > 16:
+                self._segment_cache.popitem(last=False)
+        return lines
+
+    def search(self, q=None, device=None, since=None, until=None, priority=None, tag=None,
+               session_id=None, limit=200):
+        """
+        Search archived lines across sessions, newest first.
+
+        `q` is an FTS5 query over the message text; the other filters use the indexed
+        columns. Only the segments containing matches are decompressed.
+        """
+        self._ensure_writer()
+        conn = get_log_connection()
+        try:
+            has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'log_fts'").fetchone() is not None
+            clauses = []
+            params = []
+            columns = '''
+                SELECT l.id, l.segment_id, l.seq, l.ts, l.priority, l.tag,
+                       s.path, s.codec, s.session_id, ls.device, ls.platform
+            '''
+            if q and has_fts:
+                # Drive the query from the FTS index in rowid (= ingest) order so LIMIT stops early
+                sql = columns + '''
+                    FROM log_fts f
+                    CROSS JOIN log_lines l ON l.id = f.rowid
+                    JOIN log_segments s ON s.id = l.segment_id
+                    JOIN log_sessions ls ON ls.id = s.session_id
+                '''
+                clauses.append('log_fts MATCH ?')
+                params.append(q)
+                order = ' ORDER BY f.rowid DESC'
+            else:
+                sql = columns + '''
+                    FROM log_lines l
+                    JOIN log_segments s ON s.id = l.segment_id
+                    JOIN log_sessions ls ON ls.id = s.session_id
+                '''
+                order = ' ORDER BY l.ts DESC, l.id DESC'
+            if device:
+                clauses.append('ls.device = ?')
+                params.append(device)
+            if session_id is not None:
+                clauses.append('s.session_id = ?')
+                params.append(session_id)
+            if since is not None:
+                clauses.append('l.ts >= ?')
+                params.append(since)
+            if until is not None:
+                clauses.append('l.ts <= ?')
+                params.append(until)
+            if priority:
+                clauses.append('l.priority = ?')
+                params.append(priority)
+            if tag:
+                clauses.append('l.tag = ?')
+                params.append(tag)
+            if clauses:
+                sql += ' WHERE ' + ' AND '.join(clauses)
+            sql += order
+            # Without FTS5 the text filter runs in Python, so over-fetch candidates
+            sql += ' LIMIT ?'
+            params.append(limit if (has_fts or not q) else limit * 50)
+            rows = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+        results = []
+        for row in rows:
+            lines = self._read_segment(row['segment_id'], row['path'], row['codec'])
+            line = lines[row['seq']] if row['seq'] < len(lines) else ''
+            if q and not has_fts and q.lower() not in line.lower():
+                continue
+            results.append({
+                "ts": row['ts'],
+                "device": row['device'],
+                "platform": row['platform'],
+                "session_id": row['session_id'],
+                "priority": row['priority'],
+                "tag": row['tag'],
+                "line": line,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def stats(self):
+        with self._lock:
+            active = len(self._active)
+        return {"queued": self._queue.qsize(), "active_segments": active, "ingested": self.ingested,
+                "ingest_errors": self.ingest_errors, "last_error": self.last_error,
+                "recovered": self.recovered, "has_fts": self.has_fts}
+
+    def list_sessions(self, device=None, limit=100):
+        self._ensure_writer()
+        conn = get_log_connection()
+        try:
+            sql = '''
+                SELECT ls.*, COUNT(s.id) AS segments, COALESCE(SUM(s.line_count), 0) AS lines,
+                       COALESCE(SUM(s.compressed_size), 0) AS compressed_size
+                FROM log_sessions ls LEFT JOIN log_segments s ON s.session_id = ls.id
+            '''
+            params = []
+            if device:
+                sql += ' WHERE ls.device = ?'
+                params.append(device)
+            sql += ' GROUP BY ls.id ORDER BY ls.started_at DESC LIMIT ?'
+            params.append(limit)
+            return [dict(r) for r in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Return the process-wide archive, or None when disabled via DEVICE_LOGS_ARCHIVE=0."""
+    global _archive
+    if os.getenv("DEVICE_LOGS_ARCHIVE", "1") == "0":
+        return None
+    with _archive_lock:
+        if _archive is None:
+            _archive = LogArchive()
+        return _archive
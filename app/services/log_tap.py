@@ -0,0 +1,210 @@
+import asyncio
+import collections
+import subprocess
+import threading
+
+
+class LogSubscription:
+    """A single viewer attached to a LogTap. Lines are delivered on the viewer's event loop."""
+
+    def __init__(self, tap, loop, maxsize):
+        self.tap = tap
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.ended = False
+
+    def _push(self, line):
+        # Runs on self.loop. A slow viewer loses its oldest lines rather than stalling the producer.
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(line)
+
+    async def get(self):
+        """Return the next line, or None once the producer has exited."""
+        return await self.queue.get()
+
+    async def get_batch(self, max_items=500, interval=0.05):
+        """
+        Wait for at least one item, then collect whatever else arrives within `interval`
+        (up to `max_items`) so the caller can ship one frame instead of one per line.
+        Returns None once the producer has exited and everything has been delivered.
+        """
+        if self.ended:
+            return None
+        first = await self.queue.get()
+        if first is None:
+            self.ended = True
+            return None
+        batch = [first]
+        await asyncio.sleep(interval)
+        while len(batch) < max_items and not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is None:
+                self.ended = True
+                break
+            batch.append(item)
+        return batch
+
+    def close(self):
+        self.tap.unsubscribe(self)
+
+
+class LogTap:
+    """
+    One log producer process per device (or per device and source-side filter), fanned
+    out to any number of subscribers.
+
+    The most recent `backlog` lines are kept in a ring buffer and replayed to every new
+    subscriber. When the last subscriber leaves, the process is kept alive for
+    `grace_period` seconds so a page reload does not restart logcat / log stream.
+
+    Sinks are plain callables invoked on the reader thread for every line (and with None
+    at end of stream); they keep the producer alive like a subscriber and must not block.
+    A sink that raises is counted in `sink_errors` and skipped for that line only.
+    """
+
+    def __init__(self, key, spawn, backlog=500, grace_period=10.0, queue_size=2000, parse=None):
+        self.key = key
+        self._spawn = spawn  # callable returning a subprocess.Popen with stdout=PIPE
+        self._parse = parse  # optional: raw line -> item (None to drop the line)
+        self.backlog = collections.deque(maxlen=backlog)
+        self.grace_period = grace_period
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.sinks = []
+        self.process = None
+        self._lock = threading.Lock()
+        self._stop_timer = None
+        self.sink_errors = 0
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _start_locked(self):
+        if self.is_running():
+            return
+        self.process = self._spawn()
+        threading.Thread(target=self._read_loop, args=(self.process,), daemon=True).start()
+
+    def _feed_sinks(self, sinks, line):
+        for sink in sinks:
+            try:
+                sink(line)
+            except Exception as e:
+                # One broken sink must not end the stream for the others or the viewers
+                self.sink_errors += 1
+                if self.sink_errors == 1 or self.sink_errors % 1000 == 0:
+                    print(f"[LogTap] {self.key} sink {sink!r} failed ({self.sink_errors} so far): {e}")
+
+    def _read_loop(self, process):
+        for raw in iter(process.stdout.readline, b''):
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            if self._parse:
+                line = self._parse(line)
+                if line is None:
+                    continue
+            with self._lock:
+                self.backlog.append(line)
+                subscribers = list(self.subscribers)
+                sinks = list(self.sinks)
+            self._feed_sinks(sinks, line)
+            for sub in subscribers:
+                try:
+                    sub.loop.call_soon_threadsafe(sub._push, line)
+                except RuntimeError:
+                    # Subscriber's loop is closed; it will be dropped on unsubscribe
+                    pass
+        process.stdout.close()
+        if process.stderr:
+            err = process.stderr.read()
+            if err:
+                print(f"[LogTap] {self.key} stderr: {err.decode(errors='replace')}")
+        with self._lock:
+            if self.process is not process:
+                # The tap was restarted; the new process's reader owns the viewers now
+                return
+            self.process = None
+            subscribers = list(self.subscribers)
+            sinks = list(self.sinks)
+        # Signal end of stream to current viewers
+        self._feed_sinks(sinks, None)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._push, None)
+            except RuntimeError:
+                pass
+
+    def subscribe(self):
+        """Attach a viewer. Must be called from the viewer's running event loop."""
+        loop = asyncio.get_running_loop()
+        sub = LogSubscription(self, loop, self.queue_size)
+        with self._lock:
+            if self._stop_timer:
+                self._stop_timer.cancel()
+                self._stop_timer = None
+            self._start_locked()
+            # Snapshot and register under the lock so no line is missed or duplicated
+            for line in self.backlog:
+                sub._push(line)
+            self.subscribers.add(sub)
+        return sub
+
+    def add_sink(self, sink):
+        """Attach a line callback and make sure the producer is running."""
+        with self._lock:
+            if self._stop_timer:
+                self._stop_timer.cancel()
+                self._stop_timer = None
+            if sink not in self.sinks:
+                self.sinks.append(sink)
+            self._start_locked()
+
+    def remove_sink(self, sink):
+        with self._lock:
+            if sink in self.sinks:
+                self.sinks.remove(sink)
+        self._schedule_idle_stop()
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self.subscribers.discard(sub)
+        self._schedule_idle_stop()
+
+    def _schedule_idle_stop(self):
+        with self._lock:
+            if self.subscribers or self.sinks or self._stop_timer:
+                return
+            self._stop_timer = threading.Timer(self.grace_period, self._stop_if_idle)
+            self._stop_timer.daemon = True
+            self._stop_timer.start()
+
+    def _stop_if_idle(self):
+        with self._lock:
+            self._stop_timer = None
+            if self.subscribers or self.sinks:
+                return
+            self._terminate_locked()
+
+    def _terminate_locked(self):
+        # self.process is cleared by its reader, which then ends the stream for viewers
+        p = self.process
+        if p and p.poll() is None:
+            p.terminate()
+            try:
+                p.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                p.kill()
+                p.wait()
+
+    def stop(self):
+        """Stop the producer immediately, regardless of subscribers (e.g. device shutdown)."""
+        with self._lock:
+            if self._stop_timer:
+                self._stop_timer.cancel()
+                self._stop_timer = None
+            self._terminate_locked()
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from gitlab.exceptions import GitlabAuthenticationError
+from app.database import get_connection
+from app.services import gitlab_service
+from app.services.build_events import FINISHED_STATUSES, hub, record_pipeline_status
+from app.services.gitlab_http_cache import begin_trace, trace_stats
+
+
+SYNC_INTERVAL = float(os.getenv("PIPELINE_SYNC_INTERVAL", "30"))
+# Service account token; without it the newest session of a build's owner is used
+SYNC_TOKEN = os.getenv("GITLAB_SYNC_TOKEN")
+# updated_after overlap, absorbs clock skew between GitLab and its replicas
+WATERMARK_SLACK = timedelta(seconds=60)
+
+
+def _parse_time(value):
+    # SQLite CURRENT_TIMESTAMP ("2026-10-19 10:00:00", UTC) or GitLab ISO 8601 ("...Z")
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class PipelineSync:
+    """
+    Keeps builds.status, duration and finished_at current without per-pipeline polling.
+
+    Each cycle lists the pipelines of every project with unfinished builds once, filtered
+    by `updated_after` (a per-project watermark taken from GitLab's own updated_at), so
+    pipelines that did not change cost nothing. Only a pipeline that has just finished is
+    fetched individually, once, because the list API omits duration and finished_at.
+    Changes are written to SQLite and published to /gitlab/builds/events subscribers.
+    """
+
+    def __init__(self, get_service, gitlab_url, interval=SYNC_INTERVAL, token=SYNC_TOKEN):
+        self._get_service = get_service
+        self.gitlab_url = gitlab_url
+        self.interval = interval
+        self.token = token
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._watermarks = {}  # project_id -> datetime
+        self._seen = set()  # (project_id, pipeline_id) returned by a listing at least once
+        self.cycles = 0
+        self.last_cycle = None
+        self.last_error = None
+
+    def start(self):
+        if self.interval <= 0 or (self._worker and self._worker.is_alive()):
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._loop, daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[PipelineSync] Sync failed: {e}")
+
+    def _pending(self):
+        """project_id -> {pipeline_id: (status, created_at)} for builds not finished yet."""
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT project_id, pipeline_id, status, MIN(created_at) AS created_at FROM builds
+            WHERE status IS NULL OR status NOT IN ({",".join("?" * len(FINISHED_STATUSES))})
+            GROUP BY project_id, pipeline_id
+        ''', FINISHED_STATUSES)
+        pending = {}
+        for row in cursor.fetchall():
+            pending.setdefault(row["project_id"], {})[row["pipeline_id"]] = (row["status"], row["created_at"])
+        conn.close()
+        return pending
+
+    def _tokens_for(self, project_id):
+        """Tokens to try for a project: the service token, else its build owners' sessions, newest first."""
+        if self.token:
+            return [self.token]
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT s.access_token FROM sessions s JOIN builds b ON b.username = s.username
+            WHERE b.project_id = ? GROUP BY s.access_token ORDER BY MAX(s.created_at) DESC
+        ''', (project_id,))
+        tokens = [row["access_token"] for row in cursor.fetchall()]
+        conn.close()
+        return tokens
+
+    def _sync_project(self, project_id, pipelines):
+        # An expired or revoked session answers 401; fall back to the next owner's session
+        for token in self._tokens_for(project_id):
+            try:
+                return self._sync_with(token, project_id, pipelines)
+            except GitlabAuthenticationError as e:
+                print(f"[PipelineSync] Token rejected for project {project_id}, trying the next session: {e}")
+        return 0, 0
+
+    def _sync_with(self, token, project_id, pipelines):
+        watermark = self._watermarks.get(project_id) or datetime.now(timezone.utc) - WATERMARK_SLACK
+        for pipeline_id, (_, created_at) in pipelines.items():
+            if (project_id, pipeline_id) not in self._seen and created_at:
+                # Not listed yet: make sure the window reaches back to when it was triggered
+                start = _parse_time(created_at) - WATERMARK_SLACK
+                watermark = min(watermark, start)
+
+        project = self._get_service(self.gitlab_url, token).gl.projects.get(project_id, lazy=True)
+        listed = updated = 0
+        newest = None
+        # no-cache: revalidate instead of accepting the dashboard's freshness window
+        for pipeline in project.pipelines.list(updated_after=watermark.isoformat(), per_page=100, iterator=True,
+                                               extra_headers={"Cache-Control": "no-cache"}):
+            listed += 1
+            updated_at = _parse_time(pipeline.updated_at)
+            newest = updated_at if newest is None else max(newest, updated_at)
+            if pipeline.id not in pipelines:
+                continue
+            self._seen.add((project_id, pipeline.id))
+            if pipeline.status == pipelines[pipeline.id][0]:
+                continue
+            duration = finished_at = None
+            if pipeline.status in FINISHED_STATUSES:
+                details = project.pipelines.get(pipeline.id, extra_headers={"Cache-Control": "no-cache"})
+                duration, finished_at = details.duration, details.finished_at
+            events = record_pipeline_status(project_id, pipeline.id, pipeline.status, duration, finished_at)
+            for event in events:
+                hub.publish(event)
+            updated += 1 if events else 0
+        if newest is not None:
+            watermark = max(watermark, newest - WATERMARK_SLACK)
+        self._watermarks[project_id] = watermark
+        return listed, updated
+
+    def sync_once(self):
+        """Run one sync cycle now; returns its summary."""
+        with self._lock:
+            trace = begin_trace()
+            started = time.time()
+            pending = self._pending()
+            listed = updated = 0
+            errors = {}
+            for project_id, pipelines in pending.items():
+                # One unreachable or forbidden project must not hold back the others
+                try:
+                    project_listed, project_updated = self._sync_project(project_id, pipelines)
+                except Exception as e:
+                    errors[project_id] = str(e)
+                    print(f"[PipelineSync] Sync of project {project_id} failed: {e}")
+                    continue
+                listed += project_listed
+                updated += project_updated
+            if errors:
+                self.last_error = "; ".join(f"project {p}: {e}" for p, e in errors.items())
+            seconds = time.time() - started
+            trace_stats.record("pipeline_sync", trace, seconds)
+            self.cycles += 1
+            self.last_cycle = {
+                "projects": len(pending),
+                "unfinished_builds": sum(len(p) for p in pending.values()),
+                "pipelines_listed": listed,
+                "builds_updated": updated,
+                "failed_projects": sorted(errors),
+                "gitlab_calls": trace.network,
+                "cached": trace.cached + trace.coalesced,
+                "seconds": round(seconds, 3),
+            }
+            return self.last_cycle
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "running": bool(self._worker and self._worker.is_alive()),
+            "cycles": self.cycles,
+            "last_cycle": self.last_cycle,
+            "last_error": self.last_error,
+            "watermarks": {project_id: w.isoformat() for project_id, w in self._watermarks.items()},
+        }
+
+
+pipeline_sync = PipelineSync(gitlab_service.get_service, os.getenv("GITLAB_URL", "https://git.iris.nitk.ac.in"))
@@ -0,0 +1,449 @@
+import asyncio
+import io
+import os
+import shutil
+import stat
+import struct
+import zlib
+import httpx
+from app.services.gitlab_http_cache import count_call
+
+
+TAIL_BYTES = 64 * 1024  # first ranged read: end of central directory plus, usually, the whole directory
+MAX_GAP = 256 * 1024  # members closer than this are fetched in one ranged request, gap discarded
+CHUNK_SIZE = 1024 * 1024
+RETRIES = int(os.getenv("ARTIFACT_DOWNLOAD_RETRIES", "5"))
+RETRY_BACKOFF = 0.5  # seconds, doubled per attempt
+EXTRACT_WORKERS = int(os.getenv("ARTIFACT_EXTRACT_WORKERS", "4"))  # threads (local ZIP) or ranged GETs (remote)
+MIN_SPAN = 4 * 1024 * 1024  # a run is only split across parallel GETs into pieces at least this large
+
+_EOCD = struct.Struct("<IHHHHIIH")
+_EOCD64_LOCATOR = struct.Struct("<IIQI")
+_EOCD64 = struct.Struct("<IQHHIIQQQQ")
+_CENTRAL = struct.Struct("<IHHHHHHIIIHHHHHII")
+_LOCAL = struct.Struct("<IHHHHHIIIHH")
+
+
+def open_for_write(path):
+    return open(path, "wb")
+
+
+def unix_mode(external_attr):
+    # ZIPs written on macOS/Linux keep st_mode in the high 16 bits
+    return (external_attr >> 16) & 0xFFFF
+
+
+def is_symlink(external_attr):
+    return stat.S_ISLNK(unix_mode(external_attr))
+
+
+def apply_mode(path, external_attr):
+    """Restore the permission bits recorded in the archive (the app binary must stay executable)."""
+    mode = unix_mode(external_attr) & 0o777
+    if mode:
+        os.chmod(path, mode)
+
+
+def member_path(root, relative):
+    """root/relative, refusing absolute member names and `..` escapes."""
+    path = os.path.normpath(os.path.join(root, relative))
+    if os.path.isabs(relative) or os.path.relpath(path, root).startswith(os.pardir):
+        raise UnsafeMember(f"{relative} would be extracted outside {root}")
+    return path
+
+
+def make_symlink(root, path, target):
+    """Create a symlink from the archive (e.g. Versions/Current -> A); it must point inside root."""
+    resolved = os.path.normpath(os.path.join(os.path.dirname(path), target))
+    if os.path.isabs(target) or os.path.relpath(resolved, root).startswith(os.pardir):
+        raise UnsafeMember(f"Symlink {path} -> {target} points outside {root}")
+    if os.path.lexists(path):
+        os.remove(path)
+    # ZIPs need not list directories, and a link can be the only member of its folder
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.symlink(target, path)
+
+
+class RangeNotSupported(Exception):
+    """The server ignored the Range header; use a full download instead."""
+
+
+class RemoteZipError(Exception):
+    pass
+
+
+class TruncatedResponse(RemoteZipError):
+    """A ranged response ended before the bytes it promised; worth retrying."""
+
+
+class UnsafeMember(Exception):
+    """An archive member or symlink would land outside the extraction directory."""
+
+
+class RemoteMember:
+    __slots__ = ("name", "method", "crc", "compressed_size", "size", "offset", "end", "external_attr")
+
+    def __init__(self, name, method, crc, compressed_size, size, offset, external_attr):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.compressed_size = compressed_size
+        self.size = size
+        self.offset = offset
+        self.end = None  # offset of the next local header (or the central directory)
+        self.external_attr = external_attr
+
+    @property
+    def is_dir(self):
+        return self.name.endswith('/')
+
+
+class _RangeReader:
+    """
+    Sequential reads over a streamed ranged response for archive bytes start..end,
+    tracking the archive offset. A dropped connection is reopened from the first byte
+    not yet received, so callers (and a member's inflater) just see a slower stream.
+    """
+
+    def __init__(self, remote, start, end):
+        self._remote = remote
+        self._end = end
+        self._received = start  # archive offset of the next byte to arrive
+        self._response = None
+        self._chunks = None
+        self._buffer = bytearray()
+        self.position = start
+
+    async def _open(self):
+        self._response = await self._remote._send(f"bytes={self._received}-{self._end}")
+        first, _ = self._remote._content_range(self._response)
+        if first != self._received:
+            await self.close()
+            raise RemoteZipError(f"Server returned range starting at {first}, expected {self._received}")
+        self._chunks = self._response.aiter_bytes(CHUNK_SIZE)
+
+    async def _next_chunk(self):
+        attempt = 0
+        while True:
+            try:
+                if self._chunks is None:
+                    await self._open()
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                error = TruncatedResponse(f"Ranged response ended at {self._received}, expected {self._end + 1}")
+            except httpx.TransportError as e:
+                error = e
+            else:
+                self._received += len(chunk)
+                self._remote._received(len(chunk))
+                return chunk
+            await self.close()
+            await self._remote._retrying(attempt, error)
+            attempt += 1
+
+    async def close(self):
+        if self._response is not None:
+            await self._response.aclose()
+        self._response = self._chunks = None
+
+    async def _fill(self, n):
+        while len(self._buffer) < n:
+            self._buffer.extend(await self._next_chunk())
+
+    async def read(self, n):
+        await self._fill(n)
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        self.position += n
+        return data
+
+    async def iter_bytes(self, n):
+        """Yield exactly n bytes in chunks as they arrive."""
+        while n > 0:
+            if not self._buffer:
+                self._buffer.extend(await self._next_chunk())
+            take = min(n, len(self._buffer), CHUNK_SIZE)
+            data = bytes(self._buffer[:take])
+            del self._buffer[:take]
+            self.position += take
+            n -= take
+            yield data
+
+    async def skip_to(self, offset):
+        async for _ in self.iter_bytes(offset - self.position):
+            pass
+
+
+class RemoteZip:
+    """
+    Reads members of a ZIP served over HTTP without downloading the whole archive.
+
+    open() fetches the end of the file with one suffix-range GET and parses the central
+    directory from it (a second ranged GET only when the directory is larger than the
+    tail). Members are then streamed out of the ranges that hold them: members close to
+    each other share one request, and a large run is split at member boundaries into up
+    to EXTRACT_WORKERS ranged GETs fetched in parallel. Permission bits and symlinks
+    recorded in the archive are restored. Raises RangeNotSupported when the server
+    answers a ranged GET with the full body.
+
+    A dropped connection is reopened (RETRIES times in a row, with backoff) from the
+    first byte not yet received, so a transfer never starts over. progress(done, total)
+    is called as member bytes arrive.
+    """
+
+    def __init__(self, client, url, headers=None, progress=None):
+        self.client = client
+        self.url = url
+        self.headers = dict(headers or {})
+        self.progress = progress
+        self.size = None
+        self.members = {}  # name -> RemoteMember
+        self.requests = 0
+        self.bytes_fetched = 0
+        self.retries = 0
+        self.planned_bytes = 0
+        self.done_bytes = 0
+        self.links = {}  # target path -> link target, for symlink members
+
+    async def _retrying(self, attempt, error):
+        if attempt >= RETRIES:
+            raise error
+        self.retries += 1
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    async def _fetch(self, start, end=None):
+        """Return (body, content_range_start, total_size) for bytes start..end (inclusive)."""
+        spec = f"bytes={start}-{'' if end is None else end}" if start >= 0 else f"bytes={start}"
+        for attempt in range(RETRIES + 1):
+            try:
+                async with self._stream(spec) as res:
+                    first, total = self._content_range(res)  # before reading: a 200 would be the whole archive
+                    body = await res.aread()
+                break
+            except httpx.TransportError as e:
+                await self._retrying(attempt, e)
+        self.bytes_fetched += len(body)
+        return body, first, total
+
+    def _stream(self, spec):
+        self.requests += 1
+        count_call("network")
+        return self.client.stream("GET", self.url, headers={**self.headers, "Range": spec}, follow_redirects=True)
+
+    async def _send(self, spec):
+        self.requests += 1
+        count_call("network")
+        request = self.client.build_request("GET", self.url, headers={**self.headers, "Range": spec})
+        return await self.client.send(request, stream=True, follow_redirects=True)
+
+    def _content_range(self, res):
+        if res.status_code == 200:
+            raise RangeNotSupported(f"{self.url} ignored the Range header")
+        if res.status_code != 206:
+            raise RemoteZipError(f"Ranged GET failed with {res.status_code}")
+        # Content-Range: bytes 100-199/5000
+        span, _, total = res.headers.get("Content-Range", "").rpartition("/")
+        first = span.split(" ")[-1].split("-")[0]
+        return int(first), int(total)
+
+    async def open(self):
+        tail, tail_start, self.size = await self._fetch(-TAIL_BYTES)
+        eocd_at = tail.rfind(b"PK\x05\x06")
+        if eocd_at < 0:
+            raise RemoteZipError("End of central directory not found (comment too long or not a ZIP)")
+        _, _, _, _, count, cd_size, cd_offset, _ = _EOCD.unpack_from(tail, eocd_at)
+        if count == 0xFFFF or cd_size == 0xFFFFFFFF or cd_offset == 0xFFFFFFFF:
+            count, cd_size, cd_offset = await self._read_zip64_end(tail, tail_start, eocd_at)
+
+        if cd_offset >= tail_start:
+            directory = tail[cd_offset - tail_start:cd_offset - tail_start + cd_size]
+        else:
+            directory, _, _ = await self._fetch(cd_offset, cd_offset + cd_size - 1)
+        self._parse_directory(directory, count, cd_offset)
+        return self
+
+    async def _read_zip64_end(self, tail, tail_start, eocd_at):
+        locator_at = eocd_at - _EOCD64_LOCATOR.size
+        if locator_at < 0:
+            raise RemoteZipError("ZIP64 locator outside the fetched tail")
+        _, _, eocd64_offset, _ = _EOCD64_LOCATOR.unpack_from(tail, locator_at)
+        if eocd64_offset >= tail_start:
+            record = tail[eocd64_offset - tail_start:]
+        else:
+            record, _, _ = await self._fetch(eocd64_offset, eocd64_offset + _EOCD64.size - 1)
+        fields = _EOCD64.unpack_from(record)
+        return fields[7], fields[8], fields[9]
+
+    def _parse_directory(self, directory, count, cd_offset):
+        position = 0
+        entries = []
+        for _ in range(count):
+            (signature, _, _, flags, method, _, _, crc, compressed_size, size, name_len, extra_len, comment_len,
+             _, _, external_attr, offset) = _CENTRAL.unpack_from(directory, position)
+            if signature != 0x02014B50:
+                raise RemoteZipError("Corrupt central directory")
+            position += _CENTRAL.size
+            raw_name = directory[position:position + name_len]
+            name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+            extra = directory[position + name_len:position + name_len + extra_len]
+            position += name_len + extra_len + comment_len
+            if 0xFFFFFFFF in (compressed_size, size, offset):
+                size, compressed_size, offset = self._zip64_extra(extra, size, compressed_size, offset)
+            entries.append(RemoteMember(name, method, crc, compressed_size, size, offset, external_attr))
+
+        entries.sort(key=lambda m: m.offset)
+        for current, following in zip(entries, entries[1:] + [None]):
+            current.end = following.offset if following else cd_offset
+        self.members = {m.name: m for m in entries}
+
+    @staticmethod
+    def _zip64_extra(extra, size, compressed_size, offset):
+        position = 0
+        while position + 4 <= len(extra):
+            header_id, length = struct.unpack_from("<HH", extra, position)
+            if header_id == 0x0001:
+                values = iter(struct.unpack_from(f"<{length // 8}Q", extra, position + 4))
+                if size == 0xFFFFFFFF:
+                    size = next(values)
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = next(values)
+                if offset == 0xFFFFFFFF:
+                    offset = next(values)
+                break
+            position += 4 + length
+        return size, compressed_size, offset
+
+    def _runs(self, members):
+        """Group members (sorted by offset) into spans fetched with one request each."""
+        runs = []
+        for member in sorted(members, key=lambda m: m.offset):
+            if runs and member.offset - runs[-1][-1].end <= MAX_GAP:
+                runs[-1].append(member)
+            else:
+                runs.append([member])
+        return runs
+
+    async def _write_member(self, reader, member, target_path, open_file):
+        await reader.skip_to(member.offset)
+        header = await reader.read(_LOCAL.size)
+        signature, _, _, _, _, _, _, _, _, name_len, extra_len = _LOCAL.unpack(header)
+        if signature != 0x04034B50:
+            raise RemoteZipError(f"Bad local header for {member.name}")
+        await reader.read(name_len + extra_len)
+
+        if member.method == 8:
+            decompressor = zlib.decompressobj(-15)
+        elif member.method == 0:
+            decompressor = None
+        else:
+            raise RemoteZipError(f"Unsupported compression method {member.method} for {member.name}")
+        crc = 0
+        link = is_symlink(member.external_attr)
+        # A symlink's data is its target; it is created once every file is in place
+        with (io.BytesIO() if link else open_file(target_path)) as target:
+            async for chunk in reader.iter_bytes(member.compressed_size):
+                data = decompressor.decompress(chunk) if decompressor else chunk
+                crc = zlib.crc32(data, crc)
+                target.write(data)
+            if decompressor:
+                data = decompressor.flush()
+                crc = zlib.crc32(data, crc)
+                target.write(data)
+            if link:
+                self.links[target_path] = target.getvalue().decode()
+        if crc != member.crc:
+            raise RemoteZipError(f"CRC mismatch for {member.name}")
+        if not link:
+            apply_mode(target_path, member.external_attr)
+
+    async def extract(self, targets, open_file=open_for_write):
+        """
+        Stream members to disk; targets maps member name -> destination path, opened with
+        open_file (e.g. to hash while writing).
+        """
+        members = [self.members[name] for name in targets]
+        spans = [span for run in self._runs(members) for span in self._split(run, EXTRACT_WORKERS)]
+        self.planned_bytes = sum(span[-1].end - span[0].offset for span in spans)
+        semaphore = asyncio.Semaphore(EXTRACT_WORKERS)
+
+        async def extract_span(span):
+            async with semaphore:
+                await self._extract_run(span, targets, open_file)
+
+        tasks = [asyncio.ensure_future(extract_span(span)) for span in spans]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _split(run, parts):
+        """Cut a run at member boundaries into up to `parts` spans of similar size, fetched in parallel."""
+        size = run[-1].end - run[0].offset
+        parts = max(1, min(parts, size // MIN_SPAN))
+        if parts == 1:
+            return [run]
+        target = size / parts
+        spans, current = [], []
+        for member in run:
+            current.append(member)
+            if current[-1].end - current[0].offset >= target and len(spans) < parts - 1:
+                spans.append(current)
+                current = []
+        if current:
+            spans.append(current)
+        return spans
+
+    async def _extract_run(self, run, targets, open_file):
+        reader = _RangeReader(self, run[0].offset, run[-1].end - 1)
+        try:
+            for member in run:
+                await self._write_member(reader, member, targets[member.name], open_file)
+        finally:
+            await reader.close()
+
+    def _received(self, n):
+        self.bytes_fetched += n
+        self.done_bytes += n
+        if self.progress:
+            self.progress(min(self.done_bytes, self.planned_bytes), self.planned_bytes)
+
+    def stats(self):
+        return {"requests": self.requests, "bytes_fetched": self.bytes_fetched, "archive_size": self.size,
+                "retries": self.retries}
+
+
+async def extract_remote_member(client, url, headers, member, final_path, open_file=open_for_write, progress=None):
+    """Async extract_zip_member over HTTP ranges; returns the RemoteZip for its stats."""
+    remote = await RemoteZip(client, url, headers, progress).open()
+    if member not in remote.members:
+        raise FileNotFoundError(f"File {member} not found in artifact ZIP")
+    await remote.extract({member: final_path}, open_file)
+    return remote
+
+
+async def extract_remote_directory(client, url, headers, directory, final_dir, open_file=open_for_write,
+                                   progress=None):
+    """Async extract_zip_directory over HTTP ranges; returns the RemoteZip for its stats."""
+    remote = await RemoteZip(client, url, headers, progress).open()
+    prefix = directory.rstrip('/') + '/'
+    selected = [m for name, m in remote.members.items() if name.startswith(prefix) and name != prefix]
+    if not selected:
+        raise FileNotFoundError(f"Directory {directory} not found in artifact ZIP")
+
+    if os.path.exists(final_dir):
+        shutil.rmtree(final_dir)
+    os.makedirs(final_dir, exist_ok=True)
+    targets = {}
+    for member in selected:
+        target_path = member_path(final_dir, member.name[len(prefix):])
+        if member.is_dir:
+            os.makedirs(target_path, exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            targets[member.name] = target_path
+    await remote.extract(targets, open_file)
+    for path, target in remote.links.items():
+        make_symlink(final_dir, path, target)
+    return remote
@@ -0,0 +1,149 @@
+import json
+import os
+import subprocess
+import threading
+import time
+
+
+REFRESH_INTERVAL = float(os.getenv("SIM_INVENTORY_REFRESH", "30"))
+# A listing that raced a lifecycle update is re-read at most this many times
+REFRESH_ATTEMPTS = 3
+
+
+def _simctl_list():
+    result = subprocess.run(['xcrun', 'simctl', 'list', '--json'], capture_output=True, text=True)
+    return json.loads(result.stdout)
+
+
+class SimulatorInventory:
+    """
+    Cached `simctl list` output shared by every caller.
+
+    One `xcrun simctl list --json` returns devices, device types and runtimes together, so a
+    refresh is a single fork. Devices are indexed by UDID. A background thread refreshes
+    every `refresh_interval` seconds to pick up changes made outside the farm; lifecycle
+    calls made through the manager update the cache in place (boot, shutdown, delete) or
+    mark it stale (create) so readers never see an outdated state. A listing that was
+    started before such an update may predate it, so it is thrown away and read again.
+    """
+
+    def __init__(self, fetch=_simctl_list, refresh_interval=REFRESH_INTERVAL):
+        self._fetch = fetch
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._devices = {}  # udid -> device dict (with 'runtime')
+        self._device_types = []
+        self._runtimes = []
+        self._loaded_at = None
+        self._stale = True
+        self._mutations = 0  # lifecycle updates applied so far
+        self._refresher = None
+        self.refreshes = 0
+        self.hits = 0
+
+    def refresh(self):
+        """Re-read simctl now; concurrent callers share one fork."""
+        generation = self.refreshes
+        with self._refresh_lock:
+            if self.refreshes != generation and not self._stale:
+                # Someone refreshed while we waited for the lock
+                return
+            for _ in range(REFRESH_ATTEMPTS):
+                with self._lock:
+                    mutations = self._mutations
+                data = self._fetch()
+                devices = {}
+                for runtime, entries in data.get('devices', {}).items():
+                    for device in entries:
+                        device['runtime'] = runtime
+                        devices[device.get('udid')] = device
+                with self._lock:
+                    if self._mutations != mutations:
+                        continue  # a boot/shutdown/delete landed mid-listing; keep the cache and re-read
+                    self._devices = devices
+                    self._device_types = data.get('devicetypes', [])
+                    self._runtimes = data.get('runtimes', [])
+                    self._loaded_at = time.time()
+                    self._stale = False
+                    self.refreshes += 1
+                    return
+
+    def _ensure_loaded(self):
+        self._ensure_refresher()
+        if self._stale:
+            self.refresh()
+        else:
+            self.hits += 1
+
+    def _ensure_refresher(self):
+        if self.refresh_interval <= 0 or (self._refresher and self._refresher.is_alive()):
+            return
+        with self._lock:
+            if self._refresher and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[SimulatorInventory] Background refresh failed: {e}")
+
+    # Reads
+
+    def devices(self):
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(d) for d in self._devices.values()]
+
+    def get(self, udid):
+        self._ensure_loaded()
+        with self._lock:
+            device = self._devices.get(udid)
+            return dict(device) if device else None
+
+    def device_types(self):
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._device_types)
+
+    def runtimes(self):
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._runtimes)
+
+    # Lifecycle updates
+
+    def set_state(self, udid, state):
+        with self._lock:
+            self._mutations += 1
+            device = self._devices.get(udid)
+            if device is None:
+                self._stale = True
+            else:
+                device['state'] = state
+
+    def remove(self, udid):
+        with self._lock:
+            self._mutations += 1
+            self._devices.pop(udid, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._mutations += 1
+            self._stale = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "refreshes": self.refreshes,
+                "hits": self.hits,
+                "stale": self._stale,
+                "age": round(time.time() - self._loaded_at, 1) if self._loaded_at else None,
+                "refresh_interval": self.refresh_interval,
+            }
@@ -0,0 +1,328 @@
+import collections
+import hashlib
+import os
+import subprocess
+import threading
+import time
+from app.services.admission import admission
+
+
+# "discard" deletes returned clones and clones a fresh one; "erase" wipes, re-boots and re-provisions them
+RETURN_MODE = os.getenv("SIM_POOL_RETURN_MODE", "discard")
+GOLDEN_PREFIX = "farm-golden"
+CLONE_PREFIX = "farm-pool"
+
+
+def _short(identifier):
+    # com.apple.CoreSimulator.SimDeviceType.iPhone-15 -> iPhone-15
+    return identifier.rsplit('.', 1)[-1]
+
+
+class PoolConfig:
+    def __init__(self, device_type, runtime, size, preload_apps):
+        self.device_type = device_type
+        self.runtime = runtime
+        self.size = size
+        self.preload_apps = list(preload_apps or [])
+
+    def golden_base(self):
+        return f"{GOLDEN_PREFIX}-{_short(self.device_type)}-{_short(self.runtime)}"
+
+    def golden_name(self):
+        # The preload list is part of the name, so a golden built for other apps is never adopted
+        digest = hashlib.sha1("\n".join(self.preload_apps).encode()).hexdigest()[:8]
+        return f"{self.golden_base()}-{digest}"
+
+
+class SimulatorPool:
+    """
+    Pre-booted simulators cloned from a prepared golden simulator per (device type, runtime).
+
+    The golden device is created once, booted so first-boot data migration happens there,
+    given the preload apps, then shut down; `simctl clone` of a shut-down device copies its
+    data directory, which is far cheaper than `simctl create` plus a cold first boot.
+    A maintenance thread keeps `size` booted clones ready per key. Acquiring takes a ready
+    clone (hit) or clones and boots one on the spot (miss); returned clones are discarded
+    or erased in the background. An erased clone gets the preload apps installed again, and
+    is only kept when the golden it was cloned from is still current.
+    """
+
+    def __init__(self, manager, return_mode=RETURN_MODE):
+        self.manager = manager
+        self.return_mode = return_mode
+        self._cond = threading.Condition()
+        self.configs = {}  # (device_type, runtime) -> PoolConfig
+        self.golden = {}  # key -> golden udid
+        self.ready = collections.defaultdict(collections.deque)  # key -> booted clone udids
+        self.pending = collections.Counter()  # key -> clones being prepared
+        self.in_use = {}  # udid -> key
+        self.origin = {}  # clone udid -> golden udid it was cloned from
+        self._golden_locks = collections.defaultdict(threading.Lock)
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+        self._provision_seconds = {"hit": collections.deque(maxlen=200), "miss": collections.deque(maxlen=200)}
+        self.last_error = None
+
+    # simctl helpers
+
+    def _simctl(self, *args, timeout=600):
+        result = subprocess.run(['xcrun', 'simctl', *args], capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"simctl {args[0]} failed: {result.stderr.strip()}")
+        return result.stdout.strip()
+
+    def _boot(self, udid):
+        # Booting is the expensive part; share the host's boot admission with manual boots
+        ticket = admission.acquire(udid)
+        try:
+            self._simctl('bootstatus', udid, '-b')
+        finally:
+            admission.release(ticket)
+        self.manager.inventory.set_state(udid, 'Booted')
+
+    def _discard(self, udid):
+        try:
+            self._simctl('shutdown', udid)
+        except RuntimeError:
+            pass  # already shut down
+        self._simctl('delete', udid)
+        self.manager.inventory.remove(udid)
+        with self._cond:
+            self.origin.pop(udid, None)
+
+    def _delete_golden(self, udid):
+        try:
+            self._discard(udid)
+        except RuntimeError:
+            self.manager.inventory.remove(udid)  # already gone; don't let the inventory resurrect it
+
+    def _ensure_golden(self, key):
+        with self._golden_locks[key]:
+            udid = self.golden.get(key)
+            if udid:
+                return udid
+            config = self.configs[key]
+            name, base = config.golden_name(), config.golden_base()
+            existing = None
+            for device in self.manager.inventory.devices():
+                device_name = device.get('name') or ''
+                if device_name == name and existing is None:
+                    existing = device
+                elif device_name == base or device_name.startswith(base + '-'):
+                    # Built for a different preload list (or before names carried it)
+                    self._delete_golden(device['udid'])
+            if existing:
+                # Left over from a previous run with the same preload apps: adopt it
+                udid = existing['udid']
+                if existing.get('state') == 'Booted':
+                    self._simctl('shutdown', udid)
+            else:
+                started = time.time()
+                udid = self._simctl('create', name, config.device_type, config.runtime)
+                self.manager.inventory.invalidate()
+                self._boot(udid)
+                for app_path in config.preload_apps:
+                    self._simctl('install', udid, app_path)
+                self._simctl('shutdown', udid)
+                self.manager.inventory.set_state(udid, 'Shutdown')
+                print(f"[SimulatorPool] Prepared golden {name} ({udid}) in {time.time() - started:.1f}s")
+            self.golden[key] = udid
+            return udid
+
+    def _clone_and_boot(self, key):
+        """Clone the key's golden and boot it; returns (clone udid, golden udid it came from)."""
+        golden = self._ensure_golden(key)
+        config = self.configs[key]
+        name = f"{CLONE_PREFIX}-{_short(config.device_type)}-{int(time.time() * 1000) % 10**8}"
+        try:
+            udid = self._simctl('clone', golden, name)
+        except RuntimeError:
+            # Golden device deleted or broken outside the pool: delete it and rebuild once
+            with self._golden_locks[key]:
+                if self.golden.get(key) == golden:
+                    del self.golden[key]
+                    self._delete_golden(golden)
+            golden = self._ensure_golden(key)
+            udid = self._simctl('clone', golden, name)
+        self.manager.inventory.invalidate()
+        try:
+            self._boot(udid)
+        except Exception:
+            self._discard(udid)
+            raise
+        return udid, golden
+
+    def _discard_all(self, udids):
+        for udid in udids:
+            try:
+                self._discard(udid)
+            except Exception as e:
+                print(f"[SimulatorPool] Discarding {udid} failed: {e}")
+
+    # Configuration and maintenance
+
+    def configure(self, device_type, runtime, size, preload_apps=None):
+        """Keep `size` booted clones of device_type/runtime ready; size 0 drains the pool."""
+        key = (device_type, runtime)
+        with self._cond:
+            previous = self.configs.get(key)
+            self.configs[key] = PoolConfig(device_type, runtime, size, preload_apps)
+            if previous and previous.preload_apps != self.configs[key].preload_apps:
+                # The golden image and every clone made from it are stale: rebuild on next use
+                # (the old golden is deleted then, since its name no longer matches)
+                self.golden.pop(key, None)
+                stale = list(self.ready[key])
+                self.ready[key].clear()
+                threading.Thread(target=self._discard_all, args=(stale,), daemon=True).start()
+            self._ensure_worker()
+            self._cond.notify_all()
+        return self.configs[key]
+
+    def _ensure_worker(self):
+        if self._worker and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(target=self._maintain, daemon=True)
+        self._worker.start()
+
+    def _next_task(self):
+        """Return ('fill' | 'drain', key) for the first pool off target, else None."""
+        for key, config in self.configs.items():
+            if len(self.ready[key]) + self.pending[key] < config.size:
+                return 'fill', key
+            if len(self.ready[key]) > config.size:
+                return 'drain', key
+        return None
+
+    def _maintain(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait(timeout=30)
+                    task = self._next_task()
+                action, key = task
+                if action == 'fill':
+                    self.pending[key] += 1
+                else:
+                    udid = self.ready[key].pop()
+            try:
+                if action == 'fill':
+                    udid, golden = self._clone_and_boot(key)
+                    with self._cond:
+                        current = self.golden.get(key) == golden
+                        if current:
+                            self.ready[key].append(udid)
+                            self.origin[udid] = golden
+                            self._cond.notify_all()
+                    if not current:
+                        self._discard(udid)  # the preload apps changed while it was being cloned
+                else:
+                    self._discard(udid)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[SimulatorPool] {action} for {key[0]} failed: {e}")
+                time.sleep(10)
+            finally:
+                if action == 'fill':
+                    with self._cond:
+                        self.pending[key] -= 1
+
+    # Sessions
+
+    def acquire(self, device_type, runtime):
+        """Return a booted simulator for the key; a ready clone when one is available."""
+        key = (device_type, runtime)
+        started = time.time()
+        with self._cond:
+            if key not in self.configs:
+                # Unconfigured keys still get clone provisioning, just nothing kept warm
+                self.configs[key] = PoolConfig(device_type, runtime, 0, None)
+            ready = self.ready[key]
+            udid = ready.popleft() if ready else None
+            hit = udid is not None
+            if hit:
+                self.in_use[udid] = key
+            # Replace what was taken
+            self._ensure_worker()
+            self._cond.notify_all()
+        if not hit:
+            udid, golden = self._clone_and_boot(key)
+            with self._cond:
+                self.in_use[udid] = key
+                self.origin[udid] = golden
+        seconds = round(time.time() - started, 3)
+        with self._cond:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._provision_seconds["hit" if hit else "miss"].append(seconds)
+        return {"udid": udid, "hit": hit, "provisioning_seconds": seconds}
+
+    def owns(self, udid):
+        return udid in self.in_use
+
+    def release(self, udid):
+        """Hand a pooled simulator back; it is recycled in the background."""
+        with self._cond:
+            key = self.in_use.pop(udid, None)
+        if key is None:
+            raise ValueError(f"Simulator {udid} was not provisioned from the pool")
+        self.manager.stop_video_stream(udid)
+        self.manager.stop_log_stream(udid)
+        threading.Thread(target=self._recycle, args=(udid, key), daemon=True).start()
+
+    def _recycle(self, udid, key):
+        try:
+            with self._cond:
+                golden = self.origin.get(udid)
+                reuse = self.return_mode == 'erase' and golden is not None and self.golden.get(key) == golden
+                apps = list(self.configs[key].preload_apps) if key in self.configs else []
+            if not reuse:
+                # Discard mode, or the golden was rebuilt since this clone was made
+                self._discard(udid)
+                return
+            self._simctl('shutdown', udid)
+            # Erase wipes the preload apps along with the session's data; put them back
+            self._simctl('erase', udid)
+            self.manager.inventory.set_state(udid, 'Shutdown')
+            self._boot(udid)
+            for app_path in apps:
+                self._simctl('install', udid, app_path)
+            with self._cond:
+                current = self.golden.get(key) == golden
+                if current:
+                    self.ready[key].append(udid)
+                    self._cond.notify_all()
+            if not current:
+                self._discard(udid)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[SimulatorPool] Recycling {udid} failed: {e}")
+
+    def stats(self):
+        def summary(values):
+            values = sorted(values)
+            if not values:
+                return {"count": 0, "avg": None, "p50": None, "max": None}
+            return {"count": len(values), "avg": round(sum(values) / len(values), 3),
+                    "p50": values[len(values) // 2], "max": values[-1]}
+
+        with self._cond:
+            total = self.hits + self.misses
+            return {
+                "return_mode": self.return_mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+                "provisioning_seconds": {k: summary(v) for k, v in self._provision_seconds.items()},
+                "pools": [
+                    {"device_type": c.device_type, "runtime": c.runtime, "size": c.size,
+                     "ready": len(self.ready[k]), "preparing": self.pending[k],
+                     "golden": self.golden.get(k), "preload_apps": c.preload_apps}
+                    for k, c in self.configs.items()
+                ],
+                "in_use": len(self.in_use),
+                "last_error": self.last_error,
+            }
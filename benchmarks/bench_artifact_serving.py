@@ -0,0 +1,66 @@
+"""
+GET /gitlab/artifacts/file: ETag cost, full and ranged downloads of a stored APK, and the
+ZIP of an .app tree streamed once and then served from the ZIP cache.
+
+    python benchmarks/bench_artifact_serving.py [apk MiB] [app MiB]
+"""
+import common  # noqa: F401  (must come first)
+import os
+import sys
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import database
+from app.routes import gitlab as gitlab_routes
+from app.services import artifact_serving
+from app.services.artifact_catalog import ARTIFACTS_DIR
+from app.services.artifact_store import store
+
+APK_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+APP_MB = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+
+def make_artifacts():
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    block = os.urandom(1 << 20)
+    staged = store.stage_file(".apk")
+    with staged.open() as f:
+        for _ in range(APK_MB):
+            f.write(block)
+    staged.commit(os.path.join(ARTIFACTS_DIR, "1.apk"))
+
+    tree = store.stage_tree()
+    for i in range(APP_MB * 4):
+        directory = os.path.join(tree.path, "Frameworks", f"F{i // 32}.framework")
+        os.makedirs(directory, exist_ok=True)
+        with tree.open(os.path.join(directory, f"res{i}.bin")) as f:
+            f.write(os.urandom(128 * 1024) + bytes(128 * 1024))  # half compressible
+    tree.commit(os.path.join(ARTIFACTS_DIR, "1.app"))
+
+
+def main():
+    database.init_db()
+    make_artifacts()
+    app = FastAPI()
+    app.include_router(gitlab_routes.router)
+    client = TestClient(app)
+
+    artifact, seconds = common.timed(artifact_serving.describe, "1.apk")
+    artifact.close()
+    common.report("describe stored APK (no hashing)", seconds)
+    res, seconds = common.timed(client.get, "/gitlab/artifacts/file/1.apk")
+    common.report(f"GET {APK_MB} MiB APK", seconds, mib_s=round(APK_MB / seconds))
+    etag = res.headers["etag"]
+    _, seconds = common.timed(client.get, "/gitlab/artifacts/file/1.apk", headers={"If-None-Match": etag})
+    common.report("conditional GET (304)", seconds)
+    _, seconds = common.timed(client.get, "/gitlab/artifacts/file/1.apk", headers={"Range": "bytes=-1048576"})
+    common.report("GET last MiB (206)", seconds)
+
+    res, seconds = common.timed(client.get, "/gitlab/artifacts/file/1.app")
+    common.report(f"GET {APP_MB} MiB .app, streamed ZIP", seconds, zip_mib=len(res.content) >> 20)
+    _, seconds = common.timed(client.get, "/gitlab/artifacts/file/1.app")
+    common.report(f"GET {APP_MB} MiB .app, cached ZIP", seconds)
+    print(store.stats())
+
+
+if __name__ == "__main__":
+    main()
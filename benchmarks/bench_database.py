@@ -0,0 +1,93 @@
+"""
+SQLite under concurrent API load: readers look up sessions while writers record builds.
+`pool` uses app.database (pooled connections, WAL, busy_timeout); `plain` opens a fresh
+rollback-journal connection per call, as get_connection() did before the pool.
+
+    python benchmarks/bench_database.py [pool|plain] [seconds] [readers] [writers]
+"""
+import common  # noqa: F401  (must come first)
+import sqlite3
+import sys
+import threading
+import time
+from app import database
+
+MODE = sys.argv[1] if len(sys.argv) > 1 else "pool"
+DURATION = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+READERS = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+WRITERS = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+
+
+def plain_connection():
+    conn = sqlite3.connect(database.DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def setup():
+    database.init_db()
+    conn = database.get_connection()
+    conn.executemany("INSERT INTO sessions (session_id, access_token, refresh_token, username) VALUES (?, ?, ?, ?)",
+                     [(f"s{i}", f"t{i}", "r", f"u{i}") for i in range(1000)])
+    conn.commit()
+    conn.close()
+    if MODE == "plain":
+        # Pooled WAL connections would keep the journal mode from being switched back
+        for conn in database._pool._idle:
+            conn.close()
+        database._pool._idle.clear()
+        conn = sqlite3.connect(database.DB_PATH)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        return plain_connection
+    return database.get_connection
+
+
+def main():
+    get_connection = setup()
+    stop = time.time() + DURATION
+    lock = threading.Lock()
+    latencies = {"read": [], "write": []}
+    locked = [0]
+
+    def worker(kind, n):
+        i = 0
+        while time.time() < stop:
+            started = time.perf_counter()
+            try:
+                conn = get_connection()
+                if kind == "read":
+                    conn.execute("SELECT access_token FROM sessions WHERE session_id = ?", (f"s{(n + i * 7) % 1000}",)).fetchone()
+                else:
+                    pipeline_id = n * 10_000_000 + i
+                    conn.execute("INSERT INTO builds (pipeline_id, project_id, ref, username, platform, status) "
+                                 "VALUES (?, 63, 'main', 'u1', 'android', 'created')", (pipeline_id,))
+                    conn.execute("UPDATE builds SET status = 'running' WHERE pipeline_id = ?", (pipeline_id,))
+                    conn.commit()
+                conn.close()
+            except sqlite3.OperationalError:  # "database is locked"
+                with lock:
+                    locked[0] += 1
+                continue
+            finally:
+                i += 1
+            with lock:
+                latencies[kind].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=("read", n)) for n in range(READERS)]
+    threads += [threading.Thread(target=worker, args=("write", n)) for n in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"{MODE}: {READERS} readers, {WRITERS} writers, {DURATION:.0f}s, locked errors {locked[0]}")
+    for kind, values in latencies.items():
+        print(f"  {kind:<5} {len(values) / DURATION:8.0f}/s  p50 {common.percentile(values, 0.5) * 1000:6.2f} ms  "
+              f"p99 {common.percentile(values, 0.99) * 1000:6.2f} ms")
+    if MODE == "pool":
+        print(" ", database.pool_stats())
+
+
+if __name__ == "__main__":
+    main()
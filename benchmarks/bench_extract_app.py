@@ -0,0 +1,46 @@
+"""
+Local extraction of a Runner.app from an artifact ZIP: one worker against the default
+worker count, and the cost of keeping modes and symlinks (checked on the result).
+
+    python benchmarks/bench_extract_app.py [app MiB]
+"""
+import common  # noqa: F401  (must come first)
+import os
+import stat
+import sys
+import zipfile
+from app.services.gitlab_service import extract_zip_directory
+from app.services.remote_zip import EXTRACT_WORKERS
+
+APP_MB = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+PREFIX = "build/ios/iphoneos/Runner.app"
+
+
+def make_archive(path):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        for i in range(APP_MB * 2):
+            name = f"{PREFIX}/Frameworks/F{i // 64}.framework/Versions/A/res{i}.bin"
+            archive.writestr(name, os.urandom(128 << 10) + bytes(384 << 10))  # mostly compressible
+        for f in range((APP_MB * 2 + 63) // 64):
+            link = zipfile.ZipInfo(f"{PREFIX}/Frameworks/F{f}.framework/Versions/Current")
+            link.external_attr = (stat.S_IFLNK | 0o777) << 16
+            archive.writestr(link, "A")
+        binary = zipfile.ZipInfo(f"{PREFIX}/Runner")
+        binary.external_attr = (stat.S_IFREG | 0o755) << 16
+        archive.writestr(binary, os.urandom(8 << 20))
+
+
+def main():
+    make_archive("job.zip")
+    print(f"Runner.app {APP_MB} MiB uncompressed, {os.path.getsize('job.zip') >> 20} MiB zipped, "
+          f"{os.cpu_count()} CPUs")
+    default = min(EXTRACT_WORKERS, os.cpu_count() or 1)
+    for workers in sorted({1, default, EXTRACT_WORKERS}):
+        _, seconds = common.timed(extract_zip_directory, "job.zip", PREFIX, f"out{workers}", workers=workers)
+        common.report(f"extract with {workers} worker(s)", seconds, mib_s=round(APP_MB / seconds))
+        assert os.access(f"out{workers}/Runner", os.X_OK)
+        assert os.path.islink(f"out{workers}/Frameworks/F0.framework/Versions/Current")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Concurrent users on /gitlab/branches: the async route (httpx on the event loop) against
+the same handler written as a plain `def` calling python-gitlab, which Starlette runs
+in its 40-thread pool. The GitLab side is a local HTTP server that answers after a
+fixed latency, and every request goes to it (the conditional cache's fresh window is
+turned off), so throughput is bounded by how many upstream calls can wait at once:
+40 / latency for the threadpool, GITLAB_ASYNC_MAX_CONNECTIONS / latency for the async
+route. The default latency is long enough for the threadpool ceiling to show up before
+either side runs out of CPU on a small machine.
+
+    python benchmarks/bench_gitlab_async.py [users] [requests per user] [latency ms]
+"""
+import common  # noqa: F401  (must come first)
+import asyncio
+import multiprocessing
+import socket
+import sys
+import time
+import httpx
+import uvicorn
+from fastapi import Cookie, FastAPI, HTTPException
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from app import database
+from app.database import get_connection, get_token_from_session
+from app.routes import gitlab as gitlab_routes
+from app.services import gitlab_async, gitlab_service
+from app.services.gitlab_http_cache import shared_cache
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+REQUESTS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+LATENCY = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.5
+BRANCHES = [{"name": f"feature/{i}", "commit": {"id": f"{i:040x}"}, "protected": False, "merged": False}
+            for i in range(20)]
+
+
+async def user(request):
+    await asyncio.sleep(LATENCY)
+    return JSONResponse({"id": 1, "username": "bench"})
+
+
+async def branches(request):
+    await asyncio.sleep(LATENCY)
+    return JSONResponse(BRANCHES)
+
+
+fake_gitlab = Starlette(routes=[
+    Route("/api/v4/user", user),
+    Route("/api/v4/projects/{project_id}/repository/branches", branches),
+])
+
+
+def serve(sock):
+    uvicorn.Server(uvicorn.Config(fake_gitlab, log_level="warning", backlog=4096)).run(sockets=[sock])
+
+
+def start_fake_gitlab():
+    """Serve the fake from its own process so it does not compete with the farm for the GIL."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    multiprocessing.get_context("fork").Process(target=serve, args=(sock,), daemon=True).start()
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    while True:
+        try:
+            httpx.get(f"{url}/api/v4/user", timeout=1)
+            return url
+        except httpx.TransportError:
+            time.sleep(0.05)
+
+
+def threadpool_app(url):
+    """The route as it was before the async client: sync python-gitlab in a worker thread."""
+    app = FastAPI()
+
+    @app.get("/gitlab/branches")
+    def get_branches(dev_farm_session: str = Cookie(None), project_id: int = 63):
+        token = get_token_from_session(dev_farm_session)
+        if not token:
+            raise HTTPException(status_code=401, detail="Invalid session")
+        return {"branches": gitlab_service.get_service(url, token).list_branches(project_id)}
+    return app
+
+
+def async_app():
+    app = FastAPI()
+    app.include_router(gitlab_routes.router)
+    return app
+
+
+def add_sessions():
+    conn = get_connection()
+    conn.executemany("INSERT OR REPLACE INTO sessions (session_id, access_token, username) VALUES (?, ?, ?)",
+                     [(f"s{i}", f"token-{i}", f"user{i}") for i in range(USERS)])
+    conn.commit()
+    conn.close()
+
+
+async def load(app):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+
+    async def one_user(i):
+        async with httpx.AsyncClient(transport=transport, base_url="http://farm",
+                                     cookies={"dev_farm_session": f"s{i}"}, timeout=None) as client:
+            for _ in range(REQUESTS):
+                started = time.perf_counter()
+                res = await client.get("/gitlab/branches")
+                assert res.status_code == 200 and len(res.json()["branches"]) == len(BRANCHES), res.text
+                latencies.append(time.perf_counter() - started)
+
+    # One warm-up request per user so both sides start with authenticated, cached clients
+    async with httpx.AsyncClient(transport=transport, base_url="http://farm") as client:
+        await asyncio.gather(*(client.get("/gitlab/branches", cookies={"dev_farm_session": f"s{i}"})
+                               for i in range(USERS)))
+    started = time.perf_counter()
+    await asyncio.gather(*(one_user(i) for i in range(USERS)))
+    return time.perf_counter() - started, latencies
+
+
+def run(name, app):
+    seconds, latencies = asyncio.run(load(app))
+    common.report(name, seconds, users=USERS, req_per_s=f"{len(latencies) / seconds:.0f}",
+                  p50_ms=f"{common.percentile(latencies, 0.5) * 1000:.0f}",
+                  p99_ms=f"{common.percentile(latencies, 0.99) * 1000:.0f}")
+    return len(latencies) / seconds
+
+
+def main():
+    database.init_db()
+    add_sessions()
+    url = start_fake_gitlab()
+    gitlab_routes.GITLAB_URL = url
+    gitlab_async.async_clients.max_size = gitlab_service.clients.max_size = USERS * 2
+    shared_cache.fresh_seconds = 0
+    print(f"{USERS} users x {REQUESTS} requests, GitLab latency {LATENCY * 1000:.0f} ms")
+    pooled = run("sync def route (threadpool)", threadpool_app(url))
+    evented = run("async route (gitlab_async)", async_app())
+    print(f"speed-up: {evented / pooled:.1f}x; threadpool ceiling ~{40 / LATENCY:.0f} req/s")
+    print(f"client cache: {gitlab_async.async_clients.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+GitLabClientCache against building (and authenticating) a python-gitlab client per
+request, for a few users listing branches. The GitLab side is an in-process server that
+answers after a fixed latency and counts calls per endpoint; the conditional cache's
+fresh window is turned off so every branch listing reaches it. The expiry run uses a
+TTL shorter than the run, so each user is authenticated again once per TTL.
+
+    python benchmarks/bench_gitlab_clients.py [requests per user] [latency ms]
+"""
+import common  # noqa: F401  (must come first)
+import collections
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.services.gitlab_http_cache import shared_cache
+from app.services.gitlab_service import GitLabClientCache, GitLabService
+
+USERS = ["alice", "bob", "carol", "dave"]
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+LATENCY = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+BRANCHES = [{"name": f"feature/{i}", "commit": {"id": f"{i:040x}"}, "protected": False, "merged": False}
+            for i in range(20)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024  # headers and body in one segment, or delayed ACKs add ~40 ms a call
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        self.server.calls[path.rsplit("/", 1)[-1]] += 1
+        time.sleep(LATENCY)
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        body = {"id": 1, "username": token} if path == "/api/v4/user" else BRANCHES
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def run(label, url, get_service):
+    server_calls = server.calls
+    server_calls.clear()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        for user in USERS:
+            begun = time.perf_counter()
+            get_service(url, user).list_branches(63)
+            latencies.append(time.perf_counter() - begun)
+    seconds = time.perf_counter() - started
+    requests = REQUESTS * len(USERS)
+    common.report(label, seconds, requests=requests, auth_calls=server_calls["user"],
+                  round_trips_per_request=round(sum(server_calls.values()) / requests, 2),
+                  p50_ms=round(common.percentile(latencies, 0.5) * 1000, 1),
+                  p95_ms=round(common.percentile(latencies, 0.95) * 1000, 1))
+    return seconds
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.calls = collections.Counter()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    shared_cache.fresh_seconds = 0
+    print(f"{len(USERS)} users x {REQUESTS} requests, GitLab latency {LATENCY * 1000:.0f} ms")
+
+    run("new client per request", url, GitLabService)
+    cache = GitLabClientCache()
+    seconds = run("cached client", url, cache.get)
+    print(f"  {cache.stats()}")
+    # About four expiries per user over a run of the same length
+    cache = GitLabClientCache(ttl=round(seconds / 4, 2))
+    run("cached client, TTL expiring mid-run", url, cache.get)
+    print(f"  {cache.stats()}")
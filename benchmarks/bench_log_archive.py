@@ -0,0 +1,53 @@
+"""
+Log archive ingest throughput (lines/s through the writer thread), archived size after
+compression and quota, and search latency with and without a full-text query.
+
+    python benchmarks/bench_log_archive.py [lines] [quota MiB]
+"""
+import common  # noqa: F401  (must come first)
+import random
+import sys
+import time
+from app.services.log_archive import LogArchive
+
+LINES = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+QUOTA_MB = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+TAGS = ["ActivityManager", "PackageManager", "chromium", "Flutter", "OkHttp", "SurfaceFlinger"]
+WORDS = "started stopped connected request response timeout retry frame rendered cache miss hit".split()
+
+
+def logcat_line(i):
+    words = " ".join(random.choice(WORDS) for _ in range(8))
+    return f"01-15 12:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}.{i % 1000:03d} " \
+           f"{random.choice('VDIWE')}/{random.choice(TAGS)}( {1000 + i % 50}): {words} id={i}"
+
+
+def main():
+    archive = LogArchive(root="logs", segment_max_lines=50_000, max_bytes=QUOTA_MB << 20)
+    sink = archive.sink("android", "emulator-5554")
+    lines = [logcat_line(i) for i in range(LINES)]
+    started = time.perf_counter()
+    for line in lines:
+        sink(line)
+    sink(None)  # end of session closes the last segment
+    while not archive._queue.empty() or archive._active:
+        time.sleep(0.05)
+    seconds = time.perf_counter() - started
+    common.report(f"ingest {LINES} lines", seconds, lines_s=round(LINES / seconds))
+    session = archive.list_sessions()[0]
+    print(f"archived: {session['segments']} segments, {session['lines']} lines, "
+          f"{session['compressed_size'] / 1024:.0f} KiB (quota {QUOTA_MB} MiB, fts={archive.has_fts})")
+
+    for label, kwargs in [("search tag filter", {"tag": "Flutter"}),
+                          ("search full text", {"q": "timeout"}),
+                          ("search full text + priority", {"q": "retry", "priority": "E"})]:
+        runs = []
+        for _ in range(20):
+            results, run = common.timed(archive.search, limit=200, **kwargs)
+            runs.append(run)
+        common.report(label, common.percentile(runs, 0.5), p99_ms=round(common.percentile(runs, 0.99) * 1000, 2),
+                      results=len(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Ranged extraction of artifact members (RemoteZip) against downloading the whole job
+artifact ZIP and extracting locally. The GitLab side is an in-process server modelled
+as a link with a fixed round-trip time and bandwidth, so the comparison is about bytes
+and round trips rather than this machine's disk.
+
+    python benchmarks/bench_remote_zip.py [bandwidth MiB/s] [rtt ms]
+"""
+import common  # noqa: F401  (must come first)
+import asyncio
+import os
+import re
+import sys
+import zipfile
+import httpx
+from app.services.gitlab_service import extract_zip_directory, extract_zip_member
+from app.services.remote_zip import extract_remote_directory, extract_remote_member
+
+BANDWIDTH = float(sys.argv[1]) * (1 << 20) if len(sys.argv) > 1 else 100 * (1 << 20)
+RTT = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+URL = "https://gitlab.test/api/v4/projects/63/jobs/1/artifacts"
+
+
+def make_archive(path):
+    """A job artifact: one APK and one Runner.app next to much larger intermediates and dSYMs."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        archive.writestr("build/app/intermediates/merged.jar", os.urandom(120 << 20))
+        archive.writestr("build/app/outputs/apk/release/app-release.apk", os.urandom(24 << 20))
+        for i in range(400):
+            archive.writestr(f"build/ios/iphoneos/Runner.app/Frameworks/F{i // 40}.framework/res{i}.bin",
+                             os.urandom(32 << 10) + bytes(32 << 10))
+        archive.writestr("build/ios/Runner.app.dSYM/Contents/Resources/DWARF/Runner", os.urandom(80 << 20))
+
+
+class Link:
+    def __init__(self, data):
+        self.data = data
+        self.requests = 0
+        self.bytes = 0
+
+    async def handle(self, request):
+        self.requests += 1
+        body, headers, status = self.data, {}, 200
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("Range", ""))
+        if match:
+            first, last = match.groups()
+            size = len(self.data)
+            start = size - int(last) if not first else int(first)
+            end = size - 1 if not first or not last else min(int(last), size - 1)
+            body, status = self.data[start:end + 1], 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        self.bytes += len(body)
+        await asyncio.sleep(RTT + len(body) / BANDWIDTH)
+        return httpx.Response(status, content=body, headers=headers)
+
+
+async def full_download(client, target):
+    res = await client.get(URL)
+    with open(target, "wb") as f:
+        f.write(res.content)
+
+
+async def run(data, label, work):
+    link = Link(data)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(link.handle)) as client:
+        _, seconds = await timed_async(work(client))
+    common.report(label, seconds, requests=link.requests, mib=round(link.bytes / (1 << 20), 1))
+
+
+async def timed_async(coroutine):
+    started = asyncio.get_running_loop().time()
+    result = await coroutine
+    return result, asyncio.get_running_loop().time() - started
+
+
+async def main():
+    make_archive("job.zip")
+    with open("job.zip", "rb") as f:
+        data = f.read()
+    print(f"artifact ZIP {len(data) / (1 << 20):.0f} MiB, link {BANDWIDTH / (1 << 20):.0f} MiB/s, rtt {RTT * 1000:.0f} ms")
+    apk = "build/app/outputs/apk/release/app-release.apk"
+    app = "build/ios/iphoneos/Runner.app"
+
+    async def apk_full(client):
+        await full_download(client, "full.zip")
+        extract_zip_member("full.zip", apk, "full.apk")
+
+    async def app_full(client):
+        await full_download(client, "full.zip")
+        extract_zip_directory("full.zip", app, "full.app")
+
+    await run(data, "APK: full download + extract", apk_full)
+    await run(data, "APK: ranged extract", lambda c: extract_remote_member(c, URL, {}, apk, "ranged.apk"))
+    await run(data, "Runner.app: full download + extract", app_full)
+    await run(data, "Runner.app: ranged extract", lambda c: extract_remote_directory(c, URL, {}, app, "ranged.app"))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,35 @@
+"""
+Shared setup for the scripts in this directory. Import it before anything from `app`:
+it moves into a scratch directory and points both databases there, so a benchmark
+never touches the farm's real storage/ or *.db files.
+
+Run a benchmark from the repository root, e.g. `python benchmarks/bench_artifact_serving.py`.
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="devfarm-bench-")
+os.chdir(WORKDIR)
+os.environ.setdefault("DEVICE_FARM_DB", os.path.join(WORKDIR, "device_manager.db"))
+os.environ.setdefault("DEVICE_LOGS_DB", os.path.join(WORKDIR, "device_logs.db"))
+os.environ.setdefault("PIPELINE_SYNC_INTERVAL", "0")
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(p * (len(values) - 1))] if values else float("nan")
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def report(name, seconds, **extra):
+    details = " ".join(f"{k}={v}" for k, v in extra.items())
+    print(f"{name:<40} {seconds * 1000:10.2f} ms {details}")
@@ -1,29 +1,13 @@
 import React from 'react'
-import { listBuilds, pipelineStatus, downloadBuildArtifact } from '../services/gitlab.js'
+import { listBuilds, downloadBuildArtifact, subscribeBuildEvents, getPrefetch, setPrefetch } from '../services/gitlab.js'
 
-// Renders a single build card with status polling and download button
-function BuildCard({ build }) {
-  const [status, setStatus] = React.useState(null)
+// Statuses are pushed by the webhook and kept current by the server-side pipeline sync;
+// the list refresh only reconciles anything the event stream missed
+const RECONCILE_MS = 60000
 
-  // Poll pipeline status every 10s continuously
-  React.useEffect(() => {
-    let cancelled = false
-    async function fetchStatus() {
-      try {
-        const s = await pipelineStatus({ pipeline_id: build.pipeline_id })
-        if (cancelled) return
-        setStatus(s)
-      } catch (e) {
-        console.error('pipelineStatus error', e)
-      }
-    }
-    // initial fetch
-    fetchStatus()
-    const interval = setInterval(fetchStatus, 10000)
-    return () => { cancelled = true; clearInterval(interval) }
-  }, [build.pipeline_id])
-
-  const overallSuccess = (status?.status || build.status) === 'success'
+// Renders a single build card with status and download button
+function BuildCard({ build }) {
+  const overallSuccess = build.status === 'success'
   const alreadyDownloaded = !!build.artifact_path
   const downloadLabel = alreadyDownloaded ? 'Re-download Artifact' : 'Download Artifact'
 
@@ -34,10 +18,29 @@ function BuildCard({ build }) {
         <span className={`px-2 py-1 text-xs rounded-md border ${build.platform === 'android' ? 'bg-green-50 text-green-700 border-green-200' : 'bg-indigo-50 text-indigo-700 border-indigo-200'}`}>{build.platform || 'unknown'}</span>
       </div>
       <div className="text-sm text-gray-700 truncate">{build.ref}</div>
-      <div className="text-xs text-gray-600 mt-1">Status: {status?.status || build.status || 'unknown'}</div>
+      <div className="text-xs text-gray-600 mt-1">Status: {build.status || 'unknown'}</div>
+      {build.duration != null && (
+        <div className="text-xs text-gray-600 mt-1">Duration: {Math.floor(build.duration / 60)}m {build.duration % 60}s</div>
+      )}
       {build.artifact_path && (
         <div className="text-xs text-gray-600 mt-1">Artifact: {build.artifact_path}</div>
       )}
+      {build.download && build.download.status !== 'success' && (
+        <div className="text-xs text-gray-600 mt-1">
+          Download: {build.download.status}
+          {build.download.status === 'running' && build.download.bytes_total
+            ? ` ${Math.floor(100 * build.download.bytes_done / build.download.bytes_total)}%` : ''}
+          {build.download.error ? ` (${build.download.error})` : ''}
+        </div>
+      )}
+      {build.prefetch && (
+        <div className="text-xs text-gray-600 mt-1">
+          Prefetch: {build.prefetch.status}
+          {build.prefetch.device ? ` on ${build.prefetch.device}` : ''}
+          {build.prefetch.stages?.total != null ? ` in ${build.prefetch.stages.total}s` : ''}
+          {build.prefetch.error ? ` (${build.prefetch.error})` : ''}
+        </div>
+      )}
       <div className="mt-3 flex gap-2">
         {build.web_url && (
           <a href={build.web_url} target="_blank" rel="noreferrer" className="px-3 py-2 rounded-md border cursor-pointer bg-blue-600 text-white border-blue-600">Open</a>
@@ -65,8 +68,24 @@ function BuildCard({ build }) {
 
 export default function Builds() {
   const [builds, setBuilds] = React.useState([])
+  const [prefetch, setPrefetchState] = React.useState({ enabled: false, install: false })
+
+  React.useEffect(() => {
+    getPrefetch().then(p => setPrefetchState({ enabled: !!p?.enabled, install: !!p?.install }))
+      .catch(e => console.error('getPrefetch error', e))
+  }, [])
+
+  async function updatePrefetch(next) {
+    try {
+      const p = await setPrefetch(next)
+      setPrefetchState({ enabled: !!p?.enabled, install: !!p?.install })
+    } catch (e) {
+      console.error('setPrefetch error', e)
+      alert('Failed to update prefetch settings')
+    }
+  }
 
-  // Initial fetch and periodic refresh every 10s
+  // Initial fetch, then a slow refresh to reconcile anything the event stream missed
   React.useEffect(() => {
     let cancelled = false
     async function fetchBuilds() {
@@ -80,13 +99,55 @@ export default function Builds() {
       }
     }
     fetchBuilds()
-    const interval = setInterval(fetchBuilds, 10000)
+    const interval = setInterval(fetchBuilds, RECONCILE_MS)
     return () => { cancelled = true; clearInterval(interval) }
   }, [])
 
+  // Live status updates from the GitLab webhook
+  React.useEffect(() => {
+    return subscribeBuildEvents((event) => {
+      if (event.type === 'prefetch') {
+        setBuilds(prev => prev.map(b => (
+          b.pipeline_id === event.pipeline_id && b.platform === event.platform
+            ? { ...b, prefetch: event, artifact_path: event.local_path ?? b.artifact_path }
+            : b
+        )))
+        return
+      }
+      if (event.type === 'download') {
+        setBuilds(prev => prev.map(b => (
+          b.pipeline_id === event.pipeline_id && b.platform === event.platform
+            ? { ...b, download: event, artifact_path: event.local_path ?? b.artifact_path }
+            : b
+        )))
+        return
+      }
+      if (event.type !== 'pipeline') return
+      setBuilds(prev => prev.map(b => (
+        b.pipeline_id === event.pipeline_id
+          ? { ...b, status: event.status, duration: event.duration ?? b.duration, finished_at: event.finished_at ?? b.finished_at }
+          : b
+      )))
+    })
+  }, [])
+
   return (
     <div className="bg-white border border-gray-200 rounded-lg p-3">
-      <h2 className="text-xl font-semibold mb-3">Builds</h2>
+      <div className="flex items-center justify-between mb-3">
+        <h2 className="text-xl font-semibold">Builds</h2>
+        <div className="flex gap-3 text-sm text-gray-700">
+          <label className="flex items-center gap-1">
+            <input type="checkbox" checked={prefetch.enabled}
+              onChange={e => updatePrefetch({ enabled: e.target.checked, install: e.target.checked && prefetch.install })} />
+            Download builds when they pass
+          </label>
+          <label className="flex items-center gap-1">
+            <input type="checkbox" checked={prefetch.install} disabled={!prefetch.enabled}
+              onChange={e => updatePrefetch({ enabled: prefetch.enabled, install: e.target.checked })} />
+            Install on my device
+          </label>
+        </div>
+      </div>
       {!builds.length && <div className="text-sm text-gray-500">No builds yet</div>}
       <div className="mt-3 grid gap-3 sm:grid-cols-2 lg:grid-cols-3">
         {builds.map(b => (
@@ -12,16 +12,27 @@ export default function DeviceAndroid() {
   const logWsRef = useRef(null)
   const [logs, setLogs] = useState('')
   const [artifacts, setArtifacts] = useState([])
+  const [artifactsTotal, setArtifactsTotal] = useState(0)
   const [selectedArtifact, setSelectedArtifact] = useState(null)
   const [deviceInfo, setDeviceInfo] = useState(null)
 
+  // Newest pipeline first, one page at a time
   const refreshArtifacts = useCallback(async () => {
     try {
-      const data = await listArtifacts()
+      const data = await listArtifacts({ platform: 'android' })
       setArtifacts(data?.artifacts || [])
+      setArtifactsTotal(data?.total || 0)
     } catch (e) { console.error('listArtifacts error', e) }
   }, [])
 
+  async function loadMoreArtifacts() {
+    try {
+      const data = await listArtifacts({ platform: 'android', offset: artifacts.length })
+      setArtifacts(prev => [...prev, ...(data?.artifacts || [])])
+      setArtifactsTotal(data?.total || 0)
+    } catch (e) { console.error('listArtifacts error', e) }
+  }
+
   useEffect(() => {
     // Fetch artifacts on mount (defer to next tick)
     const id = setTimeout(() => { refreshArtifacts() }, 0)
@@ -208,6 +219,11 @@ export default function DeviceAndroid() {
                   </button>
                 ))}
                 {!artifacts.length && <div className="text-sm text-gray-500 px-2 py-2">No artifacts found</div>}
+                {artifacts.length < artifactsTotal && (
+                  <button className="w-full px-2 py-2 text-sm text-blue-600 cursor-pointer hover:bg-gray-50" onClick={loadMoreArtifacts}>
+                    Load more ({artifactsTotal - artifacts.length} older)
+                  </button>
+                )}
               </div>
               <div className="grid grid-cols-2 gap-2 mt-2">
                 <button className="px-3 py-2 rounded-md border cursor-pointer bg-indigo-600 text-white border-indigo-600" onClick={onInstall}>Boot & Install Selected</button>
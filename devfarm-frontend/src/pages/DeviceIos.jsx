@@ -1,6 +1,6 @@
 import React, { useEffect, useRef, useState, useCallback } from 'react'
 import { useParams } from 'react-router-dom'
-import { openLogStream as openIosLogs, installApp as installIosApp, startSimulator, stopSimulator, deleteSimulator, getDeviceInfo } from '../services/ios.js'
+import { openLogStream as openIosLogs, formatLogRecord, installApp as installIosApp, startSimulator, stopSimulator, deleteSimulator, getDeviceInfo } from '../services/ios.js'
 import { listArtifacts } from '../services/gitlab.js'
 
 // Memoized canvas wrapper to isolate the stream from React re-renders (e.g., logs)
@@ -41,6 +41,7 @@ export default function DeviceIos() {
   const logWsRef = useRef(null)
   const [logs, setLogs] = useState('')
   const [artifacts, setArtifacts] = useState([])
+  const [artifactsTotal, setArtifactsTotal] = useState(0)
   const [selectedArtifact, setSelectedArtifact] = useState(null)
   const [deviceInfo, setDeviceInfo] = useState(null)
   const pendingBlobRef = useRef(null)
@@ -54,13 +55,23 @@ export default function DeviceIos() {
   const logFlushTimerRef = useRef(null)
   const isDownRef = useRef(false)
 
+  // Newest pipeline first, one page at a time
   const refreshArtifacts = useCallback(async () => {
     try {
-      const data = await listArtifacts()
+      const data = await listArtifacts({ platform: 'ios' })
       setArtifacts(data?.artifacts || [])
+      setArtifactsTotal(data?.total || 0)
     } catch (e) { console.error('listArtifacts error', e) }
   }, [])
 
+  async function loadMoreArtifacts() {
+    try {
+      const data = await listArtifacts({ platform: 'ios', offset: artifacts.length })
+      setArtifacts(prev => [...prev, ...(data?.artifacts || [])])
+      setArtifactsTotal(data?.total || 0)
+    } catch (e) { console.error('listArtifacts error', e) }
+  }
+
   useEffect(() => {
     const id = setTimeout(() => { refreshArtifacts() }, 0)
     return () => clearTimeout(id)
@@ -184,7 +195,14 @@ export default function DeviceIos() {
     if (logWsRef.current) { try { logWsRef.current.close() } catch (err) { console.debug('log ws close err', err) } }
     const ws = openIosLogs(udid)
     ws.onopen = () => { console.log('[iOS] Log WS open'); setLogs(l => l + `[System] Log stream connected\n`)}
-    ws.onmessage = (ev) => { logBufferRef.current.push(ev.data) }
+    ws.onmessage = (ev) => {
+      const data = JSON.parse(ev.data)
+      if (Array.isArray(data)) {
+        for (const record of data) logBufferRef.current.push(formatLogRecord(record))
+      } else if (data?.error) {
+        logBufferRef.current.push(`[System] ${data.error}`)
+      }
+    }
     ws.onerror = (e) => console.log('[iOS] Log WS error', e)
     ws.onclose = () => console.log('[iOS] Log WS close')
     logWsRef.current = ws
@@ -320,6 +338,11 @@ export default function DeviceIos() {
                   </button>
                 ))}
                 {!artifacts.length && <div className="text-sm text-gray-500 px-2 py-2">No artifacts found</div>}
+                {artifacts.length < artifactsTotal && (
+                  <button className="w-full px-2 py-2 text-sm text-blue-600 cursor-pointer hover:bg-gray-50" onClick={loadMoreArtifacts}>
+                    Load more ({artifactsTotal - artifacts.length} older)
+                  </button>
+                )}
               </div>
               <div className="grid grid-cols-2 gap-2 mt-2">
                 <button className="px-3 py-2 rounded-md border cursor-pointer bg-indigo-600 text-white border-indigo-600" onClick={onInstall}>Boot & Install Selected</button>
@@ -41,8 +41,25 @@ export async function downloadBuildArtifact({ pipeline_id, platform, project_id
   return res.json()
 }
 
-export async function listArtifacts() {
-  const res = await fetch(`${base}/artifacts`, { credentials: 'include' })
+export async function getPrefetch() {
+  const res = await fetch(`${base}/prefetch`, { credentials: 'include' })
+  return res.json()
+}
+
+export async function setPrefetch({ enabled, install = false }) {
+  const url = new URL(`${base}/prefetch`)
+  url.searchParams.set('enabled', enabled)
+  url.searchParams.set('install', install)
+  const res = await fetch(url, { method: 'PUT', credentials: 'include' })
+  return res.json()
+}
+
+export async function listArtifacts({ platform, limit = 100, offset = 0 } = {}) {
+  const url = new URL(`${base}/artifacts`)
+  if (platform) url.searchParams.set('platform', platform)
+  url.searchParams.set('limit', limit)
+  url.searchParams.set('offset', offset)
+  const res = await fetch(url, { credentials: 'include' })
   return res.json()
 }
 
@@ -57,3 +74,22 @@ export async function listBuilds() {
   const res = await fetch(`${base}/builds`, { credentials: 'include' })
   return res.json()
 }
+
+// Server-Sent Events with build status changes pushed by the GitLab webhook,
+// plus progress of queued artifact downloads.
+// EventSource reconnects on its own; returns a function that closes the stream.
+export function subscribeBuildEvents(onEvent) {
+  const source = new EventSource(`${base}/builds/events`, { withCredentials: true })
+  const handler = (e) => {
+    try {
+      onEvent(JSON.parse(e.data))
+    } catch (err) {
+      console.error('build event parse error', err)
+    }
+  }
+  source.addEventListener('pipeline', handler)
+  source.addEventListener('job', handler)
+  source.addEventListener('download', handler)
+  source.addEventListener('prefetch', handler)
+  return () => source.close()
+}
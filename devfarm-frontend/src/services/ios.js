@@ -41,13 +41,26 @@ export async function installApp({ udid, app_path }) {
   return res.json()
 }
 
-export function openLogStream(udid) {
+// filters: { process, subsystem, level } applied on the simulator via a log predicate.
+// Each message is a JSON array of records: { ts, level, process, pid, subsystem, category, message }
+export function openLogStream(udid, filters = {}) {
   const protocol = BACKEND.startsWith('https') ? 'wss:' : 'ws:'
   const host = BACKEND.replace(/^https?:\/\//, '')
-  const url = `${protocol}//${host}/device-manager/ios/logs/${encodeURIComponent(udid)}`
+  const params = new URLSearchParams()
+  for (const key of ['process', 'subsystem', 'level']) {
+    if (filters[key]) params.set(key, filters[key])
+  }
+  const query = params.toString() ? `?${params}` : ''
+  const url = `${protocol}//${host}/device-manager/ios/logs/${encodeURIComponent(udid)}${query}`
   return new WebSocket(url)
 }
 
+export function formatLogRecord(r) {
+  const ts = (r.ts || '').slice(11, 23)
+  const sub = r.subsystem ? ` [${r.subsystem}${r.category ? ':' + r.category : ''}]` : ''
+  return `${ts} ${r.level || ''} ${r.process || '?'}[${r.pid ?? ''}]${sub} ${r.message ?? ''}`
+}
+
 export function openVideoStream(udid, onData) {
   const protocol = BACKEND.startsWith('https') ? 'wss:' : 'ws:'
   const host = BACKEND.replace(/^https?:\/\//, '')
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# The app resolves its databases and storage/ against the working directory at import time,
+# so point everything at a scratch directory before any test imports it.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="devfarm-tests-")
+os.chdir(WORKDIR)
+os.environ["DEVICE_FARM_DB"] = os.path.join(WORKDIR, "device_manager.db")
+os.environ["DEVICE_LOGS_DB"] = os.path.join(WORKDIR, "device_logs.db")
+os.environ.setdefault("PIPELINE_SYNC_INTERVAL", "0")
+sys.path.insert(0, ROOT)
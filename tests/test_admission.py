@@ -0,0 +1,66 @@
+import threading
+import time
+import pytest
+from app.services.admission import AdmissionController, AdmissionRejected, HostSampler
+
+
+def fake_proc(tmp_path, mem_available_mb=16384, load=0.5, processes=()):
+    (tmp_path / "stat").write_text("cpu  100 0 100 800 0 0 0 0 0 0\n")
+    (tmp_path / "loadavg").write_text(f"{load} {load} {load} 1/100 1234\n")
+    (tmp_path / "meminfo").write_text(f"MemTotal: {32 * 1024 * 1024} kB\nMemAvailable: {mem_available_mb * 1024} kB\n")
+    for pid, argv, rss_kb, ticks in processes:
+        proc = tmp_path / str(pid)
+        proc.mkdir()
+        (proc / "cmdline").write_text("\0".join(argv) + "\0")
+        (proc / "status").write_text(f"Name:\tqemu\nVmRSS:\t{rss_kb} kB\n")
+        (proc / "stat").write_text(f"{pid} (qemu-system) S " + " ".join(["0"] * 10) + f" {ticks} 0 0 0\n")
+    return HostSampler(proc_root=str(tmp_path), cpu_window=0.01)
+
+
+def test_memory_headroom_refuses_boot(tmp_path):
+    controller = AdmissionController(sampler=fake_proc(tmp_path, mem_available_mb=2048), mode="reject",
+                                     est_mb=2048, min_free_mb=1024)
+    with pytest.raises(AdmissionRejected, match="insufficient memory"):
+        controller.acquire("Pixel_7")
+    assert controller.rejected == 1
+
+
+def test_same_device_booted_twice_holds_two_slots(tmp_path):
+    controller = AdmissionController(sampler=fake_proc(tmp_path), max_concurrent=2, mode="reject")
+    first = controller.acquire("Pixel_7")
+    second = controller.acquire("Pixel_7")
+    assert len(controller.booting) == 2
+    with pytest.raises(AdmissionRejected, match="2 boot"):
+        controller.acquire("Pixel_8")
+    controller.release(first)
+    assert len(controller.booting) == 1
+    controller.release(second)
+    assert controller.booting == {}
+
+
+def test_queued_boot_admitted_after_release(tmp_path):
+    controller = AdmissionController(sampler=fake_proc(tmp_path), max_concurrent=1, mode="queue", timeout=5)
+    first = controller.acquire("Pixel_7")
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(controller.acquire("Pixel_8")))
+    waiter.start()
+    time.sleep(0.1)
+    assert controller.status()["waiting"] == ["Pixel_8"]
+    controller.release(first)
+    waiter.join(2)
+    assert admitted and admitted[0].name == "Pixel_8"
+
+
+def test_cpu_percent_is_measured_over_a_fresh_window(tmp_path):
+    sampler = fake_proc(tmp_path)
+    readings = iter([(1000, 10000), (1090, 10100)])  # 90 busy ticks of 100 in the window
+    sampler._cpu_times = lambda: next(readings)
+    assert sampler._cpu_percent() == 90.0
+
+
+def test_emulator_process_usage(tmp_path):
+    sampler = fake_proc(tmp_path, processes=[(4242, ["qemu-system-x86_64", "-avd", "Pixel_7"], 2048000, 500)])
+    found = sampler.find_processes(lambda argv: "-avd" in argv[:-1])
+    assert [pid for pid, _ in found] == [4242]
+    usage = sampler.process_usage(4242)
+    assert usage["rss"] == 2048000 * 1024
@@ -0,0 +1,96 @@
+import os
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import database
+from app.routes import gitlab as gitlab_routes
+from app.services import artifact_catalog
+from app.services.artifact_catalog import ArtifactCatalog
+
+database.init_db()
+
+
+@pytest.fixture
+def artifacts(tmp_path, monkeypatch):
+    conn = database.get_connection()
+    conn.execute("DELETE FROM artifact_catalog")
+    conn.commit()
+    conn.close()
+    root = tmp_path / "artifacts"
+    root.mkdir()
+    (root / "100.apk").write_bytes(b"a" * 100)
+    (root / "temp_7.zip").write_bytes(b"partial")  # full-ZIP fallback still downloading
+    runner = root / "23856" / "Runner.app"
+    runner.mkdir(parents=True)
+    (runner / "Runner").write_bytes(b"r" * 300)
+    (root / "23856" / "notes.txt").write_bytes(b"not part of the app")
+    walks = []
+    real_tree_size = artifact_catalog._tree_size
+    monkeypatch.setattr(artifact_catalog, "_tree_size", lambda path: walks.append(path) or real_tree_size(path))
+    return root, ArtifactCatalog(root=str(root), interval=0), walks
+
+
+def listing(catalog, platform=None):
+    return [(a["filename"], a["pipeline_id"], a["size"]) for a in catalog.page(platform)["artifacts"]]
+
+
+def test_nested_app_is_indexed_under_its_pipeline(artifacts):
+    root, catalog, walks = artifacts
+    assert catalog.reconcile()["added"] == 2
+    assert listing(catalog) == [("23856/Runner.app", 23856, 300), ("100.apk", 100, 100)]
+    assert listing(catalog, "ios")[0][0] == "23856/Runner.app"
+    assert walks == [str(root / "23856" / "Runner.app")]
+
+
+def test_only_changed_entries_are_measured_again(artifacts):
+    root, catalog, walks = artifacts
+    catalog.reconcile()
+    walks.clear()
+    result = catalog.reconcile()
+    assert (result["added"], result["updated"], result["removed"]) == (0, 0, 0)
+    assert walks == []
+
+    # Replacing the Runner.app inside the pipeline folder leaves the folder's own mtime alone
+    runner = root / "23856" / "Runner.app"
+    (runner / "Runner").write_bytes(b"r" * 500)
+    stat = os.stat(root / "23856")
+    os.utime(runner, (stat.st_atime, stat.st_mtime + 10))
+    assert catalog.reconcile()["updated"] == 1
+    assert walks == [str(runner)]
+    assert ("23856/Runner.app", 23856, 500) in listing(catalog)
+
+
+def test_removed_entries_leave_the_catalog(artifacts):
+    root, catalog, _ = artifacts
+    catalog.reconcile()
+    os.remove(root / "100.apk")
+    assert catalog.reconcile()["removed"] == 1
+    assert [name for name, _, _ in listing(catalog)] == ["23856/Runner.app"]
+
+
+def test_newest_pipeline_first_then_by_mtime(artifacts):
+    root, catalog, _ = artifacts
+    for name, mtime in (("99.apk", 1000), ("manual-old.apk", 2000), ("manual-new.apk", 3000)):
+        (root / name).write_bytes(b"x")
+        os.utime(root / name, (mtime, mtime))
+    catalog.reconcile()
+    assert [name for name, _, _ in listing(catalog, "android")] == [
+        "100.apk", "99.apk", "manual-new.apk", "manual-old.apk"]
+    page = catalog.page("android", limit=2, offset=2)
+    assert page["total"] == 4 and [a["filename"] for a in page["artifacts"]] == ["manual-new.apk", "manual-old.apk"]
+
+
+def test_reconcile_route_needs_a_session(artifacts, monkeypatch):
+    _, catalog, _ = artifacts
+    monkeypatch.setattr(gitlab_routes, "artifact_catalog", catalog)
+    conn = database.get_connection()
+    conn.execute("INSERT OR REPLACE INTO sessions (session_id, access_token, username) VALUES ('s1', 'tok', 'alice')")
+    conn.commit()
+    conn.close()
+    app = FastAPI()
+    app.include_router(gitlab_routes.router)
+    client = TestClient(app)
+    assert client.post("/gitlab/artifacts/catalog/reconcile").status_code == 401
+    client.cookies.set("dev_farm_session", "s1")
+    res = client.post("/gitlab/artifacts/catalog/reconcile")
+    assert res.status_code == 200 and res.json()["added"] == 2
@@ -0,0 +1,210 @@
+import collections
+import io
+import json
+import os
+import re
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import database
+from app.routes import gitlab as gitlab_routes
+from app.services import gitlab_async, remote_zip
+from app.services.artifact_downloads import DownloadQueue
+from app.services.artifact_store import ArtifactStore
+
+database.init_db()
+APK = os.urandom(300_000)
+
+
+def build_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("build/app/outputs/flutter-apk/app-debug.apk", APK)
+        archive.writestr("build/reports/lint.html", b"<html></html>")
+    return buffer.getvalue()
+
+
+class FakeGitLab(ThreadingHTTPServer):
+    """Jobs API of one project; artifact responses can be cut off halfway through the body."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.archive = build_zip()
+        self.users = {"tok-alice": "alice", "tok-bob": "bob", "tok-carol": "carol"}
+        self.denied = set()  # tokens that cannot see the job
+        self.drops = 0  # artifact responses still to cut off; -1 cuts off every one
+        self.gate = threading.Event()
+        self.gate.set()
+        self.requests = []  # (path, Range, If-Range) of artifact requests
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if token not in server.users:
+            return self._json(401, {"message": "401 Unauthorized"})
+        path = self.path.split("?")[0]
+        if path == "/api/v4/user":
+            return self._json(200, {"id": 1, "username": server.users[token]})
+        if path == "/api/v4/projects/63":
+            return self._json(200, {"id": 63, "name": "app"})
+        if token in server.denied:
+            return self._json(404, {"message": "404 Not found"})
+        if path == "/api/v4/projects/63/jobs/7":
+            return self._json(200, {"id": 7, "ref": "main", "status": "success", "pipeline": {"id": 5}})
+        if path == "/api/v4/projects/63/jobs/7/artifacts":
+            return self._artifacts(server)
+        return self._json(404, {"message": "404 Not found"})
+
+    def _artifacts(self, server):
+        server.requests.append((self.path, self.headers.get("Range"), self.headers.get("If-Range")))
+        server.gate.wait(5)
+        data, status = server.archive, 200
+        headers = {"ETag": '"zip-1"', "Accept-Ranges": "bytes"}
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range") in (None, '"zip-1"'):
+            first, last = match.groups()
+            size = len(data)
+            start = size - int(last) if not first else int(first)
+            end = size - 1 if not first or not last else min(int(last), size - 1)
+            data, status = data[start:end + 1], 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if server.drops:
+            server.drops -= server.drops > 0
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def gitlab(tmp_path, monkeypatch):
+    server = FakeGitLab()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    artifacts = tmp_path / "artifacts"
+    store = ArtifactStore(root=str(tmp_path / "store"), quota_bytes=1 << 30)
+    monkeypatch.setattr(gitlab_async, "_client", None)  # bound to the loop of whoever used it last
+    monkeypatch.setattr(gitlab_async, "ARTIFACTS_DIR", str(artifacts))
+    monkeypatch.setattr(gitlab_async, "store", store)
+    monkeypatch.setattr(gitlab_async, "RETRY_BACKOFF", 0)
+    monkeypatch.setattr(remote_zip, "RETRY_BACKOFF", 0)
+    monkeypatch.setattr(gitlab_async.catalog, "record", lambda *args, **kwargs: None)
+    monkeypatch.setattr(gitlab_async.async_clients, "_entries", collections.OrderedDict())
+    yield server, artifacts, store
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(gitlab, monkeypatch):
+    server, _, _ = gitlab
+    conn = database.get_connection()
+    conn.executemany("INSERT OR REPLACE INTO sessions (session_id, access_token, username) VALUES (?, ?, ?)",
+                     [(f"s-{name}", token, name) for token, name in server.users.items()])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(gitlab_routes, "GITLAB_URL", server.url)
+    monkeypatch.setattr(gitlab_routes, "downloads", DownloadQueue())
+    app = FastAPI()
+    app.include_router(gitlab_routes.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def queue(client, session, wait=False):
+    client.cookies.set("dev_farm_session", session)
+    return client.post("/gitlab/jobs/7/artifacts", params={"wait": wait})
+
+
+def test_dropped_download_resumes_from_last_byte(gitlab, client):
+    server, artifacts, store = gitlab
+    server.drops = 2
+    res = queue(client, "s-alice", wait=True)
+    assert res.status_code == 200, res.text
+    with open(res.json()["path"], "rb") as f:
+        assert f.read() == server.archive
+
+    first, *resumed = server.requests
+    assert first[1] is None and len(resumed) == 2
+    half = len(server.archive) // 2
+    assert resumed[0][1:] == (f"bytes={half}-", '"zip-1"')
+    assert resumed[1][1] == f"bytes={half + (len(server.archive) - half) // 2}-"
+
+    download = client.get(f"/gitlab/downloads/{res.json()['download']['id']}").json()
+    assert download["status"] == "success"
+    assert download["bytes_done"] == download["bytes_total"] == len(server.archive)
+
+
+def test_failed_extraction_leaves_nothing_behind(gitlab, monkeypatch):
+    server, artifacts, store = gitlab
+    server.drops = -1
+    monkeypatch.setattr(remote_zip, "RETRIES", 1)
+    monkeypatch.setattr(gitlab_async, "RETRIES", 1)
+    service = gitlab_async.AsyncGitLabService(server.url, "tok-alice")
+    member = "build/app/outputs/flutter-apk/app-debug.apk"
+
+    async def extract():
+        try:
+            return await service.download_and_extract_artifact(63, 7, member, "5.apk")
+        finally:
+            await gitlab_async.close_client()
+
+    with pytest.raises(Exception):
+        gitlab_async.asyncio.run(extract())
+    assert not (artifacts / "5.apk").exists()
+    assert not os.listdir(os.path.join(store.root, "tmp"))
+    assert not os.path.exists(os.path.join(store.root, "objects"))
+
+    # The same member extracted from a healthy server is complete
+    server.drops = 0
+    path = gitlab_async.asyncio.run(extract())
+    with open(path, "rb") as f:
+        assert f.read() == APK
+
+
+def test_merge_needs_access_with_own_token(gitlab, client):
+    server, _, _ = gitlab
+    server.gate.clear()  # hold the transfer so later requests find it pending
+    started = queue(client, "s-alice").json()["download"]
+
+    server.denied.add("tok-bob")
+    res = queue(client, "s-bob")
+    assert res.status_code == 404
+    merged = queue(client, "s-carol").json()["download"]
+    assert merged["id"] == started["id"]
+
+    server.gate.set()
+    client.cookies.set("dev_farm_session", "s-carol")
+    download = client.get(f"/gitlab/downloads/{started['id']}").json()
+    assert download["requests"] == 2
+    assert gitlab_routes.downloads.get(started["id"]).usernames == ["alice", "carol"]
+    client.cookies.set("dev_farm_session", "s-bob")
+    assert client.get(f"/gitlab/downloads/{started['id']}").status_code == 404
@@ -0,0 +1,115 @@
+import io
+import os
+import zipfile
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import database
+from app.routes import gitlab as gitlab_routes
+from app.services import artifact_serving
+from app.services.artifact_store import ArtifactStore
+
+database.init_db()
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    """An artifacts dir holding one stored APK (linked into a fresh store) and one copied-in file."""
+    artifacts = tmp_path / "artifacts"
+    artifacts.mkdir()
+    store = ArtifactStore(root=str(tmp_path / "store"), quota_bytes=1 << 30)
+    staged = store.stage_file(".apk")
+    with staged.open() as f:
+        f.write(b"apk" * 1000)
+    digest, _ = staged.commit(str(artifacts / "123.apk"))
+    (artifacts / "manual.apk").write_bytes(b"manual")
+    monkeypatch.setattr(artifact_serving, "ARTIFACTS_DIR", str(artifacts))
+    monkeypatch.setattr(artifact_serving, "store", store)
+    monkeypatch.setattr(artifact_serving, "_digests", artifact_serving.collections.OrderedDict())
+    app = FastAPI()
+    app.include_router(gitlab_routes.router)
+    return store, digest, TestClient(app)
+
+
+def test_describe_holds_stored_object_until_closed(served):
+    store, digest, _ = served
+    artifact = artifact_serving.describe("123.apk")
+    assert artifact.stored and artifact.digest == digest
+    assert store.stats()["in_use"] == 1
+    artifact.close()
+    artifact.close()  # a second close is a no-op
+    assert store.stats()["in_use"] == 0
+
+
+def test_download_releases_hold_and_honours_etag(served):
+    store, digest, client = served
+    res = client.get("/gitlab/artifacts/file/123.apk")
+    assert res.status_code == 200 and res.content == b"apk" * 1000
+    assert res.headers["etag"] == f'"{digest}"'
+    assert store.stats()["in_use"] == 0
+
+    res = client.get("/gitlab/artifacts/file/123.apk", headers={"If-None-Match": f'"{digest}"'})
+    assert res.status_code == 304
+    res = client.get("/gitlab/artifacts/file/123.apk", headers={"Range": "bytes=0-2"})
+    assert res.status_code == 206 and res.content == b"apk"
+    res = client.head("/gitlab/artifacts/file/123.apk")
+    assert res.status_code == 200 and res.headers["content-length"] == "3000"
+    assert store.stats()["in_use"] == 0
+
+
+def test_unstored_digests_are_bounded(served, tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_serving, "DIGEST_CACHE_SIZE", 2)
+    for i in range(4):
+        (tmp_path / "artifacts" / f"manual{i}.apk").write_bytes(os.urandom(16))
+        artifact_serving.describe(f"manual{i}.apk")
+    assert len(artifact_serving._digests) == 2
+    assert not artifact_serving._zip_locks
+
+
+def test_zip_locks_are_dropped_after_build(served, tmp_path):
+    store, _, _ = served
+    app_dir = tmp_path / "artifacts" / "Manual.app"
+    app_dir.mkdir()
+    (app_dir / "Info.plist").write_bytes(b"plist")
+    artifact = artifact_serving.describe("Manual.app")
+    assert not artifact.stored
+    assert artifact_serving.build_zip(artifact) is None  # unstored trees are streamed, never cached
+    assert not artifact_serving._zip_locks
+
+
+def test_range_applies_only_while_if_range_matches(served):
+    _, digest, client = served
+    res = client.get("/gitlab/artifacts/file/123.apk", headers={"Range": "bytes=2997-", "If-Range": f'"{digest}"'})
+    assert res.status_code == 206 and res.content == b"apk"
+    assert res.headers["content-range"] == "bytes 2997-2999/3000"
+    res = client.get("/gitlab/artifacts/file/123.apk", headers={"Range": "bytes=-3"})
+    assert res.status_code == 206 and res.content == b"apk"
+    # The client's partial copy is of other content: send the whole file
+    res = client.get("/gitlab/artifacts/file/123.apk", headers={"Range": "bytes=3-", "If-Range": '"stale"'})
+    assert res.status_code == 200 and len(res.content) == 3000
+    res = client.get("/gitlab/artifacts/file/123.apk", headers={"Range": "bytes=5000-"})
+    assert res.status_code == 416
+
+
+def test_stored_app_zip_is_cached_with_the_same_etag(served, tmp_path, monkeypatch):
+    store, _, client = served
+    staged = store.stage_tree()
+    for name, data in (("Runner", b"binary" * 100), ("Frameworks/Flutter", b"flutter" * 100)):
+        path = os.path.join(staged.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with staged.open(path) as f:
+            f.write(data)
+    digest, _ = staged.commit(str(tmp_path / "artifacts" / "Runner.app"))
+
+    first = client.get("/gitlab/artifacts/file/Runner.app")
+    assert first.status_code == 200 and "content-length" not in first.headers  # streamed while cached
+    assert first.headers["etag"] == f'"{digest}/Runner.app.zip"'
+    with zipfile.ZipFile(io.BytesIO(first.content)) as archive:
+        assert archive.read("Runner.app/Frameworks/Flutter") == b"flutter" * 100
+
+    streams = []
+    monkeypatch.setattr(artifact_serving, "zip_stream", lambda artifact: streams.append(artifact))
+    second = client.get("/gitlab/artifacts/file/Runner.app")
+    assert not streams and second.headers["content-length"] == str(len(first.content))
+    assert second.headers["etag"] == first.headers["etag"] and second.content == first.content
+    assert store.stats()["in_use"] == 0
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import pytest
+from app import database
+from app.services.artifact_store import ArtifactStore
+
+database.init_db()
+MB = 1 << 20
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Eviction sums every row of artifact_objects, so start from an empty table
+    conn = database.get_connection()
+    conn.execute("DELETE FROM artifact_objects")
+    conn.execute("DELETE FROM artifact_links")
+    conn.commit()
+    conn.close()
+    (tmp_path / "artifacts").mkdir()
+    return ArtifactStore(root=str(tmp_path / "store"), quota_bytes=3 * MB)
+
+
+def put(store, data, link_path=None):
+    staged = store.stage_file(".apk")
+    with staged.open() as f:
+        for i in range(0, len(data), 64 * 1024):
+            f.write(data[i:i + 64 * 1024])
+    return staged.commit(link_path)
+
+
+def put_tree(store, files, links=()):
+    staged = store.stage_tree()
+    for relative, (data, mode) in files.items():
+        path = os.path.join(staged.path, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with staged.open(path) as f:
+            f.write(data)
+        os.chmod(path, mode)
+    for relative, target in links:
+        os.symlink(target, os.path.join(staged.path, relative))
+    return staged.commit()
+
+
+def test_streamed_content_is_hashed_and_stored_once(store, tmp_path):
+    data = os.urandom(MB // 2)
+    digest, path = put(store, data, str(tmp_path / "artifacts" / "1.apk"))
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert open(tmp_path / "artifacts" / "1.apk", "rb").read() == data
+
+    again, again_path = put(store, data, str(tmp_path / "artifacts" / "2.apk"))
+    assert (again, again_path) == (digest, path)
+    assert store.dedup_hits == 1
+    assert not os.listdir(store.tmp_dir)
+    assert store.stats()["objects"] == 1
+    assert os.path.realpath(tmp_path / "artifacts" / "2.apk") == os.path.realpath(path)
+
+
+def test_least_recently_used_goes_first(store, tmp_path):
+    links = [str(tmp_path / "artifacts" / f"{i}.apk") for i in range(4)]
+    first, _ = put(store, os.urandom(MB), links[0])
+    second, _ = put(store, os.urandom(MB), links[1])
+    put(store, os.urandom(MB), links[2])
+    store.touch(first)  # installed again: now newer than the second
+    put(store, os.urandom(MB), links[3])
+
+    assert store.evictions == 1 and store.stats()["bytes"] <= store.quota_bytes
+    assert store.digest_for(links[0]) == first
+    assert not os.path.lexists(links[1])  # the evicted object's link goes with it
+    conn = database.get_connection()
+    assert not conn.execute("SELECT 1 FROM artifact_links WHERE digest = ?", (second,)).fetchone()
+    conn.close()
+
+
+def test_pinned_and_held_objects_are_not_evicted(store, tmp_path):
+    links = [str(tmp_path / "artifacts" / f"{i}.apk") for i in range(5)]
+    pinned, _ = put(store, os.urandom(MB), links[0])
+    held, _ = put(store, os.urandom(MB), links[1])
+    store.set_pinned(pinned, True)
+    with store.using(links[1]):
+        put(store, os.urandom(MB), links[2])
+        put(store, os.urandom(MB), links[3])
+        assert os.path.exists(links[0]) and os.path.exists(links[1])
+        assert not os.path.lexists(links[2])
+    # Releasing counts as a use, so the next object out is the one staged under the hold
+    put(store, os.urandom(MB), links[4])
+    assert os.path.exists(links[1]) and not os.path.lexists(links[3])
+
+
+def test_tree_digest_covers_modes_and_symlinks(store):
+    files = {"Runner": (b"binary", 0o755), "Info.plist": (b"plist", 0o644)}
+    link = [("Current", "Info.plist")]
+    digest, path = put_tree(store, files, link)
+    assert put_tree(store, files, link)[0] == digest
+    assert put_tree(store, dict(files, Runner=(b"binary", 0o644)), link)[0] != digest
+    assert put_tree(store, files, [("Current", "Runner")])[0] != digest
+    assert put_tree(store, files)[0] != digest
+
+    assert os.readlink(os.path.join(path, "Current")) == "Info.plist"
+    assert os.stat(os.path.join(path, "Runner")).st_mode & 0o111
+
+
+def test_deduplicated_object_survives_eviction_until_linked(store, tmp_path, monkeypatch):
+    data = os.urandom(MB)
+    digest, path = put(store, data)
+    for i in range(2):
+        put(store, os.urandom(MB), str(tmp_path / "artifacts" / f"other{i}.apk"))
+    store.quota_bytes = 2 * MB  # the first object is now the eviction candidate
+
+    link = store.link
+
+    def link_after_other_thread_evicts(*args):
+        store.evict()  # another download's commit, between ours and our link
+        return link(*args)
+    monkeypatch.setattr(store, "link", link_after_other_thread_evicts)
+    target = str(tmp_path / "artifacts" / "rebuilt.apk")
+    assert put(store, data, target) == (digest, path)
+    assert open(target, "rb").read() == data
@@ -0,0 +1,85 @@
+import os
+import pytest
+from app.services.avd_catalog import AvdCatalog
+
+
+def write(path, values, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("".join(f"{k}={v}\n" for k, v in values.items()))
+    if mtime is not None:
+        # Explicit mtimes: two writes within one filesystem tick would otherwise look unchanged
+        os.utime(path, ns=(mtime, mtime))
+
+
+def add_avd(home, name, ram="2048", mtime=None):
+    write(str(home / f"{name}.ini"), {"path": str(home / f"{name}.avd"), "target": "android-34"}, mtime)
+    write(str(home / f"{name}.avd" / "config.ini"), {
+        "hw.ramSize": ram, "image.sysdir.1": "system-images/android-34/google_apis/x86_64/",
+        "hw.lcd.width": "1080", "hw.lcd.height": "2400",
+    }, mtime)
+
+
+def touch_dir(path, mtime):
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.fixture
+def home(tmp_path):
+    home = tmp_path / "avd"
+    home.mkdir()
+    add_avd(home, "Pixel_6", mtime=1_000)
+    touch_dir(home, 1_000)
+    return home
+
+
+def test_unchanged_avds_are_not_parsed_again(home, tmp_path):
+    catalog = AvdCatalog(avd_home=str(home), sdk_root=str(tmp_path / "sdk"), check_interval=0)
+    [avd] = catalog.avds()
+    assert avd["ram_mb"] == 2048 and avd["system_image"] == "system-images;android-34;google_apis;x86_64"
+    assert avd["lcd"] == {"width": 1080, "height": 2400, "density": None}
+    catalog.avds()
+    assert catalog.rescans == 1
+
+    # config.ini edited in place: the AVD directory's mtime does not move, the file's does
+    add_avd(home, "Pixel_6", ram="4096", mtime=2_000)
+    touch_dir(home, 1_000)
+    assert catalog.get_avd("Pixel_6")["ram_mb"] == 4096 and catalog.rescans == 2
+
+    add_avd(home, "Pixel_7", mtime=3_000)
+    touch_dir(home, 3_000)
+    assert catalog.avd_names() == ["Pixel_6", "Pixel_7"] and catalog.rescans == 3
+
+    os.remove(home / "Pixel_6.ini")
+    touch_dir(home, 4_000)
+    assert catalog.avd_names() == ["Pixel_7"] and catalog.rescans == 3
+
+
+def test_changes_wait_for_the_check_interval(home, tmp_path):
+    catalog = AvdCatalog(avd_home=str(home), sdk_root=str(tmp_path / "sdk"), check_interval=3600)
+    assert catalog.avd_names() == ["Pixel_6"]
+    add_avd(home, "Pixel_7", mtime=2_000)
+    touch_dir(home, 2_000)
+    assert catalog.avd_names() == ["Pixel_6"]
+    catalog.invalidate()
+    assert catalog.avd_names() == ["Pixel_6", "Pixel_7"]
+
+
+def test_system_images_are_rescanned_only_when_the_tree_changes(tmp_path):
+    sdk = tmp_path / "sdk"
+    props = sdk / "system-images" / "android-34" / "google_apis" / "x86_64" / "source.properties"
+    write(str(props), {"AndroidVersion.ApiLevel": "34", "Pkg.Revision": "12"}, 1_000)
+    catalog = AvdCatalog(avd_home=str(tmp_path / "avd"), sdk_root=str(sdk), check_interval=0)
+    assert [(i["package"], i["revision"]) for i in catalog.system_images()] == [
+        ("system-images;android-34;google_apis;x86_64", "12")]
+    catalog.system_images()
+    assert catalog.rescans == 1
+
+    # An image updated in place only changes its source.properties
+    write(str(props), {"AndroidVersion.ApiLevel": "34", "Pkg.Revision": "13"}, 2_000)
+    assert catalog.system_images()[0]["revision"] == "13" and catalog.rescans == 2
+
+    write(str(sdk / "system-images" / "android-35" / "default" / "arm64-v8a" / "source.properties"),
+          {"AndroidVersion.ApiLevel": "35"})
+    assert [i["api_level"] for i in catalog.system_images()] == [34, 35] and catalog.rescans == 3
+    assert catalog.avds() == []
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import database
+from app.routes import android_device_manager as android_routes
+from app.routes import ios_device_manager as ios_routes
+from app.services import batch_runner
+from app.services.batch_runner import run_batch
+
+database.init_db()
+
+
+class Tracker:
+    """An action that records how many calls overlap."""
+
+    def __init__(self, seconds=0.05):
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.calls = []
+
+    def __call__(self, target):
+        with self.lock:
+            self.calls.append(target)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.seconds)
+            if target.startswith("broken"):
+                raise RuntimeError(f"{target} did not answer")
+            return "Failed: no space left" if target.startswith("full") else f"done {target}"
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def collect(targets, action, concurrency=None):
+    async def main():
+        return [item async for item in run_batch(targets, action, concurrency)]
+    return asyncio.run(main())
+
+
+def test_concurrency_is_limited_and_capped(monkeypatch):
+    action = Tracker()
+    items = collect([f"t{i}" for i in range(8)], action, concurrency=3)
+    assert action.peak == 3 and len(items) == 8
+
+    monkeypatch.setattr(batch_runner, "BATCH_MAX_CONCURRENCY", 2)
+    action = Tracker()
+    collect([f"t{i}" for i in range(6)], action, concurrency=50)
+    assert action.peak == 2
+
+
+def test_results_arrive_as_targets_finish(monkeypatch):
+    durations = {"slow": 0.3, "fast": 0.0}
+    items = collect(["slow", "fast", "slow"], lambda t: time.sleep(durations[t]) or t, concurrency=2)
+    # Duplicates are dropped; the quick target is reported first
+    assert [item["target"] for item in items] == ["fast", "slow"]
+
+
+class FakeAndroidManager:
+    def __init__(self):
+        self.calls = Tracker(seconds=0.01)
+
+    def start_emulator(self, avd_name, log):
+        return self.calls(avd_name)
+
+    def stop_emulator(self, avd_name):
+        return self.calls(avd_name)
+
+    erase_avd = stop_emulator
+
+    def install_app(self, avd_name, app_path):
+        return self.calls(avd_name)
+
+    uninstall_app = install_app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    conn = database.get_connection()
+    conn.execute("INSERT OR REPLACE INTO sessions (session_id, access_token, username) VALUES ('s-batch', 'tok', 'batcher')")
+    conn.execute("DELETE FROM device_usage WHERE username = 'batcher'")
+    conn.commit()
+    conn.close()
+    manager = FakeAndroidManager()
+    monkeypatch.setattr(android_routes, "manager", manager)
+    app = FastAPI()
+    app.include_router(android_routes.router)
+    app.include_router(ios_routes.router)
+    client = TestClient(app)
+    client.cookies.set("dev_farm_session", "s-batch")
+    return client, manager
+
+
+def test_batch_streams_ndjson_and_records_device_use(client):
+    client, manager = client
+    res = client.post("/device-manager/android/batch", json={
+        "operation": "boot", "targets": ["Pixel_6", "broken_AVD", "full_AVD"], "concurrency": 2})
+    assert res.status_code == 200 and res.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    items = {item["target"]: item for item in lines[:-1]}
+    assert items["Pixel_6"] == {"target": "Pixel_6", "ok": True, "result": "done Pixel_6",
+                                "seconds": items["Pixel_6"]["seconds"]}
+    assert items["broken_AVD"]["ok"] is False and items["broken_AVD"]["error"] == "broken_AVD did not answer"
+    assert items["full_AVD"]["ok"] is False  # a "Failed ..." message is a failure too
+    summary = lines[-1]
+    assert (summary["done"], summary["operation"], summary["succeeded"], summary["failed"]) == (True, "boot", 1, 2)
+
+    # Booting from a batch counts as using the device, like the single-device start route
+    conn = database.get_connection()
+    row = conn.execute("SELECT device FROM device_usage WHERE username = 'batcher' AND platform = 'android'").fetchone()
+    conn.close()
+    assert row["device"] in ("Pixel_6", "full_AVD")
+
+
+def test_invalid_batches_are_rejected(client):
+    client, manager = client
+    assert client.post("/device-manager/android/batch", json={"operation": "reboot", "targets": ["a"]}).status_code == 400
+    assert client.post("/device-manager/ios/batch", json={"operation": "install", "targets": ["SIM-1"]}).status_code == 400
+    assert client.post("/device-manager/android/batch", json={"operation": "boot", "targets": []}).status_code == 400
+    assert not manager.calls.calls
@@ -0,0 +1,144 @@
+import asyncio
+import io
+import os
+import threading
+import time
+import pytest
+from app.services import boot_readiness
+from app.services.boot_readiness import BootReadinessTracker
+
+
+def frame(lines):
+    body = "".join(f"{serial}\t{state}\n" for serial, state in lines).encode()
+    return f"{len(body):04x}".encode() + body
+
+
+class FakeTrackDevices:
+    def __init__(self, *updates):
+        self.stdout = io.BytesIO(b"".join(frame(update) for update in updates))
+
+
+def test_serial_that_disappears_is_forgotten(monkeypatch):
+    tracker = BootReadinessTracker()
+    tracker._booted.add("emulator-5554")
+    tracker._avd_names["emulator-5554"] = "Pixel_7"
+    monkeypatch.setattr(boot_readiness.subprocess, "Popen", lambda *a, **k: FakeTrackDevices(
+        [("emulator-5554", "device"), ("emulator-5556", "device")],
+        [("emulator-5556", "device")],
+    ))
+    tracker._track_devices()
+    assert not tracker.is_booted("emulator-5554")
+    assert "emulator-5554" not in tracker._avd_names
+    assert tracker._online == {"emulator-5556"}
+
+
+def test_serial_going_offline_keeps_its_state(monkeypatch):
+    tracker = BootReadinessTracker()
+    tracker._booted.add("emulator-5554")
+    monkeypatch.setattr(boot_readiness.subprocess, "Popen", lambda *a, **k: FakeTrackDevices(
+        [("emulator-5554", "device")],
+        [("emulator-5554", "offline")],
+    ))
+    tracker._track_devices()
+    assert tracker.is_booted("emulator-5554")
+    assert tracker._online == set()
+
+
+class FakeShell:
+    """The `adb shell` watch loop; the test writes the lines the device would print."""
+
+    def __init__(self, args):
+        self.args = args
+        read, self._write = os.pipe()
+        self.stdout = os.fdopen(read, "rb")
+
+    def send(self, line):
+        os.write(self._write, f"{line}\n".encode())
+
+    def exit(self):
+        os.close(self._write)
+
+    def poll(self):
+        return None
+
+    def terminate(self):
+        self.exit()
+
+    def wait(self):
+        return 0
+
+
+@pytest.fixture
+def shells(monkeypatch):
+    started = []
+    monkeypatch.setattr(boot_readiness.subprocess, "Popen", lambda args, **kwargs: started.append(FakeShell(args)) or started[-1])
+    return started
+
+
+def until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_waiters_resolve_on_boot_completed(shells):
+    tracker = BootReadinessTracker()
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(tracker.wait("emulator-5554", timeout=5)))
+               for _ in range(2)]
+    for waiter in waiters:
+        waiter.start()
+
+    async def main():
+        pending = asyncio.ensure_future(tracker.wait_async("emulator-5554", timeout=5))
+        await asyncio.to_thread(until, lambda: len(shells) == 1)
+        shells[0].send("online")
+        shells[0].send("bootanim=running boot_completed=")
+        await asyncio.sleep(0.1)
+        assert not pending.done() and not results
+        shells[0].send("bootanim=stopped boot_completed=1")
+        return await pending
+
+    assert asyncio.run(main()) is True
+    for waiter in waiters:
+        waiter.join(5)
+    assert results == [True, True] and tracker.is_booted("emulator-5554")
+    # Later waiters are answered from the booted set without another adb shell
+    assert tracker.wait("emulator-5554", timeout=0) and len(shells) == 1
+
+
+def test_one_monitor_per_serial(shells):
+    tracker = BootReadinessTracker()
+    first = tracker.watch("emulator-5554")
+    assert tracker.watch("emulator-5554") is first
+    other = tracker.watch("emulator-5556")
+    until(lambda: len(shells) == 2)
+    assert sorted(shell.args[2] for shell in shells) == ["emulator-5554", "emulator-5556"]
+
+    # A monitor whose shell ended before boot completed is replaced on the next watch
+    next(s for s in shells if s.args[2] == "emulator-5554").exit()
+    first.done.wait(5)
+    assert not first.booted.is_set()
+    assert tracker.watch("emulator-5554") is not first
+    until(lambda: len(shells) == 3)
+    assert tracker.watch("emulator-5556") is other
+
+
+def test_phase_timings_are_kept_per_serial(shells, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(boot_readiness.time, "time", lambda: now[0])
+    tracker = BootReadinessTracker()
+    monitor = tracker.watch("emulator-5554", label="Pixel_7")
+    until(lambda: shells)
+    for elapsed, line, phase in ((2.0, "online", "device_online"),
+                                 (5.5, "bootanim=running boot_completed=", "boot_animation"),
+                                 (21.25, "bootanim=stopped boot_completed=1", "boot_completed")):
+        now[0] = 1000.0 + elapsed
+        shells[0].send(line)
+        until(lambda: phase in monitor.phases)
+    monitor.done.wait(5)
+    assert tracker.timings() == [{
+        "serial": "emulator-5554", "label": "Pixel_7", "booted": True, "error": None,
+        "phases": {"device_online": 2.0, "boot_animation": 5.5, "boot_completed": 21.25},
+    }]
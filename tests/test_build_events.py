@@ -0,0 +1,111 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import database
+from app.database import get_connection
+from app.routes import gitlab as gitlab_routes
+from app.services.build_events import BuildEventHub, apply_webhook
+
+database.init_db()
+SECRET = "hook-secret"
+
+
+@pytest.fixture
+def builds():
+    conn = get_connection()
+    conn.execute("DELETE FROM builds")
+    for username in ("alice", "bob"):
+        conn.execute("INSERT INTO builds (pipeline_id, project_id, ref, platform, username, status) "
+                     "VALUES (7, 63, 'main', 'android', ?, 'pending')", (username,))
+    conn.commit()
+    conn.close()
+
+
+def pipeline_hook(status, finished_at=None):
+    return {"object_kind": "pipeline", "project": {"id": 63},
+            "object_attributes": {"id": 7, "status": status, "duration": 30 if finished_at else None,
+                                  "finished_at": finished_at}}
+
+
+def status_of(pipeline_id):
+    conn = get_connection()
+    rows = conn.execute("SELECT status FROM builds WHERE pipeline_id = ?", (pipeline_id,)).fetchall()
+    conn.close()
+    return {row["status"] for row in rows}
+
+
+def test_webhook_requires_the_secret(builds, monkeypatch):
+    app = FastAPI()
+    app.include_router(gitlab_routes.router)
+    client = TestClient(app)
+    monkeypatch.setattr(gitlab_routes, "WEBHOOK_SECRET", None)
+    assert client.post("/gitlab/webhook", json=pipeline_hook("running")).status_code == 503
+
+    monkeypatch.setattr(gitlab_routes, "WEBHOOK_SECRET", SECRET)
+    assert client.post("/gitlab/webhook", json=pipeline_hook("running")).status_code == 401
+    res = client.post("/gitlab/webhook", json=pipeline_hook("running"), headers={"X-Gitlab-Token": "wrong"})
+    assert res.status_code == 401
+    assert status_of(7) == {"pending"}
+
+    res = client.post("/gitlab/webhook", json=pipeline_hook("running"), headers={"X-Gitlab-Token": SECRET})
+    assert res.status_code == 200 and res.json() == {"accepted": "pipeline", "events": 2}
+    assert status_of(7) == {"running"}
+
+
+def test_late_running_event_does_not_undo_success(builds):
+    events = apply_webhook(pipeline_hook("success", "2026-10-19 10:00:00 UTC"))
+    assert {e["username"] for e in events} == {"alice", "bob"}
+    assert apply_webhook(pipeline_hook("running")) == []
+    assert apply_webhook(pipeline_hook("pending")) == []
+    assert status_of(7) == {"success"}
+    # A finished status may still be corrected by another finished status
+    assert apply_webhook(pipeline_hook("failed", "2026-10-19 10:01:00 UTC"))
+    assert status_of(7) == {"failed"}
+
+
+def test_unknown_pipeline_and_job_events(builds):
+    other = pipeline_hook("success")
+    other["object_attributes"]["id"] = 8
+    assert apply_webhook(other) == []
+    job = {"object_kind": "build", "project_id": 63, "pipeline_id": 7, "build_id": 99,
+           "build_name": "build_android", "build_status": "running"}
+    assert sorted(e["username"] for e in apply_webhook(job)) == ["alice", "bob"]
+
+
+def test_fan_out_by_username():
+    async def scenario():
+        hub = BuildEventHub(queue_size=2)
+        alice, everyone = hub.subscribe("alice"), hub.subscribe()
+        for i in range(3):
+            hub.publish({"type": "pipeline", "pipeline_id": i, "username": "alice"})
+        hub.publish({"type": "pipeline", "pipeline_id": 9, "username": "bob"})
+        await asyncio.sleep(0)
+        got_alice = [alice.get_nowait()["pipeline_id"] for _ in range(alice.qsize())]
+        got_everyone = [everyone.get_nowait()["pipeline_id"] for _ in range(everyone.qsize())]
+        return got_alice, got_everyone, hub.stats()
+
+    got_alice, got_everyone, stats = asyncio.run(scenario())
+    assert got_alice == [1, 2]  # a full queue loses its oldest event
+    assert got_everyone == [2, 9]
+    assert stats["published"] == 4 and stats["dropped"] == 3
+
+
+def test_sse_stream_frames():
+    async def scenario():
+        hub = BuildEventHub()
+        stream = hub.stream("alice")
+        frames = [await stream.__anext__()]
+        reader = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        hub.publish({"type": "pipeline", "pipeline_id": 7, "status": "success", "username": "alice"})
+        frames.append(await reader)
+        await stream.aclose()
+        return frames, hub.stats()["subscribers"]
+
+    frames, subscribers = asyncio.run(scenario())
+    assert frames[0] == "retry: 5000\n\n"
+    kind, data = frames[1].strip().split("\n")
+    assert kind == "event: pipeline" and json.loads(data[len("data: "):])["status"] == "success"
+    assert subscribers == 0
@@ -0,0 +1,125 @@
+import asyncio
+import types
+import pytest
+from app import database
+from app.services import build_prefetch, gitlab_async
+from app.services.build_events import hub
+from app.services.build_prefetch import BuildPrefetcher, set_settings
+
+database.init_db()
+
+
+class FakeGitLab:
+    async def get_job_by_name(self, project_id, pipeline_id, job_name):
+        return {"id": pipeline_id * 10, "status": "success"}
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """submit_build stand-in: records each call and finishes, or fails once per pipeline in `failing`."""
+    calls, failing = [], set()
+
+    def submit_build(gl, project_id, pipeline_id, platform, job_id, username=None):
+        calls.append(pipeline_id)
+        done = asyncio.get_running_loop().create_future()
+        if pipeline_id in failing:
+            failing.discard(pipeline_id)
+            done.set_exception(RuntimeError("connection reset"))
+        else:
+            done.set_result(f"storage/artifacts/{pipeline_id}.apk")
+        return types.SimpleNamespace(done=done, started_at=1.0, finished_at=2.0)
+
+    async def get_service(url, token):
+        return FakeGitLab()
+
+    monkeypatch.setattr(build_prefetch, "submit_build", submit_build)
+    monkeypatch.setattr(gitlab_async, "get_service", get_service)
+    set_settings("alice", True, False)
+    conn = database.get_connection()
+    conn.execute("INSERT OR REPLACE INTO sessions (session_id, access_token, username) VALUES ('s-alice', 'tok', 'alice')")
+    conn.commit()
+    conn.close()
+    return calls, failing
+
+
+def success(pipeline_id, username="alice"):
+    return {"type": "pipeline", "project_id": 63, "pipeline_id": pipeline_id, "platform": "android",
+            "username": username, "status": "success"}
+
+
+async def settle(prefetcher):
+    for _ in range(20):
+        await asyncio.sleep(0.01)
+        if prefetcher._running:
+            await asyncio.gather(*prefetcher._running)
+
+
+def test_success_is_not_lost_behind_a_burst(downloads):
+    calls, _ = downloads
+
+    async def scenario():
+        prefetcher = BuildPrefetcher("https://gitlab.test")
+        prefetcher.start({})
+        await asyncio.sleep(0)
+        # Published before the watcher runs again: more than a dashboard queue holds
+        hub.publish(success(1))
+        for i in range(hub.queue_size * 2):
+            hub.publish({"type": "pipeline", "project_id": 63, "pipeline_id": 100 + i, "status": "running",
+                         "username": "bob"})
+        hub.publish(success(2))
+        await settle(prefetcher)
+        await prefetcher.stop()
+        return prefetcher
+
+    prefetcher = asyncio.run(scenario())
+    assert calls == [1, 2]
+    assert [run["status"] for run in prefetcher.list("alice")] == ["success", "success"]
+
+
+def test_watcher_survives_a_failing_settings_read(downloads, monkeypatch):
+    calls, _ = downloads
+    reads = []
+
+    def get_settings(username):
+        reads.append(username)
+        if len(reads) == 1:
+            raise database.sqlite3.OperationalError("database is locked")
+        return {"enabled": True, "install": False}
+    monkeypatch.setattr(build_prefetch, "get_settings", get_settings)
+
+    async def scenario():
+        prefetcher = BuildPrefetcher("https://gitlab.test")
+        prefetcher.start({})
+        await asyncio.sleep(0)
+        hub.publish(success(1))
+        await settle(prefetcher)
+        hub.publish(success(1))  # redelivered: the first attempt never started
+        await settle(prefetcher)
+        watching = not prefetcher._task.done()
+        await prefetcher.stop()
+        return watching
+
+    assert asyncio.run(scenario())
+    assert calls == [1]
+
+
+def test_failed_run_is_retried_and_history_is_bounded(downloads, monkeypatch):
+    calls, failing = downloads
+    monkeypatch.setattr(build_prefetch, "HANDLED_SIZE", 3)
+    failing.add(1)
+
+    async def scenario():
+        prefetcher = BuildPrefetcher("https://gitlab.test")
+        for event in (success(1), success(1), success(1)):
+            await prefetcher._handle(event)
+            await settle(prefetcher)
+        for pipeline_id in range(2, 7):
+            await prefetcher._handle(success(pipeline_id))
+            await settle(prefetcher)
+        return prefetcher
+
+    prefetcher = asyncio.run(scenario())
+    # Failed once, fetched again on the next event, then remembered
+    assert calls == [1, 1, 2, 3, 4, 5, 6]
+    assert [run["status"] for run in prefetcher.list("alice")][-2:] == ["success", "failed"]
+    assert list(prefetcher._handled) == [(63, p, "android", "alice") for p in (4, 5, 6)]
@@ -0,0 +1,28 @@
+import os
+import stat
+import zipfile
+from app.services.gitlab_service import extract_zip_directory
+
+PREFIX = "build/ios/iphoneos/Runner.app"
+
+
+def test_app_keeps_modes_and_symlinks(tmp_path):
+    archive_path = tmp_path / "job.zip"
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(6):
+            archive.writestr(f"{PREFIX}/Frameworks/Flutter.framework/Versions/A/res{i}", os.urandom(1024))
+        binary = zipfile.ZipInfo(f"{PREFIX}/Runner")
+        binary.external_attr = (stat.S_IFREG | 0o755) << 16
+        archive.writestr(binary, b"\xcf\xfa\xed\xfe")
+        # The only member of its folder, with no directory entries in the archive
+        link = zipfile.ZipInfo(f"{PREFIX}/Frameworks/App.framework/Versions/Current")
+        link.external_attr = (stat.S_IFLNK | 0o777) << 16
+        archive.writestr(link, "A")
+        archive.writestr("build/ios/Runner.app.dSYM/Contents/Info.plist", b"plist")
+
+    final_dir = tmp_path / "Runner.app"
+    extract_zip_directory(str(archive_path), PREFIX, str(final_dir), workers=3)
+    assert os.access(final_dir / "Runner", os.X_OK)
+    assert os.readlink(final_dir / "Frameworks/App.framework/Versions/Current") == "A"
+    assert len(os.listdir(final_dir / "Frameworks/Flutter.framework/Versions/A")) == 6
+    assert not (tmp_path / "Runner.app.dSYM").exists()
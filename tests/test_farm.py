@@ -0,0 +1,121 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import database
+from app.routes import farm as farm_routes
+from app.services import lease_scheduler
+from app.services.farm_router import AgentConflict, FarmRouter
+from app.services.lease_scheduler import Lease
+
+database.init_db()
+TOKEN = "agent-secret"
+
+
+def inventory(avds=(), running=None, simulators=(), load=0.0):
+    return {"android": {"avds": list(avds), "running": running or {}},
+            "ios": {"simulators": list(simulators)}, "load": {"load_per_cpu": load}}
+
+
+class FakeAgents:
+    """Agent hosts answering /agent/inventory and /device-manager/... through httpx.MockTransport."""
+
+    def __init__(self, inventories):
+        self.inventories = inventories  # host -> inventory
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request)
+        if request.url.path == "/agent/inventory":
+            return httpx.Response(200, json=self.inventories[request.url.host])
+        return httpx.Response(200, json={"host": request.url.host, "path": request.url.path})
+
+
+@pytest.fixture
+def farm(monkeypatch):
+    agents = FakeAgents({
+        "host-a": inventory(avds=["Pixel_7", "Pixel_8"], running={"Pixel_8": ["emulator-5554"]}, load=0.9),
+        "host-b": inventory(avds=["Pixel_7"], simulators=[{"udid": "SIM-1", "state": "Shutdown"}], load=0.1),
+    })
+    router = FarmRouter()
+    router.client = httpx.AsyncClient(transport=httpx.MockTransport(agents.handler))
+    monkeypatch.setattr(farm_routes, "farm", router)
+    monkeypatch.setattr(farm_routes, "AGENT_TOKEN", TOKEN)
+    app = FastAPI()
+    app.include_router(farm_routes.router)
+    client = TestClient(app)
+    for host in ("host-a", "host-b"):
+        res = client.post("/farm/agents/register", params={"agent_id": host, "url": f"http://{host}:8101"},
+                          headers={"X-Farm-Agent-Token": TOKEN})
+        assert res.status_code == 200 and res.json()["healthy"]
+    return router, agents, client
+
+
+def test_registration_needs_the_agent_token(farm):
+    router, _, client = farm
+    params = {"agent_id": "host-c", "url": "http://host-c:8101"}
+    assert client.post("/farm/agents/register", params=params).status_code == 401
+    assert client.post("/farm/agents/register", params=params,
+                       headers={"X-Farm-Agent-Token": "wrong"}).status_code == 401
+    assert "host-c" not in router.agents
+
+
+def test_known_agent_cannot_move(farm):
+    router, _, client = farm
+    res = client.post("/farm/agents/register", params={"agent_id": "host-a", "url": "http://evil:8101"},
+                      headers={"X-Farm-Agent-Token": TOKEN})
+    assert res.status_code == 409
+    assert router.agents["host-a"].url == "http://host-a:8101"
+    with pytest.raises(AgentConflict):
+        router.register("host-b", "http://evil:8101")
+
+    assert client.delete("/farm/agents/host-a", headers={"X-Farm-Agent-Token": TOKEN}).status_code == 200
+    router.register("host-a", "http://host-a2:8101")
+    assert router.agents["host-a"].url == "http://host-a2:8101"
+
+
+def test_static_agent_is_renamed_on_registration():
+    router = FarmRouter(["http://host-a:8101/"])
+    assert list(router.agents) == ["http://host-a:8101"]
+    router.register("host-a", "http://host-a:8101")
+    assert list(router.agents) == ["host-a"]
+
+
+def test_placement_across_agents(farm):
+    router, _, client = farm
+    assert router.choose_for_boot("android", "Pixel_7").agent_id == "host-b"  # less loaded
+    assert router.choose_for_boot("android", "Pixel_8").agent_id == "host-a"  # already running there
+    assert router.owner_of("ios", "SIM-1").agent_id == "host-b"
+    assert router.owner_of("android", "Pixel_7") is None  # on both, running on neither
+    devices = client.get("/farm/devices").json()["devices"]
+    assert sorted((d["device"], d["agent_id"]) for d in devices) == [
+        ("Pixel_7", "host-a"), ("Pixel_7", "host-b"), ("Pixel_8", "host-a"), ("SIM-1", "host-b")]
+
+
+def test_proxy_forwards_session_and_checks_leases(farm, monkeypatch):
+    _, agents, client = farm
+    client.cookies.set("dev_farm_session", "s-alice")
+    res = client.post("/farm/android/emulator/start", params={"avd_name": "Pixel_7"})
+    assert res.status_code == 200 and res.headers["X-Farm-Agent"] == "host-b"
+    forwarded = [r for r in agents.requests if r.url.path == "/device-manager/android/emulator/start"][-1]
+    assert forwarded.headers["cookie"] == "dev_farm_session=s-alice"
+
+    lease = Lease("android", "android", "Pixel_8", "bob", 60)
+    monkeypatch.setitem(lease_scheduler.scheduler.leases, lease.id, lease)
+    res = client.post("/farm/android/emulator/stop", params={"avd_name": "Pixel_8"})
+    assert res.status_code == 409 and "bob" in res.json()["detail"]
+
+
+def test_reads_and_sockets_of_leased_devices_are_checked(farm, monkeypatch):
+    _, agents, client = farm
+    lease = Lease("android", "android", "Pixel_8", "bob", 60)
+    monkeypatch.setitem(lease_scheduler.scheduler.leases, lease.id, lease)
+    client.cookies.set("dev_farm_session", "s-alice")
+    res = client.get("/farm/android/emulator/logs", params={"avd_name": "Pixel_8"})
+    assert res.status_code == 409 and "bob" in res.json()["detail"]
+    assert not any(r.url.path == "/device-manager/android/emulator/logs" for r in agents.requests)
+    # Nothing named, nothing leased
+    assert client.get("/farm/android/emulators", params={"agent": "host-a"}).status_code == 200
+
+    with client.websocket_connect("/farm/android/logs/Pixel_8") as socket:
+        assert "bob" in socket.receive_json()["error"]
@@ -0,0 +1,41 @@
+import asyncio
+from app.services.gitlab_async import AsyncGitLabService
+
+
+class SlowService(AsyncGitLabService):
+    def __init__(self):
+        super().__init__("https://gitlab.example", "token")
+        self.fetches = 0
+
+    async def _fetch(self, url, entry):
+        self.fetches += 1
+        await asyncio.sleep(0.2)
+        return 200, {}, b'{"ok": true}'
+
+
+def test_concurrent_gets_share_one_fetch():
+    async def run():
+        gl = SlowService()
+        results = await asyncio.gather(*(gl._get("/projects/1/pipelines/7") for _ in range(5)))
+        return gl.fetches, results
+
+    fetches, results = asyncio.run(run())
+    assert fetches == 1
+    assert all(body == {"ok": True} for body, _ in results)
+
+
+def test_cancelled_leader_hands_fetch_to_follower():
+    async def run():
+        gl = SlowService()
+        leader = asyncio.create_task(gl._get("/projects/1/pipelines/8"))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(gl._get("/projects/1/pipelines/8"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        body, _ = await asyncio.wait_for(follower, 2)
+        return gl, body
+
+    gl, body = asyncio.run(run())
+    assert body == {"ok": True}
+    assert gl.fetches == 2
+    assert gl._inflight == {}
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from app.services.gitlab_http_cache import ConditionalCacheAdapter, ResponseCache
+
+PIPELINES = "/api/v4/projects/63/pipelines"
+
+
+class FakeGitLab(ThreadingHTTPServer):
+    """Pipelines of one project with ETags; `denied` tokens get a 404, `gate` holds responses."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.version = 1
+        self.denied = set()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.requests = []  # (method, token, If-None-Match)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=b"", etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        server.requests.append(("GET", token, self.headers.get("If-None-Match")))
+        server.gate.wait(5)
+        if token in server.denied:
+            return self._reply(404, b'{"message": "404 Project Not Found"}')
+        etag = f'W/"v{server.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._reply(304, etag=etag)
+        self._reply(200, json.dumps([{"id": server.version}]).encode(), etag)
+
+    def do_POST(self):
+        self.server.requests.append(("POST", None, None))
+        self.server.version += 1
+        self._reply(201, b"{}")
+
+
+@pytest.fixture
+def gitlab():
+    server = FakeGitLab()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cache = ResponseCache(fresh_seconds=60)
+    adapter = ConditionalCacheAdapter(cache)
+    yield server, cache, adapter
+    server.shutdown()
+    server.server_close()
+
+
+def session(adapter, token):
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.headers["Authorization"] = f"Bearer {token}"
+    return s
+
+
+def test_each_token_revalidates_before_seeing_a_cached_body(gitlab):
+    server, cache, adapter = gitlab
+    alice, bob, eve = (session(adapter, t) for t in ("tok-alice", "tok-bob", "tok-eve"))
+    assert alice.get(server.url + PIPELINES).json() == [{"id": 1}]
+    assert alice.get(server.url + PIPELINES).json() == [{"id": 1}]
+    assert server.requests == [("GET", "tok-alice", None)]  # the repeat never left the process
+
+    # bob is served the shared body only after GitLab answers 304 to bob's own token
+    assert bob.get(server.url + PIPELINES).json() == [{"id": 1}]
+    assert server.requests[-1] == ("GET", "tok-bob", 'W/"v1"')
+    server.denied.add("tok-eve")
+    res = eve.get(server.url + PIPELINES)
+    assert res.status_code == 404 and "Not Found" in res.text
+    assert (cache.hits, cache.revalidated) == (1, 1)
+
+
+def test_fresh_window_and_writes(gitlab):
+    server, cache, adapter = gitlab
+    alice = session(adapter, "tok-alice")
+    alice.get(server.url + PIPELINES)
+    # no-cache skips the fresh window but still only costs a 304
+    res = alice.get(server.url + PIPELINES, headers={"Cache-Control": "no-cache"})
+    assert res.json() == [{"id": 1}] and server.requests[-1] == ("GET", "tok-alice", 'W/"v1"')
+
+    # A write to the project drops freshness, so the next read sees the new ETag
+    alice.post(server.url + "/api/v4/projects/63/pipeline")
+    assert alice.get(server.url + PIPELINES).json() == [{"id": 2}]
+    assert server.requests[-1] == ("GET", "tok-alice", 'W/"v1"')
+    assert cache.stats()["entries"] == 1
+
+
+def test_concurrent_identical_gets_share_one_round_trip(gitlab):
+    server, cache, adapter = gitlab
+    server.gate.clear()
+    alice = [session(adapter, "tok-alice") for _ in range(5)]
+    bob = session(adapter, "tok-bob")
+    with ThreadPoolExecutor(6) as pool:
+        futures = [pool.submit(s.get, server.url + PIPELINES) for s in alice + [bob]]
+        while len(server.requests) < 2:
+            time.sleep(0.01)
+        time.sleep(0.1)  # let every follower join its flight
+        server.gate.set()
+        results = [f.result() for f in futures]
+
+    assert all(r.json() == [{"id": 1}] for r in results)
+    # One request per token: followers wait on the leader instead of calling GitLab
+    assert sorted(token for _, token, _ in server.requests) == ["tok-alice", "tok-bob"]
+    assert cache.coalesced == 4
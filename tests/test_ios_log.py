@@ -0,0 +1,60 @@
+import json
+import pytest
+from app.services.ios_log import build_log_stream_args, filter_key, format_compact, parse_ndjson
+
+UDID = "A1B2C3D4-0000-1111-2222-333344445555"
+
+
+def predicate(args):
+    return args[args.index("--predicate") + 1] if "--predicate" in args else None
+
+
+def test_filters_compile_into_the_predicate():
+    args = build_log_stream_args(UDID, process="Runner", subsystem="com.example.app", level="error")
+    assert args[:8] == ["xcrun", "simctl", "spawn", UDID, "log", "stream", "--style", "ndjson"]
+    assert predicate(args) == ('process == "Runner" AND subsystem == "com.example.app" '
+                               'AND (messageType == error OR messageType == fault)')
+    assert "--level" not in args
+    assert predicate(build_log_stream_args(UDID, level="FAULT")) == "messageType == fault"
+    assert build_log_stream_args(UDID) == args[:8]
+
+
+def test_low_levels_use_the_level_flag():
+    args = build_log_stream_args(UDID, process="Runner", level="debug")
+    assert args[args.index("--level") + 1] == "debug" and predicate(args) == 'process == "Runner"'
+    # default is what `log stream` emits without --level
+    assert build_log_stream_args(UDID, level="default") == build_log_stream_args(UDID)
+    with pytest.raises(ValueError):
+        build_log_stream_args(UDID, level="verbose")
+
+
+def test_predicate_literals_are_escaped():
+    args = build_log_stream_args(UDID, process='My "App"', subsystem="a\\b")
+    assert predicate(args) == r'process == "My \"App\"" AND subsystem == "a\\b"'
+
+
+def test_equivalent_filters_share_a_key():
+    assert filter_key("Runner", "", "ERROR") == filter_key("Runner", None, "error") == ("Runner", None, "error")
+    assert filter_key() == (None, None, None)
+
+
+def test_log_events_are_parsed_and_everything_else_skipped():
+    event = {
+        "eventType": "logEvent", "timestamp": "2026-10-19 09:41:07.123456+0000", "messageType": "Error",
+        "processImagePath": "/Users/ci/Library/Developer/CoreSimulator/Devices/X/data/Runner.app/Runner",
+        "processID": 4242, "subsystem": "com.example.app", "category": "network",
+        "eventMessage": "Request failed: timed out",
+    }
+    record = parse_ndjson(json.dumps(event))
+    assert record == {"ts": "2026-10-19 09:41:07.123456+0000", "level": "error", "process": "Runner", "pid": 4242,
+                      "subsystem": "com.example.app", "category": "network", "message": "Request failed: timed out"}
+    assert format_compact(record) == ("2026-10-19 09:41:07.123 E Runner[4242] [com.example.app:network] "
+                                      "Request failed: timed out")
+
+    bare = parse_ndjson(json.dumps({"eventMessage": "hello", "subsystem": "", "processImagePath": ""}))
+    assert (bare["level"], bare["process"], bare["subsystem"]) == (None, None, None)
+    assert format_compact(bare) == " Df ?[0] hello"
+
+    assert parse_ndjson("Filtering the log data using \"process == \\\"Runner\\\"\"") is None
+    assert parse_ndjson('{"eventType": "activityCreateEvent", "eventMessage": "x"}') is None
+    assert parse_ndjson('{"eventType": "logEvent", "eventMe') is None  # cut off mid-line
@@ -0,0 +1,96 @@
+import pytest
+from app.services import lease_scheduler
+from app.services.lease_scheduler import LeaseError, LeaseScheduler
+
+DEVICES = [("android", "Pixel_6"), ("android", "Pixel_7")]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(lease_scheduler.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler(clock):
+    return LeaseScheduler(resolve_class=lambda device_class: DEVICES, default_ttl=60, ticket_ttl=30)
+
+
+def test_queued_ticket_is_granted_when_a_device_frees(scheduler, clock):
+    first, _ = scheduler.acquire("alice", "android")
+    second, _ = scheduler.acquire("bob", "android")
+    assert {first.device, second.device} == {"Pixel_6", "Pixel_7"}
+    lease, ticket = scheduler.acquire("carol", "android")
+    assert lease is None and scheduler.position(ticket) == 1
+    assert scheduler.acquire("carol", "android")[1] is ticket  # asking again keeps the place
+
+    scheduler.release(first.id, "alice")
+    granted = scheduler.poll(ticket.id, "carol").lease
+    assert granted.owner == "carol" and granted.device == first.device
+    with pytest.raises(LeaseError):
+        scheduler.poll(ticket.id, "carol")  # handed out once
+    with pytest.raises(LeaseError):
+        scheduler.release(second.id, "carol")
+
+
+def test_fewest_leases_first_then_arrival_order(scheduler, clock):
+    held = [scheduler.acquire("alice", "android")[0] for _ in DEVICES]
+    tickets = {}
+    for owner in ("alice", "bob", "carol"):
+        clock.now += 1
+        tickets[owner] = scheduler.acquire(owner, "android")[1]
+
+    # alice still holds one device, so bob goes ahead of her even though she queued first
+    scheduler.release(held[0].id, "alice")
+    assert tickets["bob"].lease and not tickets["alice"].lease
+    # Now alice holds nothing either and has waited longest
+    scheduler.release(held[1].id, "alice")
+    assert tickets["alice"].lease and not tickets["carol"].lease
+    assert scheduler.position(tickets["carol"]) == 1
+
+
+def test_expired_leases_and_abandoned_tickets_are_reclaimed(scheduler, clock):
+    for owner in ("alice", "bob"):
+        scheduler.acquire(owner, "android", ttl=10)
+    waiting = scheduler.acquire("carol", "android")[1]
+    abandoned = scheduler.acquire("dave", "android")[1]
+
+    clock.now += 5
+    scheduler.heartbeat(scheduler.leases_for_owner("bob")[0].id, "bob")
+    clock.now += 6
+    # Polling reclaims alice's lapsed lease and hands the device to the head of the line
+    assert scheduler.poll(waiting.id, "carol").lease is not None
+    assert scheduler.reclaimed == 1 and not scheduler.leases_for_owner("alice")
+    assert scheduler.leases_for_owner("bob")
+
+    clock.now += 31  # dave never polled; bob never heartbeated again
+    snapshot = scheduler.snapshot()
+    assert abandoned.id not in scheduler.tickets and snapshot["queues"] == {}
+    assert [l["owner"] for l in snapshot["leases"]] == ["carol"]
+
+
+def test_wait_times_feed_the_metrics(scheduler, clock):
+    first = scheduler.acquire("alice", "android")[0]
+    scheduler.acquire("bob", "android")
+    ticket = scheduler.acquire("carol", "android")[1]
+    clock.now += 20
+    metrics = scheduler.metrics()["classes"]["android"]
+    assert (metrics["queued"], metrics["oldest_wait"], metrics["grants"]) == (1, 20.0, 2)
+
+    clock.now += 10
+    scheduler.release(first.id, "alice")
+    assert ticket.lease is not None
+    metrics = scheduler.metrics()
+    assert metrics["active_leases"] == 2
+    android = metrics["classes"]["android"]
+    assert (android["queued"], android["grants"], android["wait_max"], android["wait_p50"]) == (0, 3, 30.0, 0.0)
+    assert android["wait_avg"] == 10.0
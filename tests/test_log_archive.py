@@ -0,0 +1,83 @@
+import os
+import time
+from app.database import fts5_available, get_log_connection, init_log_db
+from app.services.log_archive import LogArchive
+
+
+def archived_bytes():
+    conn = get_log_connection()
+    total = conn.execute('SELECT COALESCE(SUM(compressed_size), 0) FROM log_segments').fetchone()[0]
+    conn.close()
+    return total
+
+
+def test_line_count_rotation_enforces_quota(tmp_path):
+    init_log_db()
+    archive = LogArchive(root=str(tmp_path), segment_max_lines=200, segment_max_seconds=3600, max_bytes=64 * 1024)
+    # Drive _ingest directly instead of through the writer thread
+    archive._conn = get_log_connection()
+    archive.has_fts = fts5_available(archive._conn)
+    batch = [("android", "emulator-5554", f"01-15 12:34:56.789 I/Bench( 1234): completed {os.urandom(64).hex()}")
+             for _ in range(5000)]
+    archive._ingest(batch)
+    # 25 segments of ~16 KiB were closed on line count alone; the oldest must be gone already
+    assert 0 < archived_bytes() <= 64 * 1024
+    assert len(os.listdir(tmp_path / os.listdir(tmp_path)[0])) < 25
+    assert archive.search(q="completed", limit=5)
+
+
+def line(message):
+    return f"01-15 12:34:56.789 I/App( 1234): {message}"
+
+
+def test_restart_seals_written_segments_and_drops_lost_ones(tmp_path):
+    init_log_db()
+    conn = get_log_connection()
+    for table in ("log_lines", "log_segments", "log_sessions"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+    conn.close()
+    crashed = LogArchive(root=str(tmp_path), segment_max_lines=1000, segment_max_seconds=3600)
+    crashed._conn = get_log_connection()
+    crashed.has_fts = fts5_available(crashed._conn)
+    crashed._ingest([("android", "emulator-5554", line("written before the crash")),
+                     ("android", "emulator-5556", line("only ever in memory"))])
+    # Process died after the rename in _close_segment but before the row update committed
+    written = crashed._active["emulator-5554"]
+    cursor = crashed._conn.cursor()
+    crashed._close_segment(cursor, "emulator-5554")
+    crashed._conn.rollback()
+    assert os.path.exists(written.path)
+
+    restarted = LogArchive(root=str(tmp_path))
+    restarted._conn = get_log_connection()
+    restarted.has_fts = crashed.has_fts
+    restarted._recover_unsealed()
+    assert restarted.recovered == {"sealed": 1, "dropped": 1}
+    assert [r["line"] for r in restarted.search()] == [line("written before the crash")]
+    sessions = restarted.list_sessions()
+    assert len(sessions) == 2 and all(s["ended_at"] is not None for s in sessions)
+    assert {(s["device"], s["lines"]) for s in sessions} == {("emulator-5554", 1), ("emulator-5556", 0)}
+
+
+def test_ingest_errors_are_counted(tmp_path, monkeypatch):
+    archive = LogArchive(root=str(tmp_path))
+    failures = []
+
+    def ingest(batch):
+        if not failures:
+            failures.append(batch)
+            raise OSError("disk full")
+        LogArchive._ingest(archive, batch)
+    monkeypatch.setattr(archive, "_ingest", ingest)
+    sink = archive.sink("android", "emulator-5554")
+    sink(line("lost"))
+    deadline = time.time() + 5
+    while not failures and time.time() < deadline:
+        time.sleep(0.01)
+    sink(line("kept"))
+    while archive.stats()["ingested"] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    stats = archive.stats()
+    assert stats["ingest_errors"] == 1 and stats["last_error"] == "disk full"
+    assert stats["ingested"] == 1 and stats["recovered"] is not None
@@ -0,0 +1,109 @@
+import asyncio
+import subprocess
+import sys
+import time
+from app.services.log_tap import LogTap
+
+
+def spawn(text, linger=30, delay=0):
+    """A producer that prints text (one line per line of text) after delay, then idles for linger seconds."""
+    script = f"import sys, time; time.sleep({delay}); print({text!r}, flush=True); time.sleep({linger})"
+    return lambda: subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_stop_ends_the_stream():
+    tap = LogTap("dev", spawn("first"))
+    received = []
+    tap.add_sink(received.append)
+    assert wait_for(lambda: received == ["first"])
+    tap.stop()
+    assert wait_for(lambda: received == ["first", None])
+    assert tap.process is None
+
+
+def test_restarted_tap_keeps_its_viewers():
+    tap = LogTap("dev", spawn("first", linger=0.2))
+    received = []
+    tap.add_sink(received.append)
+    assert wait_for(lambda: received == ["first"])
+    with tap._lock:
+        # Restart before the old reader can finish: it waits for this lock after EOF
+        tap.process.wait()
+        tap._spawn = spawn("second")
+        tap._start_locked()
+    assert wait_for(lambda: "second" in received)
+    time.sleep(0.2)
+    assert None not in received  # the old reader must not end the new stream
+    tap.stop()
+    assert wait_for(lambda: received[-1] is None)
+
+
+def test_failing_sink_does_not_end_the_stream():
+    tap = LogTap("dev", spawn("one\ntwo"))
+    received = []
+
+    def broken(line):
+        raise ValueError("archive is full")
+    tap.add_sink(broken)
+    tap.add_sink(received.append)
+    assert wait_for(lambda: received == ["one", "two"])
+    assert tap.is_running()
+    tap.stop()
+    assert wait_for(lambda: received == ["one", "two", None])
+    assert tap.sink_errors == 3
+
+
+def test_late_viewer_gets_the_backlog():
+    tap = LogTap("dev", spawn("\n".join(f"line {i}" for i in range(5))), backlog=3)
+    received = []
+    tap.add_sink(received.append)
+    assert wait_for(lambda: len(received) == 5)
+
+    async def view():
+        sub = tap.subscribe()
+        lines = [await sub.get() for _ in range(3)]
+        sub.close()
+        return lines
+
+    assert asyncio.run(view()) == ["line 2", "line 3", "line 4"]
+    tap.stop()
+
+
+def test_viewers_share_one_process_and_all_see_every_line():
+    spawned = []
+    start = spawn("a\nb", linger=0, delay=0.3)
+    tap = LogTap("dev", lambda: spawned.append(1) or start())
+
+    async def read(sub):
+        return [await sub.get_batch(interval=0.2), await sub.get_batch()]
+
+    async def view():
+        return await asyncio.gather(read(tap.subscribe()), read(tap.subscribe()))
+
+    first, second = asyncio.run(view())
+    assert first == second == [["a", "b"], None]
+    assert spawned == [1]
+
+
+def test_producer_outlives_last_viewer_for_the_grace_period():
+    tap = LogTap("dev", spawn("first"), grace_period=0.3)
+
+    async def visit():
+        sub = tap.subscribe()
+        await sub.get()
+        sub.close()
+        return tap.process
+
+    process = asyncio.run(visit())
+    assert asyncio.run(visit()) is process  # a reload within the grace period reuses it
+    time.sleep(0.1)
+    assert tap.is_running()
+    assert wait_for(lambda: process.poll() is not None)
+    assert wait_for(lambda: tap.process is None)
@@ -0,0 +1,160 @@
+import json
+import re
+import gitlab
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from app import database
+from app.database import get_connection
+from app.services.gitlab_http_cache import ConditionalCacheAdapter, ResponseCache
+from app.services.pipeline_sync import PipelineSync
+
+database.init_db()
+GITLAB_URL = "https://gitlab.test"
+NOW = "2026-10-19T10:00:00Z"
+
+
+class FakeGitLab:
+    """Pipelines API of a GitLab instance, answering requests.HTTPAdapter.send."""
+
+    def __init__(self):
+        self.pipelines = {}  # project_id -> {pipeline_id: status}
+        self.tokens = {"good"}
+        self.broken = set()  # project ids that answer 500
+        self.calls = []
+
+    def send(self, adapter, request, **kwargs):
+        path = request.path_url.split("?")[0]
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        self.calls.append(path)
+        match = re.fullmatch(r"/api/v4/projects/(\d+)/pipelines(?:/(\d+))?", path)
+        project_id = int(match.group(1))
+        if token not in self.tokens:
+            return self._response(request, 401, {"message": "401 Unauthorized"})
+        if project_id in self.broken:
+            return self._response(request, 500, {"message": "500 Internal Server Error"})
+        pipelines = self.pipelines.get(project_id, {})
+        if match.group(2):
+            pipeline_id = int(match.group(2))
+            return self._response(request, 200, {"id": pipeline_id, "status": pipelines[pipeline_id],
+                                                 "updated_at": NOW, "duration": 42, "finished_at": NOW})
+        body = [{"id": p, "status": s, "updated_at": NOW} for p, s in pipelines.items()]
+        etag = f'W/"{hash(json.dumps(body))}"'
+        if request.headers.get("If-None-Match") == etag:
+            return self._response(request, 304, None, {"ETag": etag})
+        return self._response(request, 200, body, {"ETag": etag})
+
+    @staticmethod
+    def _response(request, status, body, headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update({"Content-Type": "application/json", **(headers or {})})
+        response._content = json.dumps(body).encode() if body is not None else b""
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class FakeService:
+    def __init__(self, url, token):
+        self.gl = gitlab.Gitlab(url, oauth_token=token)
+        self.gl.session.mount(url, ConditionalCacheAdapter(ResponseCache()))
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    conn = get_connection()
+    conn.execute("DELETE FROM builds")
+    conn.execute("DELETE FROM sessions")
+    conn.commit()
+    conn.close()
+    server = FakeGitLab()
+    monkeypatch.setattr(HTTPAdapter, "send", lambda adapter, request, **kw: server.send(adapter, request, **kw))
+    return server
+
+
+def add_build(project_id, pipeline_id, status, username="alice"):
+    conn = get_connection()
+    conn.execute("INSERT INTO builds (pipeline_id, project_id, ref, platform, username, status) VALUES (?, ?, ?, ?, ?, ?)",
+                 (pipeline_id, project_id, "main", "android", username, status))
+    conn.commit()
+    conn.close()
+
+
+def add_session(session_id, token, username, created_at):
+    conn = get_connection()
+    conn.execute("INSERT INTO sessions (session_id, access_token, username, created_at) VALUES (?, ?, ?, ?)",
+                 (session_id, token, username, created_at))
+    conn.commit()
+    conn.close()
+
+
+def status_of(pipeline_id):
+    conn = get_connection()
+    row = conn.execute("SELECT status, duration FROM builds WHERE pipeline_id = ?", (pipeline_id,)).fetchone()
+    conn.close()
+    return row["status"], row["duration"]
+
+
+def test_one_listing_per_project_per_cycle(fake):
+    add_session("s1", "good", "alice", "2026-10-19 09:00:00")
+    add_build(63, 1, "running")
+    add_build(63, 2, "running")
+    add_build(64, 10, "pending")
+    fake.pipelines = {63: {1: "success", 2: "running"}, 64: {10: "pending"}}
+    sync = PipelineSync(FakeService, GITLAB_URL, interval=0)
+
+    cycle = sync.sync_once()
+    # Two listings plus one detail fetch for the pipeline that just finished
+    assert len(fake.calls) == 3 and cycle["gitlab_calls"] == 3
+    assert cycle["builds_updated"] == 1 and cycle["failed_projects"] == []
+    assert status_of(1) == ("success", 42)
+
+    fake.calls.clear()
+    cycle = sync.sync_once()
+    assert len(fake.calls) == 2  # nothing changed: one revalidated listing per project
+    assert cycle["builds_updated"] == 0
+
+
+def test_rejected_token_falls_back_to_older_session(fake):
+    add_session("s1", "good", "alice", "2026-10-19 09:00:00")
+    add_session("s2", "expired", "bob", "2026-10-19 09:30:00")
+    add_build(63, 1, "running", username="alice")
+    add_build(63, 1, "running", username="bob")
+    fake.pipelines = {63: {1: "failed"}}
+    sync = PipelineSync(FakeService, GITLAB_URL, interval=0)
+
+    cycle = sync.sync_once()
+    assert cycle["failed_projects"] == []
+    assert status_of(1) == ("failed", 42)
+
+
+def test_failing_project_does_not_block_others(fake):
+    add_session("s1", "good", "alice", "2026-10-19 09:00:00")
+    add_build(63, 1, "running")
+    add_build(64, 10, "running")
+    fake.pipelines = {63: {1: "success"}, 64: {10: "success"}}
+    fake.broken = {64}
+    sync = PipelineSync(FakeService, GITLAB_URL, interval=0)
+
+    cycle = sync.sync_once()
+    assert cycle["failed_projects"] == [64]
+    assert "project 64" in sync.last_error
+    assert status_of(1)[0] == "success"
+    assert status_of(10)[0] == "running"
+
+
+def test_manual_sync_requires_session(fake):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routes import gitlab as gitlab_routes
+
+    app = FastAPI()
+    app.include_router(gitlab_routes.router)
+    client = TestClient(app)
+    assert client.post("/gitlab/sync").status_code == 401
+    client.cookies.set("dev_farm_session", "nope")
+    assert client.post("/gitlab/sync").status_code == 401
+    add_session("s1", "good", "alice", "2026-10-19 09:00:00")
+    client.cookies.set("dev_farm_session", "s1")
+    assert client.post("/gitlab/sync").status_code == 200
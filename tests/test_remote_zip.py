@@ -0,0 +1,159 @@
+import asyncio
+import io
+import os
+import re
+import stat
+import struct
+import zipfile
+import httpx
+import pytest
+from app import database
+from app.services import gitlab_async, remote_zip
+from app.services.artifact_store import ArtifactStore
+from app.services.remote_zip import RangeNotSupported, RemoteZip, extract_remote_directory, extract_remote_member
+
+database.init_db()
+BINARY = os.urandom(200_000)
+
+
+def build_zip(zip64=False, monkeypatch=None):
+    """An iOS-style archive: an executable, a deflated plist, a symlink and a large stored member."""
+    if zip64:
+        # Every offset and size past 1 KiB goes into ZIP64 extras and end records
+        monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1024)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("build/notes.txt", b"x" * 5000, zipfile.ZIP_DEFLATED)
+        runner = zipfile.ZipInfo("build/Runner.app/Runner")
+        runner.external_attr = (stat.S_IFREG | 0o755) << 16
+        archive.writestr(runner, BINARY, zipfile.ZIP_STORED)
+        archive.writestr("build/Runner.app/Info.plist", b"<plist/>" * 100, zipfile.ZIP_DEFLATED)
+        link = zipfile.ZipInfo("build/Runner.app/Current")
+        link.external_attr = (stat.S_IFLNK | 0o777) << 16
+        archive.writestr(link, b"Info.plist")
+    data = bytearray(buffer.getvalue())
+    if zip64:
+        # zipfile only writes the sentinels once values overflow for real; readers must follow them
+        eocd = data.rfind(b"PK\x05\x06")
+        struct.pack_into("<HHII", data, eocd + 8, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF)
+    return bytes(data)
+
+
+class ZipServer:
+    """Serves one archive through httpx.MockTransport, answering single byte ranges with 206."""
+
+    def __init__(self, data, ranges=True):
+        self.data = data
+        self.ranges = ranges
+        self.drops = 0  # member reads still to cut off halfway
+        self.requests = []  # Range header of every request
+
+    def __call__(self, request):
+        spec = request.headers.get("Range")
+        self.requests.append(spec)
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", spec or "")
+        if not self.ranges or not match:
+            return httpx.Response(200, content=self.data)
+        first, last = match.groups()
+        size = len(self.data)
+        start = size - int(last) if not first else int(first)
+        end = size - 1 if not first or not last else min(int(last), size - 1)
+        body = self.data[start:end + 1]
+        if first and self.drops:
+            self.drops -= 1
+            body = body[:len(body) // 2]
+        return httpx.Response(206, content=body, headers={"Content-Range": f"bytes {start}-{end}/{size}"})
+
+
+def run(server, extract):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+            return await extract(client)
+    return asyncio.run(main())
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(remote_zip, "RETRY_BACKOFF", 0)
+
+
+@pytest.mark.parametrize("tail_bytes", [64 * 1024, 42])
+def test_zip64_records_are_followed(tmp_path, monkeypatch, tail_bytes):
+    # 42 bytes holds only the end record and the ZIP64 locator, so the ZIP64 record and directory need their own GETs
+    server = ZipServer(build_zip(zip64=True, monkeypatch=monkeypatch))
+    monkeypatch.setattr(remote_zip, "TAIL_BYTES", tail_bytes)
+    target = tmp_path / "Runner.app"
+    remote = run(server, lambda client: extract_remote_directory(
+        client, "http://gitlab/artifacts", {}, "build/Runner.app", str(target)))
+
+    # Stored as 0xFFFFFFFF in the directory; only the ZIP64 extras carry the real values
+    assert remote.members["build/Runner.app/Runner"].size == len(BINARY)
+    assert remote.members["build/Runner.app/Info.plist"].offset > len(BINARY)
+    assert (target / "Runner").read_bytes() == BINARY
+    assert os.stat(target / "Runner").st_mode & 0o777 == 0o755
+    assert os.readlink(target / "Current") == "Info.plist"
+    assert (target / "Info.plist").read_bytes() == b"<plist/>" * 100
+    assert remote.requests == (2 if tail_bytes > 1024 else 4)
+
+
+def test_member_resumes_across_ranged_requests(tmp_path):
+    server = ZipServer(build_zip())
+    server.drops = 2
+    target = tmp_path / "Runner"
+    remote = run(server, lambda client: extract_remote_member(
+        client, "http://gitlab/artifacts", {}, "build/Runner.app/Runner", str(target)))
+
+    assert target.read_bytes() == BINARY
+    assert remote.retries == 2
+    member = remote.members["build/Runner.app/Runner"]
+    starts = [int(spec[6:].split("-")[0]) for spec in server.requests[1:]]
+    # Each reopened request starts at the first byte not yet received, never at the member again
+    assert starts[0] == member.offset and starts[0] < starts[1] < starts[2] < member.end
+    assert remote.bytes_fetched < len(server.data) + remote_zip.TAIL_BYTES
+
+
+def test_large_runs_are_split_over_parallel_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(remote_zip, "MIN_SPAN", 1024)
+    members = {f"build/part{i}.bin": os.urandom(50_000) for i in range(8)}
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    server = ZipServer(buffer.getvalue())
+    targets = {name: str(tmp_path / os.path.basename(name)) for name in members}
+
+    async def extract(client):
+        remote = await RemoteZip(client, "http://gitlab/artifacts").open()
+        await remote.extract(targets)
+        return remote
+
+    remote = run(server, extract)
+    assert remote.requests == 1 + remote_zip.EXTRACT_WORKERS
+    for name, data in members.items():
+        assert open(targets[name], "rb").read() == data
+
+
+def test_server_ignoring_range_falls_back_to_full_download(tmp_path, monkeypatch):
+    server = ZipServer(build_zip(), ranges=False)
+    with pytest.raises(RangeNotSupported):
+        run(server, lambda client: RemoteZip(client, "http://gitlab/artifacts").open())
+
+    class Service(gitlab_async.AsyncGitLabService):
+        async def get_job(self, project_id, job_id):
+            return {"id": job_id, "pipeline": {"id": 5}}
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server)) as client:
+            monkeypatch.setattr(gitlab_async, "get_client", lambda: client)
+            return await Service("http://gitlab", "token").download_and_extract_artifact(
+                63, 7, "build/Runner.app/Runner", "5.ipa")
+
+    server.requests.clear()
+    monkeypatch.setattr(gitlab_async, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(gitlab_async, "store", ArtifactStore(root=str(tmp_path / "store"), quota_bytes=1 << 30))
+    monkeypatch.setattr(gitlab_async.catalog, "record", lambda *args, **kwargs: None)
+    path = asyncio.run(main())
+    with open(path, "rb") as f:
+        assert f.read() == BINARY
+    assert server.requests == ["bytes=-65536", None]
+    assert not (tmp_path / "artifacts" / "temp_7.zip").exists()
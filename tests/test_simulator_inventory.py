@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+import pytest
+from app.services.ios_device_manager import IOSDeviceManager
+from app.services.simulator_inventory import SimulatorInventory
+
+UDID = "5A1E-0001"
+LISTING = {
+    "devices": {"com.apple.CoreSimulator.SimRuntime.iOS-17-2": [
+        {"udid": UDID, "name": "iPhone 15", "state": "Shutdown"},
+    ]},
+    "devicetypes": [{"identifier": "com.apple.CoreSimulator.SimDeviceType.iPhone-15"}],
+    "runtimes": [{"identifier": "com.apple.CoreSimulator.SimRuntime.iOS-17-2"}],
+}
+
+
+@pytest.fixture
+def xcrun(tmp_path, monkeypatch):
+    """Stub `xcrun` on PATH that logs every fork and prints the listing from output.json."""
+    forks = tmp_path / "forks"
+    output = tmp_path / "output.json"
+    output.write_text(json.dumps(LISTING))
+    script = tmp_path / "xcrun"
+    script.write_text(f"#!/bin/sh\necho \"$*\" >> {forks}\nsleep 0.05\ncat {output}\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+    class Stub:
+        def count(self):
+            return len(forks.read_text().splitlines()) if forks.exists() else 0
+
+        def set_output(self, text):
+            output.write_text(text)
+    return Stub()
+
+
+def test_reads_share_one_fork(xcrun):
+    inventory = SimulatorInventory(refresh_interval=0)
+    threads = [threading.Thread(target=inventory.devices) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for _ in range(50):
+        inventory.devices()
+        inventory.get(UDID)
+        inventory.device_types()
+        inventory.runtimes()
+    assert xcrun.count() == 1
+
+    inventory.set_state(UDID, "Booted")
+    assert inventory.get(UDID)["state"] == "Booted" and xcrun.count() == 1
+    inventory.invalidate()
+    inventory.devices()
+    assert xcrun.count() == 2
+
+
+def test_listing_that_raced_an_update_is_read_again():
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        if len(fetches) == 1:
+            # simctl answered with the old state, but the boot finished meanwhile
+            inventory.set_state(UDID, "Booted")
+            return json.loads(json.dumps(LISTING))
+        listing = json.loads(json.dumps(LISTING))
+        listing["devices"]["com.apple.CoreSimulator.SimRuntime.iOS-17-2"][0]["state"] = "Booted"
+        return listing
+
+    inventory = SimulatorInventory(fetch=fetch, refresh_interval=0)
+    inventory.refresh()
+    assert len(fetches) == 2
+    assert inventory.get(UDID)["state"] == "Booted"
+
+
+def test_unparseable_listing_gives_empty_types_and_runtimes(xcrun):
+    xcrun.set_output("xcrun: error: unable to find utility \"simctl\"")
+    manager = IOSDeviceManager()
+    manager.inventory.refresh_interval = 0
+    assert manager.list_device_types() == []
+    assert manager.list_runtimes() == []
@@ -0,0 +1,171 @@
+import itertools
+import pytest
+from app.services import simulator_pool
+from app.services.simulator_pool import SimulatorPool
+
+DEVICE_TYPE = "com.apple.CoreSimulator.SimDeviceType.iPhone-15"
+RUNTIME = "com.apple.CoreSimulator.SimRuntime.iOS-17-2"
+
+
+class FakeInventory:
+    def __init__(self, devices):
+        self.devices_by_udid = devices
+
+    def devices(self):
+        return [dict(d, udid=u) for u, d in self.devices_by_udid.items()]
+
+    def invalidate(self):
+        pass
+
+    def set_state(self, udid, state):
+        if udid in self.devices_by_udid:
+            self.devices_by_udid[udid]["state"] = state
+
+    def remove(self, udid):
+        self.devices_by_udid.pop(udid, None)
+
+
+class FakeManager:
+    def __init__(self):
+        self.inventory = FakeInventory({})
+
+
+class FakeSimctlPool(SimulatorPool):
+    """SimulatorPool over an in-memory device set standing in for `xcrun simctl`."""
+
+    def __init__(self):
+        super().__init__(FakeManager(), return_mode="discard")
+        self.devices = self.manager.inventory.devices_by_udid
+        self.apps = {}  # udid -> installed app paths
+        self.calls = []
+        self._ids = itertools.count(1)
+
+    def _simctl(self, *args, timeout=600):
+        self.calls.append(args)
+        command = args[0]
+        if command == "create":
+            udid = f"UDID-{next(self._ids)}"
+            self.devices[udid] = {"name": args[1], "state": "Shutdown"}
+            self.apps[udid] = []
+            return udid
+        if command == "clone":
+            if args[1] not in self.devices:
+                raise RuntimeError(f"simctl clone failed: {args[1]} not found")
+            udid = f"UDID-{next(self._ids)}"
+            self.devices[udid] = {"name": args[2], "state": "Shutdown"}
+            self.apps[udid] = list(self.apps[args[1]])
+            return udid
+        if command == "install":
+            self.apps[args[1]].append(args[2])
+        elif command == "delete":
+            if args[1] not in self.devices:
+                raise RuntimeError("simctl delete failed: not found")
+            del self.devices[args[1]]
+        elif command in ("shutdown", "bootstatus") and args[1] not in self.devices:
+            raise RuntimeError(f"simctl {command} failed: not found")
+        return ""
+
+
+class FreeAdmission:
+    def acquire(self, name):
+        return name
+
+    def release(self, ticket):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(simulator_pool, "admission", FreeAdmission())
+    pool = FakeSimctlPool()
+    pool.configs[(DEVICE_TYPE, RUNTIME)] = simulator_pool.PoolConfig(DEVICE_TYPE, RUNTIME, 0, ["/apps/v1.app"])
+    return pool
+
+
+def goldens(pool):
+    return {u: d["name"] for u, d in pool.devices.items() if d["name"].startswith("farm-golden")}
+
+
+def test_changed_preload_apps_rebuild_golden(pool):
+    key = (DEVICE_TYPE, RUNTIME)
+    first = pool._ensure_golden(key)
+    assert pool.apps[first] == ["/apps/v1.app"]
+
+    pool.configure(DEVICE_TYPE, RUNTIME, 0, ["/apps/v2.app"])
+    second = pool._ensure_golden(key)
+    assert second != first
+    assert pool.apps[second] == ["/apps/v2.app"]
+    assert list(goldens(pool)) == [second]  # the stale golden was deleted, not adopted
+
+
+def test_golden_with_same_apps_is_adopted_after_restart(pool):
+    key = (DEVICE_TYPE, RUNTIME)
+    golden = pool._ensure_golden(key)
+    pool.golden.clear()  # as after a restart
+    assert pool._ensure_golden(key) == golden
+    assert sum(1 for call in pool.calls if call[0] == "create") == 1
+
+
+def test_broken_golden_is_rebuilt_not_readopted(pool):
+    key = (DEVICE_TYPE, RUNTIME)
+    golden = pool._ensure_golden(key)
+    real_simctl = pool._simctl
+
+    def broken_clone(*args, **kwargs):
+        if args[0] == "clone" and args[1] == golden:
+            raise RuntimeError("simctl clone failed: data container corrupt")
+        return real_simctl(*args, **kwargs)
+
+    pool._simctl = broken_clone
+    clone, source = pool._clone_and_boot(key)
+    assert source != golden
+    assert golden not in pool.devices
+    assert pool.apps[clone] == ["/apps/v1.app"]
+
+
+def test_ready_clones_of_old_golden_are_drained(pool):
+    key = (DEVICE_TYPE, RUNTIME)
+    clone, _ = pool._clone_and_boot(key)
+    pool.ready[key].append(clone)
+    pool._discard_all = lambda udids: [pool._discard(u) for u in udids]
+    pool._ensure_worker = lambda: None
+    pool.configure(DEVICE_TYPE, RUNTIME, 0, ["/apps/v2.app"])
+    assert not pool.ready[key]
+
+
+def erasing(pool):
+    real_simctl = pool._simctl
+
+    def simctl(*args, **kwargs):
+        if args[0] == "erase":
+            pool.calls.append(args)
+            pool.apps[args[1]] = []  # erase wipes installed apps with everything else
+            return ""
+        return real_simctl(*args, **kwargs)
+
+    pool._simctl = simctl
+    pool.return_mode = "erase"
+
+
+def test_erased_clone_comes_back_with_its_apps(pool):
+    key = (DEVICE_TYPE, RUNTIME)
+    erasing(pool)
+    clone = pool.acquire(DEVICE_TYPE, RUNTIME)["udid"]
+    with pool._cond:
+        pool.in_use.pop(clone)
+    pool._recycle(clone, key)
+    assert list(pool.ready[key]) == [clone]
+    assert pool.apps[clone] == ["/apps/v1.app"]
+
+
+def test_erased_clone_of_old_golden_is_discarded(pool):
+    key = (DEVICE_TYPE, RUNTIME)
+    erasing(pool)
+    pool._ensure_worker = lambda: None
+    clone = pool.acquire(DEVICE_TYPE, RUNTIME)["udid"]
+    with pool._cond:
+        pool.in_use.pop(clone)
+    pool.configure(DEVICE_TYPE, RUNTIME, 0, ["/apps/v2.app"])
+    pool._recycle(clone, key)
+    assert not pool.ready[key]
+    assert clone not in pool.devices